@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
+import re
+import sys
 from enum import Enum
 
 import aws_cdk as cdk
 import yaml
 
+from cdk.capacity_profiles import capacity_report
 from cdk.main import RagChatbotStack
 
 
@@ -15,16 +18,74 @@ class CommunicationChannels(Enum):
     CHAT_VOICE_AND_SMS = "chat_voice_and_sms"
 
 
-def create_app():
-    CONFIG_PATH = "./config.yaml"
-    config = yaml.safe_load(open(CONFIG_PATH))
+# Channels the orchestrator tailors answers for (channel_profiles keys)
+ANSWER_CHANNELS = ("voice", "chat", "sms")
 
-    database_name = config["database_name"]
-    knowledge_base_name = config["knowledge_base_name"]
-    embeddings_model_id = config["embeddings_model_id"]
-    bedrock_model_id = config["bedrock_model_id"]
-    chunking_strategy = config["chunking_strategy"]
+# Bedrock knowledge base limit on numberOfResults
+MAX_RETRIEVAL_RESULTS = 100
+
+# Program knowledge base names become vector table names (bedrock_kb_<name>)
+PROGRAM_NAME_PATTERN = re.compile(r"^[a-z][a-z0-9_]{0,30}$")
+RESERVED_PROGRAM_NAMES = {"main", "green"}
 
+
+def validate_program_knowledge_bases(programs, fan_out, main_prefix=None):
+    names = [program["name"] for program in programs]
+    invalid = [name for name in names if not PROGRAM_NAME_PATTERN.match(name)]
+    if invalid:
+        raise ValueError(
+            f"Invalid knowledge_bases names {invalid}: use lowercase "
+            "letters, digits and underscores, starting with a letter"
+        )
+    if len(set(names)) != len(names) or RESERVED_PROGRAM_NAMES & set(names):
+        raise ValueError(
+            "knowledge_bases names must be unique and not main or green, "
+            "which name the knowledge base from knowledge_base_name and its "
+            "blue/green slot"
+        )
+    unknown = set(fan_out.get("sources", [])) - {"main", *names}
+    if unknown:
+        raise ValueError(
+            f"Unknown fan_out sources {sorted(unknown)}, expected main or "
+            "a knowledge_bases name"
+        )
+    prefixes = [
+        program.get("prefix", f"{program['name']}/") for program in programs
+    ]
+    if main_prefix is None:
+        if prefixes:
+            print(
+                "main knowledge base ingests the whole bucket, so documents "
+                f"under {', '.join(prefixes)} are also embedded in its table; "
+                "set main_knowledge_base_prefix to ingest each document once",
+                file=sys.stderr,
+            )
+        return
+    overlapping = [
+        prefix
+        for prefix in prefixes
+        if prefix.startswith(main_prefix) or main_prefix.startswith(prefix)
+    ]
+    if not main_prefix or overlapping:
+        raise ValueError(
+            f"main_knowledge_base_prefix {main_prefix!r} must be non-empty and "
+            f"not overlap the knowledge_bases prefixes {overlapping}"
+        )
+
+
+def validate_rate_limit(rate_limit):
+    # The orchestrator fills a missing rate or burst from its defaults
+    # (rate_limit.load_settings), which pass
+    for scope in ("session", "global"):
+        bucket = rate_limit.get(scope, {})
+        if bucket.get("rate", 1) <= 0 or bucket.get("burst", 1) < 1:
+            raise ValueError(
+                f"rate_limit.{scope} needs rate > 0 and burst >= 1, got "
+                f"{bucket}"
+            )
+
+
+def build_chunking_config(config, chunking_strategy):
     # Create base configuration dict with all parameters as default values
     chunking_config = {
         "overlap_tokens": 60,
@@ -67,20 +128,109 @@ def create_app():
             }
         )
 
+    return chunking_config
+
+
+def create_app():
+    CONFIG_PATH = "./config.yaml"
+    config = yaml.safe_load(open(CONFIG_PATH))
+
+    database_name = config["database_name"]
+    knowledge_base_name = config["knowledge_base_name"]
+    embeddings_model_id = config["embeddings_model_id"]
+    bedrock_model_id = config["bedrock_model_id"]
+    chunking_strategy = config["chunking_strategy"]
+
+    chunking_config = build_chunking_config(config, chunking_strategy)
+
+    # Blue/green: the green slot inherits every setting it does not override
+    blue_green = config.get("blue_green", {"enabled": False})
+    if blue_green.get("enabled"):
+        green_config = {**config, **blue_green.get("green", {})}
+        blue_green = {
+            **blue_green,
+            "green": {
+                "embeddings_model_id": green_config["embeddings_model_id"],
+                "embedding_dimension": green_config.get(
+                    "embedding_dimension", 1024
+                ),
+                "chunking_strategy": green_config["chunking_strategy"],
+                "chunking_config": build_chunking_config(
+                    green_config, green_config["chunking_strategy"]
+                ),
+            },
+        }
+
+    channel_profiles = config.get("channel_profiles", {})
+    unknown_channels = set(channel_profiles) - set(ANSWER_CHANNELS)
+    if unknown_channels:
+        raise ValueError(
+            f"Unknown channel_profiles {sorted(unknown_channels)}, "
+            f"expected {', '.join(ANSWER_CHANNELS)}"
+        )
+
+    adaptive_retrieval = config.get("adaptive_retrieval", {})
+    min_results = adaptive_retrieval.get("min_results", 1)
+    max_results = adaptive_retrieval.get("max_results", MAX_RETRIEVAL_RESULTS)
+    if not 1 <= min_results <= max_results <= MAX_RETRIEVAL_RESULTS:
+        raise ValueError(
+            "adaptive_retrieval needs 1 <= min_results <= max_results <= "
+            f"{MAX_RETRIEVAL_RESULTS}, got {min_results} and {max_results}"
+        )
+
+    program_knowledge_bases = config.get("knowledge_bases", [])
+    main_knowledge_base_prefix = config.get("main_knowledge_base_prefix")
+    fan_out = config.get("fan_out", {})
+    validate_program_knowledge_bases(
+        program_knowledge_bases, fan_out, main_knowledge_base_prefix
+    )
+
+    rate_limit = config.get("rate_limit", {})
+    validate_rate_limit(rate_limit)
+
+    capacity_profiles = config.get("capacity_profiles", {})
+    print(
+        capacity_report(capacity_profiles, config["environment"]),
+        file=sys.stderr,
+    )
+
     app = cdk.App()
 
-    RagChatbotStack(
+    stack = RagChatbotStack(
         app,
         "RagChatbotStack",
         database_name=database_name,
         knowledge_base_name=knowledge_base_name,
         embeddings_model_id=embeddings_model_id,
         bedrock_model_id=bedrock_model_id,
+        orchestrator_config=config.get("orchestrator", {}),
+        fulfillment_updates_config=config.get("fulfillment_updates", {}),
+        channel_profiles=channel_profiles,
+        context_compression_config=config.get("context_compression", {}),
+        adaptive_retrieval_config=adaptive_retrieval,
+        session_store_config=config.get("session_store", {}),
+        prefetch_config=config.get("prefetch", {}),
+        fan_out_config=fan_out,
+        rate_limit_config=rate_limit,
+        answer_queue_config=config.get("answer_queue", {}),
+        answer_store_config=config.get("answer_store", {}),
+        retrieval_cache_config=config.get("retrieval_cache", {}),
+        redaction_config=config.get("redaction", {}),
+        normalization_config=config.get("normalization", {}),
+        kb_version_check_schedule=config.get("kb_version_check_schedule"),
         chunking_strategy=chunking_strategy,
         chunking_config=chunking_config,
+        maintenance_config=config.get("vector_store_maintenance", {}),
+        capacity_profiles=capacity_profiles,
+        blue_green=blue_green,
+        program_knowledge_bases=program_knowledge_bases,
+        main_knowledge_base_prefix=main_knowledge_base_prefix,
         environment=config["environment"],
+        bundling_config=config.get("bundling", {}),
         chat_welcome_prompt=config["chat_welcome_prompt"],
     )
+    stack.bundler.prune()
+    print(stack.bundler.report(), file=sys.stderr)
 
     app.synth()
 
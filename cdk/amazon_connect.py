@@ -2,7 +2,6 @@ import uuid
 from string import Template
 
 from aws_cdk import (
-    BundlingOptions,
     CustomResource,
     Duration,
     RemovalPolicy,
@@ -24,6 +23,8 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+from .bundling import LambdaBundler
+
 
 class Connect(Construct):
     def __init__(
@@ -36,6 +37,7 @@ class Connect(Construct):
         account_id: str,
         region: str,
         stack_name: str,
+        bundler: LambdaBundler,
         **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
@@ -67,10 +69,10 @@ class Connect(Construct):
         #     country_code="US",
         # )
 
-        # Lambda Role for GetSecurityProfile
-        get_security_profile_role = iam.Role(
+        # Lambda Role for the Connect resource resolver
+        resolve_connect_resources_role = iam.Role(
             self,
-            "GetSecurityProfileRole",
+            "ResolveConnectResourcesRole",
             assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
             managed_policies=[
                 iam.ManagedPolicy.from_aws_managed_policy_name(
@@ -79,108 +81,48 @@ class Connect(Construct):
             ],
         )
 
-        get_security_profile_role.add_to_policy(
+        resolve_connect_resources_role.add_to_policy(
             iam.PolicyStatement(
-                actions=["connect:ListSecurityProfiles"],
-                resources=[
-                    f"arn:aws:connect:{region}:{account_id}:instance*",
+                actions=[
+                    "connect:ListQueues",
+                    "connect:ListRoutingProfiles",
+                    "connect:ListSecurityProfiles",
                 ],
-            )
-        )
-
-        # Lambda Function for GetSecurityProfile
-        get_security_profile_lambda = lambda_.Function(
-            self,
-            "LambdaFunctionGetSecurityProfile",
-            handler="get_security_profile.lambda_handler",
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            code=lambda_.Code.from_asset(
-                "src/get_security_profile",
-                bundling=BundlingOptions(
-                    image=lambda_.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        "pip install cfnresponse==1.1.5 -t /asset-output && cp -au . /asset-output",
-                    ],
-                ),
-            ),
-            role=get_security_profile_role,
-            memory_size=128,
-            timeout=Duration.seconds(30),
-            environment={
-                "LOG_LEVEL": "INFO",
-                "INSTANCE_ID": connect_instance.ref,
-            },
-        )
-
-        # Custom Resource for Security Profile Agent
-        security_profile_agent = CustomResource(
-            self,
-            "CustomResourceGetSecurityProfileAgent",
-            service_token=get_security_profile_lambda.function_arn,
-            properties={"SecurityProfileName": "Agent"},
-        )
-
-        # Custom Resource for Security Profile Admin
-        security_profile_admin = CustomResource(
-            self,
-            "CustomResourceGetSecurityProfileAdmin",
-            service_token=get_security_profile_lambda.function_arn,
-            properties={"SecurityProfileName": "Admin"},
-        )
-
-        # Lambda Role for GetRoutingProfile
-        get_routing_profile_role = iam.Role(
-            self,
-            "GetRoutingProfileRole",
-            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
-            managed_policies=[
-                iam.ManagedPolicy.from_aws_managed_policy_name(
-                    "service-role/AWSLambdaBasicExecutionRole"
-                )
-            ],
-        )
-
-        get_routing_profile_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=["connect:ListRoutingProfiles"],
                 resources=[f"arn:aws:connect:{region}:{account_id}:instance*"],
             )
         )
 
-        # Lambda Function for GetRoutingProfile
-        get_routing_profile_lambda = lambda_.Function(
+        # Lambda Function resolving queue, routing and security profile names
+        resolve_connect_resources_lambda = lambda_.Function(
             self,
-            "LambdaFunctionGetRoutingProfile",
-            handler="get_routing_profile.lambda_handler",
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            code=lambda_.Code.from_asset(
-                "src/get_routing_profile",
-                bundling=BundlingOptions(
-                    image=lambda_.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        "pip install cfnresponse==1.1.5 -t /asset-output && cp -au . /asset-output",
-                    ],
-                ),
+            "LambdaFunctionResolveConnectResources",
+            handler="connect_resource_resolver.lambda_handler",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=bundler.code(
+                "src/connect_resource_resolver", lambda_.Runtime.PYTHON_3_12
             ),
-            role=get_routing_profile_role,
+            layers=bundler.layers("src/connect_resource_resolver"),
+            role=resolve_connect_resources_role,
             memory_size=128,
-            timeout=Duration.seconds(30),
+            timeout=Duration.seconds(60),
             environment={
                 "LOG_LEVEL": "INFO",
                 "INSTANCE_ID": connect_instance.ref,
             },
         )
 
-        # Custom Resource for Routing Profile Basic
-        routing_profile_basic = CustomResource(
+        # Custom Resource resolving every name in a single invocation
+        connect_resources = CustomResource(
             self,
-            "CustomResourceGetRoutingProfileBasic",
-            service_token=get_routing_profile_lambda.function_arn,
-            properties={"RoutingProfileName": "Basic Routing Profile"},
+            "CustomResourceResolveConnectResources",
+            service_token=resolve_connect_resources_lambda.function_arn,
+            properties={
+                "Queues": {
+                    "Basic": {"Name": "BasicQueue", "Types": ["STANDARD"]}
+                },
+                "RoutingProfiles": {"Basic": "Basic Routing Profile"},
+                "SecurityProfiles": {"Agent": "Agent", "Admin": "Admin"},
+            },
         )
 
         # Lambda Role for Generate Random String
@@ -208,17 +150,10 @@ class Connect(Construct):
             "LambdaFunctionGenerateRandomString",
             handler="generate_random_string.lambda_handler",
             runtime=lambda_.Runtime.PYTHON_3_9,
-            code=lambda_.Code.from_asset(
-                "src/generate_random_string",
-                bundling=BundlingOptions(
-                    image=lambda_.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        "pip install cfnresponse==1.1.5 -t /asset-output && cp -au . /asset-output",
-                    ],
-                ),
+            code=bundler.code(
+                "src/generate_random_string", lambda_.Runtime.PYTHON_3_9
             ),
+            layers=bundler.layers("src/generate_random_string"),
             role=generate_random_string_role,
             memory_size=128,
             timeout=Duration.seconds(3),
@@ -241,64 +176,6 @@ class Connect(Construct):
             properties={"StringLength": "15", "SecurityProfileName": "Admin"},
         )
 
-        # Lambda Role for GetContactQueue
-        get_contact_queue_role = iam.Role(
-            self,
-            "GetContactQueueRole",
-            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
-            managed_policies=[
-                iam.ManagedPolicy.from_aws_managed_policy_name(
-                    "service-role/AWSLambdaBasicExecutionRole"
-                )
-            ],
-        )
-
-        get_contact_queue_role.add_to_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=["connect:*"],
-                resources=[f"arn:aws:connect:{region}:{account_id}:*"],
-            )
-        )
-
-        # Lambda Function for GetContactQueue
-        get_contact_queue_lambda = lambda_.Function(
-            self,
-            "LambdaFunctionGetContactQueue",
-            handler="get_contact_queue.lambda_handler",
-            runtime=lambda_.Runtime.PYTHON_3_9,
-            code=lambda_.Code.from_asset(
-                "src/get_contact_queue",
-                bundling=BundlingOptions(
-                    image=lambda_.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        "pip install cfnresponse==1.1.5 -t /asset-output && cp -au . /asset-output",
-                    ],
-                ),
-            ),
-            role=get_contact_queue_role,
-            memory_size=128,
-            timeout=Duration.seconds(30),
-            environment={
-                "LOG_LEVEL": "INFO",
-                "INSTANCE_ID": connect_instance.ref,
-            },
-        )
-
-        # Custom Resource for Customer Queue
-        customer_queue = CustomResource(
-            self,
-            "CustomResourceGetCustomerQueue",
-            service_token=get_contact_queue_lambda.function_arn,
-            properties={
-                "ContactQueueName": "BasicQueue",
-                "ContactQueueTypes": ["STANDARD"],
-                "SecurityProfileName": "Admin",
-            },
-        )
-
         contact_template = Template("""
             {
               "Version": "2019-10-30",
@@ -352,6 +229,43 @@ class Connect(Construct):
                       "y": 8
                     },
                     "dynamicParams": []
+                  },
+                  "check-agent-transfer": {
+                    "position": {
+                      "x": 880,
+                      "y": -40
+                    },
+                    "conditions": [],
+                    "conditionMetadata": [
+                      {
+                        "operator": {
+                          "name": "Equals",
+                          "value": "Equals",
+                          "shortDisplay": "="
+                        },
+                        "value": "true"
+                      }
+                    ]
+                  },
+                  "set-agent-queue": {
+                    "position": {
+                      "x": 1120,
+                      "y": -120
+                    },
+                    "parameters": {
+                      "QueueId": {
+                        "displayName": "BasicQueue"
+                      }
+                    },
+                    "queue": {
+                      "text": "BasicQueue"
+                    }
+                  },
+                  "transfer-to-agent": {
+                    "position": {
+                      "x": 1360,
+                      "y": -120
+                    }
                   }
                 },
                 "Annotations": [],
@@ -362,6 +276,67 @@ class Connect(Construct):
                 "hash": {}
               },
               "Actions": [
+                {
+                  "Parameters": {
+                    "ComparisonValue": "$$.Lex.SessionAttributes.transfer_to_agent"
+                  },
+                  "Identifier": "check-agent-transfer",
+                  "Type": "Compare",
+                  "Transitions": {
+                    "NextAction": "error-message",
+                    "Conditions": [
+                      {
+                        "NextAction": "set-agent-queue",
+                        "Condition": {
+                          "Operator": "Equals",
+                          "Operands": [
+                            "true"
+                          ]
+                        }
+                      }
+                    ],
+                    "Errors": [
+                      {
+                        "NextAction": "error-message",
+                        "ErrorType": "NoMatchingCondition"
+                      }
+                    ]
+                  }
+                },
+                {
+                  "Parameters": {
+                    "QueueId": "${contact_queue_arn}"
+                  },
+                  "Identifier": "set-agent-queue",
+                  "Type": "UpdateContactTargetQueue",
+                  "Transitions": {
+                    "NextAction": "transfer-to-agent",
+                    "Errors": [
+                      {
+                        "NextAction": "error-message",
+                        "ErrorType": "NoMatchingError"
+                      }
+                    ]
+                  }
+                },
+                {
+                  "Parameters": {},
+                  "Identifier": "transfer-to-agent",
+                  "Type": "TransferContactToQueue",
+                  "Transitions": {
+                    "NextAction": "error-message",
+                    "Errors": [
+                      {
+                        "NextAction": "error-message",
+                        "ErrorType": "QueueAtCapacity"
+                      },
+                      {
+                        "NextAction": "error-message",
+                        "ErrorType": "NoMatchingError"
+                      }
+                    ]
+                  }
+                },
                 {
                   "Parameters": {},
                   "Identifier": "5cf04938-31f2-49e3-a118-86f685a5d99f",
@@ -399,12 +374,17 @@ class Connect(Construct):
                     "Text": "$$.Attributes.prompt",
                     "LexV2Bot": {
                       "AliasArn": "arn:aws:lex:${aws_region}:${aws_account_id}:bot-alias/${lex_bot_id}/TSTALIASID"
+                    },
+                    "LexSessionAttributes": {
+                      "channel": "$$.Channel",
+                      "channel_subtype": "$$.SegmentAttributes['connect:Subtype']",
+                      "customer_address": "$$.CustomerEndpoint.Address"
                     }
                   },
                   "Identifier": "70af26d9-bdf9-4c41-ab94-525e982559aa",
                   "Type": "ConnectParticipantWithLexBot",
                   "Transitions": {
-                    "NextAction": "error-message",
+                    "NextAction": "check-agent-transfer",
                     "Errors": [
                       {
                         "NextAction": "0120f1fa-d67d-4b4a-8698-646f2e0b596d",
@@ -440,8 +420,8 @@ class Connect(Construct):
             }""")
 
         contact_flow_data = {
-            "contact_queue_arn": customer_queue.get_att_string(
-                "ContactQueueArn"
+            "contact_queue_arn": connect_resources.get_att_string(
+                "BasicQueueArn"
             ),
             "aws_region": region,
             "aws_account_id": account_id,
@@ -474,11 +454,11 @@ class Connect(Construct):
             ),
             username="demouser",
             instance_arn=connect_instance.attr_arn,
-            routing_profile_arn=routing_profile_basic.get_att_string(
-                "RoutingProfileArn"
+            routing_profile_arn=connect_resources.get_att_string(
+                "BasicRoutingProfileArn"
             ),
             security_profile_arns=[
-                security_profile_agent.get_att_string("SecurityProfileArn")
+                connect_resources.get_att_string("AgentSecurityProfileArn")
             ],
             password=random_string_agent.get_att_string("RandomString"),
         )
@@ -495,11 +475,11 @@ class Connect(Construct):
             ),
             username="adminuser",
             instance_arn=connect_instance.attr_arn,
-            routing_profile_arn=routing_profile_basic.get_att_string(
-                "RoutingProfileArn"
+            routing_profile_arn=connect_resources.get_att_string(
+                "BasicRoutingProfileArn"
             ),
             security_profile_arns=[
-                security_profile_admin.get_att_string("SecurityProfileArn")
+                connect_resources.get_att_string("AdminSecurityProfileArn")
             ],
             password=random_string_admin.get_att_string("RandomString"),
         )
@@ -1,10 +1,12 @@
-from typing import Dict
+import json
+from typing import Any, Dict, List, Optional
 
 from aws_cdk import (
-    BundlingOptions,
+    CfnOutput,
     CustomResource,
     Duration,
     RemovalPolicy,
+    Stack,
 )
 from aws_cdk import (
     aws_bedrock as bedrock,
@@ -12,6 +14,12 @@ from aws_cdk import (
 from aws_cdk import (
     aws_ec2 as ec2,
 )
+from aws_cdk import (
+    aws_events as events,
+)
+from aws_cdk import (
+    aws_events_targets as targets,
+)
 from aws_cdk import (
     aws_iam as iam,
 )
@@ -27,11 +35,21 @@ from aws_cdk import (
 from aws_cdk import (
     aws_secretsmanager as secretsmanager,
 )
+from aws_cdk import (
+    aws_ssm as ssm,
+)
 from aws_cdk import (
     custom_resources as cr,
 )
 from constructs import Construct
 
+from .bundling import LambdaBundler
+from .capacity_profiles import resolve_capacity_profile
+
+# How often kb_ingestion_manager looks for completed ingestions to record
+# as a new knowledge base version
+DEFAULT_VERSION_CHECK_SCHEDULE = "rate(5 minutes)"
+
 
 class AuroraKnowledgeBase(Construct):
     def __init__(
@@ -43,6 +61,14 @@ class AuroraKnowledgeBase(Construct):
         embeddings_model_id: str,
         chunking_strategy: str,
         chunking_config: Dict[str, int],
+        maintenance_config: Dict[str, Any],
+        capacity_profiles: Dict[str, Dict[str, Any]],
+        blue_green: Dict[str, Any],
+        program_knowledge_bases: List[Dict[str, Any]],
+        main_prefix: Optional[str],
+        version_check_schedule: Optional[str],
+        environment: str,
+        bundler: LambdaBundler,
         account_id: str,
         region: str,
         **kwargs,
@@ -179,6 +205,10 @@ class AuroraKnowledgeBase(Construct):
             description="Allow Lambda to connect to Database and Proxy",
         )
 
+        capacity_profile = resolve_capacity_profile(
+            capacity_profiles, environment
+        )
+
         # Create Aurora Serverless v2 Cluster
         aurora_cluster = rds.DatabaseCluster(
             self,
@@ -192,10 +222,15 @@ class AuroraKnowledgeBase(Construct):
                 subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
             ),
             writer=rds.ClusterInstance.serverless_v2("Writer"),
+            # Readers serve the reader proxy endpoint below
+            readers=[
+                rds.ClusterInstance.serverless_v2(f"Reader{number}")
+                for number in range(1, capacity_profile["readers"] + 1)
+            ],
             credentials=rds.Credentials.from_secret(db_credentials),
             removal_policy=RemovalPolicy.DESTROY,
-            serverless_v2_min_capacity=0.5,  # Minimum ACU
-            serverless_v2_max_capacity=1.0,  # Maximum ACU
+            serverless_v2_min_capacity=capacity_profile["min_capacity"],
+            serverless_v2_max_capacity=capacity_profile["max_capacity"],
             enable_data_api=True,
         )
 
@@ -212,6 +247,29 @@ class AuroraKnowledgeBase(Construct):
             max_connections_percent=100,
         )
 
+        # Read-only proxy endpoint for export tooling (vector_store_export.py
+        # reads it from the stack output), so dumps stay off the ingestion
+        # writer. Bedrock retrieval goes through the cluster's Data API, and
+        # setup and maintenance write, so they use the default endpoint.
+        if capacity_profile["readers"]:
+            aurora_proxy_reader = rds.CfnDBProxyEndpoint(
+                self,
+                "AuroraProxyReaderEndpoint",
+                db_proxy_endpoint_name=f"{database_name}-reader",
+                db_proxy_name=aurora_proxy.db_proxy_name,
+                target_role="READ_ONLY",
+                vpc_subnet_ids=vpc.select_subnets(
+                    subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+                ).subnet_ids,
+                vpc_security_group_ids=[
+                    aurora_security_group.security_group_id
+                ],
+            )
+            aurora_proxy_reader.node.add_dependency(aurora_cluster)
+            db_reader_host = aurora_proxy_reader.attr_endpoint
+        else:
+            db_reader_host = aurora_proxy.endpoint
+
         # Lambda to enable pgvector extension in the database
         setup_pgvector_lambda_role = iam.Role(
             self,
@@ -233,17 +291,10 @@ class AuroraKnowledgeBase(Construct):
             "SetupPgvectorLambda",
             handler="vector_store_setup.handler",
             runtime=lambda_.Runtime.PYTHON_3_9,
-            code=lambda_.Code.from_asset(
-                "src/vector_store_setup",
-                bundling=BundlingOptions(
-                    image=lambda_.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        "pip install -r requirements.txt -t /asset-output && cp -au . /asset-output",
-                    ],
-                ),
+            code=bundler.code(
+                "src/vector_store_setup", lambda_.Runtime.PYTHON_3_9
             ),
+            layers=bundler.layers("src/vector_store_setup"),
             vpc=vpc,
             security_groups=[lambda_security_group],
             timeout=Duration.minutes(15),
@@ -266,11 +317,108 @@ class AuroraKnowledgeBase(Construct):
             self,
             "SetupDatabase",
             service_token=setup_db_provider.service_token,
-            properties={"Timestamp": self.node.addr},
+            properties={
+                "Timestamp": self.node.addr,
+                "Tables": [
+                    {"Name": "bedrock_kb", "Dimension": 1024},
+                    *(
+                        [
+                            {
+                                "Name": "bedrock_kb_green",
+                                "Dimension": blue_green["green"][
+                                    "embedding_dimension"
+                                ],
+                            }
+                        ]
+                        if blue_green.get("enabled")
+                        else []
+                    ),
+                    *(
+                        {
+                            "Name": f"bedrock_kb_{program['name']}",
+                            "Dimension": 1024,
+                        }
+                        for program in program_knowledge_bases
+                    ),
+                ],
+            },
         )
         setup_db.node.add_dependency(aurora_proxy)
         setup_db.node.add_dependency(aurora_cluster)
 
+        # Lambda to VACUUM / ANALYZE / REINDEX the vector table on a schedule
+        maintenance_lambda_role = iam.Role(
+            self,
+            "VectorStoreMaintenanceLambdaRole",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "service-role/AWSLambdaVPCAccessExecutionRole"
+                )
+            ],
+        )
+        db_credentials.grant_read(maintenance_lambda_role)
+        maintenance_lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["cloudwatch:PutMetricData"],
+                resources=["*"],
+                conditions={
+                    "StringEquals": {
+                        "cloudwatch:namespace": "RagChatbot/VectorStore"
+                    }
+                },
+            )
+        )
+
+        maintenance_thresholds = {
+            key: value
+            for key, value in maintenance_config.items()
+            if key != "schedule"
+        }
+
+        # Every knowledge base's table, so a promoted green slot and the
+        # program tables are maintained too
+        vector_tables = [
+            "bedrock_kb",
+            *(["bedrock_kb_green"] if blue_green.get("enabled") else []),
+            *(
+                f"bedrock_kb_{program['name']}"
+                for program in program_knowledge_bases
+            ),
+        ]
+
+        maintenance_lambda = lambda_.Function(
+            self,
+            "VectorStoreMaintenanceLambda",
+            handler="vector_store_maintenance.handler",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=bundler.code(
+                "src/vector_store_maintenance", lambda_.Runtime.PYTHON_3_12
+            ),
+            layers=bundler.layers("src/vector_store_maintenance"),
+            vpc=vpc,
+            security_groups=[lambda_security_group],
+            timeout=Duration.minutes(15),
+            role=maintenance_lambda_role,
+            environment={
+                "DB_SECRET_ARN": db_credentials.secret_arn,
+                "DB_HOST": aurora_proxy.endpoint,
+                "DB_NAME": database_name,
+                "THRESHOLDS": json.dumps(maintenance_thresholds),
+                "TABLES": json.dumps(vector_tables),
+            },
+        )
+        maintenance_lambda.node.add_dependency(setup_db)
+
+        events.Rule(
+            self,
+            "VectorStoreMaintenanceSchedule",
+            schedule=events.Schedule.expression(
+                maintenance_config.get("schedule", "cron(0 9 * * ? *)")
+            ),
+            targets=[targets.LambdaFunction(maintenance_lambda)],
+        )
+
         bedrock_role = iam.Role(
             self,
             "AmazonBedrockExecutionRoleForKnowledgeBase",
@@ -386,17 +534,10 @@ class AuroraKnowledgeBase(Construct):
             function_name="bucket-manager",
             handler="bucket_manager.lambda_handler",
             runtime=lambda_.Runtime.PYTHON_3_12,
-            code=lambda_.Code.from_asset(
-                "src/bucket_manager",
-                bundling=BundlingOptions(
-                    image=lambda_.Runtime.PYTHON_3_9.bundling_image,
-                    command=[
-                        "bash",
-                        "-c",
-                        "pip install cfnresponse==1.1.5 -t /asset-output && cp -au . /asset-output",
-                    ],
-                ),
+            code=bundler.code(
+                "src/bucket_manager", lambda_.Runtime.PYTHON_3_12
             ),
+            layers=bundler.layers("src/bucket_manager"),
             role=lambda_iam_role,
             timeout=Duration.seconds(50),
         )
@@ -441,13 +582,294 @@ class AuroraKnowledgeBase(Construct):
             )
         )
 
+        # Knowledge bases, one per blue/green slot. Blue keeps the original
+        # table and construct ids; green is only built when enabled. Both
+        # ingest main_prefix, or the whole bucket without one.
+        slots = {
+            "blue": {
+                "construct_prefix": "",
+                "name": knowledge_base_name,
+                "table_name": "bedrock_kb",
+                "embedding_dimension": 1024,
+                "embeddings_model_id": embeddings_model_id,
+                "chunking_strategy": chunking_strategy,
+                "chunking_config": chunking_config,
+            }
+        }
+        if blue_green.get("enabled"):
+            slots["green"] = {
+                "construct_prefix": "Green",
+                "name": f"{knowledge_base_name}-green",
+                "table_name": "bedrock_kb_green",
+                **blue_green["green"],
+            }
+
+        knowledge_bases = {}
+        data_sources = {}
+        for slot, slot_config in slots.items():
+            knowledge_base, data_source = self._create_knowledge_base(
+                construct_prefix=slot_config["construct_prefix"],
+                name=slot_config["name"],
+                description=knowledge_base_description,
+                role_arn=bedrock_role_arn,
+                region=region,
+                embeddings_model_id=slot_config["embeddings_model_id"],
+                database_name=database_name,
+                cluster_arn=aurora_cluster_arn,
+                secret_arn=aurora_secret_arn,
+                table_name=f"bedrock_integration.{slot_config['table_name']}",
+                bucket_arn=s3_bucket_arn,
+                bucket_name=s3_bucket_name,
+                chunking_strategy=slot_config["chunking_strategy"],
+                chunking_config=slot_config["chunking_config"],
+                inclusion_prefixes=[main_prefix] if main_prefix else None,
+            )
+            knowledge_base.node.add_dependency(aurora_cluster)
+            knowledge_base.node.add_dependency(setup_db)
+            knowledge_bases[slot] = knowledge_base
+            data_sources[slot] = data_source
+
+        # Program knowledge bases, searched alongside the main one by the
+        # orchestrator's fan-out. Each ingests its own prefix of the bucket
+        # into its own table, with the main knowledge base's settings.
+        program_knowledge_base_ids = {}
+        ingestion_targets = [
+            (knowledge_bases[slot], data_sources[slot]) for slot in slots
+        ]
+        for program in program_knowledge_bases:
+            name = program["name"]
+            knowledge_base, data_source = self._create_knowledge_base(
+                construct_prefix="".join(
+                    part.capitalize() for part in name.split("_")
+                ),
+                name=f"{knowledge_base_name}-{name.replace('_', '-')}",
+                description=knowledge_base_description,
+                role_arn=bedrock_role_arn,
+                region=region,
+                embeddings_model_id=embeddings_model_id,
+                database_name=database_name,
+                cluster_arn=aurora_cluster_arn,
+                secret_arn=aurora_secret_arn,
+                table_name=f"bedrock_integration.bedrock_kb_{name}",
+                bucket_arn=s3_bucket_arn,
+                bucket_name=s3_bucket_name,
+                chunking_strategy=chunking_strategy,
+                chunking_config=chunking_config,
+                inclusion_prefixes=[program.get("prefix", f"{name}/")],
+            )
+            knowledge_base.node.add_dependency(aurora_cluster)
+            knowledge_base.node.add_dependency(setup_db)
+            program_knowledge_base_ids[name] = knowledge_base.ref
+            ingestion_targets.append((knowledge_base, data_source))
+
+        # Add Bedrock permissions to KBSyncRole
+        kb_sync_role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "bedrock:StartIngestionJob",
+                    "bedrock:ListIngestionJobs",
+                ],
+                resources=[
+                    f"arn:aws:bedrock:{region}:{account_id}:knowledge-base/{knowledge_base.ref}"
+                    for knowledge_base, _ in ingestion_targets
+                ],
+            )
+        )
+
+        # Create KBSync Lambda
+        kb_sync = lambda_.Function(
+            self,
+            "KnowlegeBaseSync",
+            function_name="kbsync-function",
+            handler="kb_ingestion_manager.lambda_handler",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=lambda_.Code.from_asset("src/kb_ingestion_manager"),
+            role=kb_sync_role,
+            timeout=Duration.seconds(900),
+            memory_size=1024,
+            environment={
+                "KNOWLEDGEBASEID": knowledge_bases["blue"].ref,
+                "DATASOURCEID": data_sources["blue"]
+                .get_att("DataSourceId")
+                .to_string(),
+                # Every slot ingests each upload, so green stays current in
+                # the background until it is promoted; program knowledge
+                # bases pick up only their own prefix
+                "INGESTION_TARGETS": Stack.of(self).to_json_string(
+                    [
+                        {
+                            "knowledgeBaseId": knowledge_base.ref,
+                            "dataSourceId": data_source.get_att(
+                                "DataSourceId"
+                            ).to_string(),
+                        }
+                        for knowledge_base, data_source in ingestion_targets
+                    ]
+                ),
+            },
+        )
+
+        # Version of the knowledge base contents, recorded by kb_sync once
+        # every ingestion target has settled; precomputed answers are
+        # stamped with it (src/lambda_orchestrator/answer_store.py)
+        kb_version_parameter = None
+        if version_check_schedule:
+            kb_version_parameter = ssm.StringParameter(
+                self,
+                "KnowledgeBaseVersionParameter",
+                parameter_name=f"/{Stack.of(self).stack_name}/knowledge-base/version",
+                string_value="initial",
+                description="Last completed ingestion of every knowledge base",
+            )
+            kb_version_parameter.grant_read(kb_sync_role)
+            kb_version_parameter.grant_write(kb_sync_role)
+            kb_sync.add_environment(
+                "KB_VERSION_PARAMETER", kb_version_parameter.parameter_name
+            )
+            events.Rule(
+                self,
+                "KnowledgeBaseVersionCheckSchedule",
+                schedule=events.Schedule.expression(version_check_schedule),
+                targets=[
+                    targets.LambdaFunction(
+                        kb_sync,
+                        event=events.RuleTargetInput.from_object(
+                            {"check_ingestion": True}
+                        ),
+                    )
+                ],
+            )
+
+        # Create Lambda permission
+        lambda_permission = lambda_.CfnPermission(
+            self,
+            "PermissionForS3BucketToInvokeLambda",
+            function_name=kb_sync.function_name,
+            action="lambda:InvokeFunction",
+            principal="s3.amazonaws.com",
+            source_account=account_id,
+            source_arn=s3_bucket_arn,
+        )
+
+        # Create LambdaTrigger
+        lambda_trigger = CustomResource(
+            self,
+            "LambdaTrigger",
+            service_token=bucket_manager.function_arn,
+            properties={
+                "LambdaArn": kb_sync.function_arn,
+                "Bucket": s3_bucket_name,
+            },
+        )
+        lambda_trigger.node.add_dependency(lambda_permission)
+
+        CfnOutput(
+            self,
+            "VectorStoreReaderEndpointOutput",
+            description=(
+                "Read-only database endpoint; pass it to vector_store_export.py "
+                "as --host or DB_READER_HOST"
+            ),
+            value=db_reader_host,
+        )
+
+        # The orchestrator resolves the active slot through this parameter, so
+        # promoting green or rolling back is a single parameter write
+        knowledge_base_slot_ids = {
+            slot: knowledge_base.ref
+            for slot, knowledge_base in knowledge_bases.items()
+        }
+        active_slot_parameter = None
+        if blue_green.get("enabled"):
+            parameter_prefix = f"/{Stack.of(self).stack_name}/knowledge-base"
+            for slot, knowledge_base in knowledge_bases.items():
+                ssm.StringParameter(
+                    self,
+                    f"{slot.capitalize()}KnowledgeBaseIdParameter",
+                    parameter_name=f"{parameter_prefix}/{slot}",
+                    string_value=knowledge_base.ref,
+                )
+            # Written once on create: kb_cutover.py owns the value after
+            # that, so a deploy after a promotion does not reset it
+            active_slot_name = f"{parameter_prefix}/active"
+            cr.AwsCustomResource(
+                self,
+                "ActiveKnowledgeBaseSlotParameter",
+                on_create=cr.AwsSdkCall(
+                    service="SSM",
+                    action="putParameter",
+                    parameters={
+                        "Name": active_slot_name,
+                        "Value": blue_green.get("active_slot", "blue"),
+                        "Type": "String",
+                        "Overwrite": True,
+                        "Description": "Knowledge base slot (blue or green) "
+                        "answering callers",
+                    },
+                    physical_resource_id=cr.PhysicalResourceId.of(
+                        active_slot_name
+                    ),
+                ),
+                on_delete=cr.AwsSdkCall(
+                    service="SSM",
+                    action="deleteParameter",
+                    parameters={"Name": active_slot_name},
+                ),
+                policy=cr.AwsCustomResourcePolicy.from_sdk_calls(
+                    resources=[
+                        Stack.of(self).format_arn(
+                            service="ssm",
+                            resource="parameter",
+                            resource_name=active_slot_name.lstrip("/"),
+                        )
+                    ]
+                ),
+                install_latest_aws_sdk=False,
+            )
+            active_slot_parameter = (
+                ssm.StringParameter.from_string_parameter_name(
+                    self, "ActiveKnowledgeBaseSlot", active_slot_name
+                )
+            )
+
+        self.knowledge_base_id = knowledge_bases[
+            (
+                blue_green.get("active_slot", "blue")
+                if blue_green.get("enabled")
+                else "blue"
+            )
+        ].ref
+        self.knowledge_base_slot_ids = knowledge_base_slot_ids
+        self.program_knowledge_base_ids = program_knowledge_base_ids
+        self.active_slot_parameter = active_slot_parameter
+        self.kb_version_parameter = kb_version_parameter
+
+    def _create_knowledge_base(
+        self,
+        construct_prefix: str,
+        name: str,
+        description: str,
+        role_arn: str,
+        region: str,
+        embeddings_model_id: str,
+        database_name: str,
+        cluster_arn: str,
+        secret_arn: str,
+        table_name: str,
+        bucket_arn: str,
+        bucket_name: str,
+        chunking_strategy: str,
+        chunking_config: Dict[str, int],
+        inclusion_prefixes: Optional[List[str]] = None,
+    ):
         # Create Knowledge Base resource
         knowledge_base = bedrock.CfnKnowledgeBase(
             self,
-            "RagKnowledgeBase",
-            name=knowledge_base_name,
-            description=knowledge_base_description,
-            role_arn=bedrock_role_arn,
+            f"{construct_prefix}RagKnowledgeBase",
+            name=name,
+            description=description,
+            role_arn=role_arn,
             knowledge_base_configuration=bedrock.CfnKnowledgeBase.KnowledgeBaseConfigurationProperty(
                 type="VECTOR",
                 vector_knowledge_base_configuration=bedrock.CfnKnowledgeBase.VectorKnowledgeBaseConfigurationProperty(
@@ -458,9 +880,9 @@ class AuroraKnowledgeBase(Construct):
                 type="RDS",
                 rds_configuration=bedrock.CfnKnowledgeBase.RdsConfigurationProperty(
                     database_name=database_name,
-                    resource_arn=aurora_cluster_arn,
-                    credentials_secret_arn=aurora_secret_arn,
-                    table_name="bedrock_integration.bedrock_kb",
+                    resource_arn=cluster_arn,
+                    credentials_secret_arn=secret_arn,
+                    table_name=table_name,
                     field_mapping=bedrock.CfnKnowledgeBase.RdsFieldMappingProperty(
                         primary_key_field="id",
                         vector_field="embedding",
@@ -471,19 +893,17 @@ class AuroraKnowledgeBase(Construct):
             ),
         )
 
-        knowledge_base.node.add_dependency(aurora_cluster)
-        knowledge_base.node.add_dependency(setup_db)
-
         # Create the data source
         data_source = bedrock.CfnDataSource(
             self,
-            "KnowledgeBaseDataSource",
+            f"{construct_prefix}KnowledgeBaseDataSource",
             knowledge_base_id=knowledge_base.ref,
-            name=s3_bucket_name,
+            name=bucket_name,
             data_source_configuration=bedrock.CfnDataSource.DataSourceConfigurationProperty(
                 type="S3",
                 s3_configuration=bedrock.CfnDataSource.S3DataSourceConfigurationProperty(
-                    bucket_arn=s3_bucket_arn
+                    bucket_arn=bucket_arn,
+                    inclusion_prefixes=inclusion_prefixes,
                 ),
             ),
             vector_ingestion_configuration=bedrock.CfnDataSource.VectorIngestionConfigurationProperty(
@@ -517,58 +937,4 @@ class AuroraKnowledgeBase(Construct):
             ),
         )
 
-        # Add Bedrock permissions to KBSyncRole
-        kb_sync_role.add_to_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=[
-                    "bedrock:StartIngestionJob",
-                    "bedrock:ListIngestionJobs",
-                ],
-                resources=[
-                    f"arn:aws:bedrock:{region}:{account_id}:knowledge-base/{knowledge_base.ref}"
-                ],
-            )
-        )
-
-        # Create KBSync Lambda
-        kb_sync = lambda_.Function(
-            self,
-            "KnowlegeBaseSync",
-            function_name="kbsync-function",
-            handler="kb_ingestion_manager.lambda_handler",
-            runtime=lambda_.Runtime.PYTHON_3_12,
-            code=lambda_.Code.from_asset("src/kb_ingestion_manager"),
-            role=kb_sync_role,
-            timeout=Duration.seconds(900),
-            memory_size=1024,
-            environment={
-                "KNOWLEDGEBASEID": knowledge_base.ref,
-                "DATASOURCEID": data_source.get_att("DataSourceId").to_string(),
-            },
-        )
-
-        # Create Lambda permission
-        lambda_permission = lambda_.CfnPermission(
-            self,
-            "PermissionForS3BucketToInvokeLambda",
-            function_name=kb_sync.function_name,
-            action="lambda:InvokeFunction",
-            principal="s3.amazonaws.com",
-            source_account=account_id,
-            source_arn=s3_bucket_arn,
-        )
-
-        # Create LambdaTrigger
-        lambda_trigger = CustomResource(
-            self,
-            "LambdaTrigger",
-            service_token=bucket_manager.function_arn,
-            properties={
-                "LambdaArn": kb_sync.function_arn,
-                "Bucket": s3_bucket_name,
-            },
-        )
-        lambda_trigger.node.add_dependency(lambda_permission)
-
-        self.knowledge_base_id = knowledge_base.ref
+        return knowledge_base, data_source
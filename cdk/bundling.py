@@ -0,0 +1,331 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import jsii
+from aws_cdk import AssetHashType, BundlingOptions, ILocalBundling
+from aws_cdk import aws_lambda as lambda_
+from constructs import Construct
+
+COMMON_LAYER_PATH = "src/layers/common"
+REQUIREMENTS_FILE = "requirements.txt"
+
+# Files that never affect what gets deployed
+IGNORED_NAMES = {"__pycache__", ".pytest_cache"}
+IGNORED_SUFFIXES = (".pyc", ".pyo")
+
+PIP_PLATFORMS = {
+    lambda_.Architecture.X86_64.name: "manylinux2014_x86_64",
+    lambda_.Architecture.ARM_64.name: "manylinux2014_aarch64",
+}
+
+
+def read_requirements(path: str) -> List[str]:
+    requirements_path = os.path.join(path, REQUIREMENTS_FILE)
+    if not os.path.exists(requirements_path):
+        return []
+    with open(requirements_path) as f:
+        return [
+            line.strip()
+            for line in f
+            if line.strip() and not line.startswith("#")
+        ]
+
+
+def source_hash(path: str, *salt: str) -> str:
+    """Hash every file under path, plus anything else that shapes the bundle."""
+    digest = hashlib.sha256()
+    for value in salt:
+        digest.update(value.encode())
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_NAMES)
+        for name in sorted(files):
+            if name.endswith(IGNORED_SUFFIXES):
+                continue
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            with open(file_path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+@jsii.implements(ILocalBundling)
+class CachedLocalBundling:
+    """Bundle on the host, reusing a previous bundle with the same hash.
+
+    On a cache miss the requirements are installed with pip for the Lambda
+    platform and the result is cached. If that fails (no matching wheels,
+    pip unavailable) try_bundle returns False and CDK falls back to Docker.
+    """
+
+    def __init__(
+        self,
+        bundler: "LambdaBundler",
+        path: str,
+        asset_hash: str,
+        runtime: lambda_.Runtime,
+        architecture: lambda_.Architecture,
+        target_subdir: str,
+        copy_source: bool,
+    ) -> None:
+        self.bundler = bundler
+        self.path = path
+        self.asset_hash = asset_hash
+        self.runtime = runtime
+        self.architecture = architecture
+        self.target_subdir = target_subdir
+        self.copy_source = copy_source
+
+    def _pip_install(self, target: str) -> bool:
+        python_version = self.runtime.name.replace("python", "")
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "pip",
+                "install",
+                "--quiet",
+                "--requirement",
+                os.path.join(self.path, REQUIREMENTS_FILE),
+                "--target",
+                target,
+                "--platform",
+                PIP_PLATFORMS[self.architecture.name],
+                "--implementation",
+                "cp",
+                "--python-version",
+                python_version,
+                "--only-binary=:all:",
+            ],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            print(
+                f"Local bundling of {self.path} failed, "
+                f"falling back to Docker:\n{result.stderr}",
+                file=sys.stderr,
+            )
+        return result.returncode == 0
+
+    def try_bundle(self, output_dir: str, options: Any = None) -> bool:
+        started = time.monotonic()
+        cache_path = os.path.join(self.bundler.cache_dir, self.asset_hash)
+
+        if os.path.isdir(cache_path):
+            shutil.copytree(cache_path, output_dir, dirs_exist_ok=True)
+            self.bundler.touch(self.asset_hash)
+            self.bundler.record(self.path, "local cache hit", started)
+            return True
+
+        # Build under a name unique to this synth, next to the cache so the
+        # final rename is atomic
+        build_dir = tempfile.mkdtemp(
+            prefix=f"{self.asset_hash}.", dir=self.bundler.cache_dir
+        )
+        try:
+            if read_requirements(self.path) and not self._pip_install(
+                os.path.join(build_dir, self.target_subdir)
+            ):
+                self.bundler.record(self.path, "docker fallback", started)
+                return False
+            if self.copy_source:
+                shutil.copytree(
+                    self.path,
+                    build_dir,
+                    dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns(
+                        *IGNORED_NAMES, *(f"*{s}" for s in IGNORED_SUFFIXES)
+                    ),
+                )
+            try:
+                os.rename(build_dir, cache_path)
+            except OSError:
+                # A concurrent synth cached the same bundle first; keep it
+                if not os.path.isdir(cache_path):
+                    raise
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+        shutil.copytree(cache_path, output_dir, dirs_exist_ok=True)
+        self.bundler.record(self.path, "local build", started)
+        return True
+
+
+class LambdaBundler:
+    """Builds Python Lambda code assets for src/ directories.
+
+    Asset hashes come from each directory's contents and requirements, so
+    unchanged functions are neither re-bundled nor re-uploaded. Bundles are
+    kept in a local cache that outlives cdk.out, and Docker is only used
+    when a bundle cannot be built locally. Optionally, dependencies covered
+    by src/layers/common are served from one shared layer instead of being
+    copied into every function.
+
+    bundling_config keys: local_cache (default true), cache_dir (default
+    .bundle_cache), cache_max_age_days (default 7) and shared_layer
+    (default false). prune() removes cached bundles that this synth did not
+    use and that no synth has used for cache_max_age_days, so switching
+    between branches or configs still hits the cache while stale bundles
+    do not pile up.
+    """
+
+    def __init__(
+        self, scope: Construct, bundling_config: Dict[str, Any]
+    ) -> None:
+        self.local_cache = bundling_config.get("local_cache", True)
+        self.cache_dir = os.path.abspath(
+            bundling_config.get("cache_dir", ".bundle_cache")
+        )
+        if self.local_cache:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_max_age_seconds = (
+            float(bundling_config.get("cache_max_age_days", 7)) * 86400
+        )
+        self.used_hashes: Set[str] = set()
+        self.pruned: List[str] = []
+        self.timings: Dict[str, Dict[str, Any]] = {}
+
+        self.common_layer: Optional[lambda_.LayerVersion] = None
+        self.common_requirements = set(read_requirements(COMMON_LAYER_PATH))
+        if bundling_config.get("shared_layer", False):
+            self.common_layer = lambda_.LayerVersion(
+                scope,
+                "CommonDependenciesLayer",
+                code=self._asset(
+                    COMMON_LAYER_PATH,
+                    lambda_.Runtime.PYTHON_3_12,
+                    lambda_.Architecture.X86_64,
+                    target_subdir="python",
+                    copy_source=False,
+                ),
+                compatible_runtimes=[
+                    lambda_.Runtime.PYTHON_3_9,
+                    lambda_.Runtime.PYTHON_3_12,
+                ],
+                description="cfnresponse, pg8000 and other shared dependencies",
+            )
+
+    def _uses_common_layer(self, path: str) -> bool:
+        requirements = set(read_requirements(path))
+        return (
+            self.common_layer is not None
+            and bool(requirements)
+            and requirements <= self.common_requirements
+        )
+
+    def _asset(
+        self,
+        path: str,
+        runtime: lambda_.Runtime,
+        architecture: lambda_.Architecture,
+        target_subdir: str = "",
+        copy_source: bool = True,
+    ) -> lambda_.Code:
+        output = (
+            f"/asset-output/{target_subdir}"
+            if target_subdir
+            else "/asset-output"
+        )
+        command = f"pip install -r {REQUIREMENTS_FILE} -t {output}"
+        if copy_source:
+            command += " && cp -au . /asset-output"
+        asset_hash = source_hash(path, runtime.name, architecture.name, command)
+        self.used_hashes.add(asset_hash)
+        # Also used when cdk.out already holds the bundle and CDK never asks
+        # for it
+        self.touch(asset_hash)
+        # Overwritten by CachedLocalBundling if CDK asks for a bundle at all;
+        # it skips bundling when cdk.out already holds this hash
+        self.timings[path] = {
+            "status": "unchanged" if self.local_cache else "docker",
+            "seconds": 0.0,
+        }
+
+        return lambda_.Code.from_asset(
+            path,
+            asset_hash_type=AssetHashType.CUSTOM,
+            asset_hash=asset_hash,
+            bundling=BundlingOptions(
+                image=runtime.bundling_image,
+                platform=(
+                    "linux/arm64"
+                    if architecture.name == lambda_.Architecture.ARM_64.name
+                    else "linux/amd64"
+                ),
+                command=["bash", "-c", command],
+                local=(
+                    CachedLocalBundling(
+                        self,
+                        path,
+                        asset_hash,
+                        runtime,
+                        architecture,
+                        target_subdir,
+                        copy_source,
+                    )
+                    if self.local_cache
+                    else None
+                ),
+            ),
+        )
+
+    def code(
+        self,
+        path: str,
+        runtime: lambda_.Runtime,
+        architecture: lambda_.Architecture = lambda_.Architecture.X86_64,
+    ) -> lambda_.Code:
+        if not read_requirements(path) or self._uses_common_layer(path):
+            return lambda_.Code.from_asset(path)
+        return self._asset(path, runtime, architecture)
+
+    def layers(self, path: str) -> List[lambda_.ILayerVersion]:
+        return [self.common_layer] if self._uses_common_layer(path) else []
+
+    def touch(self, asset_hash: str) -> None:
+        """Mark a cached bundle as used now."""
+        cache_path = os.path.join(self.cache_dir, asset_hash)
+        if os.path.isdir(cache_path):
+            os.utime(cache_path)
+
+    def prune(self, now: Optional[float] = None) -> List[str]:
+        """Remove cache entries, including leftover build directories, that
+        were not used by this synth or in the last cache_max_age_days."""
+        if not os.path.isdir(self.cache_dir):
+            return self.pruned
+        cutoff = (now or time.time()) - self.cache_max_age_seconds
+        for name in sorted(os.listdir(self.cache_dir)):
+            cache_path = os.path.join(self.cache_dir, name)
+            if name in self.used_hashes or not os.path.isdir(cache_path):
+                continue
+            if os.path.getmtime(cache_path) < cutoff:
+                shutil.rmtree(cache_path, ignore_errors=True)
+                self.pruned.append(name)
+        return self.pruned
+
+    def record(self, path: str, status: str, started: float) -> None:
+        self.timings[path] = {
+            "status": status,
+            "seconds": time.monotonic() - started,
+        }
+
+    def report(self) -> str:
+        lines = ["Lambda bundling"]
+        width = max((len(path) for path in self.timings), default=0)
+        for path, timing in sorted(self.timings.items()):
+            lines.append(
+                f"  {path.ljust(width)}  {timing['seconds']:6.2f}s  {timing['status']}"
+            )
+        total = sum(timing["seconds"] for timing in self.timings.values())
+        lines.append(f"  {'total'.ljust(width)}  {total:6.2f}s")
+        if self.pruned:
+            lines.append(
+                f"  pruned {len(self.pruned)} stale bundle(s) from {self.cache_dir}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,99 @@
+from typing import Any, Dict
+
+# Used for any environment without an entry under capacity_profiles
+DEFAULT_CAPACITY_PROFILE = {
+    "min_capacity": 0.5,
+    "max_capacity": 1.0,
+    "readers": 0,
+}
+
+# Aurora Serverless v2 limits. The pinned engine (Aurora PostgreSQL 15.4)
+# predates automatic pause, so instances cannot scale to 0 ACU.
+MIN_ACU = 0.5
+MAX_ACU = 256.0
+ACU_STEP = 0.5
+
+
+def resolve_capacity_profile(
+    capacity_profiles: Dict[str, Dict[str, Any]], environment: str
+) -> Dict[str, Any]:
+    """Return the validated capacity profile for one environment."""
+    profile = dict(DEFAULT_CAPACITY_PROFILE)
+    profile.update(capacity_profiles.get(environment, {}))
+
+    min_capacity = float(profile["min_capacity"])
+    max_capacity = float(profile["max_capacity"])
+    readers = int(profile["readers"])
+
+    for name, value in (
+        ("min_capacity", min_capacity),
+        ("max_capacity", max_capacity),
+    ):
+        if not MIN_ACU <= value <= MAX_ACU or value % ACU_STEP:
+            raise ValueError(
+                f"capacity_profiles.{environment}.{name} must be between "
+                f"{MIN_ACU} and {MAX_ACU} ACU in steps of {ACU_STEP}, got {value}"
+            )
+    if max_capacity < min_capacity:
+        raise ValueError(
+            f"capacity_profiles.{environment}.max_capacity must be at least "
+            f"min_capacity, got {max_capacity}"
+        )
+    if readers < 0:
+        raise ValueError(
+            f"capacity_profiles.{environment}.readers must not be negative"
+        )
+
+    return {
+        "min_capacity": min_capacity,
+        "max_capacity": max_capacity,
+        "readers": readers,
+    }
+
+
+def capacity_report(
+    capacity_profiles: Dict[str, Dict[str, Any]], active_environment: str
+) -> str:
+    """Tabulate per-instance and whole-cluster ACU bounds for every environment.
+
+    Every serverless v2 instance in a cluster shares the same capacity range,
+    so the cluster bounds are the per-instance bounds times the writer plus
+    its readers.
+    """
+    environments = list(capacity_profiles)
+    if active_environment not in environments:
+        environments.append(active_environment)
+    rows = [
+        (
+            "environment",
+            "instances",
+            "instance ACU",
+            "cluster min ACU",
+            "cluster max ACU",
+        )
+    ]
+    for environment in environments:
+        profile = resolve_capacity_profile(capacity_profiles, environment)
+        instances = 1 + profile["readers"]
+        marker = " *" if environment == active_environment else ""
+        rows.append(
+            (
+                f"{environment}{marker}",
+                f"1 writer + {profile['readers']} reader(s)",
+                f"{profile['min_capacity']:g}-{profile['max_capacity']:g}",
+                f"{profile['min_capacity'] * instances:g}",
+                f"{profile['max_capacity'] * instances:g}",
+            )
+        )
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = [
+        "Aurora vector cluster capacity (* = environment being synthesized)"
+    ]
+    for row in rows:
+        lines.append(
+            "  ".join(
+                cell.ljust(width) for cell, width in zip(row, widths)
+            ).rstrip()
+        )
+    return "\n".join(lines)
@@ -4,13 +4,281 @@
 ## The output of the CloudFormation template shows the Lambda Function and DynomoDB table.
 
 
-from aws_cdk import CfnOutput, CfnResource, Duration, RemovalPolicy
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from aws_cdk import (
+    CfnOutput,
+    CfnResource,
+    Duration,
+    RemovalPolicy,
+    Stack,
+    TimeZone,
+)
+from aws_cdk import aws_applicationautoscaling as appscaling
 from aws_cdk import aws_dynamodb as dynamodb
+from aws_cdk import aws_events as events
+from aws_cdk import aws_events_targets as targets
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda as _lambda
+from aws_cdk import aws_lambda_event_sources as event_sources
 from aws_cdk import aws_lex as lex
+from aws_cdk import aws_logs as logs
+from aws_cdk import aws_sqs as sqs
+from aws_cdk import aws_ssm as ssm
 from constructs import Construct
 
+# Orchestrator build profiles; orchestrator config keys override the values
+ORCHESTRATOR_PROFILES = {
+    "default": {
+        "runtime": "python3.9",
+        "architecture": "x86_64",
+        "memory_size": 1024,
+        "log_level": "INFO",
+        "handler": "sync",
+    },
+    # Newer runtime with faster imports, Graviton, and a full vCPU (1769 MB)
+    # for init; debug logging stays off so nothing is formatted per request
+    "startup": {
+        "runtime": "python3.12",
+        "architecture": "arm64",
+        "memory_size": 1769,
+        "log_level": "INFO",
+        "handler": "sync",
+    },
+}
+
+# Orchestrator entry points: the sync handler, or the asyncio variant in
+# src/lambda_orchestrator/async_orchestrator.py that overlaps session and
+# Bedrock I/O
+ORCHESTRATOR_HANDLERS = {
+    "sync": "lambda_orchestrator.lambda_handler",
+    "async": "async_orchestrator.lambda_handler",
+}
+
+PYTHON_RUNTIMES = {
+    runtime.name: runtime
+    for runtime in (
+        _lambda.Runtime.PYTHON_3_9,
+        _lambda.Runtime.PYTHON_3_10,
+        _lambda.Runtime.PYTHON_3_11,
+        _lambda.Runtime.PYTHON_3_12,
+        _lambda.Runtime.PYTHON_3_13,
+    )
+}
+
+ARCHITECTURES = {
+    "x86_64": _lambda.Architecture.X86_64,
+    "arm64": _lambda.Architecture.ARM_64,
+}
+
+# Provisioned concurrency on the orchestrator alias. Outside the scheduled
+# windows, capacity tracks utilization between min_capacity and max_capacity;
+# max_capacity 0 with no schedules leaves the alias on-demand only.
+DEFAULT_CONCURRENCY = {
+    "alias": "live",
+    "min_capacity": 0,
+    "max_capacity": 0,
+    "utilization_target": 0.7,
+    "time_zone": None,
+    "schedules": [],
+    # e.g. rate(5 minutes); sends {"warmup": true} to the alias
+    "warmup_schedule": None,
+}
+
+# Spoken while the FallbackIntent code hook waits for Bedrock. The start
+# message plays only if fulfillment takes longer than start_delay_seconds,
+# so fast answers are not interrupted; updates then repeat every
+# update_frequency_seconds until the code hook returns or times out.
+DEFAULT_FULFILLMENT_UPDATES = {
+    "enabled": True,
+    "start_delay_seconds": 2,
+    "start_messages": ["One moment while I look that up."],
+    "update_frequency_seconds": 5,
+    "update_messages": ["Still looking, thanks for waiting."],
+    "allow_interrupt": True,
+    "timeout_seconds": 30,
+    "timeout_message": "Sorry, that is taking longer than expected. Please try asking again.",
+    # Orchestrator gives up on Bedrock after this long, leaving time to
+    # answer before Lex times out; defaults to timeout_seconds - 5
+    "generation_budget_seconds": None,
+}
+
+# Generated by src/orchestrator_tools/generate_faq_intents.py build
+FAQ_INTENTS_PATH = os.path.join(os.path.dirname(__file__), "faq_intents.json")
+
+# Lex ends idle sessions after this long
+IDLE_SESSION_TTL_SECONDS = 300
+
+# DynamoDB deletes conversation items once this epoch-seconds attribute
+# passes (src/lambda_orchestrator/session_store.py)
+SESSION_TTL_ATTRIBUTE = "expires_at"
+
+# Token buckets shared by every orchestrator execution environment
+# (src/lambda_orchestrator/rate_limit.py)
+RATE_LIMIT_KEY_ATTRIBUTE = "bucket"
+RATE_LIMIT_TTL_ATTRIBUTE = "expires_at"
+
+# Queue and worker settings for queued answers; the orchestrator reads the
+# rest (src/lambda_orchestrator/answer_queue.py)
+DEFAULT_ANSWER_QUEUE = {
+    "batch_size": 10,
+    "max_batching_window_seconds": 5,
+    # Worker invocations at once (2-1000); with worker_threads this bounds
+    # the questions in flight to Bedrock
+    "max_concurrency": 5,
+    "worker_timeout_seconds": 120,
+    # Receives before a message moves to the dead-letter queue
+    "max_receive_count": 3,
+    # The log callback is for local runs; deployed callers expect a text
+    "callback": "sns",
+}
+
+# Precompute job settings; the orchestrator and the job read the rest
+# (src/lambda_orchestrator/answer_store.py)
+DEFAULT_ANSWER_STORE = {
+    "backend": "dynamodb",
+    # Besides every new knowledge base version
+    "schedule": "cron(0 8 * * ? *)",
+    "log_days": 7,
+}
+
+# Precomputed answers keyed by channel and normalized question
+ANSWER_KEY_ATTRIBUTE = "question_key"
+ANSWER_TTL_ATTRIBUTE = "expires_at"
+
+# Retrieval results keyed by knowledge base version and query
+# (src/lambda_orchestrator/retrieval_cache.py)
+RETRIEVAL_CACHE_KEY_ATTRIBUTE = "cache_key"
+RETRIEVAL_CACHE_TTL_ATTRIBUTE = "expires_at"
+
+# Lex conversation logs, read by the precompute job for question counts
+CONVERSATION_LOG_RETENTION = logs.RetentionDays.ONE_MONTH
+CONVERSATION_LOG_RETENTION_DAYS = 30
+
+# Files in src/lambda_orchestrator that are never needed at runtime
+ORCHESTRATOR_ASSET_EXCLUDES = ["__pycache__", "*.pyc", "*.md", "tests"]
+
+
+def resolve_orchestrator_profile(orchestrator_config: Dict[str, Any]):
+    profile_name = orchestrator_config.get("profile", "default")
+    if profile_name not in ORCHESTRATOR_PROFILES:
+        raise ValueError(
+            f"Unknown orchestrator profile '{profile_name}', expected one of "
+            f"{', '.join(ORCHESTRATOR_PROFILES)}"
+        )
+    profile = dict(ORCHESTRATOR_PROFILES[profile_name])
+    profile.update(
+        {
+            k: v
+            for k, v in orchestrator_config.items()
+            if k not in ("profile", "concurrency", "async")
+        }
+    )
+    if profile["runtime"] not in PYTHON_RUNTIMES:
+        raise ValueError(
+            f"Unsupported orchestrator runtime {profile['runtime']}"
+        )
+    if profile["handler"] not in ORCHESTRATOR_HANDLERS:
+        raise ValueError(
+            f"Unknown orchestrator handler '{profile['handler']}', expected "
+            f"one of {', '.join(ORCHESTRATOR_HANDLERS)}"
+        )
+    if profile["architecture"] not in ARCHITECTURES:
+        raise ValueError(
+            f"Unsupported orchestrator architecture {profile['architecture']}"
+        )
+    return profile
+
+
+def resolve_fulfillment_updates(fulfillment_config: Dict[str, Any]):
+    updates = dict(DEFAULT_FULFILLMENT_UPDATES)
+    updates.update(fulfillment_config)
+    if updates["generation_budget_seconds"] is None:
+        updates["generation_budget_seconds"] = updates["timeout_seconds"] - 5
+    if not (
+        0
+        < updates["start_delay_seconds"]
+        < updates["generation_budget_seconds"]
+        < updates["timeout_seconds"]
+        <= 900
+    ):
+        raise ValueError(
+            "Fulfillment updates need 0 < start_delay_seconds < "
+            "generation_budget_seconds < timeout_seconds <= 900"
+        )
+    if not 1 <= updates["update_frequency_seconds"] <= 900:
+        raise ValueError("update_frequency_seconds must be between 1 and 900")
+    return updates
+
+
+def message_groups(messages):
+    # Lex plays one group per response and picks among its variations
+    group = {"Message": {"PlainTextMessage": {"Value": messages[0]}}}
+    if len(messages) > 1:
+        group["Variations"] = [
+            {"PlainTextMessage": {"Value": message}} for message in messages[1:]
+        ]
+    return [group]
+
+
+def build_fulfillment_code_hook(updates: Dict[str, Any]):
+    if not updates["enabled"]:
+        return {"Enabled": True}
+    return {
+        "Enabled": True,
+        "FulfillmentUpdatesSpecification": {
+            "Active": True,
+            "StartResponse": {
+                "DelayInSeconds": updates["start_delay_seconds"],
+                "MessageGroups": message_groups(updates["start_messages"]),
+                "AllowInterrupt": updates["allow_interrupt"],
+            },
+            "UpdateResponse": {
+                "FrequencyInSeconds": updates["update_frequency_seconds"],
+                "MessageGroups": message_groups(updates["update_messages"]),
+                "AllowInterrupt": updates["allow_interrupt"],
+            },
+            "TimeoutInSeconds": updates["timeout_seconds"],
+        },
+        "PostFulfillmentStatusSpecification": {
+            "TimeoutResponse": {
+                "MessageGroups": message_groups([updates["timeout_message"]]),
+                "AllowInterrupt": updates["allow_interrupt"],
+            }
+        },
+    }
+
+
+def conversation_log_settings(
+    log_group: Optional[logs.ILogGroup],
+) -> Dict[str, Any]:
+    if log_group is None:
+        return {}
+    return {
+        "ConversationLogSettings": {
+            "TextLogSettings": [
+                {
+                    "Enabled": True,
+                    "Destination": {
+                        "CloudWatch": {
+                            "CloudWatchLogGroupArn": log_group.log_group_arn,
+                            "LogPrefix": "lex",
+                        }
+                    },
+                }
+            ]
+        }
+    }
+
+
+def load_faq_intents(path: str = FAQ_INTENTS_PATH) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
 
 class LambdaAndLexBot(Construct):
     def __init__(
@@ -18,13 +286,53 @@ class LambdaAndLexBot(Construct):
         scope: Construct,
         construct_id: str,
         knowledge_base_id: str,
+        knowledge_base_slot_ids: Dict[str, str],
+        program_knowledge_base_ids: Dict[str, str],
+        active_slot_parameter: Optional[ssm.IStringParameter],
+        kb_version_parameter: Optional[ssm.IStringParameter],
         bedrock_model_id: str,
+        orchestrator_config: Dict[str, Any],
+        fulfillment_updates_config: Dict[str, Any],
+        channel_profiles: Dict[str, Dict[str, Any]],
+        context_compression_config: Dict[str, Any],
+        adaptive_retrieval_config: Dict[str, Any],
+        session_store_config: Dict[str, Any],
+        prefetch_config: Dict[str, Any],
+        fan_out_config: Dict[str, Any],
+        rate_limit_config: Dict[str, Any],
+        answer_queue_config: Dict[str, Any],
+        answer_store_config: Dict[str, Any],
+        retrieval_cache_config: Dict[str, Any],
+        redaction_config: Dict[str, Any],
+        normalization_config: Dict[str, Any],
         account_id: str,
         region: str,
         **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        session_ttl = session_store_config.get("ttl_seconds")
+        if session_ttl is not None and session_ttl < IDLE_SESSION_TTL_SECONDS:
+            raise ValueError(
+                f"session_store.ttl_seconds ({session_ttl}) must be at least "
+                f"the Lex idle session TTL ({IDLE_SESSION_TTL_SECONDS})"
+            )
+        answer_queue_config = {
+            **answer_queue_config,
+            "callback": answer_queue_config.get(
+                "callback", DEFAULT_ANSWER_QUEUE["callback"]
+            ),
+        }
+        if (
+            answer_queue_config.get("enabled")
+            and answer_queue_config["callback"] == "log"
+        ):
+            raise ValueError(
+                "answer_queue.callback log only writes answers to the worker's "
+                "log, so callers never get the text the acknowledgement "
+                "promises; use sns or module:function"
+            )
+
         #################################################################################
         # CDK For DynamoDB and Lambda
         #################################################################################
@@ -49,6 +357,7 @@ class LambdaAndLexBot(Construct):
                 name="SessionID_Lex", type=dynamodb.AttributeType.STRING
             ),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute=SESSION_TTL_ATTRIBUTE,
             removal_policy=RemovalPolicy.DESTROY,
         )
 
@@ -57,7 +366,11 @@ class LambdaAndLexBot(Construct):
             iam.PolicyStatement(
                 actions=["bedrock:RetrieveAndGenerate", "bedrock:Retrieve"],
                 resources=[
-                    f"arn:aws:bedrock:{region}:{account_id}:knowledge-base/{knowledge_base_id}"
+                    f"arn:aws:bedrock:{region}:{account_id}:knowledge-base/{slot_id}"
+                    for slot_id in [
+                        *knowledge_base_slot_ids.values(),
+                        *program_knowledge_base_ids.values(),
+                    ]
                 ],
             )
         )
@@ -80,22 +393,223 @@ class LambdaAndLexBot(Construct):
             )
         )
 
+        orchestrator_profile = resolve_orchestrator_profile(orchestrator_config)
+        environment = {
+            "KBID": knowledge_base_id,
+            "MODEL_ARN": f"arn:aws:bedrock:{region}::foundation-model/{bedrock_model_id}",
+            "DDB_Name": conversation_table.table_name,
+            "LOG_LEVEL": orchestrator_profile["log_level"],
+            # Overrides for src/lambda_orchestrator/channels.py defaults
+            "CHANNEL_PROFILES": json.dumps(channel_profiles),
+            # Overrides for src/lambda_orchestrator/context_compression.py
+            "CONTEXT_COMPRESSION": json.dumps(context_compression_config),
+            # Overrides for src/lambda_orchestrator/adaptive_retrieval.py
+            "ADAPTIVE_RETRIEVAL": json.dumps(adaptive_retrieval_config),
+            # Overrides for src/lambda_orchestrator/session_store.py
+            "SESSION_STORE": json.dumps(session_store_config),
+            # Overrides for src/lambda_orchestrator/prefetch.py
+            "PREFETCH": json.dumps(prefetch_config),
+            # Overrides for src/lambda_orchestrator/async_orchestrator.py
+            "ASYNC_ORCHESTRATOR": json.dumps(
+                orchestrator_config.get("async", {})
+            ),
+            # Overrides for src/lambda_orchestrator/fan_out.py
+            "FAN_OUT": json.dumps(fan_out_config),
+            # Overrides for src/lambda_orchestrator/rate_limit.py
+            "RATE_LIMIT": json.dumps(rate_limit_config),
+            # Overrides for src/lambda_orchestrator/answer_queue.py
+            "ANSWER_QUEUE": json.dumps(answer_queue_config),
+            # Overrides for src/lambda_orchestrator/answer_store.py
+            "ANSWER_STORE": json.dumps(answer_store_config),
+            # Overrides for src/lambda_orchestrator/retrieval_cache.py
+            "RETRIEVAL_CACHE": json.dumps(retrieval_cache_config),
+            # Overrides for src/lambda_orchestrator/redaction.py
+            "REDACTION": json.dumps(redaction_config),
+            # Overrides for src/lambda_orchestrator/normalizer.py
+            "NORMALIZATION": json.dumps(normalization_config),
+            "PROGRAM_KNOWLEDGE_BASES": Stack.of(self).to_json_string(
+                program_knowledge_base_ids
+            ),
+        }
+
+        # Blue/green: follow the active slot instead of a fixed KBID
+        if active_slot_parameter is not None:
+            active_slot_parameter.grant_read(lambda_role)
+            environment["ACTIVE_KB_PARAMETER"] = (
+                active_slot_parameter.parameter_name
+            )
+            environment["KB_SLOTS"] = Stack.of(self).to_json_string(
+                knowledge_base_slot_ids
+            )
+
+        # Precomputed answers and cached retrievals are stamped with the
+        # knowledge base version kb_ingestion_manager records
+        if kb_version_parameter is not None:
+            kb_version_parameter.grant_read(lambda_role)
+            environment["KB_VERSION_PARAMETER"] = (
+                kb_version_parameter.parameter_name
+            )
+
+        if (
+            retrieval_cache_config.get("enabled")
+            and retrieval_cache_config.get("backend", "dynamodb") == "dynamodb"
+        ):
+            retrieval_cache_table = dynamodb.Table(
+                self,
+                "RetrievalCacheTable",
+                partition_key=dynamodb.Attribute(
+                    name=RETRIEVAL_CACHE_KEY_ATTRIBUTE,
+                    type=dynamodb.AttributeType.STRING,
+                ),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute=RETRIEVAL_CACHE_TTL_ATTRIBUTE,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            lambda_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=["dynamodb:GetItem", "dynamodb:PutItem"],
+                    resources=[retrieval_cache_table.table_arn],
+                )
+            )
+            environment["RETRIEVAL_CACHE_TABLE"] = (
+                retrieval_cache_table.table_name
+            )
+
+        if (
+            rate_limit_config.get("enabled")
+            and rate_limit_config.get("backend", "dynamodb") == "dynamodb"
+        ):
+            rate_limit_table = dynamodb.Table(
+                self,
+                "RateLimitTable",
+                partition_key=dynamodb.Attribute(
+                    name=RATE_LIMIT_KEY_ATTRIBUTE,
+                    type=dynamodb.AttributeType.STRING,
+                ),
+                billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute=RATE_LIMIT_TTL_ATTRIBUTE,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            lambda_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=["dynamodb:UpdateItem"],
+                    resources=[rate_limit_table.table_arn],
+                )
+            )
+            # The answer worker warms the same clients from this environment
+            environment["RATE_LIMIT_TABLE"] = rate_limit_table.table_name
+
+        # Precomputed answers for the most frequent questions
+        answer_store = None
+        conversation_log_group = None
+        if answer_store_config.get("enabled"):
+            if not (
+                context_compression_config.get("enabled")
+                or fan_out_config.get("enabled")
+            ):
+                raise ValueError(
+                    "answer_store needs context_compression or fan_out "
+                    "enabled: stored answers leave no Bedrock session, so "
+                    "retrieve_and_generate would answer follow-ups without "
+                    "context, and the orchestrator does not serve them"
+                )
+            answer_store = {**DEFAULT_ANSWER_STORE, **answer_store_config}
+            if answer_store["log_days"] > CONVERSATION_LOG_RETENTION_DAYS:
+                raise ValueError(
+                    f"answer_store.log_days ({answer_store['log_days']}) must "
+                    f"be at most the conversation log retention "
+                    f"({CONVERSATION_LOG_RETENTION_DAYS})"
+                )
+            if answer_store["backend"] == "dynamodb":
+                answer_table = dynamodb.Table(
+                    self,
+                    "AnswerTable",
+                    partition_key=dynamodb.Attribute(
+                        name=ANSWER_KEY_ATTRIBUTE,
+                        type=dynamodb.AttributeType.STRING,
+                    ),
+                    billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                    time_to_live_attribute=ANSWER_TTL_ATTRIBUTE,
+                    removal_policy=RemovalPolicy.DESTROY,
+                )
+                lambda_role.add_to_policy(
+                    iam.PolicyStatement(
+                        actions=["dynamodb:GetItem", "dynamodb:BatchWriteItem"],
+                        resources=[answer_table.table_arn],
+                    )
+                )
+                environment["ANSWER_TABLE"] = answer_table.table_name
+            conversation_log_group = logs.LogGroup(
+                self,
+                "ConversationLogGroup",
+                retention=CONVERSATION_LOG_RETENTION,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+
         # Lambda function for orchestration
         lambda_function = _lambda.Function(
             self,
             "LambdaFunction",
-            runtime=_lambda.Runtime.PYTHON_3_9,
-            handler="lambda_orchestrator.lambda_handler",
+            runtime=PYTHON_RUNTIMES[orchestrator_profile["runtime"]],
+            architecture=ARCHITECTURES[orchestrator_profile["architecture"]],
+            handler=ORCHESTRATOR_HANDLERS[orchestrator_profile["handler"]],
             timeout=Duration.seconds(900),
-            memory_size=1024,
+            memory_size=orchestrator_profile["memory_size"],
             role=lambda_role,
-            code=_lambda.Code.from_asset("src/lambda_orchestrator"),
-            environment={
-                "KBID": knowledge_base_id,
-                "MODEL_ARN": f"arn:aws:bedrock:{region}::foundation-model/{bedrock_model_id}",
-                "DDB_Name": conversation_table.table_name,
-            },
+            code=_lambda.Code.from_asset(
+                "src/lambda_orchestrator",
+                exclude=ORCHESTRATOR_ASSET_EXCLUDES,
+            ),
+            environment=environment,
+        )
+
+        if answer_store is not None:
+            self._add_answer_precompute(
+                lambda_role,
+                orchestrator_profile,
+                environment,
+                answer_store,
+                kb_version_parameter,
+                conversation_log_group,
+            )
+
+        # Queued answers for channels that need no reply within the Lex turn
+        if answer_queue_config.get("enabled"):
+            answer_queue = self._add_answer_worker(
+                lambda_role,
+                orchestrator_profile,
+                environment,
+                {**DEFAULT_ANSWER_QUEUE, **answer_queue_config},
+            )
+            answer_queue.grant_send_messages(lambda_role)
+            lambda_function.add_environment(
+                "ANSWER_QUEUE_URL", answer_queue.queue_url
+            )
+
+        # Keep the Bedrock call inside the Lex fulfillment timeout
+        fulfillment_updates = resolve_fulfillment_updates(
+            fulfillment_updates_config
         )
+        if fulfillment_updates["enabled"]:
+            lambda_function.add_environment(
+                "GENERATION_BUDGET_SECONDS",
+                str(fulfillment_updates["generation_budget_seconds"]),
+            )
+            lambda_function.add_environment(
+                "BUDGET_EXCEEDED_MESSAGE",
+                fulfillment_updates["timeout_message"],
+            )
+
+        # Lex invokes a published alias so provisioned concurrency applies
+        concurrency = dict(DEFAULT_CONCURRENCY)
+        concurrency.update(orchestrator_config.get("concurrency", {}))
+        lambda_alias = _lambda.Alias(
+            self,
+            "LambdaFunctionAlias",
+            alias_name=concurrency["alias"],
+            version=lambda_function.current_version,
+        )
+        self._add_concurrency_scaling(lambda_alias, concurrency)
 
         #################################################################################
         # CDK For Lex Bot
@@ -123,16 +637,22 @@ class LambdaAndLexBot(Construct):
                     "bedrock:InvokeModel",
                 ],
                 resources=[
-                    f"arn:aws:bedrock:{region}:{account_id}:knowledge-base/{knowledge_base_id}",
+                    *(
+                        f"arn:aws:bedrock:{region}:{account_id}:knowledge-base/{slot_id}"
+                        for slot_id in knowledge_base_slot_ids.values()
+                    ),
                     f"arn:aws:bedrock:{region}::foundation-model/{bedrock_model_id}",
                 ],
             )
         )
 
+        if conversation_log_group is not None:
+            conversation_log_group.grant_write(bot_runtime_role)
+
         bot_runtime_role.add_to_policy(
             iam.PolicyStatement(
                 actions=["lambda:InvokeFunction"],
-                resources=[lambda_function.function_arn],
+                resources=[lambda_alias.function_arn],
             )
         )
 
@@ -145,10 +665,11 @@ class LambdaAndLexBot(Construct):
                 "Name": "KnowledgeBaseRAGBot",
                 "RoleArn": bot_runtime_role.role_arn,
                 "DataPrivacy": {"ChildDirected": False},
-                "IdleSessionTTLInSeconds": 300,
+                "IdleSessionTTLInSeconds": IDLE_SESSION_TTL_SECONDS,
                 "Description": "Amazon Bedrock Knowledge Base RAG Bot",
                 "AutoBuildBotLocales": True,
                 "TestBotAliasSettings": {
+                    **conversation_log_settings(conversation_log_group),
                     "BotAliasLocaleSettings": [
                         {
                             "LocaleId": "en_US",
@@ -157,12 +678,12 @@ class LambdaAndLexBot(Construct):
                                 "CodeHookSpecification": {
                                     "LambdaCodeHook": {
                                         "CodeHookInterfaceVersion": "1.0",
-                                        "LambdaArn": lambda_function.function_arn,
+                                        "LambdaArn": lambda_alias.function_arn,
                                     }
                                 },
                             },
                         }
-                    ]
+                    ],
                 },
                 "BotLocales": [
                     {
@@ -183,9 +704,12 @@ class LambdaAndLexBot(Construct):
                             {
                                 "Name": "FallbackIntent",
                                 "Description": "Default intent when no other intent matches",
-                                "FulfillmentCodeHook": {"Enabled": True},
+                                "FulfillmentCodeHook": build_fulfillment_code_hook(
+                                    fulfillment_updates
+                                ),
                                 "ParentIntentSignature": "AMAZON.FallbackIntent",
                             },
+                            *load_faq_intents(),
                         ],
                     }
                 ],
@@ -197,7 +721,7 @@ class LambdaAndLexBot(Construct):
             self,
             "LexLambdaPermission",
             action="lambda:invokeFunction",
-            function_name=lambda_function.function_name,
+            function_name=lambda_alias.function_arn,
             principal="lex.amazonaws.com",
             source_account=account_id,
             source_arn=f"arn:aws:lex:{region}:{account_id}:bot-alias/{lex_bot.ref}/*",
@@ -248,3 +772,187 @@ class LambdaAndLexBot(Construct):
         )
 
         self.lex_bot_id = lex_bot.ref
+
+    def _add_answer_worker(
+        self,
+        lambda_role: iam.IRole,
+        orchestrator_profile: Dict[str, Any],
+        environment: Dict[str, str],
+        settings: Dict[str, Any],
+    ) -> sqs.Queue:
+        """Queue, dead-letter queue and worker Lambda for queued answers.
+
+        The worker runs src/lambda_orchestrator/answer_worker.py from the
+        orchestrator's code and role.
+        """
+        dead_letter_queue = sqs.Queue(
+            self,
+            "AnswerDeadLetterQueue",
+            retention_period=Duration.days(14),
+            enforce_ssl=True,
+        )
+        worker_timeout = Duration.seconds(settings["worker_timeout_seconds"])
+        queue = sqs.Queue(
+            self,
+            "AnswerQueue",
+            # Lambda's guidance: six times the function timeout
+            visibility_timeout=Duration.seconds(
+                6 * settings["worker_timeout_seconds"]
+            ),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=settings["max_receive_count"],
+                queue=dead_letter_queue,
+            ),
+            enforce_ssl=True,
+        )
+        worker = _lambda.Function(
+            self,
+            "AnswerWorkerFunction",
+            runtime=PYTHON_RUNTIMES[orchestrator_profile["runtime"]],
+            architecture=ARCHITECTURES[orchestrator_profile["architecture"]],
+            handler="answer_worker.lambda_handler",
+            timeout=worker_timeout,
+            memory_size=orchestrator_profile["memory_size"],
+            role=lambda_role,
+            code=_lambda.Code.from_asset(
+                "src/lambda_orchestrator",
+                exclude=ORCHESTRATOR_ASSET_EXCLUDES,
+            ),
+            environment=environment,
+        )
+        worker.add_event_source(
+            event_sources.SqsEventSource(
+                queue,
+                batch_size=settings["batch_size"],
+                max_batching_window=Duration.seconds(
+                    settings["max_batching_window_seconds"]
+                ),
+                max_concurrency=settings["max_concurrency"],
+                report_batch_item_failures=True,
+            )
+        )
+        if settings["callback"] == "sns":
+            # Direct-to-phone SMS publishes have no topic to scope to
+            lambda_role.add_to_policy(
+                iam.PolicyStatement(actions=["sns:Publish"], resources=["*"])
+            )
+        CfnOutput(
+            self,
+            "AnswerDeadLetterQueueUrl",
+            description="Queued questions that could not be answered",
+            value=dead_letter_queue.queue_url,
+        )
+        return queue
+
+    def _add_answer_precompute(
+        self,
+        lambda_role: iam.IRole,
+        orchestrator_profile: Dict[str, Any],
+        environment: Dict[str, str],
+        settings: Dict[str, Any],
+        kb_version_parameter: ssm.IStringParameter,
+        conversation_log_group: logs.ILogGroup,
+    ) -> None:
+        """Lambda that precomputes answers nightly and on every new
+        knowledge base version.
+
+        The job runs src/lambda_orchestrator/answer_precompute.py from the
+        orchestrator's code and role.
+        """
+        precompute = _lambda.Function(
+            self,
+            "AnswerPrecomputeFunction",
+            runtime=PYTHON_RUNTIMES[orchestrator_profile["runtime"]],
+            architecture=ARCHITECTURES[orchestrator_profile["architecture"]],
+            handler="answer_precompute.lambda_handler",
+            timeout=Duration.minutes(15),
+            memory_size=orchestrator_profile["memory_size"],
+            role=lambda_role,
+            code=_lambda.Code.from_asset(
+                "src/lambda_orchestrator",
+                exclude=ORCHESTRATOR_ASSET_EXCLUDES,
+            ),
+            environment={
+                **environment,
+                "CONVERSATION_LOG_GROUP": conversation_log_group.log_group_name,
+            },
+        )
+        lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["logs:StartQuery"],
+                resources=[conversation_log_group.log_group_arn],
+            )
+        )
+        lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["logs:GetQueryResults"], resources=["*"]
+            )
+        )
+        events.Rule(
+            self,
+            "AnswerPrecomputeSchedule",
+            schedule=events.Schedule.expression(settings["schedule"]),
+            targets=[targets.LambdaFunction(precompute)],
+        )
+        # kb_ingestion_manager writes the parameter once an ingestion
+        # completes, so answers follow every content update
+        events.Rule(
+            self,
+            "AnswerPrecomputeOnIngestion",
+            event_pattern=events.EventPattern(
+                source=["aws.ssm"],
+                detail_type=["Parameter Store Change"],
+                detail={
+                    "name": [kb_version_parameter.parameter_name],
+                    "operation": ["Update"],
+                },
+            ),
+            targets=[targets.LambdaFunction(precompute)],
+        )
+
+    def _add_concurrency_scaling(
+        self, lambda_alias: _lambda.Alias, concurrency: Dict[str, Any]
+    ) -> None:
+        schedules = concurrency["schedules"]
+        max_capacity = max(
+            [concurrency["max_capacity"]]
+            + [window["max_capacity"] for window in schedules]
+        )
+        if max_capacity > 0:
+            scaling = lambda_alias.add_auto_scaling(
+                min_capacity=concurrency["min_capacity"],
+                max_capacity=concurrency["max_capacity"] or max_capacity,
+            )
+            scaling.scale_on_utilization(
+                utilization_target=concurrency["utilization_target"]
+            )
+            time_zone = (
+                TimeZone.of(concurrency["time_zone"])
+                if concurrency["time_zone"]
+                else None
+            )
+            for window in schedules:
+                scaling.scale_on_schedule(
+                    window["name"],
+                    schedule=appscaling.Schedule.expression(window["schedule"]),
+                    min_capacity=window["min_capacity"],
+                    max_capacity=window["max_capacity"],
+                    time_zone=time_zone,
+                )
+
+        if concurrency["warmup_schedule"]:
+            events.Rule(
+                self,
+                "OrchestratorWarmupRule",
+                schedule=events.Schedule.expression(
+                    concurrency["warmup_schedule"]
+                ),
+                targets=[
+                    targets.LambdaFunction(
+                        lambda_alias,
+                        event=events.RuleTargetInput.from_object(
+                            {"warmup": True}
+                        ),
+                    )
+                ],
+            )
@@ -1,11 +1,15 @@
 # stacks/main_stack.py
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from aws_cdk import Stack
 from constructs import Construct
 
 from .amazon_connect import Connect
-from .aurora_knowledge_base import AuroraKnowledgeBase
+from .aurora_knowledge_base import (
+    DEFAULT_VERSION_CHECK_SCHEDULE,
+    AuroraKnowledgeBase,
+)
+from .bundling import LambdaBundler
 from .lambda_lex_bot import LambdaAndLexBot
 
 
@@ -18,14 +22,48 @@ class RagChatbotStack(Stack):
         knowledge_base_name: str,
         embeddings_model_id: str,
         bedrock_model_id: str,
+        orchestrator_config: Dict[str, Any],
+        fulfillment_updates_config: Dict[str, Any],
+        channel_profiles: Dict[str, Dict[str, Any]],
+        context_compression_config: Dict[str, Any],
+        adaptive_retrieval_config: Dict[str, Any],
+        session_store_config: Dict[str, Any],
+        prefetch_config: Dict[str, Any],
+        fan_out_config: Dict[str, Any],
+        rate_limit_config: Dict[str, Any],
+        answer_queue_config: Dict[str, Any],
+        answer_store_config: Dict[str, Any],
+        retrieval_cache_config: Dict[str, Any],
+        redaction_config: Dict[str, Any],
+        normalization_config: Dict[str, Any],
+        kb_version_check_schedule: Optional[str],
         chunking_strategy: str,
         chunking_config: Dict[str, Any],
+        maintenance_config: Dict[str, Any],
+        capacity_profiles: Dict[str, Dict[str, Any]],
+        blue_green: Dict[str, Any],
+        program_knowledge_bases: List[Dict[str, Any]],
+        main_knowledge_base_prefix: Optional[str],
         environment: str,
+        bundling_config: Dict[str, Any],
         chat_welcome_prompt: str,
         **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Shared by every construct so assets are bundled and cached alike
+        self.bundler = LambdaBundler(self, bundling_config)
+
+        # Precomputed answers and cached retrievals need the knowledge base
+        # version recorded
+        version_check_schedule = None
+        if answer_store_config.get("enabled") or retrieval_cache_config.get(
+            "enabled"
+        ):
+            version_check_schedule = (
+                kb_version_check_schedule or DEFAULT_VERSION_CHECK_SCHEDULE
+            )
+
         # Create Knowledge Base
         kb_component = AuroraKnowledgeBase(
             self,
@@ -35,6 +73,14 @@ class RagChatbotStack(Stack):
             embeddings_model_id=embeddings_model_id,
             chunking_strategy=chunking_strategy,
             chunking_config=chunking_config,
+            maintenance_config=maintenance_config,
+            capacity_profiles=capacity_profiles,
+            blue_green=blue_green,
+            program_knowledge_bases=program_knowledge_bases,
+            main_prefix=main_knowledge_base_prefix,
+            version_check_schedule=version_check_schedule,
+            environment=environment,
+            bundler=self.bundler,
             account_id=self.account,
             region=self.region,
         )
@@ -44,7 +90,25 @@ class RagChatbotStack(Stack):
             self,
             "LambdaAndLexBot",
             knowledge_base_id=kb_component.knowledge_base_id,
+            knowledge_base_slot_ids=kb_component.knowledge_base_slot_ids,
+            program_knowledge_base_ids=kb_component.program_knowledge_base_ids,
+            active_slot_parameter=kb_component.active_slot_parameter,
+            kb_version_parameter=kb_component.kb_version_parameter,
             bedrock_model_id=bedrock_model_id,
+            orchestrator_config=orchestrator_config,
+            fulfillment_updates_config=fulfillment_updates_config,
+            channel_profiles=channel_profiles,
+            context_compression_config=context_compression_config,
+            adaptive_retrieval_config=adaptive_retrieval_config,
+            session_store_config=session_store_config,
+            prefetch_config=prefetch_config,
+            fan_out_config=fan_out_config,
+            rate_limit_config=rate_limit_config,
+            answer_queue_config=answer_queue_config,
+            answer_store_config=answer_store_config,
+            retrieval_cache_config=retrieval_cache_config,
+            redaction_config=redaction_config,
+            normalization_config=normalization_config,
             account_id=self.account,
             region=self.region,
         )
@@ -59,4 +123,5 @@ class RagChatbotStack(Stack):
             account_id=self.account,
             region=self.region,
             stack_name=self.stack_name,
+            bundler=self.bundler,
         )
@@ -0,0 +1,111 @@
+import logging
+import os
+
+import boto3
+import cfnresponse
+
+client = boto3.client("connect")
+
+LOG_LEVEL = os.getenv("LOG_LEVEL")
+INSTANCE_ID = os.getenv("INSTANCE_ID")
+
+# Largest MaxResults each List API accepts
+MAX_PAGE_SIZE = 1000
+
+# Resource property -> (list operation, summary list key, attribute suffix)
+RESOURCE_TYPES = {
+    "Queues": ("list_queues", "QueueSummaryList", "Queue"),
+    "RoutingProfiles": (
+        "list_routing_profiles",
+        "RoutingProfileSummaryList",
+        "RoutingProfile",
+    ),
+    "SecurityProfiles": (
+        "list_security_profiles",
+        "SecurityProfileSummaryList",
+        "SecurityProfile",
+    ),
+}
+
+
+def list_by_name(connect_client, operation, list_key, instance_id, **kwargs):
+    """Page through one List API with the largest page size, keyed by name."""
+    paginator = connect_client.get_paginator(operation)
+    summaries = {}
+    for page in paginator.paginate(
+        InstanceId=instance_id,
+        PaginationConfig={"PageSize": MAX_PAGE_SIZE},
+        **kwargs,
+    ):
+        for summary in page[list_key]:
+            summaries[summary["Name"]] = summary
+    return summaries
+
+
+def resolve_resources(connect_client, instance_id, properties):
+    """Resolve every requested name to its id and ARN.
+
+    properties maps each resource type to {alias: name}; queues may also be
+    {alias: {"Name": ..., "Types": [...]}}. Each resource type is listed at
+    most once, and the result is keyed "<alias><Type>Id" / "<alias><Type>Arn",
+    e.g. "AgentSecurityProfileArn".
+    """
+    response_data = {}
+    missing = []
+    for resource_type, (operation, list_key, suffix) in RESOURCE_TYPES.items():
+        requested = properties.get(resource_type)
+        if not requested:
+            continue
+
+        names = {}
+        queue_types = set()
+        for alias, spec in requested.items():
+            if isinstance(spec, dict):
+                names[alias] = spec["Name"]
+                queue_types.update(spec.get("Types", []))
+            else:
+                names[alias] = spec
+        kwargs = {"QueueTypes": sorted(queue_types)} if queue_types else {}
+
+        summaries = list_by_name(
+            connect_client, operation, list_key, instance_id, **kwargs
+        )
+        for alias, name in names.items():
+            summary = summaries.get(name)
+            if summary is None:
+                missing.append(f"{suffix} '{name}'")
+                continue
+            response_data[f"{alias}{suffix}Id"] = summary["Id"]
+            response_data[f"{alias}{suffix}Arn"] = summary["Arn"]
+
+    if missing:
+        raise LookupError(f"Not found in instance: {', '.join(missing)}")
+    return response_data
+
+
+def lambda_handler(event, context):
+    global log_level
+    log_level = str(LOG_LEVEL).upper()
+    if log_level not in {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}:
+        log_level = "ERROR"
+    logging.getLogger().setLevel(log_level)
+
+    logging.info(f"Event: {event}")
+
+    request_type = event["RequestType"]
+
+    if request_type == "Delete":
+        cfnresponse.send(event, context, cfnresponse.SUCCESS, {})
+        return
+
+    if request_type in {"Create", "Update"}:
+        try:
+            response_data = resolve_resources(
+                client, INSTANCE_ID, event["ResourceProperties"]
+            )
+            cfnresponse.send(event, context, cfnresponse.SUCCESS, response_data)
+        except Exception as e:
+            logging.error(e)
+            cfnresponse.send(
+                event, context, cfnresponse.FAILED, {"message": f"ERROR: {e}"}
+            )
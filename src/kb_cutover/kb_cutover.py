@@ -0,0 +1,257 @@
+"""
+Blue/green knowledge base cutover.
+
+The stack keeps one SSM parameter per slot holding its knowledge base id and
+an "active" parameter naming the slot the orchestrator answers from. This
+tool fills a slot from the bucket, validates it against a golden question
+set and flips the active parameter, so promotion and rollback are each a
+single parameter write. The stack only sets the active parameter when it
+is created, so a deploy never undoes a promotion.
+
+A new green slot only ingests uploads made after it was created; ingest it
+once before validating it. Validation fails while any of the slot's data
+sources has no completed latest ingestion.
+
+Usage:
+    python kb_cutover.py status
+    python kb_cutover.py ingest --slot green
+    python kb_cutover.py validate --slot green --golden golden_questions.json
+    python kb_cutover.py promote --slot green --golden golden_questions.json
+    python kb_cutover.py rollback
+
+Golden questions are a JSON list of
+    {"question": "...", "expected_sources": ["..."], "expected_text": ["..."]}
+where a question counts as recalled when any retrieved chunk comes from a
+source URI containing one of expected_sources, or contains one of
+expected_text.
+"""
+
+import argparse
+import json
+import math
+import statistics
+import sys
+import time
+
+import boto3
+
+SLOTS = ("blue", "green")
+DEFAULT_PARAMETER_PREFIX = "/RagChatbotStack/knowledge-base"
+DEFAULT_THRESHOLDS = {"min_recall": 0.8, "max_p95_latency_ms": 2000}
+
+
+def read_slots(ssm, parameter_prefix):
+    response = ssm.get_parameters(
+        Names=[f"{parameter_prefix}/{name}" for name in (*SLOTS, "active")]
+    )
+    values = {
+        parameter["Name"].rsplit("/", 1)[1]: parameter["Value"]
+        for parameter in response["Parameters"]
+    }
+    if "active" not in values:
+        raise ValueError(
+            f"No blue/green parameters under {parameter_prefix}; "
+            "is blue_green enabled in config.yaml?"
+        )
+    return values
+
+
+def switch_slot(ssm, parameter_prefix, slot):
+    ssm.put_parameter(
+        Name=f"{parameter_prefix}/active",
+        Value=slot,
+        Type="String",
+        Overwrite=True,
+    )
+
+
+def latest_ingestion_status(bedrock_agent, knowledge_base_id):
+    data_sources = bedrock_agent.list_data_sources(
+        knowledgeBaseId=knowledge_base_id
+    )["dataSourceSummaries"]
+    statuses = {}
+    for data_source in data_sources:
+        jobs = bedrock_agent.list_ingestion_jobs(
+            knowledgeBaseId=knowledge_base_id,
+            dataSourceId=data_source["dataSourceId"],
+            sortBy={"attribute": "STARTED_AT", "order": "DESCENDING"},
+            maxResults=1,
+        )["ingestionJobSummaries"]
+        statuses[data_source["name"]] = jobs[0]["status"] if jobs else None
+    return statuses
+
+
+def start_ingestion(bedrock_agent, knowledge_base_id):
+    """Start an ingestion job on every data source of the knowledge base;
+    returns {data source name: job id}."""
+    data_sources = bedrock_agent.list_data_sources(
+        knowledgeBaseId=knowledge_base_id
+    )["dataSourceSummaries"]
+    jobs = {}
+    for data_source in data_sources:
+        job = bedrock_agent.start_ingestion_job(
+            knowledgeBaseId=knowledge_base_id,
+            dataSourceId=data_source["dataSourceId"],
+        )["ingestionJob"]
+        jobs[data_source["name"]] = job["ingestionJobId"]
+    return jobs
+
+
+def ingestion_failures(statuses):
+    incomplete = {
+        name: status
+        for name, status in statuses.items()
+        if status != "COMPLETE"
+    }
+    if not statuses:
+        return ["no data sources"]
+    if incomplete:
+        return [f"latest ingestion not complete: {incomplete}"]
+    return []
+
+
+def is_recalled(question, results):
+    for result in results:
+        uri = result.get("location", {}).get("s3Location", {}).get("uri", "")
+        text = result.get("content", {}).get("text", "").lower()
+        if any(
+            source in uri for source in question.get("expected_sources", [])
+        ):
+            return True
+        if any(
+            expected.lower() in text
+            for expected in question.get("expected_text", [])
+        ):
+            return True
+    return False
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[
+        min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)
+    ]
+
+
+def validate_slot(agent_runtime, knowledge_base_id, golden_questions, k=5):
+    latencies = []
+    misses = []
+    for question in golden_questions:
+        started = time.monotonic()
+        response = agent_runtime.retrieve(
+            knowledgeBaseId=knowledge_base_id,
+            retrievalQuery={"text": question["question"]},
+            retrievalConfiguration={
+                "vectorSearchConfiguration": {"numberOfResults": k}
+            },
+        )
+        latencies.append((time.monotonic() - started) * 1000)
+        if not is_recalled(question, response["retrievalResults"]):
+            misses.append(question["question"])
+
+    return {
+        "knowledge_base_id": knowledge_base_id,
+        "questions": len(golden_questions),
+        "recall": 1 - len(misses) / len(golden_questions),
+        "p50_latency_ms": round(statistics.median(latencies), 1),
+        "p95_latency_ms": round(percentile(latencies, 0.95), 1),
+        "misses": misses,
+    }
+
+
+def check_thresholds(report, thresholds):
+    failures = []
+    if report["recall"] < thresholds["min_recall"]:
+        failures.append(
+            f"recall {report['recall']:.2f} < {thresholds['min_recall']}"
+        )
+    if report["p95_latency_ms"] > thresholds["max_p95_latency_ms"]:
+        failures.append(
+            f"p95 latency {report['p95_latency_ms']} ms > "
+            f"{thresholds['max_p95_latency_ms']} ms"
+        )
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Blue/green KB cutover")
+    parser.add_argument("--parameter-prefix", default=DEFAULT_PARAMETER_PREFIX)
+    parser.add_argument(
+        "--config", help="config.yaml with blue_green.validation"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("status", help="Show slots and ingestion status")
+    subparsers.add_parser(
+        "ingest", help="Ingest the whole bucket into a slot"
+    ).add_argument("--slot", choices=SLOTS, required=True)
+    for name in ("validate", "promote"):
+        command = subparsers.add_parser(name)
+        command.add_argument("--slot", choices=SLOTS, required=True)
+        command.add_argument("--golden", required=True)
+        command.add_argument("-k", type=int, default=5)
+    subparsers.choices["promote"].add_argument(
+        "--force", action="store_true", help="Switch even if validation fails"
+    )
+    subparsers.add_parser("rollback", help="Switch back to the other slot")
+
+    args = parser.parse_args()
+
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if args.config:
+        import yaml
+
+        with open(args.config) as f:
+            config = yaml.safe_load(f)
+        thresholds.update(config.get("blue_green", {}).get("validation", {}))
+
+    ssm = boto3.client("ssm")
+    slots = read_slots(ssm, args.parameter_prefix)
+
+    if args.command == "status":
+        bedrock_agent = boto3.client("bedrock-agent")
+        for slot in SLOTS:
+            if slot in slots:
+                marker = " (active)" if slots["active"] == slot else ""
+                statuses = latest_ingestion_status(bedrock_agent, slots[slot])
+                print(f"{slot}{marker}: {slots[slot]} ingestion={statuses}")
+        return
+
+    if args.command == "ingest":
+        jobs = start_ingestion(boto3.client("bedrock-agent"), slots[args.slot])
+        print(
+            f"Started ingestion into {args.slot}: {jobs}; run status to "
+            "follow it"
+        )
+        return
+
+    if args.command == "rollback":
+        previous = "green" if slots["active"] == "blue" else "blue"
+        switch_slot(ssm, args.parameter_prefix, previous)
+        print(f"Active slot switched from {slots['active']} to {previous}")
+        return
+
+    with open(args.golden) as f:
+        golden_questions = json.load(f)
+    report = validate_slot(
+        boto3.client("bedrock-agent-runtime"),
+        slots[args.slot],
+        golden_questions,
+        k=args.k,
+    )
+    failures = ingestion_failures(
+        latest_ingestion_status(boto3.client("bedrock-agent"), slots[args.slot])
+    ) + check_thresholds(report, thresholds)
+    print(json.dumps({**report, "failures": failures}, indent=2))
+
+    if args.command == "promote":
+        if failures and not args.force:
+            sys.exit(f"Not promoting {args.slot}: {'; '.join(failures)}")
+        switch_slot(ssm, args.parameter_prefix, args.slot)
+        print(f"Active slot switched from {slots['active']} to {args.slot}")
+    elif failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,32 @@
+import hashlib
 import json
 import os
 
 import boto3
 
 bedrockClient = boto3.client("bedrock-agent")
+ssmClient = boto3.client("ssm")
 
+# Scheduled events carrying this key check for completed ingestions instead
+# of starting one
+CHECK_EVENT_KEY = "check_ingestion"
 
-def lambda_handler(event, context):
-    dataSourceId = os.environ["DATASOURCEID"]
-    knowledgeBaseId = os.environ["KNOWLEDGEBASEID"]
+UNSETTLED_STATUSES = ("STARTING", "IN_PROGRESS", "STOPPING")
+
+
+def get_ingestion_targets():
+    # With blue/green enabled every knowledge base slot ingests each upload
+    if os.environ.get("INGESTION_TARGETS"):
+        return json.loads(os.environ["INGESTION_TARGETS"])
+    return [
+        {
+            "knowledgeBaseId": os.environ["KNOWLEDGEBASEID"],
+            "dataSourceId": os.environ["DATASOURCEID"],
+        }
+    ]
+
+
+def start_ingestion(knowledgeBaseId, dataSourceId):
     # Check for in-progress ingestion jobs
     try:
         list_response = bedrockClient.list_ingestion_jobs(
@@ -24,30 +42,84 @@ def lambda_handler(event, context):
         )
         # Check if the ingestionJobSummaries list is empty
         if list_response.get("ingestionJobSummaries"):
-            print("There are ingestion jobs currently in progress.")
-            return {
-                "statusCode": 200,
-                "body": json.dumps("Ingestion job already in progress."),
-            }
+            print(
+                "There are ingestion jobs currently in progress for",
+                knowledgeBaseId,
+            )
+            return 200, "Ingestion job already in progress."
     except Exception as e:
         print("Error checking ingestion jobs: ", str(e))
-        return {
-            "statusCode": 500,
-            "body": json.dumps("Error checking ingestion jobs: " + str(e)),
-        }
+        return 500, "Error checking ingestion jobs: " + str(e)
     # Start a new ingestion job if no jobs are in progress
     try:
         response = bedrockClient.start_ingestion_job(
             knowledgeBaseId=knowledgeBaseId, dataSourceId=dataSourceId
         )
         print("Ingestion Job Response: ", response)
-        return {
-            "statusCode": 200,
-            "body": json.dumps("Ingestion job started successfully."),
-        }
+        return 200, "Ingestion job started successfully."
     except Exception as e:
         print("Error starting ingestion job: ", str(e))
-        return {
-            "statusCode": 500,
-            "body": json.dumps("Error starting ingestion job: " + str(e)),
-        }
+        return 500, "Error starting ingestion job: " + str(e)
+
+
+def latest_ingestion_job(knowledgeBaseId, dataSourceId, status=None):
+    kwargs = {}
+    if status:
+        kwargs["filters"] = [
+            {"attribute": "STATUS", "operator": "EQ", "values": [status]}
+        ]
+    summaries = bedrockClient.list_ingestion_jobs(
+        knowledgeBaseId=knowledgeBaseId,
+        dataSourceId=dataSourceId,
+        sortBy={"attribute": "STARTED_AT", "order": "DESCENDING"},
+        maxResults=1,
+        **kwargs,
+    ).get("ingestionJobSummaries", [])
+    return summaries[0] if summaries else None
+
+
+def knowledge_base_version(targets):
+    """Version naming the last completed ingestion job of every target, or
+    None while an ingestion is still running."""
+    job_ids = []
+    for target in targets:
+        latest = latest_ingestion_job(
+            target["knowledgeBaseId"], target["dataSourceId"]
+        )
+        if latest and latest["status"] in UNSETTLED_STATUSES:
+            return None
+        completed = latest_ingestion_job(
+            target["knowledgeBaseId"], target["dataSourceId"], "COMPLETE"
+        )
+        job_ids.append(completed["ingestionJobId"] if completed else "")
+    return hashlib.sha256(",".join(job_ids).encode("utf-8")).hexdigest()[:16]
+
+
+def record_version():
+    # The parameter change starts answer_precompute through EventBridge
+    version = knowledge_base_version(get_ingestion_targets())
+    if version is None:
+        return 200, "Ingestion in progress."
+    parameter_name = os.environ["KB_VERSION_PARAMETER"]
+    current = ssmClient.get_parameter(Name=parameter_name)["Parameter"]
+    if current["Value"] == version:
+        return 200, "Knowledge base version unchanged."
+    ssmClient.put_parameter(
+        Name=parameter_name, Value=version, Type="String", Overwrite=True
+    )
+    print("Knowledge base version", current["Value"], "->", version)
+    return 200, "Knowledge base version " + version
+
+
+def lambda_handler(event, context):
+    if event.get(CHECK_EVENT_KEY):
+        status, message = record_version()
+        return {"statusCode": status, "body": json.dumps(message)}
+    results = [
+        start_ingestion(target["knowledgeBaseId"], target["dataSourceId"])
+        for target in get_ingestion_targets()
+    ]
+    return {
+        "statusCode": max(status for status, _ in results),
+        "body": json.dumps(" ".join(message for _, message in results)),
+    }
@@ -0,0 +1,79 @@
+"""
+Per-query knowledge base retrieval settings.
+
+Short, keyword-like questions ("MMR vaccine", "form DH-680") match better
+with hybrid search, which adds full-text matching on the chunks; longer,
+multi-part questions need more results to cover every part. An optional
+probe retrieves a few results first and uses their scores: a confident,
+clear winner needs only a few results, while uniformly weak scores call
+for hybrid search and the most results allowed.
+"""
+
+import re
+
+HYBRID = "HYBRID"
+SEMANTIC = "SEMANTIC"
+SEARCH_TYPES = (HYBRID, SEMANTIC)
+
+# Overridden by the ADAPTIVE_RETRIEVAL environment variable
+DEFAULT_ADAPTIVE_RETRIEVAL = {
+    "enabled": False,
+    # Bounds on numberOfResults; the channel profile's value is the start
+    "min_results": 2,
+    "max_results": 10,
+    # Queries this short, or with codes and numbers, use hybrid search
+    "hybrid_max_words": 4,
+    # Queries this long, or with several questions, get extra results
+    "long_query_words": 15,
+    "long_query_extra_results": 3,
+    # Results fetched by the score probe; 0 skips the probe
+    "probe_results": 0,
+    # Probe top score that makes a query confident, if it also leads the
+    # last probe result by score_gap
+    "confident_score": 0.75,
+    "score_gap": 0.15,
+    # Probe top score below which the query is escalated
+    "weak_score": 0.45,
+}
+
+WORD_PATTERN = re.compile(r"\w+")
+# Form numbers, product codes and other tokens mixing letters and digits
+CODE_PATTERN = re.compile(r"\b(?=\w*\d)(?=\w*[a-zA-Z])\w+\b|\b[A-Z]{2,}\b")
+CLAUSE_PATTERN = re.compile(r"\?\s*\S|\b(?:and also|as well as)\b", re.I)
+
+
+def clamp(number, settings):
+    return max(settings["min_results"], min(settings["max_results"], number))
+
+
+def query_settings(query, profile, settings):
+    """(numberOfResults, search type) from the text of the query alone."""
+    words = WORD_PATTERN.findall(query)
+    number = profile["number_of_results"]
+    if len(words) >= settings["long_query_words"] or CLAUSE_PATTERN.search(
+        query
+    ):
+        number += settings["long_query_extra_results"]
+    search_type = SEMANTIC
+    if len(words) <= settings["hybrid_max_words"] or CODE_PATTERN.search(query):
+        search_type = HYBRID
+    return clamp(number, settings), search_type
+
+
+def probe_settings(scores, number, search_type, settings):
+    """Refine query settings with the scores of the probe results."""
+    if not scores:
+        return settings["max_results"], HYBRID
+    top = scores[0]
+    if top < settings["weak_score"]:
+        return settings["max_results"], HYBRID
+    if (
+        top >= settings["confident_score"]
+        and top - scores[-1] >= settings["score_gap"]
+    ):
+        return settings["min_results"], search_type
+    return number, search_type
+
+
+def vector_search_configuration(number, search_type):
+    return {"numberOfResults": number, "overrideSearchType": search_type}
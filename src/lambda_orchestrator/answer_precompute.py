@@ -0,0 +1,217 @@
+"""
+Batch job that precomputes answers for the most frequent questions.
+
+Runs nightly and whenever kb_ingestion_manager records a new knowledge
+base version. It counts the FallbackIntent questions in the Lex
+conversation logs of the last log_days (a Logs Insights query),
+normalizes and redacts them as the orchestrator would have, folds their
+wordings together with prefetch.normalize, and answers the
+top_questions most frequent ones for every configured channel through
+the orchestrator's own generation path, concurrency at a time, retrying
+each answer up to max_attempts times. Answers are written to the answer
+store stamped with the knowledge base they were generated from
+(answer_store.py).
+
+Questions are answered most frequent first, and the job stops starting
+new ones when the Lambda is about to time out, so a short run still
+covers the questions that matter most. Small talk is skipped: the
+orchestrator never sends it to Bedrock.
+
+Events:
+    {"kb_version": "..."}  precompute for this version (skips the read)
+    anything else          precompute for the current version; the
+                           schedule and parameter change events
+"""
+
+import collections
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import answer_store
+import channels
+import lambda_orchestrator as orchestrator
+import metrics
+import prefetch
+import smalltalk
+
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+# Questions asked per transcript, in the Lex V2 conversation log format
+QUESTIONS_QUERY = """
+fields inputTranscript, inputMode
+| filter sessionState.intent.name = "FallbackIntent"
+| stats count(*) as asked by inputTranscript, inputMode
+| sort asked desc
+| limit 10000
+"""
+
+QUERY_POLL_SECONDS = 1
+
+# Stop starting answers this long before the Lambda times out, leaving time
+# to write the ones generated so far
+DEADLINE_MARGIN_SECONDS = 60
+
+
+def logged_questions(log_group, days):
+    """Times each transcript was asked, from the conversation logs."""
+    logs = orchestrator.get_client("logs")
+    now = int(time.time())
+    query_id = logs.start_query(
+        logGroupName=log_group,
+        startTime=now - days * 86400,
+        endTime=now,
+        queryString=QUESTIONS_QUERY,
+    )["queryId"]
+    while True:
+        response = logs.get_query_results(queryId=query_id)
+        if response["status"] not in ("Scheduled", "Running"):
+            break
+        time.sleep(QUERY_POLL_SECONDS)
+    if response["status"] != "Complete":
+        raise RuntimeError(f"Conversation log query {response['status']}")
+    counts = {}
+    for row in response["results"]:
+        fields = {field["field"]: field["value"] for field in row}
+        # Conversation logs hold what callers said, before normalization
+        # and redaction
+        transcript = orchestrator.redact_question(
+            orchestrator.normalize_question(
+                fields.get("inputTranscript", "").strip(),
+                channels.detect_channel({"inputMode": fields.get("inputMode")}),
+            )
+        )
+        if transcript:
+            counts[transcript] = counts.get(transcript, 0) + int(
+                fields["asked"]
+            )
+    return counts
+
+
+def top_questions(counts, limit, min_count):
+    """The limit most asked questions as (wording, times asked), folding
+    wordings that normalize alike and using the most common one."""
+    totals = collections.Counter()
+    wordings = {}
+    for transcript, count in counts.items():
+        key = prefetch.normalize(transcript)
+        if not key or smalltalk.classify(transcript):
+            continue
+        totals[key] += count
+        if count > wordings.get(key, ("", 0))[1]:
+            wordings[key] = (transcript, count)
+    return [
+        (wordings[key][0], total)
+        for key, total in totals.most_common(limit)
+        if total >= min_count
+    ]
+
+
+def generate(question, channel, kb_id, arn):
+    """Answer text for the question as the orchestrator would give it on
+    the first turn of a session."""
+    profile = channels.CHANNEL_PROFILES[channel]
+    vector_search = orchestrator.vector_search_configuration(
+        question, kb_id, profile
+    )
+    if orchestrator.generates_from_retrieve():
+        response, _ = orchestrator.retrieve_compress_generate(
+            question, kb_id, arn, profile, vector_search
+        )
+    else:
+        response = orchestrator.retrieve_and_generate(
+            question, kb_id, arn, None, profile, vector_search
+        )
+    text = response["output"]["text"]
+    return channels.fit_answer(text, profile) if text else None
+
+
+def generate_with_retries(question, channel, kb_id, arn, settings):
+    for attempt in range(1, settings["max_attempts"] + 1):
+        try:
+            return generate(question, channel, kb_id, arn)
+        except Exception as e:
+            if attempt == settings["max_attempts"]:
+                logger.error("Giving up on %r (%s): %s", question, channel, e)
+                return None
+            # Full jitter keeps the workers from retrying in step
+            time.sleep(
+                random.uniform(0, settings["retry_base_seconds"] * 2**attempt)
+            )
+
+
+def precompute(questions, kb_id, kb_stamp, settings, deadline=None):
+    """Generate and store answers for (question, times asked) pairs;
+    returns the number of answers stored and attempted."""
+    arn = os.environ["MODEL_ARN"]
+    tasks = [
+        (question, channel)
+        for question, _ in questions
+        for channel in settings["channels"]
+    ]
+
+    def answer(task):
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        question, channel = task
+        return generate_with_retries(question, channel, kb_id, arn, settings)
+
+    with ThreadPoolExecutor(max_workers=settings["concurrency"]) as executor:
+        answers = [
+            (question, channel, text)
+            for (question, channel), text in zip(
+                tasks, executor.map(answer, tasks)
+            )
+            if text
+        ]
+    orchestrator.get_answer_store().put_many(answers, kb_stamp)
+    return len(answers), len(tasks)
+
+
+def lambda_handler(event, context):
+    settings = orchestrator.ANSWER_STORE
+    started = time.monotonic()
+    # Clients are created here: creating them from threads is not safe
+    orchestrator.warm_up()
+    version = event.get("kb_version") or orchestrator.get_kb_version()
+    if version is None:
+        logger.warning("No knowledge base version recorded yet, skipping")
+        return {"stored": 0}
+    kb_id = orchestrator.get_knowledge_base_id()
+    kb_stamp = answer_store.stamp(kb_id, version)
+    questions = top_questions(
+        logged_questions(
+            os.environ["CONVERSATION_LOG_GROUP"], settings["log_days"]
+        ),
+        settings["top_questions"],
+        settings["min_count"],
+    )
+    deadline = None
+    if context is not None:
+        deadline = started + (
+            context.get_remaining_time_in_millis() / 1000
+            - DEADLINE_MARGIN_SECONDS
+        )
+    stored, attempted = precompute(
+        questions, kb_id, kb_stamp, settings, deadline
+    )
+    logger.info(
+        "Stored %s of %s answers for %s questions at %s",
+        stored,
+        attempted,
+        len(questions),
+        kb_stamp,
+    )
+    metrics.emit(
+        {
+            "PrecomputedAnswers": (stored, "Count"),
+            "PrecomputeUnanswered": (attempted - stored, "Count"),
+            "PrecomputeDuration": (time.monotonic() - started, "Seconds"),
+        },
+        {"KnowledgeBase": kb_id},
+        {"KnowledgeBaseVersion": version},
+    )
+    return {"stored": stored, "attempted": attempted, "kb_version": kb_stamp}
@@ -0,0 +1,113 @@
+"""
+Queued answers for channels that do not need a reply within the Lex turn.
+
+A text message can be answered a few seconds later just as well, so for
+the configured channels the orchestrator puts the question on an SQS
+queue, acknowledges it at once, and returns. answer_worker.py receives
+the questions in batches, answers them through the usual knowledge base
+path, and hands each answer to a delivery callback. The queue absorbs
+spikes, and the worker's batch size and maximum concurrency set how hard
+Bedrock is driven, rather than the arrival rate of messages.
+
+Callbacks take (answer, message) and are chosen by name:
+    log       write the answer to the worker's log (local runs and tests;
+              a deployed stack rejects it)
+    sns       text the answer to the caller's number with SNS
+    module:function  any importable function, e.g. to send email
+
+A callback raises DeliveryError when retrying cannot help, such as a
+message without a reply address; the worker drops that message instead
+of returning it to the queue.
+"""
+
+import importlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Overridden by the ANSWER_QUEUE environment variable
+DEFAULT_ANSWER_QUEUE = {
+    "enabled": False,
+    "channels": ["sms"],
+    "acknowledgement": (
+        "Thanks for your question. We'll text you the answer in a moment."
+    ),
+    "callback": "log",
+    # Questions answered at once by each worker invocation
+    "worker_threads": 4,
+}
+
+# Set by the Connect contact flow to the customer's phone number
+REPLY_ADDRESS_ATTRIBUTE = "customer_address"
+
+# Parts of the Lex event the worker needs to answer the question
+EVENT_KEYS = ("sessionId", "inputMode", "transcriptions", "requestAttributes")
+
+clients = {}
+
+
+class DeliveryError(Exception):
+    """An answer cannot be delivered, however often it is retried."""
+
+
+def message(intent_request, session_attributes):
+    """Queue message body for a Lex turn."""
+    return {
+        "event": {
+            **{k: intent_request[k] for k in EVENT_KEYS if k in intent_request},
+            "sessionState": {
+                "intent": intent_request["sessionState"]["intent"],
+                "sessionAttributes": session_attributes,
+            },
+        },
+        "enqueued_at": time.time(),
+    }
+
+
+def reply_address(body):
+    attributes = body["event"]["sessionState"]["sessionAttributes"]
+    return attributes.get(REPLY_ADDRESS_ATTRIBUTE)
+
+
+def deliver_to_log(answer, body):
+    logger.info("Answer for session %s: %s", body["event"]["sessionId"], answer)
+
+
+def deliver_by_sns(answer, body):
+    address = reply_address(body)
+    if not address:
+        raise DeliveryError("No reply address in the session attributes")
+    get_sns_client().publish(PhoneNumber=address, Message=answer)
+
+
+def get_sns_client():
+    if "sns" not in clients:
+        import boto3
+
+        clients["sns"] = boto3.client("sns")
+    return clients["sns"]
+
+
+CALLBACKS = {"log": deliver_to_log, "sns": deliver_by_sns}
+
+
+def get_callback(name):
+    """The named callback, with its clients created so that worker threads
+    can share them."""
+    if name == "sns":
+        get_sns_client()
+    if name in CALLBACKS:
+        return CALLBACKS[name]
+    module_name, _, function_name = name.partition(":")
+    if not function_name:
+        raise ValueError(
+            f"Unknown answer callback {name!r}, expected one of "
+            f"{', '.join(CALLBACKS)} or module:function"
+        )
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def encode(body):
+    return json.dumps(body, separators=(",", ":"))
@@ -0,0 +1,157 @@
+"""
+Precomputed answers for the most frequent questions.
+
+answer_precompute.py generates answers for the top questions in the
+conversation logs and writes them here, stamped with the knowledge base
+they were generated from: the active knowledge base id and the version
+kb_ingestion_manager records after each completed ingestion. The
+orchestrator serves a stored answer only while its stamp matches the
+current one, so a new ingestion or a blue/green cutover retires every
+stored answer at once, without deleting anything; the next precompute
+run fills the store again.
+
+Answers are keyed by channel and normalized question (prefetch.normalize),
+because each channel's profile shapes its answers.
+
+Backends:
+    dynamodb  the answer table (the deployed default)
+    memory    a dict in the execution environment, for tests and local runs
+"""
+
+import abc
+import logging
+import time
+
+import prefetch
+
+logger = logging.getLogger(__name__)
+
+# Overridden by the ANSWER_STORE environment variable
+DEFAULT_ANSWER_STORE = {
+    "enabled": False,
+    "backend": "dynamodb",
+    # Channels answers are precomputed for and served to
+    "channels": ["chat", "sms", "voice"],
+    # Most frequent questions precomputed, and how often a question must
+    # have been asked to qualify
+    "top_questions": 500,
+    "min_count": 3,
+    # Conversation logs read for question counts
+    "log_days": 7,
+    # Answers generated at once, and attempts per answer
+    "concurrency": 8,
+    "max_attempts": 3,
+    "retry_base_seconds": 1.0,
+    # Stored answers outlive a missed nightly run
+    "ttl_days": 3,
+}
+
+KEY_ATTRIBUTE = "question_key"
+QUESTION_ATTRIBUTE = "question"
+ANSWER_ATTRIBUTE = "answer"
+VERSION_ATTRIBUTE = "kb_version"
+TTL_ATTRIBUTE = "expires_at"
+
+
+class AnswerStoreError(Exception):
+    """Answers could not be read or written."""
+
+
+def question_key(question, channel):
+    return f"{channel}#{prefetch.normalize(question)}"
+
+
+def stamp(kb_id, version):
+    """Knowledge base stamp stored with, and required of, every answer."""
+    return f"{kb_id}:{version}"
+
+
+class AnswerStore(abc.ABC):
+    """Stamp and expiry checks shared by the backends."""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def get(self, question, channel, kb_stamp):
+        """The stored answer for the question if it was generated from
+        kb_stamp, else None."""
+        item = self.read(question_key(question, channel))
+        if not item or item.get(VERSION_ATTRIBUTE) != kb_stamp:
+            return None
+        if item.get(TTL_ATTRIBUTE, 0) <= time.time():
+            return None
+        return item[ANSWER_ATTRIBUTE]
+
+    def put_many(self, answers, kb_stamp):
+        """Store (question, channel, answer) tuples under kb_stamp."""
+        expires_at = int(time.time()) + self.settings["ttl_days"] * 86400
+        self.write_many(
+            [
+                {
+                    KEY_ATTRIBUTE: question_key(question, channel),
+                    QUESTION_ATTRIBUTE: question,
+                    ANSWER_ATTRIBUTE: answer,
+                    VERSION_ATTRIBUTE: kb_stamp,
+                    TTL_ATTRIBUTE: expires_at,
+                }
+                for question, channel, answer in answers
+            ]
+        )
+
+    @abc.abstractmethod
+    def read(self, key):
+        """The item stored under key, or None."""
+
+    @abc.abstractmethod
+    def write_many(self, items):
+        """Store items, replacing those with the same keys."""
+
+
+class InMemoryAnswerStore(AnswerStore):
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.items = {}
+
+    def read(self, key):
+        return self.items.get(key)
+
+    def write_many(self, items):
+        for item in items:
+            self.items[item[KEY_ATTRIBUTE]] = item
+
+
+class DynamoDBAnswerStore(AnswerStore):
+    """get_table returns the boto3 Table, so the resource is only created
+    on first use."""
+
+    def __init__(self, settings, get_table):
+        super().__init__(settings)
+        self.get_table = get_table
+
+    def read(self, key):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            response = self.get_table().get_item(Key={KEY_ATTRIBUTE: key})
+        except (BotoCoreError, ClientError) as e:
+            raise AnswerStoreError(f"Cannot read answer {key}: {e}") from e
+        return response.get("Item")
+
+    def write_many(self, items):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            with self.get_table().batch_writer() as batch:
+                for item in items:
+                    batch.put_item(Item=item)
+        except (BotoCoreError, ClientError) as e:
+            raise AnswerStoreError(f"Cannot write answers: {e}") from e
+
+
+def create_store(settings, get_table=None):
+    backend = settings["backend"]
+    if backend == "dynamodb":
+        return DynamoDBAnswerStore(settings, get_table)
+    if backend == "memory":
+        return InMemoryAnswerStore(settings)
+    raise ValueError(f"Unknown answer store backend {backend!r}")
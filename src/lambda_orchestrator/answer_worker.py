@@ -0,0 +1,111 @@
+"""
+SQS worker that answers questions queued by the orchestrator.
+
+Each invocation receives a batch of queue messages (answer_queue.py),
+answers them through lambda_orchestrator's knowledge base path with up to
+worker_threads questions in flight, and delivers every answer with the
+configured callback. Questions from the same session are answered one
+after another in queue order, so a follow-up question sees the previous
+answer in the session history.
+
+Messages that fail are reported as batch item failures and return to the
+queue; after the queue's maxReceiveCount they move to its dead-letter
+queue. When a message fails, the later messages of its session in the
+same batch are returned too, so they are not answered out of order.
+Undeliverable answers (answer_queue.DeliveryError) are logged and
+dropped. SQS delivers at least once, so a caller can, rarely, receive
+an answer twice.
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import answer_queue
+import channels
+import lambda_orchestrator as orchestrator
+import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+
+def answer(body):
+    """Answer text for a queued question."""
+    event = body["event"]
+    session_attributes = event["sessionState"]["sessionAttributes"]
+    response = orchestrator.knowledge_base_turn(
+        event,
+        session_attributes,
+        event["transcriptions"][0]["transcription"],
+        channels.detect_channel(event),
+        time.monotonic(),
+    )
+    return response["messages"][0]["content"]
+
+
+def process_session(records, callback):
+    """Answer one session's records in order; returns the message ids to
+    retry."""
+    for position, record in enumerate(records):
+        body = json.loads(record["body"])
+        try:
+            text = answer(body)
+            callback(text, body)
+        except answer_queue.DeliveryError as e:
+            logger.error(
+                "Dropping answer for session %s: %s",
+                body["event"]["sessionId"],
+                e,
+            )
+            continue
+        except Exception:
+            logger.exception(
+                "Answering session %s failed", body["event"]["sessionId"]
+            )
+            return [r["messageId"] for r in records[position:]]
+        metrics.emit(
+            {
+                "QueuedAnswerDelay": (
+                    (time.time() - body["enqueued_at"]) * 1000,
+                    "Milliseconds",
+                )
+            },
+            {"Channel": channels.detect_channel(body["event"])},
+        )
+    return []
+
+
+def group_by_session(records):
+    sessions = {}
+    for record in records:
+        session_id = json.loads(record["body"])["event"]["sessionId"]
+        sessions.setdefault(session_id, []).append(record)
+    return list(sessions.values())
+
+
+def lambda_handler(event, context):
+    settings = orchestrator.ANSWER_QUEUE
+    # Clients are created here: creating them from threads is not safe
+    orchestrator.warm_up()
+    callback = answer_queue.get_callback(settings["callback"])
+    sessions = group_by_session(event["Records"])
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(settings["worker_threads"], len(sessions)))
+    ) as executor:
+        failed = [
+            message_id
+            for retry in executor.map(
+                lambda records: process_session(records, callback), sessions
+            )
+            for message_id in retry
+        ]
+    if failed:
+        logger.warning(
+            "Returning %s of %s messages to the queue",
+            len(failed),
+            len(event["Records"]),
+        )
+    return {"batchItemFailures": [{"itemIdentifier": m} for m in failed]}
@@ -0,0 +1,375 @@
+"""
+Asyncio variant of the orchestrator handler.
+
+Takes the same events and settings as lambda_orchestrator and returns the
+same responses and metrics, but overlaps the I/O of a FallbackIntent turn:
+the session read runs while retrieval settings are chosen and, with
+context compression, while the knowledge base is searched; retrieval can
+fan out to several knowledge bases at once; and, if enabled, the session
+write is started but not awaited before the response is returned.
+
+Bedrock is reached through async clients. By default these wrap the
+orchestrator's boto3 clients and run each call in a worker thread, which
+keeps the deployment package to boto3 from the Lambda runtime. Any
+client with the same async methods, such as an aioboto3 client or a test
+stub, can be registered in async_clients instead. Session store calls
+always run in worker threads.
+
+Session writes are awaited before responding unless defer_session_writes
+is set. Lambda freezes the execution environment once the handler
+returns, so a deferred write only makes progress during the next
+invocation of the same environment, which awaits it before reading
+sessions. Lex does not route a conversation to the same environment,
+though: a follow-up question handled by another environment reads the
+session without the last turn and, for retrieve_and_generate, without
+its knowledge base session, and the write is lost altogether if the
+environment is shut down first. Only defer writes where a lost turn is
+acceptable, such as single-question channels or benchmarks.
+
+Deploy with the orchestrator config "handler: async".
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+import adaptive_retrieval
+import channels
+import context_compression
+import fan_out
+import lambda_orchestrator as orchestrator
+import prefetch
+
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+# Overridden by the ASYNC_ORCHESTRATOR environment variable
+DEFAULT_ASYNC_ORCHESTRATOR = {
+    # Answer before the session write finishes; see the module docstring
+    # for the stale sessions this can cause
+    "defer_session_writes": False,
+    # Longest an invocation waits for the previous one's deferred writes
+    "drain_seconds": 2.0,
+}
+
+ASYNC_ORCHESTRATOR = {
+    **DEFAULT_ASYNC_ORCHESTRATOR,
+    **json.loads(os.environ.get("ASYNC_ORCHESTRATOR", "{}")),
+}
+
+# Native async clients by service name; others wrap the boto3 clients
+async_clients = {}
+
+# Deferred session writes that have not finished yet
+background = set()
+
+event_loop = {}
+
+
+class ThreadedClient:
+    """Async methods over a boto3 client, each call run in a worker thread."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        async def call(**kwargs):
+            return await asyncio.to_thread(method, **kwargs)
+
+        return call
+
+
+def get_async_client(service_name):
+    if service_name in async_clients:
+        return async_clients[service_name]
+    # Created here, on the event loop thread: boto3 client creation is not
+    # safe from worker threads
+    return ThreadedClient(orchestrator.get_client(service_name))
+
+
+def get_event_loop():
+    if "loop" not in event_loop:
+        event_loop["loop"] = asyncio.new_event_loop()
+    return event_loop["loop"]
+
+
+async def drain():
+    if background:
+        await asyncio.wait(
+            set(background), timeout=ASYNC_ORCHESTRATOR["drain_seconds"]
+        )
+
+
+async def within_budget(call):
+    """Await a Bedrock call for only the time left in the turn's generation
+    budget; async lambda_orchestrator.within_budget."""
+    remaining = orchestrator.time_left()
+    if remaining is None:
+        return await call
+    if remaining <= 0:
+        call.close()
+        raise orchestrator.BudgetExceeded()
+    try:
+        return await asyncio.wait_for(call, remaining)
+    except asyncio.TimeoutError:
+        raise orchestrator.BudgetExceeded() from None
+
+
+async def retrieve(input_text, kb_id, vector_search):
+    prefetched = prefetch.lookup(input_text, kb_id, vector_search)
+    if prefetched is not None:
+        logger.info("Using prefetched retrieval results")
+        return prefetched
+    key = orchestrator.retrieval_cache_key(input_text, kb_id, vector_search)
+    if key:
+        cached = await asyncio.to_thread(orchestrator.cached_retrieval, key)
+        if cached is not None:
+            return cached
+    response = await within_budget(
+        get_async_client("bedrock-agent-runtime").retrieve(
+            **orchestrator.retrieve_request(input_text, kb_id, vector_search)
+        )
+    )
+    results = response["retrievalResults"]
+    if key:
+        # Written while generation runs; a write cut off by the freeze
+        # after the response only costs another environment a cache miss
+        write = asyncio.create_task(
+            asyncio.to_thread(orchestrator.cache_retrieval, key, results)
+        )
+        background.add(write)
+        write.add_done_callback(background.discard)
+    return results
+
+
+async def retrieve_all(input_text, sources, vector_search, timeout=None):
+    """Retrieve from several knowledge bases at once.
+
+    Maps source name to results for the sources that answered within
+    timeout seconds; the rest are cancelled.
+    """
+    tasks = {
+        name: asyncio.create_task(retrieve(input_text, kb_id, vector_search))
+        for name, kb_id in sources.items()
+    }
+    done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    results = {}
+    for name, task in tasks.items():
+        if task not in done:
+            continue
+        if task.exception():
+            logger.warning(
+                "Retrieval from %s failed: %s", name, task.exception()
+            )
+            continue
+        results[name] = task.result()
+    return results
+
+
+async def retrieve_sources(input_text, kb_id, vector_search):
+    """Async lambda_orchestrator.retrieve_sources."""
+    settings = orchestrator.FAN_OUT
+    if not settings["enabled"]:
+        return await retrieve(input_text, kb_id, vector_search)
+    started = time.monotonic()
+    sources = fan_out.select_sources(
+        kb_id, orchestrator.get_program_knowledge_base_ids(), settings
+    )
+    results = await retrieve_all(
+        input_text, sources, vector_search, orchestrator.source_timeout()
+    )
+    return orchestrator.merge_sources(sources, results, vector_search, started)
+
+
+async def vector_search_configuration(input_text, kb_id, profile):
+    """Async lambda_orchestrator.vector_search_configuration."""
+    settings = orchestrator.ADAPTIVE_RETRIEVAL
+    if not settings["enabled"]:
+        return None
+    number, search_type = adaptive_retrieval.query_settings(
+        input_text, profile, settings
+    )
+    if settings["probe_results"]:
+        probe = await retrieve(
+            input_text,
+            kb_id,
+            adaptive_retrieval.vector_search_configuration(
+                settings["probe_results"], search_type
+            ),
+        )
+        number, search_type = adaptive_retrieval.probe_settings(
+            [result["score"] for result in probe],
+            number,
+            search_type,
+            settings,
+        )
+    return adaptive_retrieval.vector_search_configuration(number, search_type)
+
+
+async def save_session(session_id, session):
+    write = asyncio.create_task(
+        asyncio.to_thread(orchestrator.save_session, session_id, session)
+    )
+    if not ASYNC_ORCHESTRATOR["defer_session_writes"]:
+        await write
+        return
+    background.add(write)
+    write.add_done_callback(background.discard)
+    # Let the write reach its worker thread before the response returns
+    await asyncio.sleep(0)
+
+
+async def fallback_intent_handler(intent_request, session_attributes):
+    started = time.monotonic()
+    query_string = intent_request["transcriptions"][0]["transcription"]
+    channel = channels.detect_channel(intent_request)
+    response = orchestrator.smalltalk_answer(
+        intent_request, session_attributes, query_string, channel, started
+    )
+    if response:
+        return response
+    # Create clients before their calls move to worker threads
+    orchestrator.get_session_store()
+    if orchestrator.SESSION_STORE["backend"] == "dynamodb":
+        orchestrator.get_conversation_table()
+    if (
+        orchestrator.RATE_LIMIT["enabled"]
+        and orchestrator.RATE_LIMIT["backend"] == "dynamodb"
+    ):
+        orchestrator.get_rate_limit_table()
+    orchestrator.prepare_retrieval_cache()
+    if orchestrator.ANSWER_STORE["enabled"]:
+        orchestrator.get_answer_store()
+        if orchestrator.ANSWER_STORE["backend"] == "dynamodb":
+            orchestrator.get_answer_table()
+        # Either may create the SSM client
+        orchestrator.get_kb_version()
+        orchestrator.get_knowledge_base_id()
+        response = await asyncio.to_thread(
+            orchestrator.precomputed_answer,
+            intent_request,
+            session_attributes,
+            query_string,
+            channel,
+            started,
+        )
+        if response:
+            return response
+    response = await asyncio.to_thread(
+        orchestrator.rate_limited_answer,
+        intent_request,
+        session_attributes,
+        query_string,
+        channel,
+        started,
+    )
+    if response:
+        return response
+    if orchestrator.ANSWER_QUEUE["enabled"]:
+        orchestrator.get_client("sqs")
+        response = await asyncio.to_thread(
+            orchestrator.queued_answer,
+            intent_request,
+            session_attributes,
+            query_string,
+            channel,
+            started,
+        )
+        if response:
+            return response
+    profile = channels.CHANNEL_PROFILES[channel]
+    kb_id = orchestrator.get_knowledge_base_id()
+    arn = os.environ["MODEL_ARN"]
+    session_id = intent_request["sessionId"]
+
+    session_read = asyncio.create_task(
+        asyncio.to_thread(orchestrator.load_session, session_id)
+    )
+    orchestrator.start_budget(started)
+    try:
+        vector_search = await vector_search_configuration(
+            query_string, kb_id, profile
+        )
+        if orchestrator.generates_from_retrieve():
+            retrieved = await retrieve_sources(
+                query_string,
+                kb_id,
+                vector_search or orchestrator.default_vector_search(profile),
+            )
+            passages, stats = context_compression.compress(
+                retrieved, orchestrator.CONTEXT_COMPRESSION
+            )
+            session = await session_read
+            generated = await within_budget(
+                get_async_client("bedrock-runtime").converse(
+                    **orchestrator.converse_request(
+                        query_string, arn, profile, passages, session["history"]
+                    )
+                )
+            )
+            response, stats = orchestrator.converse_answer(generated, stats)
+            orchestrator.record_compression(channel, stats)
+        else:
+            # The knowledge base session id is an input to the call
+            session = await session_read
+            client = get_async_client("bedrock-agent-runtime")
+            response = await within_budget(
+                client.retrieve_and_generate(
+                    **orchestrator.retrieve_and_generate_request(
+                        query_string,
+                        kb_id,
+                        arn,
+                        session["kb_session"],
+                        profile,
+                        vector_search,
+                    )
+                )
+            )
+            session["kb_session"] = response["sessionId"]
+    except Exception as e:
+        if not orchestrator.out_of_budget(e):
+            raise
+        return orchestrator.budget_exceeded(
+            intent_request, session_attributes, channel, started, e
+        )
+    finally:
+        orchestrator.turn_deadline["at"] = None
+    response = orchestrator.knowledge_base_answer(
+        intent_request,
+        session_attributes,
+        query_string,
+        response,
+        profile,
+        session,
+    )
+    await save_session(session_id, session)
+    orchestrator.record_answer(channel, "knowledge_base", started, response)
+    return response
+
+
+async def handle(event, context):
+    # Finish the previous turn's session write before reading sessions
+    await drain()
+    intent_name = event["sessionState"]["intent"]["name"]
+    handler = ASYNC_HANDLERS.get(intent_name)
+    if handler is None:
+        return orchestrator.lambda_handler(event, context)
+    orchestrator.normalize_event(event)
+    orchestrator.redact_event(event)
+    return await handler(event, orchestrator.get_session_attributes(event))
+
+
+def lambda_handler(event, context):
+    if event.get(orchestrator.WARMUP_EVENT_KEY):
+        return orchestrator.warm_up()
+    return get_event_loop().run_until_complete(handle(event, context))
+
+
+# Intents with async handlers; the rest use lambda_orchestrator's
+ASYNC_HANDLERS = {"FallbackIntent": fallback_intent_handler}
@@ -0,0 +1,135 @@
+"""
+Per-channel answer profiles.
+
+Voice answers are spoken by Polly, so they should be short and quick to
+generate; SMS answers should fit in a couple of segments; chat can afford
+more detail. Each profile bounds the output tokens and retrieved chunks
+and adds a style instruction to the generation prompt.
+"""
+
+import json
+import os
+
+VOICE = "voice"
+CHAT = "chat"
+SMS = "sms"
+
+# Overridden per channel and key by the CHANNEL_PROFILES environment variable
+DEFAULT_CHANNEL_PROFILES = {
+    VOICE: {
+        "max_tokens": 150,
+        "number_of_results": 3,
+        "max_characters": None,
+        "style": (
+            "Answer in one or two short sentences that sound natural when "
+            "spoken aloud. Do not use lists, URLs, or formatting."
+        ),
+    },
+    CHAT: {
+        "max_tokens": 500,
+        "number_of_results": 5,
+        "max_characters": None,
+        "style": (
+            "Answer concisely. Use a short list only when it makes the "
+            "answer easier to read."
+        ),
+    },
+    SMS: {
+        "max_tokens": 120,
+        "number_of_results": 3,
+        # Two concatenated SMS segments
+        "max_characters": 306,
+        "style": (
+            "Answer in at most two short plain-text sentences without "
+            "formatting."
+        ),
+    },
+}
+
+PROMPT_TEMPLATE = """You are a public health assistant. Answer the user's \
+question using only the information in the search results below. If the \
+search results do not contain the answer, say that you could not find it.
+{style}
+
+Search results:
+$search_results$"""
+
+# Lex channel integrations that deliver text messages
+SMS_PLATFORMS = {"Twilio-SMS", "Twilio"}
+
+
+def load_channel_profiles():
+    profiles = {name: dict(p) for name, p in DEFAULT_CHANNEL_PROFILES.items()}
+    for name, overrides in json.loads(
+        os.environ.get("CHANNEL_PROFILES", "{}")
+    ).items():
+        profiles.setdefault(name, dict(DEFAULT_CHANNEL_PROFILES[CHAT]))
+        profiles[name].update(overrides)
+    return profiles
+
+
+CHANNEL_PROFILES = load_channel_profiles()
+
+
+def detect_channel(event):
+    """Channel of a Lex V2 event, from Connect attributes or the input mode.
+
+    The Connect contact flow passes $.Channel and the segment subtype as
+    session attributes; direct Lex integrations only tell us the platform
+    or whether the input was speech.
+    """
+    session_attributes = (event.get("sessionState") or {}).get(
+        "sessionAttributes"
+    ) or {}
+    request_attributes = event.get("requestAttributes") or {}
+
+    subtype = session_attributes.get("channel_subtype", "")
+    if subtype == "connect:SMS":
+        return SMS
+    connect_channel = session_attributes.get("channel", "").upper()
+    if connect_channel == "VOICE":
+        return VOICE
+    if connect_channel == "CHAT":
+        return CHAT
+
+    if request_attributes.get("x-amz-lex:channels:platform") in SMS_PLATFORMS:
+        return SMS
+    if event.get("inputMode") in ("Speech", "DTMF"):
+        return VOICE
+    return CHAT
+
+
+def generation_configuration(profile, vector_search=None):
+    """Knowledge base config keys that apply a channel profile.
+
+    vector_search replaces the profile's vectorSearchConfiguration, e.g.
+    with per-query settings from adaptive_retrieval.
+    """
+    return {
+        "retrievalConfiguration": {
+            "vectorSearchConfiguration": vector_search
+            or {"numberOfResults": profile["number_of_results"]}
+        },
+        "generationConfiguration": {
+            "inferenceConfig": {
+                "textInferenceConfig": {"maxTokens": profile["max_tokens"]}
+            },
+            "promptTemplate": {
+                "textPromptTemplate": PROMPT_TEMPLATE.format(
+                    style=profile["style"]
+                )
+            },
+        },
+    }
+
+
+def fit_answer(text, profile):
+    """Trim text to the profile's character limit at a sentence boundary."""
+    limit = profile.get("max_characters")
+    if not limit or len(text) <= limit:
+        return text
+    cut = text[:limit]
+    end = max(cut.rfind(". "), cut.rfind("? "), cut.rfind("! "))
+    if end > 0:
+        return cut[: end + 1]
+    return cut[: limit - 3].rsplit(" ", 1)[0] + "..."
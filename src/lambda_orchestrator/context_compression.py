@@ -0,0 +1,181 @@
+"""
+Compress knowledge base retrieval results before generation.
+
+Hierarchical chunking returns the parent chunk for every matching child,
+so the same parent often comes back several times, and adjacent chunks of
+one document repeat their overlap tokens. This stage drops passages that
+score far below the best one, removes contained and near-identical
+passages, merges chunks of the same document that overlap end-to-start,
+and packs what is left, best first, into a token budget.
+"""
+
+import re
+import time
+
+# Overridden by the CONTEXT_COMPRESSION environment variable
+DEFAULT_COMPRESSION = {
+    "enabled": False,
+    # Context passed to the model, in estimated tokens
+    "token_budget": 1200,
+    # Drop passages scoring below this share of the best score
+    "min_score_ratio": 0.5,
+    # Word 5-gram Jaccard similarity above which passages are duplicates
+    "similarity_threshold": 0.8,
+    # Merge chunks whose end and start share at least this many words
+    "min_merge_overlap_words": 8,
+}
+
+SHINGLE_SIZE = 5
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    # Close enough for English prose with the Claude and Titan tokenizers
+    return max(1, round(len(text) / 4))
+
+
+def to_passages(retrieval_results):
+    passages = []
+    for result in retrieval_results:
+        text = " ".join(result["content"]["text"].split())
+        if not text:
+            continue
+        metadata = result.get("metadata") or {}
+        location = result.get("location") or {}
+        source = metadata.get("x-amz-bedrock-kb-source-uri") or (
+            location.get("s3Location") or {}
+        ).get("uri", "")
+        passages.append(
+            {"text": text, "source": source, "score": result.get("score", 0.0)}
+        )
+    return passages
+
+
+def shingles(text):
+    words = text.lower().split()
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def deduplicate(passages, similarity_threshold):
+    """Keep the best-scoring passage of each contained or near-identical set."""
+    kept = []
+    for passage in sorted(passages, key=lambda p: p["score"], reverse=True):
+        passage_shingles = shingles(passage["text"])
+        duplicate = False
+        for other in kept:
+            if passage["text"] in other["text"]:
+                duplicate = True
+            elif other["text"] in passage["text"]:
+                # A parent chunk contains a child we kept: keep the parent
+                other["text"] = passage["text"]
+                other["shingles"] = passage_shingles
+                duplicate = True
+            else:
+                overlap = len(passage_shingles & other["shingles"])
+                union = len(passage_shingles | other["shingles"])
+                duplicate = overlap / union >= similarity_threshold
+            if duplicate:
+                break
+        if not duplicate:
+            kept.append({**passage, "shingles": passage_shingles})
+    for passage in kept:
+        del passage["shingles"]
+    return kept
+
+
+def overlap_words(first, second, minimum):
+    """Words at the end of first that start second, or 0 below minimum."""
+    first_words, second_words = first.split(), second.split()
+    longest = min(len(first_words), len(second_words))
+    for size in range(longest, minimum - 1, -1):
+        if first_words[-size:] == second_words[:size]:
+            return size
+    return 0
+
+
+def merge_adjacent(passages, min_overlap_words):
+    """Join chunks of one document that overlap end-to-start."""
+    merged = list(passages)
+    changed = True
+    while changed:
+        changed = False
+        for i, first in enumerate(merged):
+            for j, second in enumerate(merged):
+                if i == j or first["source"] != second["source"]:
+                    continue
+                size = overlap_words(
+                    first["text"], second["text"], min_overlap_words
+                )
+                if size:
+                    tail = " ".join(second["text"].split()[size:])
+                    first["text"] = f"{first['text']} {tail}".strip()
+                    first["score"] = max(first["score"], second["score"])
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def pack(passages, token_budget):
+    """Best passages first; the last one is cut at a sentence if needed."""
+    packed, used = [], 0
+    for passage in sorted(passages, key=lambda p: p["score"], reverse=True):
+        tokens = estimate_tokens(passage["text"])
+        if used + tokens <= token_budget:
+            packed.append(passage)
+            used += tokens
+            continue
+        sentences, kept = SENTENCE_END.split(passage["text"]), []
+        for sentence in sentences:
+            if (
+                used + estimate_tokens(" ".join(kept + [sentence]))
+                > token_budget
+            ):
+                break
+            kept.append(sentence)
+        if kept:
+            text = " ".join(kept)
+            packed.append({**passage, "text": text})
+            used += estimate_tokens(text)
+        break
+    return packed
+
+
+def compress(retrieval_results, settings):
+    """Return (passages, stats) for Retrieve API results."""
+    started = time.perf_counter()
+    passages = to_passages(retrieval_results)
+    input_tokens = sum(estimate_tokens(p["text"]) for p in passages)
+
+    if passages:
+        best = max(p["score"] for p in passages)
+        passages = [
+            p
+            for p in passages
+            if p["score"] >= best * settings["min_score_ratio"]
+        ]
+    passages = deduplicate(passages, settings["similarity_threshold"])
+    passages = merge_adjacent(passages, settings["min_merge_overlap_words"])
+    passages = pack(passages, settings["token_budget"])
+
+    output_tokens = sum(estimate_tokens(p["text"]) for p in passages)
+    return passages, {
+        "passages_in": len(retrieval_results),
+        "passages_out": len(passages),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "compression_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+def format_context(passages):
+    return "\n\n".join(
+        f"[{n}] {passage['text']}" for n, passage in enumerate(passages, 1)
+    )
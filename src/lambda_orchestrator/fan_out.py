@@ -0,0 +1,117 @@
+"""
+Search several knowledge bases for one question and merge the results.
+
+Each program (immunization, WIC, environmental health, ...) can keep its
+documents in its own knowledge base. The orchestrator queries the selected
+knowledge bases at the same time, drops any that have not answered within
+the per-source timeout, puts the scores of the rest on a common scale,
+and passes the best merged results to generation.
+
+Scores from different knowledge bases are only comparable when they use
+the same embedding model and search type. Program knowledge bases share
+the main knowledge base's model, so raw, the default, keeps the Bedrock
+scores as they are and an unrelated source ranks below a relevant one.
+min_max rescales each source to
+0-1, which protects against sources with shifted score ranges but also
+lifts a source's best result to 1.0 however weak it is; min_score is
+applied to the original scores first to keep unrelated sources out. rrf
+(reciprocal rank fusion) ignores scores and ranks by position in each
+source. Use either when a source has its own embedding model, e.g. a green
+slot built with another one.
+"""
+
+# Overridden by the FAN_OUT environment variable
+DEFAULT_FAN_OUT = {
+    "enabled": False,
+    # Knowledge bases to search: "main" and program names; empty means all
+    "sources": [],
+    # Sources that have not answered by then are left out of the answer
+    "source_timeout_seconds": 1.5,
+    # raw, min_max or rrf
+    "normalization": "raw",
+    # Results scoring below this before normalization are dropped
+    "min_score": 0.0,
+    # Merged results passed on; defaults to the query's numberOfResults
+    "top_k": None,
+}
+
+# The knowledge base from KBID, or the active blue/green slot
+MAIN_SOURCE = "main"
+
+NORMALIZATIONS = ("raw", "min_max", "rrf")
+
+# Damping constant of reciprocal rank fusion
+RRF_K = 60
+
+SOURCE_ATTRIBUTE = "source"
+
+
+def select_sources(main_kb_id, program_kb_ids, settings):
+    """Map source name to knowledge base id for the configured sources."""
+    available = {MAIN_SOURCE: main_kb_id, **program_kb_ids}
+    names = settings["sources"] or list(available)
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(
+            f"Unknown fan-out sources {unknown}, expected one of "
+            f"{', '.join(available)}"
+        )
+    return {name: available[name] for name in names}
+
+
+def normalize(results, method):
+    """Copies of one source's results with normalized scores, best first."""
+    results = sorted(
+        results, key=lambda result: result.get("score", 0.0), reverse=True
+    )
+    if method == "rrf":
+        return [
+            {**result, "score": 1.0 / (RRF_K + rank)}
+            for rank, result in enumerate(results, 1)
+        ]
+    if method == "min_max" and results:
+        best = results[0].get("score", 0.0)
+        worst = results[-1].get("score", 0.0)
+        spread = best - worst
+        return [
+            {
+                **result,
+                "score": (
+                    (result.get("score", 0.0) - worst) / spread
+                    if spread
+                    else 1.0
+                ),
+            }
+            for result in results
+        ]
+    return [dict(result) for result in results]
+
+
+def merge(results_by_source, top_k, settings):
+    """Best top_k results across sources, each tagged with its source.
+
+    A passage returned by more than one source is kept once, at its best
+    score.
+    """
+    method = settings["normalization"]
+    if method not in NORMALIZATIONS:
+        raise ValueError(
+            f"Unknown fan-out normalization '{method}', expected one of "
+            f"{', '.join(NORMALIZATIONS)}"
+        )
+    merged = {}
+    for name, results in results_by_source.items():
+        kept = [
+            result
+            for result in results
+            if result.get("score", 0.0) >= settings["min_score"]
+        ]
+        for result in normalize(kept, method):
+            result[SOURCE_ATTRIBUTE] = name
+            text = " ".join(result["content"]["text"].split())
+            if text not in merged or result["score"] > merged[text]["score"]:
+                merged[text] = result
+    ranked = sorted(
+        merged.values(), key=lambda result: result["score"], reverse=True
+    )
+    return ranked[:top_k]
@@ -1,12 +1,284 @@
 import json
 import logging
 import os
-import pprint
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
 
-import boto3
+import adaptive_retrieval
+import answer_queue
+import answer_store
+import channels
+import context_compression
+import fan_out
+import metrics
+import normalizer
+import prefetch
+import rate_limit
+import redaction
+import retrieval_cache
+import session_store
+import smalltalk
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+# PII in transcriptions and log lines is replaced before use
+REDACTION = {
+    **redaction.DEFAULT_REDACTION,
+    **json.loads(os.environ.get("REDACTION", "{}")),
+}
+redactor = redaction.Redactor(REDACTION)
+if REDACTION["enabled"]:
+    redaction.install_log_filter(redactor)
+
+# Filler words, spelled-out numbers and misheard program names in voice
+# transcriptions
+NORMALIZATION = {
+    **normalizer.DEFAULT_NORMALIZATION,
+    **json.loads(os.environ.get("NORMALIZATION", "{}")),
+}
+transcript_normalizer = normalizer.Normalizer(NORMALIZATION)
+
+# Created once per execution environment and reused across invocations.
+# boto3 itself is imported on first use so the greeting path never loads it.
+clients = {}
+
+# Set from the Lex fulfillment timeout so Bedrock calls end before Lex
+# gives up on the code hook
+GENERATION_BUDGET_SECONDS = float(
+    os.environ.get("GENERATION_BUDGET_SECONDS", 0)
+)
+BUDGET_EXCEEDED_MESSAGE = os.environ.get(
+    "BUDGET_EXCEEDED_MESSAGE",
+    "Sorry, that is taking longer than expected. Please try asking again.",
+)
+# Error codes of Bedrock calls still throttled once their retries are spent
+THROTTLING_ERRORS = {"ThrottlingException", "TooManyRequestsException"}
+# When the Bedrock calls of the turn in progress must have answered by
+turn_deadline = {"at": None}
+
+# Bedrock calls bounded by the turn's deadline, fan-out retrievals and the
+# greeting prefetch run on these threads. The pool outlives invocations, so a call abandoned at a
+# deadline finishes within the client's read_timeout on one of them instead
+# of leaving a new thread behind.
+BEDROCK_THREADS = 16
+pool_thread = threading.local()
+bedrock_calls = ThreadPoolExecutor(
+    max_workers=BEDROCK_THREADS,
+    thread_name_prefix="bedrock",
+    initializer=lambda: setattr(pool_thread, "active", True),
+)
+
+# Retrieve, compress and generate separately instead of retrieve_and_generate
+CONTEXT_COMPRESSION = {
+    **context_compression.DEFAULT_COMPRESSION,
+    **json.loads(os.environ.get("CONTEXT_COMPRESSION", "{}")),
+}
+
+# Backend, TTL and history limits of conversation sessions
+SESSION_STORE = {
+    **session_store.DEFAULT_SESSION_STORE,
+    **json.loads(os.environ.get("SESSION_STORE", "{}")),
+}
+
+# Warm up and retrieve likely first questions while the greeting plays
+PREFETCH = {
+    **prefetch.DEFAULT_PREFETCH,
+    **json.loads(os.environ.get("PREFETCH", "{}")),
+}
+
+# Keyed by backend; the memory backend lives as long as the environment
+session_stores = {}
+
+# Choose numberOfResults and the search type per query
+ADAPTIVE_RETRIEVAL = {
+    **adaptive_retrieval.DEFAULT_ADAPTIVE_RETRIEVAL,
+    **json.loads(os.environ.get("ADAPTIVE_RETRIEVAL", "{}")),
+}
+
+# Search several knowledge bases per question and merge the results
+FAN_OUT = {
+    **fan_out.DEFAULT_FAN_OUT,
+    **json.loads(os.environ.get("FAN_OUT", "{}")),
+}
+
+# Admission control for turns that call Bedrock
+RATE_LIMIT = rate_limit.load_settings(
+    json.loads(os.environ.get("RATE_LIMIT", "{}"))
+)
+rate_limiters = {}
+
+# Channels answered later from a queue instead of within the Lex turn
+ANSWER_QUEUE = {
+    **answer_queue.DEFAULT_ANSWER_QUEUE,
+    **json.loads(os.environ.get("ANSWER_QUEUE", "{}")),
+}
+
+# Answers precomputed for the most frequent questions
+ANSWER_STORE = {
+    **answer_store.DEFAULT_ANSWER_STORE,
+    **json.loads(os.environ.get("ANSWER_STORE", "{}")),
+}
+answer_stores = {}
+
+# Retrieval results cached by knowledge base version
+RETRIEVAL_CACHE = {
+    **retrieval_cache.DEFAULT_RETRIEVAL_CACHE,
+    **json.loads(os.environ.get("RETRIEVAL_CACHE", "{}")),
+}
+retrieval_caches = {}
+
+# Curated answers for generated FAQ intents, served without any network call
+FAQ_ANSWERS_PATH = os.path.join(os.path.dirname(__file__), "faq_answers.json")
+
+
+def load_faq_answers(path=FAQ_ANSWERS_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+FAQ_ANSWERS = load_faq_answers()
+
+# Session attribute the Connect contact flow checks to transfer to an agent
+TRANSFER_ATTRIBUTE = "transfer_to_agent"
+
+# Events carrying this key only initialize the execution environment
+WARMUP_EVENT_KEY = "warmup"
+
+# Blue/green: how long to trust the last read of the active slot parameter
+ACTIVE_KB_CACHE_SECONDS = 30
+active_kb_slot = {"slot": None, "expires_at": 0.0}
+
+# How long to trust the last read of the knowledge base version parameter
+KB_VERSION_CACHE_SECONDS = 60
+kb_version = {"version": None, "expires_at": 0.0}
+
+
+def get_client(service_name):
+    if service_name not in clients:
+        import boto3
+        from botocore.config import Config
+
+        config = None
+        if (
+            service_name in ("bedrock-agent-runtime", "bedrock-runtime")
+            and GENERATION_BUDGET_SECONDS
+        ):
+            # Throttled calls are retried, but within_budget stops waiting
+            # for them once the turn's deadline has passed
+            config = Config(
+                read_timeout=GENERATION_BUDGET_SECONDS,
+                retries={"mode": "standard", "total_max_attempts": 3},
+            )
+        clients[service_name] = boto3.client(service_name, config=config)
+    return clients[service_name]
+
+
+class BudgetExceeded(Exception):
+    """The turn's generation budget ran out before Bedrock answered."""
+
+
+def time_left():
+    """Seconds left until the turn's deadline, or None without a budget."""
+    if turn_deadline["at"] is None:
+        return None
+    return turn_deadline["at"] - time.monotonic()
+
+
+def within_budget(method, **kwargs):
+    """Call a Bedrock client method, waiting only for the time left in the
+    turn's generation budget.
+
+    Raises BudgetExceeded instead of calling once the deadline has passed.
+    A call that runs out of time finishes on its bedrock_calls thread,
+    ignored.
+    """
+    remaining = time_left()
+    if remaining is None:
+        return method(**kwargs)
+    if remaining <= 0:
+        raise BudgetExceeded()
+    if getattr(pool_thread, "active", False):
+        # A fan-out retrieval, whose caller stops waiting at the deadline
+        return method(**kwargs)
+    future = bedrock_calls.submit(method, **kwargs)
+    try:
+        return future.result(timeout=remaining)
+    except FutureTimeoutError:
+        raise BudgetExceeded() from None
+
+
+def source_timeout():
+    """How long fan-out waits for its sources."""
+    remaining = time_left()
+    if remaining is None:
+        return FAN_OUT["source_timeout_seconds"]
+    if remaining <= 0:
+        raise BudgetExceeded()
+    return min(FAN_OUT["source_timeout_seconds"], remaining)
+
+
+def out_of_budget(error):
+    """Whether a failed Bedrock call is answered with BUDGET_EXCEEDED_MESSAGE:
+    the budget ran out, a connection or read timed out, or throttling
+    outlasted the retries."""
+    from botocore.exceptions import (
+        ClientError,
+        ConnectTimeoutError,
+        ReadTimeoutError,
+    )
+
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in THROTTLING_ERRORS
+    return isinstance(
+        error, (BudgetExceeded, ConnectTimeoutError, ReadTimeoutError)
+    )
+
+
+def get_conversation_table():
+    if "conversation_table" not in clients:
+        import boto3
+
+        clients["conversation_table"] = boto3.resource("dynamodb").Table(
+            os.environ["DDB_Name"]
+        )
+    return clients["conversation_table"]
+
+
+def get_rate_limit_table():
+    if "rate_limit_table" not in clients:
+        import boto3
+
+        clients["rate_limit_table"] = boto3.resource("dynamodb").Table(
+            os.environ["RATE_LIMIT_TABLE"]
+        )
+    return clients["rate_limit_table"]
+
+
+def get_answer_table():
+    if "answer_table" not in clients:
+        import boto3
+
+        clients["answer_table"] = boto3.resource("dynamodb").Table(
+            os.environ["ANSWER_TABLE"]
+        )
+    return clients["answer_table"]
+
+
+def get_retrieval_cache_table():
+    if "retrieval_cache_table" not in clients:
+        import boto3
+
+        clients["retrieval_cache_table"] = boto3.resource("dynamodb").Table(
+            os.environ["RETRIEVAL_CACHE_TABLE"]
+        )
+    return clients["retrieval_cache_table"]
 
 
 def get_session_attributes(intent_request):
@@ -25,16 +297,23 @@ def close(intent_request, session_attributes, fulfillment_state, message):
         "sessionId": intent_request["sessionId"],
     }
     response["sessionState"]["intent"]["state"] = fulfillment_state
-    logger.debug(
-        '<<help_desk_bot>> "Lambda fulfillment function response = \n'
-        + pprint.pformat(response, indent=4)
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "<<help_desk_bot>> Lambda fulfillment function response = %s",
+            json.dumps(response, indent=4),
+        )
     return response
 
 
 def hello_intent_handler(intent_request, session_attributes):
     # Clear out session attributes to start new
     session_attributes = {}
+    if PREFETCH["enabled"]:
+        try:
+            prefetch_session(intent_request)
+        except Exception as e:
+            # The greeting must not fail because of an optimization
+            logger.warning("Prefetch skipped: %s", e)
     response_string = "Hello! How can we help you today?"
     return close(
         intent_request,
@@ -44,110 +323,842 @@ def hello_intent_handler(intent_request, session_attributes):
     )
 
 
-def retrieve_and_generate(input_text, kb_id, arn, session_id):
-    bedrock_agent_runtime = boto3.client("bedrock-agent-runtime")
+def faq_intent_handler(intent_request, session_attributes):
+    started = time.monotonic()
+    intent_name = intent_request["sessionState"]["intent"]["name"]
+    response = close(
+        intent_request,
+        session_attributes,
+        "Fulfilled",
+        {"contentType": "PlainText", "content": FAQ_ANSWERS[intent_name]},
+    )
+    record_answer(
+        channels.detect_channel(intent_request), "faq", started, response
+    )
+    return response
+
+
+def smalltalk_handler(intent_request, session_attributes, label):
+    if label in smalltalk.TRANSFER_LABELS:
+        session_attributes[TRANSFER_ATTRIBUTE] = "true"
+    return close(
+        intent_request,
+        session_attributes,
+        "Fulfilled",
+        {"contentType": "PlainText", "content": smalltalk.RESPONSES[label]},
+    )
+
+
+def smalltalk_answer(
+    intent_request, session_attributes, query_string, channel, started
+):
+    """Response for a small-talk turn, or None for a question."""
+    # Thanks, goodbyes, agent requests and chatter never reach Bedrock
+    label = smalltalk.classify(query_string)
+    if not label:
+        return None
+    logger.info("Short-circuited %s turn", label)
+    response = smalltalk_handler(intent_request, session_attributes, label)
+    record_answer(channel, "smalltalk", started, response)
+    return response
+
+
+def get_rate_limiter():
+    if "limiter" not in rate_limiters:
+        rate_limiters["limiter"] = rate_limit.create_limiter(
+            RATE_LIMIT, get_rate_limit_table
+        )
+    return rate_limiters["limiter"]
+
+
+def rate_limited_answer(
+    intent_request, session_attributes, query_string, channel, started
+):
+    """A cached or canned answer if the turn is over its rate limit, else
+    None."""
+    if not RATE_LIMIT["enabled"]:
+        return None
+    try:
+        scope = get_rate_limiter().admit(intent_request["sessionId"])
+    except rate_limit.RateLimitError as e:
+        # Answer rather than turn callers away while the table is unreachable
+        logger.warning("Admitting turn without a rate limit check: %s", e)
+        return None
+    if scope is None:
+        return None
+    answer = rate_limit.recent_answer(query_string, channel)
+    logger.warning(
+        "Rate limited %s turn, answering with a %s answer",
+        scope,
+        "cached" if answer else "canned",
+    )
+    response = close(
+        intent_request,
+        session_attributes,
+        "Fulfilled",
+        {
+            "contentType": "PlainText",
+            "content": answer or RATE_LIMIT["message"],
+        },
+    )
+    metrics.emit(
+        {"RateLimitedTurns": (1, "Count")},
+        {"Channel": channel, "Scope": scope},
+        {"Served": "cached" if answer else "canned"},
+    )
+    record_answer(channel, "rate_limited", started, response)
+    return response
+
+
+def prefetch_session(intent_request):
+    """Start the session and retrieve likely first questions on the shared
+    pool, waiting at most the prefetch budget; unfinished work carries on in
+    the background (after the environment thaws, once Lambda has frozen it
+    for returning the greeting)."""
+    started = time.monotonic()
+    session_id = intent_request["sessionId"]
+    # Clients are created here: creating them from threads is not safe
+    get_session_store()
+    if SESSION_STORE["backend"] == "dynamodb":
+        get_conversation_table()
+    tasks = [(save_session, session_id, session_store.new_session())]
+    questions = PREFETCH["opening_questions"]
+    if questions:
+        if not generates_from_retrieve():
+            # Only the Retrieve path reuses results; one call still opens
+            # the connection to Bedrock
+            questions = questions[:1]
+        kb_id = get_knowledge_base_id()
+        profile = channels.CHANNEL_PROFILES[
+            channels.detect_channel(intent_request)
+        ]
+        get_client("bedrock-agent-runtime")
+        prepare_retrieval_cache()
+        tasks.extend(
+            (prefetch_retrieval, question, kb_id, profile)
+            for question in questions
+        )
+
+    futures = [bedrock_calls.submit(*task) for task in tasks]
+    done, _ = wait(futures, timeout=PREFETCH["budget_seconds"])
+    for future in done:
+        if future.exception():
+            logger.warning("Prefetch failed: %s", future.exception())
+    logger.info(
+        "Prefetched %s of %s tasks in %.0f ms",
+        len(done),
+        len(futures),
+        (time.monotonic() - started) * 1000,
+    )
+
+
+def prefetch_retrieval(question, kb_id, profile):
+    vector_search = vector_search_configuration(
+        question, kb_id, profile
+    ) or default_vector_search(profile)
+    prefetch.store(
+        question,
+        kb_id,
+        vector_search,
+        retrieve(question, kb_id, vector_search),
+        PREFETCH["cache_seconds"],
+    )
+
+
+def default_vector_search(profile):
+    return {"numberOfResults": profile["number_of_results"]}
+
+
+def retrieve_request(input_text, kb_id, vector_search):
+    return {
+        "knowledgeBaseId": kb_id,
+        "retrievalQuery": {"text": input_text},
+        "retrievalConfiguration": {"vectorSearchConfiguration": vector_search},
+    }
+
+
+def retrieve(input_text, kb_id, vector_search):
+    prefetched = prefetch.lookup(input_text, kb_id, vector_search)
+    if prefetched is not None:
+        logger.info("Using prefetched retrieval results")
+        return prefetched
+    key = retrieval_cache_key(input_text, kb_id, vector_search)
+    if key:
+        cached = cached_retrieval(key)
+        if cached is not None:
+            return cached
+    results = within_budget(
+        get_client("bedrock-agent-runtime").retrieve,
+        **retrieve_request(input_text, kb_id, vector_search),
+    )["retrievalResults"]
+    if key:
+        cache_retrieval(key, results)
+    return results
+
+
+def get_retrieval_cache():
+    backend = RETRIEVAL_CACHE["backend"]
+    if backend not in retrieval_caches:
+        retrieval_caches[backend] = retrieval_cache.create_cache(
+            RETRIEVAL_CACHE, get_retrieval_cache_table
+        )
+    return retrieval_caches[backend]
+
+
+def prepare_retrieval_cache():
+    """Create the retrieval cache's clients, which threads cannot."""
+    if not RETRIEVAL_CACHE["enabled"]:
+        return
+    get_retrieval_cache()
+    if RETRIEVAL_CACHE["backend"] == "dynamodb":
+        get_retrieval_cache_table()
+    get_kb_version()
+
+
+def retrieval_cache_key(input_text, kb_id, vector_search):
+    """Cache key for the retrieval, or None when it cannot be cached."""
+    if not RETRIEVAL_CACHE["enabled"]:
+        return None
+    version = get_kb_version()
+    if version is None:
+        # Without a version there is nothing to invalidate entries by
+        return None
+    return retrieval_cache.cache_key(input_text, kb_id, vector_search, version)
+
+
+def cached_retrieval(key):
+    """Cached results for the key, or None."""
+    try:
+        results, tier = get_retrieval_cache().get(key)
+    except retrieval_cache.RetrievalCacheError as e:
+        logger.warning("Retrieving without the shared cache: %s", e)
+        results, tier = None, None
+    # Averages of the hit metrics are the hit rates
+    metrics.emit(
+        {
+            "RetrievalCacheLookups": (1, "Count"),
+            "RetrievalCacheLocalHits": (
+                int(tier == retrieval_cache.LOCAL),
+                "Count",
+            ),
+            "RetrievalCacheSharedHits": (
+                int(tier == retrieval_cache.SHARED),
+                "Count",
+            ),
+        },
+        {},
+    )
+    return results
+
+
+def cache_retrieval(key, results):
+    try:
+        get_retrieval_cache().put(key, results)
+    except retrieval_cache.RetrievalCacheError as e:
+        logger.warning("Retrieval results not cached: %s", e)
+
+
+def retrieve_sources(input_text, kb_id, vector_search):
+    """Retrieve from kb_id, or from every fan-out source at once."""
+    if not FAN_OUT["enabled"]:
+        return retrieve(input_text, kb_id, vector_search)
+    started = time.monotonic()
+    sources = fan_out.select_sources(
+        kb_id, get_program_knowledge_base_ids(), FAN_OUT
+    )
+    # Created here: creating clients from threads is not safe
+    get_client("bedrock-agent-runtime")
+    prepare_retrieval_cache()
+    timeout = source_timeout()
+
+    futures = {
+        name: bedrock_calls.submit(
+            retrieve, input_text, source_id, vector_search
+        )
+        for name, source_id in sources.items()
+    }
+    # Slow sources finish on their threads and are ignored
+    done, _ = wait(futures.values(), timeout=timeout)
+    results = {}
+    for name, future in futures.items():
+        if future not in done:
+            continue
+        if future.exception():
+            logger.warning(
+                "Retrieval from %s failed: %s", name, future.exception()
+            )
+            continue
+        results[name] = future.result()
+    return merge_sources(sources, results, vector_search, started)
+
+
+def merge_sources(sources, results, vector_search, started):
+    """Merged fan-out results; sources missing from results were dropped."""
+    dropped = [name for name in sources if name not in results]
+    if dropped:
+        logger.warning("Answering without knowledge bases %s", dropped)
+    metrics.emit(
+        {
+            "FanOutSources": (len(results), "Count"),
+            "FanOutDropped": (len(dropped), "Count"),
+            "FanOutLatency": (
+                (time.monotonic() - started) * 1000,
+                "Milliseconds",
+            ),
+        },
+        {},
+        {"DroppedSources": dropped},
+    )
+    return fan_out.merge(
+        results,
+        FAN_OUT["top_k"] or vector_search["numberOfResults"],
+        FAN_OUT,
+    )
+
+
+def vector_search_configuration(input_text, kb_id, profile):
+    """Per-query retrieval settings, or None for the channel profile's."""
+    if not ADAPTIVE_RETRIEVAL["enabled"]:
+        return None
+    number, search_type = adaptive_retrieval.query_settings(
+        input_text, profile, ADAPTIVE_RETRIEVAL
+    )
+    if ADAPTIVE_RETRIEVAL["probe_results"]:
+        probe = retrieve(
+            input_text,
+            kb_id,
+            adaptive_retrieval.vector_search_configuration(
+                ADAPTIVE_RETRIEVAL["probe_results"], search_type
+            ),
+        )
+        number, search_type = adaptive_retrieval.probe_settings(
+            [result["score"] for result in probe],
+            number,
+            search_type,
+            ADAPTIVE_RETRIEVAL,
+        )
+    logger.debug("Retrieving %s results with %s search", number, search_type)
+    return adaptive_retrieval.vector_search_configuration(number, search_type)
+
+
+def retrieve_and_generate_request(
+    input_text, kb_id, arn, session_id, profile, vector_search=None
+):
+    kwargs = {}
     if session_id:
         logger.debug(session_id)
-        return bedrock_agent_runtime.retrieve_and_generate(
-            sessionId=session_id,
-            input={"text": input_text},
-            retrieveAndGenerateConfiguration={
-                "type": "KNOWLEDGE_BASE",
-                "knowledgeBaseConfiguration": {
-                    "knowledgeBaseId": kb_id,
-                    "modelArn": arn,
-                },
-            },
-        )
+        kwargs["sessionId"] = session_id
     else:
         logger.debug("no session ID")
-        return bedrock_agent_runtime.retrieve_and_generate(
-            input={"text": input_text},
-            retrieveAndGenerateConfiguration={
-                "type": "KNOWLEDGE_BASE",
-                "knowledgeBaseConfiguration": {
-                    "knowledgeBaseId": kb_id,
-                    "modelArn": arn,
-                },
+    return {
+        "input": {"text": input_text},
+        "retrieveAndGenerateConfiguration": {
+            "type": "KNOWLEDGE_BASE",
+            "knowledgeBaseConfiguration": {
+                "knowledgeBaseId": kb_id,
+                "modelArn": arn,
+                **channels.generation_configuration(profile, vector_search),
             },
+        },
+        **kwargs,
+    }
+
+
+def retrieve_and_generate(
+    input_text, kb_id, arn, session_id, profile, vector_search=None
+):
+    return within_budget(
+        get_client("bedrock-agent-runtime").retrieve_and_generate,
+        **retrieve_and_generate_request(
+            input_text, kb_id, arn, session_id, profile, vector_search
+        ),
+    )
+
+
+def history_messages(history):
+    messages = []
+    for turn in history:
+        messages.append({"role": "user", "content": [{"text": turn["q"]}]})
+        messages.append({"role": "assistant", "content": [{"text": turn["a"]}]})
+    return messages
+
+
+def converse_request(input_text, arn, profile, passages, history=()):
+    """Converse arguments that answer from compressed passages.
+
+    Bedrock knowledge base sessions only exist for retrieve_and_generate,
+    so earlier turns from the session store are sent as messages instead.
+    """
+    prompt = channels.PROMPT_TEMPLATE.format(style=profile["style"]).replace(
+        "$search_results$", context_compression.format_context(passages)
+    )
+    return {
+        "modelId": arn,
+        "system": [{"text": prompt}],
+        "messages": [
+            *history_messages(history),
+            {"role": "user", "content": [{"text": input_text}]},
+        ],
+        "inferenceConfig": {"maxTokens": profile["max_tokens"]},
+    }
+
+
+def converse_answer(response, stats):
+    """A Converse response in the shape of retrieve_and_generate's."""
+    text = response["output"]["message"]["content"][0]["text"]
+    stats["model_input_tokens"] = response["usage"]["inputTokens"]
+    return {"output": {"text": text}}, stats
+
+
+def retrieve_compress_generate(
+    input_text, kb_id, arn, profile, vector_search=None, history=()
+):
+    """Answer from compressed retrieval results in the shape of
+    retrieve_and_generate, plus the compression stats."""
+    retrieved = retrieve_sources(
+        input_text, kb_id, vector_search or default_vector_search(profile)
+    )
+    passages, stats = context_compression.compress(
+        retrieved, CONTEXT_COMPRESSION
+    )
+    response = within_budget(
+        get_client("bedrock-runtime").converse,
+        **converse_request(input_text, arn, profile, passages, history),
+    )
+    return converse_answer(response, stats)
+
+
+def generates_from_retrieve():
+    """Whether answers use Retrieve + Converse rather than
+    retrieve_and_generate, which searches a single knowledge base and does
+    not expose its chunks for compression."""
+    return CONTEXT_COMPRESSION["enabled"] or FAN_OUT["enabled"]
+
+
+def get_program_knowledge_base_ids():
+    return json.loads(os.environ.get("PROGRAM_KNOWLEDGE_BASES", "{}"))
+
+
+def get_knowledge_base_id():
+    parameter_name = os.environ.get("ACTIVE_KB_PARAMETER")
+    if not parameter_name:
+        return os.environ["KBID"]
+    now = time.monotonic()
+    if now >= active_kb_slot["expires_at"]:
+        try:
+            response = get_client("ssm").get_parameter(Name=parameter_name)
+            active_kb_slot["slot"] = response["Parameter"]["Value"]
+        except Exception as e:
+            # Keep answering from the last known slot (or KBID) on errors
+            logger.error("Error reading active knowledge base slot: %s", e)
+        active_kb_slot["expires_at"] = now + ACTIVE_KB_CACHE_SECONDS
+    slots = json.loads(os.environ["KB_SLOTS"])
+    return slots.get(active_kb_slot["slot"], os.environ["KBID"])
+
+
+def get_kb_version():
+    """Version kb_ingestion_manager recorded for the last completed
+    ingestion, or None before the first."""
+    parameter_name = os.environ.get("KB_VERSION_PARAMETER")
+    if not parameter_name:
+        return None
+    now = time.monotonic()
+    if now >= kb_version["expires_at"]:
+        try:
+            response = get_client("ssm").get_parameter(Name=parameter_name)
+            kb_version["version"] = response["Parameter"]["Value"]
+        except Exception as e:
+            logger.error("Error reading knowledge base version: %s", e)
+        kb_version["expires_at"] = now + KB_VERSION_CACHE_SECONDS
+    return kb_version["version"]
+
+
+def get_answer_store():
+    backend = ANSWER_STORE["backend"]
+    if backend not in answer_stores:
+        answer_stores[backend] = answer_store.create_store(
+            ANSWER_STORE, get_answer_table
         )
+    return answer_stores[backend]
+
 
+def precomputed_answer(
+    intent_request, session_attributes, query_string, channel, started
+):
+    """The stored answer for the question if one was precomputed from the
+    current knowledge base, else None.
 
-def retrieve_knowledge_base_session(session_id):
-    table_name = os.environ["DDB_Name"]
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(table_name)
+    Stored answers were generated without any conversation, so they only
+    answer the first question of a session; a follow-up such as "is it
+    free" depends on the turns before it. They are only served on the
+    Retrieve + Converse path, which replays the session history with the
+    follow-up: a retrieve_and_generate follow-up would go out without the
+    Bedrock session a generated first answer leaves behind.
+    """
+    if not ANSWER_STORE["enabled"] or channel not in ANSWER_STORE["channels"]:
+        return None
+    if not generates_from_retrieve():
+        return None
+    version = get_kb_version()
+    if version is None:
+        return None
     try:
-        response = table.get_item(Key={"SessionID_Lex": session_id})
-        column_value = response.get("Item", {}).get("kbsession")
-        return column_value
-    except Exception as e:
-        return {"statusCode": 500, "body": f"Error: {str(e)}"}
+        answer = get_answer_store().get(
+            query_string,
+            channel,
+            answer_store.stamp(get_knowledge_base_id(), version),
+        )
+    except answer_store.AnswerStoreError as e:
+        logger.warning("Answering without the answer store: %s", e)
+        return None
+    if answer is None:
+        return None
+    session_id = intent_request["sessionId"]
+    session = load_session(session_id)
+    if session["history"]:
+        return None
+    session["history"].append({"q": query_string, "a": answer})
+    save_session(session_id, session)
+    response = close(
+        intent_request,
+        session_attributes,
+        "Fulfilled",
+        {"contentType": "PlainText", "content": answer},
+    )
+    record_answer(channel, "precomputed", started, response)
+    return response
 
 
-def update_knowledge_base_session(session_id, kb_session):
-    table_name = os.environ["DDB_Name"]
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(table_name)
-    update_attribute_name = "kbsession"
+def get_session_store():
+    backend = SESSION_STORE["backend"]
+    if backend not in session_stores:
+        session_stores[backend] = session_store.create_store(
+            SESSION_STORE, get_conversation_table
+        )
+    return session_stores[backend]
+
+
+def load_session(session_id):
     try:
-        response = table.update_item(
-            Key={"SessionID_Lex": session_id},
-            UpdateExpression=f"SET {update_attribute_name} = :val",
-            ExpressionAttributeValues={":val": kb_session},
-            ReturnValues="UPDATED_NEW",
-        )
-        updated_attributes = response.get("Attributes", {})
-        return {
-            "statusCode": 200,
-            "body": {"UpdatedAttributes": updated_attributes},
-        }
-    except Exception as e:
-        return {"statusCode": 500, "body": f"Error: {str(e)}"}
+        return get_session_store().load(session_id)
+    except session_store.SessionStoreError as e:
+        # Answer without history rather than fail the turn
+        logger.warning("Starting a new session: %s", e)
+        return session_store.new_session()
+
+
+def save_session(session_id, session):
+    try:
+        get_session_store().save(session_id, session)
+    except session_store.SessionStoreError as e:
+        logger.warning("Session not saved: %s", e)
 
 
 def fallback_intent_handler(intent_request, session_attributes):
+    started = time.monotonic()
     query_string = intent_request["transcriptions"][0]["transcription"]
-    kb_id = os.environ["KBID"]
+    channel = channels.detect_channel(intent_request)
+    response = smalltalk_answer(
+        intent_request, session_attributes, query_string, channel, started
+    )
+    if response:
+        return response
+    response = precomputed_answer(
+        intent_request, session_attributes, query_string, channel, started
+    )
+    if response:
+        return response
+    response = rate_limited_answer(
+        intent_request, session_attributes, query_string, channel, started
+    )
+    if response:
+        return response
+    response = queued_answer(
+        intent_request, session_attributes, query_string, channel, started
+    )
+    if response:
+        return response
+    return knowledge_base_turn(
+        intent_request, session_attributes, query_string, channel, started
+    )
+
+
+def queued_answer(
+    intent_request, session_attributes, query_string, channel, started
+):
+    """An acknowledgement if the question was queued for answer_worker,
+    else None."""
+    if not ANSWER_QUEUE["enabled"] or channel not in ANSWER_QUEUE["channels"]:
+        return None
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    try:
+        get_client("sqs").send_message(
+            QueueUrl=os.environ["ANSWER_QUEUE_URL"],
+            MessageBody=answer_queue.encode(
+                answer_queue.message(intent_request, session_attributes)
+            ),
+        )
+    except (BotoCoreError, ClientError) as e:
+        logger.warning("Answering now, the question was not queued: %s", e)
+        return None
+    response = close(
+        intent_request,
+        session_attributes,
+        "Fulfilled",
+        {
+            "contentType": "PlainText",
+            "content": ANSWER_QUEUE["acknowledgement"],
+        },
+    )
+    record_answer(channel, "queued", started, response)
+    return response
+
+
+def knowledge_base_turn(
+    intent_request, session_attributes, query_string, channel, started
+):
+    """Answer from the knowledge base and update the session."""
+    profile = channels.CHANNEL_PROFILES[channel]
+    kb_id = get_knowledge_base_id()
     arn = os.environ["MODEL_ARN"]
     session_id = intent_request["sessionId"]
     logger.debug(
-        '<<help_desk_bot>> fallback_intent_handler(): calling retrieve_and_generate(query="%s")',
+        '<<help_desk_bot>> fallback_intent_handler(): calling retrieve_and_generate(query="%s", channel=%s)',
+        query_string,
+        channel,
+    )
+    start_budget(started)
+    try:
+        vector_search = vector_search_configuration(
+            query_string, kb_id, profile
+        )
+        session = load_session(session_id)
+        if generates_from_retrieve():
+            response, stats = retrieve_compress_generate(
+                query_string,
+                kb_id,
+                arn,
+                profile,
+                vector_search,
+                session["history"],
+            )
+            record_compression(channel, stats)
+        else:
+            response = retrieve_and_generate(
+                query_string,
+                kb_id,
+                arn,
+                session["kb_session"],
+                profile,
+                vector_search,
+            )
+            session["kb_session"] = response["sessionId"]
+    except Exception as e:
+        if not out_of_budget(e):
+            raise
+        return budget_exceeded(
+            intent_request, session_attributes, channel, started, e
+        )
+    finally:
+        turn_deadline["at"] = None
+    response = knowledge_base_answer(
+        intent_request,
+        session_attributes,
         query_string,
+        response,
+        profile,
+        session,
     )
-    kb_session = retrieve_knowledge_base_session(session_id)
-    response = retrieve_and_generate(query_string, kb_id, arn, kb_session)
-    generated_kbsession = response["sessionId"]
+    save_session(session_id, session)
+    record_answer(channel, "knowledge_base", started, response)
+    return response
+
+
+def start_budget(started):
+    """Set the deadline of a turn that started at started."""
+    turn_deadline["at"] = (
+        started + GENERATION_BUDGET_SECONDS
+        if GENERATION_BUDGET_SECONDS
+        else None
+    )
+
+
+def budget_exceeded(
+    intent_request, session_attributes, channel, started, error=None
+):
+    logger.warning(
+        "Bedrock did not answer within %s seconds: %r",
+        GENERATION_BUDGET_SECONDS,
+        error,
+    )
+    response = close(
+        intent_request,
+        session_attributes,
+        "Fulfilled",
+        {"contentType": "PlainText", "content": BUDGET_EXCEEDED_MESSAGE},
+    )
+    record_answer(channel, "timeout", started, response)
+    return response
+
+
+def knowledge_base_answer(
+    intent_request, session_attributes, query_string, response, profile, session
+):
+    """Close the turn with a generated answer and add it to the history."""
     generated_text = response["output"]["text"]
-    kb_session = update_knowledge_base_session(session_id, generated_kbsession)
     if generated_text is None:
         generated_text = "Sorry, I was not able to understand your question."
-        return close(
-            intent_request,
-            session_attributes,
-            "Fulfilled",
-            {"contentType": "PlainText", "content": generated_text},
-        )
     else:
         logger.debug(
             '<<help_desk_bot>> "fallback_intent_handler(): kendra_response = %s',
             generated_text,
         )
-        return close(
-            intent_request,
-            session_attributes,
-            "Fulfilled",
-            {"contentType": "PlainText", "content": generated_text},
+        generated_text = channels.fit_answer(generated_text, profile)
+        # Follow-up answers depend on this session's history, so only
+        # first answers are served to other sessions' over-limit turns
+        first_turn = not session["history"]
+        session["history"].append({"q": query_string, "a": generated_text})
+        if RATE_LIMIT["enabled"] and first_turn:
+            rate_limit.remember(
+                query_string,
+                channels.detect_channel(intent_request),
+                generated_text,
+                RATE_LIMIT,
+            )
+    return close(
+        intent_request,
+        session_attributes,
+        "Fulfilled",
+        {"contentType": "PlainText", "content": generated_text},
+    )
+
+
+def record_answer(channel, source, started, response):
+    answer = response["messages"][0]["content"]
+    metrics.emit(
+        {
+            "AnswerLatency": (
+                (time.monotonic() - started) * 1000,
+                "Milliseconds",
+            ),
+            "AnswerCharacters": (len(answer), "Count"),
+        },
+        {"Channel": channel},
+        {"Source": source},
+    )
+
+
+def record_compression(channel, stats):
+    metrics.emit(
+        {
+            "ContextTokens": (stats["output_tokens"], "Count"),
+            "ContextTokensSaved": (
+                stats["input_tokens"] - stats["output_tokens"],
+                "Count",
+            ),
+            "CompressionLatency": (stats["compression_ms"], "Milliseconds"),
+        },
+        {"Channel": channel},
+        {
+            "PassagesIn": stats["passages_in"],
+            "PassagesOut": stats["passages_out"],
+            "ModelInputTokens": stats["model_input_tokens"],
+        },
+    )
+
+
+def warm_up():
+    """Create clients and resolve the knowledge base without calling Bedrock."""
+    started = time.monotonic()
+    get_client("bedrock-agent-runtime")
+    if generates_from_retrieve():
+        get_client("bedrock-runtime")
+    if ANSWER_QUEUE["enabled"]:
+        get_client("sqs")
+    get_session_store()
+    if SESSION_STORE["backend"] == "dynamodb":
+        get_conversation_table()
+    if RATE_LIMIT["enabled"] and RATE_LIMIT["backend"] == "dynamodb":
+        get_rate_limit_table()
+    if ANSWER_STORE["enabled"]:
+        get_answer_store()
+        if ANSWER_STORE["backend"] == "dynamodb":
+            get_answer_table()
+        get_kb_version()
+    prepare_retrieval_cache()
+    smalltalk.load_model()
+    kb_id = get_knowledge_base_id()
+    return {
+        "warmed": True,
+        "knowledge_base_id": kb_id,
+        "seconds": time.monotonic() - started,
+    }
+
+
+def normalize_question(text, channel):
+    if NORMALIZATION["enabled"] and channel in NORMALIZATION["channels"]:
+        return transcript_normalizer.normalize(text)
+    return text
+
+
+def normalize_event(event):
+    """Normalize the caller's words before they are looked up or redacted."""
+    channel = channels.detect_channel(event)
+    if not NORMALIZATION["enabled"] or channel not in NORMALIZATION["channels"]:
+        return
+    changed = 0
+    for transcription in event.get("transcriptions") or []:
+        text = transcription.get("transcription", "")
+        transcription["transcription"] = normalize_question(text, channel)
+        changed += transcription["transcription"] != text
+    if event.get("inputTranscript"):
+        event["inputTranscript"] = normalize_question(
+            event["inputTranscript"], channel
+        )
+    metrics.emit(
+        {"NormalizedTranscriptions": (changed, "Count")}, {"Channel": channel}
+    )
+
+
+def redact_question(text):
+    """text with PII replaced, as redact_event would leave it."""
+    return redactor.redact(text) if REDACTION["enabled"] else text
+
+
+def redact_event(event):
+    """Replace PII in the caller's words before anything reads them."""
+    if not REDACTION["enabled"]:
+        return
+    found = []
+    for transcription in event.get("transcriptions") or []:
+        transcription["transcription"], entities = redactor.scan(
+            transcription.get("transcription", "")
+        )
+        found += entities
+    if event.get("inputTranscript"):
+        event["inputTranscript"] = redact_question(event["inputTranscript"])
+    if found:
+        metrics.emit(
+            {"RedactedEntities": (len(found), "Count")},
+            {},
+            {"Entities": found},
         )
 
 
 def lambda_handler(event, context):
-    logger.debug("<<help_desk_bot>> Lex event info = " + json.dumps(event))
+    # Scheduled pings and provisioned concurrency warm-up, not Lex events
+    if event.get(WARMUP_EVENT_KEY):
+        return warm_up()
+    normalize_event(event)
+    redact_event(event)
     session_attributes = get_session_attributes(event)
-    logger.debug(
-        "<<help_desk_bot> lambda_handler: session_attributes = "
-        + json.dumps(session_attributes)
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("<<help_desk_bot>> Lex event info = %s", json.dumps(event))
+        logger.debug(
+            "<<help_desk_bot> lambda_handler: session_attributes = %s",
+            json.dumps(session_attributes),
+        )
     current_intent = event["sessionState"]["intent"]["name"]
     if current_intent is None:
         response_string = "Sorry, I didn't understand."
@@ -186,3 +1197,5 @@ HANDLERS = {
     "greeting_intent": {"handler": hello_intent_handler},
     "FallbackIntent": {"handler": fallback_intent_handler},
 }
+# Generated by src/orchestrator_tools/generate_faq_intents.py
+HANDLERS.update({name: {"handler": faq_intent_handler} for name in FAQ_ANSWERS})
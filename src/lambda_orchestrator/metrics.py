@@ -0,0 +1,40 @@
+"""
+CloudWatch metrics in Embedded Metric Format.
+
+Lambda forwards stdout to CloudWatch Logs, which extracts EMF records into
+metrics, so emitting a metric costs a print rather than an API call.
+"""
+
+import json
+import sys
+import time
+
+NAMESPACE = "RagChatbot/Orchestrator"
+
+
+def emit(metrics, dimensions, properties=None, namespace=NAMESPACE):
+    """Write one EMF record.
+
+    metrics maps a metric name to (value, unit); dimensions maps dimension
+    names to values; properties are searchable in Logs Insights but are
+    not metrics.
+    """
+    record = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": namespace,
+                    "Dimensions": [list(dimensions)],
+                    "Metrics": [
+                        {"Name": name, "Unit": unit}
+                        for name, (_, unit) in metrics.items()
+                    ],
+                }
+            ],
+        },
+        **dimensions,
+        **(properties or {}),
+        **{name: value for name, (value, _) in metrics.items()},
+    }
+    sys.stdout.write(json.dumps(record) + "\n")
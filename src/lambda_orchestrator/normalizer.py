@@ -0,0 +1,475 @@
+"""
+Normalization of voice transcriptions.
+
+Speech recognition writes what it heard: filler words, numbers and dates
+spelled out, and local program names as the nearest common words ("why
+see" for WIC). The same question then reaches the caches, the answer
+store and retrieval in many spellings. The orchestrator normalizes the
+transcriptions of the configured channels before anything reads them
+(and before redaction, so spelled-out numbers are redacted as digits):
+
+    lexicon   phrases replaced by the term the documents use
+    fillers   words dropped ("um", "you know")
+    numbers   spelled-out numbers as digits; "sixty five" is "65", "four
+              hundred and fifty" is "450", "nineteen eighty five" is
+              "1985" and "five five five" is "555". Other numbers said
+              one after another stay apart: "two three year olds" is "2 3
+              year olds". A lone "one" stays a word ("which one"), as do
+              clock times ("nine thirty") and ordinals outside dates
+              ("wait a second").
+    dates     a month with a day and an optional year as "march 14" or
+              "march 14 1985", from "march fourteenth", "the fourteenth
+              of march", "March 14th, 1985"
+
+Lexicon phrases, fillers, number words and months are compiled into one
+character trie. The text is walked once from each word start, following
+the trie for the longest phrase that ends at a word boundary, so the work
+per character is bounded by the longest phrase, however large the
+lexicon. Numbers and dates are then assembled from the matched words.
+
+settings["lexicon"] adds phrases to, or replaces phrases of, LEXICON.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Overridden by the NORMALIZATION environment variable
+DEFAULT_NORMALIZATION = {
+    "enabled": True,
+    # Channels whose transcriptions are normalized; typed text is left as is
+    "channels": ["voice"],
+    # Spoken or misrecognized phrase to the term the documents use
+    "lexicon": {},
+    "fillers": [
+        "um",
+        "umm",
+        "uh",
+        "uhh",
+        "uhm",
+        "erm",
+        "ah",
+        "hmm",
+        "mm",
+        "mhm",
+        "you know",
+    ],
+    "numbers": True,
+    "dates": True,
+}
+
+# Misrecognitions of program and vaccine names
+LEXICON = {
+    "why see": "WIC",
+    "why sea": "WIC",
+    "w i c": "WIC",
+    "wick program": "WIC program",
+    "medic aid": "Medicaid",
+    "medi care": "Medicare",
+    "co vid": "COVID",
+    "cove it": "COVID",
+    "covert vaccine": "COVID vaccine",
+    "c h i p": "CHIP",
+    "h p v": "HPV",
+    "r s v": "RSV",
+    "m m r": "MMR",
+    "t dap": "Tdap",
+    "tea dap": "Tdap",
+    "d tap": "DTaP",
+    "dee tap": "DTaP",
+    "s n a p": "SNAP",
+}
+
+UNITS = [
+    "zero",
+    "one",
+    "two",
+    "three",
+    "four",
+    "five",
+    "six",
+    "seven",
+    "eight",
+    "nine",
+    "ten",
+    "eleven",
+    "twelve",
+    "thirteen",
+    "fourteen",
+    "fifteen",
+    "sixteen",
+    "seventeen",
+    "eighteen",
+    "nineteen",
+]
+TENS = {
+    "twenty": 20,
+    "thirty": 30,
+    "forty": 40,
+    "fifty": 50,
+    "sixty": 60,
+    "seventy": 70,
+    "eighty": 80,
+    "ninety": 90,
+}
+SCALES = {"hundred": 100, "thousand": 1000}
+ORDINALS = {
+    "first": 1,
+    "second": 2,
+    "third": 3,
+    "fourth": 4,
+    "fifth": 5,
+    "sixth": 6,
+    "seventh": 7,
+    "eighth": 8,
+    "ninth": 9,
+    "tenth": 10,
+    "eleventh": 11,
+    "twelfth": 12,
+    "thirteenth": 13,
+    "fourteenth": 14,
+    "fifteenth": 15,
+    "sixteenth": 16,
+    "seventeenth": 17,
+    "eighteenth": 18,
+    "nineteenth": 19,
+    "twentieth": 20,
+    "thirtieth": 30,
+}
+MONTHS = {
+    "january": "january",
+    "jan": "january",
+    "february": "february",
+    "feb": "february",
+    "march": "march",
+    "april": "april",
+    "may": "may",
+    "june": "june",
+    "july": "july",
+    "august": "august",
+    "aug": "august",
+    "september": "september",
+    "sept": "september",
+    "october": "october",
+    "oct": "october",
+    "november": "november",
+    "nov": "november",
+    "december": "december",
+    "dec": "december",
+}
+ORDINAL_SUFFIXES = ("st", "nd", "rd", "th")
+
+# Token kinds
+SEPARATOR = "separator"
+WORD = "word"
+DIGITS = "digits"
+TERM = "term"
+FILLER = "filler"
+NUMBER = "number"
+ORDINAL = "ordinal"
+MONTH = "month"
+
+# Trie node key of the (kind, value) a phrase ends with
+END = ""
+
+
+def is_word_char(char):
+    return char.isalnum() or char == "'"
+
+
+class Normalizer:
+    def __init__(self, settings):
+        self.settings = settings
+        self.trie = {}
+        for phrase in settings["fillers"]:
+            self.add(phrase, FILLER, None)
+        if settings["numbers"] or settings["dates"]:
+            for value, word in enumerate(UNITS):
+                self.add(word, NUMBER, value)
+            for word, value in {**TENS, **SCALES}.items():
+                self.add(word, NUMBER, value)
+            for word, value in ORDINALS.items():
+                self.add(word, ORDINAL, value)
+        if settings["dates"]:
+            for word, month in MONTHS.items():
+                self.add(word, MONTH, month)
+        for phrase, term in {**LEXICON, **settings["lexicon"]}.items():
+            self.add(phrase, TERM, term)
+
+    def add(self, phrase, kind, value):
+        node = self.trie
+        for char in " ".join(phrase.lower().split()):
+            node = node.setdefault(char, {})
+        node[END] = (kind, value)
+
+    def tokens(self, text):
+        """(kind, surface text, value) tuples covering the whole text."""
+        lower = text.lower()
+        length = len(text)
+        tokens = []
+        i = 0
+        while i < length:
+            if not is_word_char(lower[i]):
+                j = i + 1
+                while j < length and not is_word_char(lower[j]):
+                    j += 1
+                tokens.append((SEPARATOR, text[i:j], None))
+                i = j
+                continue
+            # Longest phrase from this word start that ends a word
+            node, j, match = self.trie, i, None
+            while j < length:
+                char = lower[j]
+                if char.isspace():
+                    if " " not in node:
+                        break
+                    node = node[" "]
+                    while j < length and lower[j].isspace():
+                        j += 1
+                    continue
+                if char not in node:
+                    break
+                node = node[char]
+                j += 1
+                if END in node and (j == length or not is_word_char(lower[j])):
+                    match = (j, node[END])
+            if match:
+                end, (kind, value) = match
+                tokens.append((kind, text[i:end], value))
+                i = end
+                continue
+            j = i + 1
+            while j < length and is_word_char(lower[j]):
+                j += 1
+            tokens.append(word_token(text[i:j]))
+            i = j
+        return tokens
+
+    def normalize(self, text):
+        if not text:
+            return text
+        tokens = self.tokens(text)
+        out = []
+        i = 0
+        while i < len(tokens):
+            kind, surface, value = tokens[i]
+            if kind == FILLER:
+                i += 1
+                # The comma or space after the filler goes with it
+                if i < len(tokens) and tokens[i][0] == SEPARATOR:
+                    if not tokens[i][1].strip(" ,"):
+                        i += 1
+                continue
+            if kind == TERM:
+                out.append(value)
+                i += 1
+                continue
+            if self.settings["dates"]:
+                date, end = read_date(tokens, i)
+                if date:
+                    out.append(date)
+                    i = end
+                    continue
+            if kind == NUMBER and self.settings["numbers"]:
+                groups, ordinal, end = read_number(tokens, i)
+                if groups is not None:
+                    if ordinal or is_clock_time(groups):
+                        # Kept as said: "twenty first century", "at nine
+                        # thirty"
+                        out.extend(token[1] for token in tokens[i:end])
+                    else:
+                        out.append(join_groups(groups))
+                    i = end
+                    continue
+            out.append(surface)
+            i += 1
+        # A transcription of nothing but fillers is left as it was
+        return " ".join("".join(out).split()) or text
+
+
+def word_token(word):
+    """A word not in the trie, with typed digits and ordinals ("14th")
+    recognized."""
+    if word.isdigit():
+        return (DIGITS, word, int(word))
+    stem, suffix = word[:-2], word[-2:].lower()
+    if stem.isdigit() and suffix in ORDINAL_SUFFIXES:
+        return (ORDINAL, word, int(stem))
+    return (WORD, word, None)
+
+
+def join_groups(groups):
+    """Digits for numbers said one after the other: run together for
+    digit strings (phone numbers, zip codes, IDs) and years said in pairs,
+    apart otherwise ("twenty four seven" is "24 7")."""
+    digit_string = len(groups) >= 3 and all(len(g) == 1 for g in groups)
+    year = (
+        len(groups) == 2 and 11 <= int(groups[0]) <= 20 and len(groups[1]) == 2
+    )
+    return "".join(groups) if digit_string or year else " ".join(groups)
+
+
+def is_clock_time(groups):
+    """Whether digit groups were said as an hour and minutes, as in
+    "nine thirty" or "eleven forty five"."""
+    return (
+        len(groups) == 2
+        and 1 <= int(groups[0]) <= 12
+        and 10 <= int(groups[1]) <= 59
+    )
+
+
+def joins_number(token):
+    """Whether a separator keeps spoken number words in one number."""
+    return token[0] == SEPARATOR and not token[1].strip(" -")
+
+
+def joins_after_scale(tokens, j):
+    """Whether tokens[j + 1:j + 5] are an "and" and a number under a
+    hundred, as in "four hundred and fifty" or "two thousand and five"."""
+    return (
+        j + 4 < len(tokens)
+        and joins_number(tokens[j + 1])
+        and tokens[j + 2][0] == WORD
+        and tokens[j + 2][1].lower() == "and"
+        and joins_number(tokens[j + 3])
+        and tokens[j + 4][0] == NUMBER
+        and tokens[j + 4][2] < 100
+    )
+
+
+def read_number(tokens, i):
+    """Assemble the spoken number starting at tokens[i].
+
+    Returns (digit groups, whether it ends with an ordinal, index after
+    it), or (None, False, i) for a lone "one". Groups are numbers that do
+    not add up, said one after the other: "nineteen eighty five" is
+    ["19", "85"] and "five five five" is ["5", "5", "5"].
+    """
+    groups = []
+    total = current = 0
+    started = ordinal = False
+    words = 0
+    j = end = i
+    while j < len(tokens):
+        kind, surface, value = tokens[j]
+        if kind == ORDINAL:
+            if started and 20 <= current % 100 and current % 10 == 0:
+                if value < 10 and surface.isalpha():
+                    current += value
+                    ordinal = True
+                    end = j + 1
+            elif not started and surface.isalpha():
+                current, started, ordinal = value, True, True
+                end = j + 1
+            break
+        if kind != NUMBER:
+            break
+        words += 1
+        if value == 100:
+            current = (current or 1) * 100
+        elif value == 1000:
+            total += (current or 1) * 1000
+            current = 0
+        elif not started:
+            current = value
+        elif (total or current) and current % 100 == 0:
+            current += value
+        elif 20 <= current % 100 and current % 10 == 0 and value < 10:
+            current += value
+        else:
+            groups.append(str(total + current))
+            total, current = 0, value
+        started = True
+        end = j + 1
+        if value in (100, 1000) and joins_after_scale(tokens, j):
+            j += 4
+        elif j + 2 < len(tokens) and joins_number(tokens[j + 1]):
+            j += 2
+        else:
+            break
+    if not started:
+        return None, False, i
+    if words == 1 and not ordinal and tokens[i][1].lower() == "one":
+        return None, False, i
+    groups.append(str(total + current))
+    return groups, ordinal, end
+
+
+def skip_space(tokens, i, words=()):
+    """Index of the next token after spaces, commas and any of words."""
+    while i < len(tokens):
+        kind, surface = tokens[i][:2]
+        if kind == SEPARATOR and not surface.strip(" ,"):
+            i += 1
+        elif kind == WORD and surface.lower() in words:
+            i += 1
+        else:
+            break
+    return i
+
+
+def read_day(tokens, i):
+    """(day, digit groups said after it, whether it was said as an
+    ordinal, index after) at tokens[i], or day None."""
+    if i >= len(tokens):
+        return None, [], False, i
+    kind, surface, value = tokens[i]
+    if kind in (DIGITS, ORDINAL) and not surface.isalpha():
+        # Typed, or written as digits by speech recognition
+        if 1 <= value <= 31:
+            return value, [], kind == ORDINAL, i + 1
+    elif kind in (NUMBER, ORDINAL):
+        groups, ordinal, end = read_number(tokens, i)
+        if groups and 1 <= int(groups[0]) <= 31:
+            return int(groups[0]), groups[1:], ordinal, end
+    return None, [], False, i
+
+
+def read_year(tokens, i, groups):
+    """A four digit year from groups left over after the day, or from the
+    tokens at i."""
+    if groups:
+        year = "".join(groups)
+        return (year, i) if len(year) == 4 else (None, i)
+    j = skip_space(tokens, i)
+    if j < len(tokens):
+        kind, surface, _ = tokens[j]
+        if kind == DIGITS and len(surface) == 4:
+            return surface, j + 1
+        if kind == NUMBER:
+            groups, ordinal, end = read_number(tokens, j)
+            if groups and not ordinal and len("".join(groups)) == 4:
+                return "".join(groups), end
+    return None, i
+
+
+def read_date(tokens, i):
+    """("march 14" or "march 14 1985", index after) for the date starting
+    at tokens[i], or (None, i)."""
+    kind = tokens[i][0]
+    if kind == MONTH:
+        month = tokens[i][2]
+        day, groups, _, end = read_day(tokens, skip_space(tokens, i + 1))
+        if day is None:
+            return None, i
+    elif kind in (ORDINAL, NUMBER) or (
+        kind == WORD and tokens[i][1].lower() == "the"
+    ):
+        # "the fourteenth of march"; "fourteen march" is too often not a
+        # date, so the day must be an ordinal
+        day, groups, ordinal, end = read_day(
+            tokens, skip_space(tokens, i, ("the",))
+        )
+        if day is None or groups or not ordinal:
+            return None, i
+        month_at = skip_space(tokens, end, ("of",))
+        if month_at >= len(tokens) or tokens[month_at][0] != MONTH:
+            return None, i
+        month, end = tokens[month_at][2], month_at + 1
+    else:
+        return None, i
+    year, end = read_year(tokens, end, groups)
+    if groups and year is None:
+        return None, i
+    return (f"{month} {day} {year}" if year else f"{month} {day}"), end
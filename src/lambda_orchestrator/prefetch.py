@@ -0,0 +1,59 @@
+"""
+Greeting-time prefetch of the caller's first question.
+
+While the greeting plays, the orchestrator creates its clients, writes a
+fresh session record, and retrieves context for the most common opening
+questions, so the first real question finds warm connections and,
+if it is one of those questions, its retrieval results already here.
+
+Prefetched results are cached per execution environment by question, so
+any session served by this environment can use them until they expire.
+"""
+
+import json
+import re
+import time
+
+# Overridden by the PREFETCH environment variable
+DEFAULT_PREFETCH = {
+    "enabled": False,
+    # Longest the greeting waits for the prefetch before answering; the
+    # work goes on without it, so this only bounds the greeting's cost
+    "budget_seconds": 0.05,
+    # Retrieved when a caller greets; list the most common first questions
+    # (src/orchestrator_tools/replay.py openings)
+    "opening_questions": [],
+    "cache_seconds": 300,
+}
+
+NON_WORD = re.compile(r"[^a-z0-9]+")
+
+retrievals = {}
+
+
+def normalize(text):
+    return NON_WORD.sub(" ", text.lower()).strip()
+
+
+def cache_key(text, kb_id, vector_search):
+    return (normalize(text), kb_id, json.dumps(vector_search, sort_keys=True))
+
+
+def store(text, kb_id, vector_search, results, cache_seconds):
+    retrievals[cache_key(text, kb_id, vector_search)] = (
+        time.monotonic() + cache_seconds,
+        results,
+    )
+
+
+def lookup(text, kb_id, vector_search):
+    """Prefetched results for the question, or None."""
+    key = cache_key(text, kb_id, vector_search)
+    entry = retrievals.get(key)
+    if entry is None:
+        return None
+    expires_at, results = entry
+    if time.monotonic() >= expires_at:
+        retrievals.pop(key, None)
+        return None
+    return results
@@ -0,0 +1,254 @@
+"""
+Token-bucket admission control for turns that call Bedrock.
+
+Every FallbackIntent turn takes a token from its Lex session's bucket and
+one from a global bucket. A bucket refills at rate tokens per second up
+to burst tokens; a turn that finds either bucket empty is not sent to
+Bedrock, so a stuck chat loop or a burst of robocalls cannot use up the
+model quota for everyone else.
+
+Buckets are kept as a theoretical arrival time (GCRA): admitting n tokens
+moves it n / rate seconds forward, and a bucket is empty while it is more
+than burst / rate seconds ahead of the clock. That needs no read before a
+write, so the DynamoDB backend admits a turn with one or two conditional
+updates.
+
+The in-process fast path:
+    - every execution environment also tracks session buckets locally;
+      a turn its environment alone has already over-run is rejected
+      without a DynamoDB call
+    - global tokens are taken from DynamoDB lease_size at a time and
+      served from memory until they run out or lease_seconds pass
+
+Backends:
+    dynamodb  buckets shared by every execution environment
+    memory    buckets per execution environment, for tests and local runs
+
+Over-limit turns are answered from answers recently generated in this
+execution environment for the same question, or with a canned message.
+Only answers to a session's first question are kept for that: a later
+answer may lean on its own session's history ("is it free?").
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+import prefetch
+
+logger = logging.getLogger(__name__)
+
+# Overridden by the RATE_LIMIT environment variable
+DEFAULT_RATE_LIMIT = {
+    "enabled": False,
+    "backend": "dynamodb",
+    # Sustained turns per second and burst, per Lex session
+    "session": {"rate": 0.2, "burst": 5},
+    # Sustained turns per second and burst, across all sessions
+    "global": {"rate": 20, "burst": 40},
+    # Global tokens taken from DynamoDB per update, and how long they last
+    "lease_size": 5,
+    "lease_seconds": 1.0,
+    "message": (
+        "I'm getting a lot of questions right now. Please try again in a "
+        "moment."
+    ),
+    # Recent answers reused for over-limit turns
+    "answer_cache_size": 256,
+    "answer_cache_seconds": 600,
+}
+
+SESSION = "session"
+GLOBAL = "global"
+
+KEY_ATTRIBUTE = "bucket"
+ARRIVAL_ATTRIBUTE = "arrival"
+TTL_ATTRIBUTE = "expires_at"
+
+# Local session buckets kept before full ones are pruned
+MAX_LOCAL_BUCKETS = 10000
+
+answers = OrderedDict()
+
+
+class RateLimitError(Exception):
+    """The shared buckets could not be reached."""
+
+
+def load_settings(overrides):
+    """DEFAULT_RATE_LIMIT with overrides; a bucket that sets only rate or
+    burst keeps the default of the other."""
+    settings = {**DEFAULT_RATE_LIMIT, **overrides}
+    for scope in (SESSION, GLOBAL):
+        settings[scope] = {
+            **DEFAULT_RATE_LIMIT[scope],
+            **overrides.get(scope, {}),
+        }
+    return settings
+
+
+def session_key(session_id):
+    return f"{SESSION}#{session_id}"
+
+
+class LocalBuckets:
+    """Buckets in the execution environment."""
+
+    def __init__(self):
+        self.arrivals = OrderedDict()
+
+    def take(self, key, bucket, tokens, now):
+        interval = tokens / bucket["rate"]
+        arrival = max(self.arrivals.get(key, now), now)
+        if arrival + interval - now > bucket["burst"] / bucket["rate"]:
+            return False
+        self.arrivals[key] = arrival + interval
+        self.arrivals.move_to_end(key)
+        if len(self.arrivals) > MAX_LOCAL_BUCKETS:
+            self.prune(now)
+        return True
+
+    def prune(self, now):
+        # A bucket whose arrival time has passed is full, the same as absent
+        for key in [
+            k for k, arrival in self.arrivals.items() if arrival <= now
+        ]:
+            del self.arrivals[key]
+        while len(self.arrivals) > MAX_LOCAL_BUCKETS:
+            self.arrivals.popitem(last=False)
+
+
+class DynamoDBBuckets:
+    """Buckets shared through the rate limit table.
+
+    get_table returns the boto3 Table, so the resource is only created on
+    first use.
+    """
+
+    def __init__(self, get_table):
+        self.get_table = get_table
+
+    def take(self, key, bucket, tokens, now):
+        interval = tokens / bucket["rate"]
+        capacity = bucket["burst"] / bucket["rate"]
+        names = {"#arrival": ARRIVAL_ATTRIBUTE, "#ttl": TTL_ATTRIBUTE}
+        # Full bucket: restart from now
+        if self.update(
+            key,
+            "SET #arrival = :arrival, #ttl = :ttl",
+            "attribute_not_exists(#arrival) OR #arrival < :now",
+            names,
+            {
+                ":arrival": decimal(now + interval),
+                ":now": decimal(now),
+                ":ttl": int(now + capacity) + 1,
+            },
+        ):
+            return True
+        # Partly drained bucket: admit while tokens are left
+        return self.update(
+            key,
+            "SET #arrival = #arrival + :interval, #ttl = :ttl",
+            "#arrival <= :latest",
+            names,
+            {
+                ":interval": decimal(interval),
+                ":latest": decimal(now + capacity - interval),
+                ":ttl": int(now + 2 * capacity) + 1,
+            },
+        )
+
+    def update(self, key, expression, condition, names, values):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            self.get_table().update_item(
+                Key={KEY_ATTRIBUTE: key},
+                UpdateExpression=expression,
+                ConditionExpression=condition,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise RateLimitError(f"Cannot update bucket {key}: {e}") from e
+        except BotoCoreError as e:
+            raise RateLimitError(f"Cannot update bucket {key}: {e}") from e
+        return True
+
+
+def decimal(seconds):
+    # boto3 only accepts Decimal numbers; milliseconds are precise enough
+    return Decimal(f"{seconds:.3f}")
+
+
+class RateLimiter:
+    def __init__(self, settings, shared=None):
+        self.settings = settings
+        self.local = LocalBuckets()
+        self.shared = shared
+        self.lease = {"tokens": 0, "expires_at": 0.0}
+
+    def admit(self, session_id, now=None):
+        """None if the turn may call Bedrock, otherwise the scope of the
+        empty bucket (SESSION or GLOBAL)."""
+        now = time.time() if now is None else now
+        key = session_key(session_id)
+        session = self.settings["session"]
+        if not self.local.take(key, session, 1, now):
+            return SESSION
+        if self.shared and not self.shared.take(key, session, 1, now):
+            return SESSION
+        if not self.take_global(now):
+            return GLOBAL
+        return None
+
+    def take_global(self, now):
+        if self.lease["tokens"] and now < self.lease["expires_at"]:
+            self.lease["tokens"] -= 1
+            return True
+        bucket = self.settings["global"]
+        if not self.shared:
+            return self.local.take(GLOBAL, bucket, 1, now)
+        size = max(1, min(self.settings["lease_size"], bucket["burst"]))
+        # Fall back to a single token when a whole lease is not left
+        for tokens in dict.fromkeys((size, 1)):
+            if self.shared.take(GLOBAL, bucket, tokens, now):
+                self.lease = {
+                    "tokens": tokens - 1,
+                    "expires_at": now + self.settings["lease_seconds"],
+                }
+                return True
+        return False
+
+
+def create_limiter(settings, get_table=None):
+    backend = settings["backend"]
+    if backend == "dynamodb":
+        return RateLimiter(settings, DynamoDBBuckets(get_table))
+    if backend == "memory":
+        return RateLimiter(settings)
+    raise ValueError(f"Unknown rate limit backend {backend!r}")
+
+
+def remember(question, channel, answer, settings):
+    key = (channel, prefetch.normalize(question))
+    answers[key] = (time.monotonic() + settings["answer_cache_seconds"], answer)
+    answers.move_to_end(key)
+    while len(answers) > settings["answer_cache_size"]:
+        answers.popitem(last=False)
+
+
+def recent_answer(question, channel):
+    """An answer generated recently for the question, or None."""
+    key = (channel, prefetch.normalize(question))
+    entry = answers.get(key)
+    if entry is None:
+        return None
+    expires_at, answer = entry
+    if time.monotonic() >= expires_at:
+        answers.pop(key, None)
+        return None
+    return answer
@@ -0,0 +1,177 @@
+"""
+PII redaction for caller transcriptions and log lines.
+
+Callers read out phone numbers, dates of birth and member ids. The
+orchestrator replaces them in the Lex event's transcriptions before the
+question is sent to Bedrock, queued, cached or stored in the session, and
+a log filter replaces them in every log line, including the debug dump of
+the whole event.
+
+Every configured entity is one named group of a single compiled pattern,
+so a text is scanned once however many entities are on; each match is
+replaced by its entity's token, e.g. "[PHONE]". Every built-in pattern
+needs a digit or an "@", so most questions are passed over after one
+search for either, and starts a word, so the scan only tries the
+alternatives at word starts. Tokens never match a pattern, so redacting twice is
+harmless.
+
+Callers also ask about clinic dates ("open on 12/24/2025"), so a date is
+only redacted after a birth cue such as "born", "DOB" or "date of birth"
+shortly before it.
+
+Entities (in match order; earlier entities win where patterns overlap):
+    email         name@example.org
+    date          03/14/1985, 1985-03-14, March 14th 1985, 14 March 1985,
+                  after a birth cue
+    phone         555-123-4567, (555) 123 4567, +1 555 123 4567
+    ssn           123-45-6789, 123 45 6789
+    medicaid_id   8 to 12 digits, or letters around 5 to 10 digits
+                  (AB12345C)
+    card_number   13 to 19 digits in groups (not on by default)
+
+settings["patterns"] adds entities or replaces built-in patterns.
+src/orchestrator_tools/benchmark_redaction.py measures the cost per turn.
+"""
+
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Overridden by the REDACTION environment variable
+DEFAULT_REDACTION = {
+    "enabled": True,
+    "entities": ["email", "date", "phone", "ssn", "medicaid_id"],
+    # Entity name to regular expression, for ids specific to a program
+    "patterns": {},
+}
+
+MONTHS = (
+    r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|"
+    r"july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|"
+    r"dec(?:ember)?)"
+)
+
+PATTERNS = {
+    "email": r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b",
+    "date": (
+        r"\b(?:\d{1,2}[/.-]\d{1,2}[/.-](?:\d{4}|\d{2})"
+        r"|\d{4}-\d{1,2}-\d{1,2}"
+        rf"|{MONTHS}\.?\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}"
+        rf"|\d{{1,2}}(?:st|nd|rd|th)?\s+(?:of\s+)?{MONTHS}\.?,?\s+\d{{4}})\b"
+    ),
+    "phone": (
+        r"(?<![\w+])(?:\+?1[\s.-]?)?(?:\(\d{3}\)\s?|\d{3}[\s.-]?)"
+        r"\d{3}[\s.-]?\d{4}\b"
+    ),
+    "ssn": r"\b\d{3}[\s-]?\d{2}[\s-]?\d{4}\b",
+    "medicaid_id": r"\b(?:\d{8,12}|[a-z]{1,3}\d{5,10}[a-z]{0,2})\b",
+    "card_number": r"\b\d{4}(?:[\s-]?\d{4}){2}[\s-]?\d{1,7}\b",
+}
+
+# Built-in entities only redacted when this matches just before them
+CUES = {
+    "date": re.compile(
+        r"\b(?:born|birth(?:day|date)?|dob|d\.o\.b)\b", re.IGNORECASE
+    ),
+}
+# Characters before a match searched for its cue
+CUE_WINDOW = 40
+
+# Text without a match for this cannot hold a built-in entity
+CANDIDATE = re.compile(r"[\d@]")
+# Every built-in entity starts a word or "(" or "+"; checking that once
+# spares trying each alternative inside words and between them
+START = r"(?<!\w)(?=[\w(+])"
+
+
+def token(entity):
+    return f"[{entity.upper()}]"
+
+
+class Redactor:
+    def __init__(self, settings):
+        patterns = {**PATTERNS, **settings["patterns"]}
+        entities = list(settings["entities"])
+        entities += [e for e in settings["patterns"] if e not in entities]
+        unknown = [e for e in entities if e not in patterns]
+        if unknown:
+            raise ValueError(f"No redaction pattern for {unknown}")
+        # A replaced built-in pattern matches without its cue
+        self.cues = {
+            e: CUES[e]
+            for e in entities
+            if e in CUES and e not in settings["patterns"]
+        }
+        # Custom patterns may match text without digits, anywhere
+        self.prefilter = not settings["patterns"]
+        combined = "|".join(f"(?P<{e}>{patterns[e]})" for e in entities)
+        if self.prefilter:
+            combined = f"{START}(?:{combined})"
+        self.pattern = re.compile(combined, re.IGNORECASE) if entities else None
+
+    def candidate(self, text):
+        if self.pattern is None or not text:
+            return False
+        return not self.prefilter or CANDIDATE.search(text) is not None
+
+    def cued(self, match):
+        """Whether the match is an entity, given the text before it."""
+        cue = self.cues.get(match.lastgroup)
+        return cue is None or bool(
+            cue.search(
+                match.string, max(0, match.start() - CUE_WINDOW), match.start()
+            )
+        )
+
+    def redact(self, text):
+        """text with every entity replaced by its token."""
+        return self.scan(text)[0]
+
+    def scan(self, text):
+        """(redacted text, entity names found, in order)."""
+        found = []
+        if not self.candidate(text):
+            return text, found
+
+        def replace(match):
+            if not self.cued(match):
+                return match.group()
+            found.append(match.lastgroup)
+            return token(match.lastgroup)
+
+        return self.pattern.sub(replace, text), found
+
+
+class RedactingFilter(logging.Filter):
+    """Redacts the formatted message, traceback and stack of every record
+    it sees."""
+
+    def __init__(self, redactor):
+        super().__init__()
+        self.redactor = redactor
+
+    def filter(self, record):
+        message = record.getMessage()
+        redacted = self.redactor.redact(message)
+        if redacted != message:
+            record.msg, record.args = redacted, None
+        if record.exc_info and not record.exc_text:
+            # Formatters reuse exc_text rather than format exc_info again
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+        if record.exc_text:
+            record.exc_text = self.redactor.redact(record.exc_text)
+        if record.stack_info:
+            record.stack_info = self.redactor.redact(record.stack_info)
+        return True
+
+
+def install_log_filter(redactor, root=None):
+    """Redact everything the handlers of the root logger write, whichever
+    module logs it. Returns the filter."""
+    log_filter = RedactingFilter(redactor)
+    for handler in (root or logging.getLogger()).handlers:
+        handler.addFilter(log_filter)
+    return log_filter
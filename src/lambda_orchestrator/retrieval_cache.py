@@ -0,0 +1,166 @@
+"""
+Cache of knowledge base retrieval results.
+
+Retrieval results for a question only change when the knowledge base
+does, even when the answer must be generated fresh from the session's
+history. Results are cached by the knowledge base version that
+kb_ingestion_manager records after each completed ingestion (the
+KB_VERSION_PARAMETER), together with the knowledge base id, the
+normalized question and the vector search settings. A new version changes
+every key, so old entries are never read again: the in-process tier
+evicts them as least recently used and DynamoDB deletes them by TTL.
+
+Tiers, checked in order:
+    local   an LRU of local_size entries in the execution environment
+    shared  the retrieval cache table, for every execution environment
+            (backend dynamodb; backend memory has the local tier only)
+
+Entries hold the ranked results as returned by Retrieve (text, location,
+score and the chunk metadata), stored zlib-compressed.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import prefetch
+
+logger = logging.getLogger(__name__)
+
+# Overridden by the RETRIEVAL_CACHE environment variable
+DEFAULT_RETRIEVAL_CACHE = {
+    "enabled": False,
+    "backend": "dynamodb",
+    "local_size": 1024,
+    # Entries of old versions are deleted by TTL after this long
+    "ttl_days": 7,
+}
+
+LOCAL = "local"
+SHARED = "shared"
+
+KEY_ATTRIBUTE = "cache_key"
+RESULTS_ATTRIBUTE = "results"
+TTL_ATTRIBUTE = "expires_at"
+
+
+class RetrievalCacheError(Exception):
+    """The shared tier could not be read or written."""
+
+
+def cache_key(text, kb_id, vector_search, version):
+    return hashlib.sha256(
+        json.dumps(
+            [version, kb_id, prefetch.normalize(text), vector_search],
+            sort_keys=True,
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def encode(results):
+    return zlib.compress(
+        json.dumps(results, separators=(",", ":")).encode("utf-8")
+    )
+
+
+def decode(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class LocalTier:
+    """LRU shared by the threads of a fan-out."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            results = self.entries.get(key)
+            if results is not None:
+                self.entries.move_to_end(key)
+            return results
+
+    def put(self, key, results):
+        with self.lock:
+            self.entries[key] = results
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class DynamoDBTier:
+    """get_table returns the boto3 Table, so the resource is only created
+    on first use."""
+
+    def __init__(self, settings, get_table):
+        self.settings = settings
+        self.get_table = get_table
+
+    def get(self, key):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            item = (
+                self.get_table().get_item(Key={KEY_ATTRIBUTE: key}).get("Item")
+            )
+        except (BotoCoreError, ClientError) as e:
+            raise RetrievalCacheError(f"Cannot read {key}: {e}") from e
+        if not item:
+            return None
+        # boto3 wraps binary attributes in Binary
+        blob = item[RESULTS_ATTRIBUTE]
+        return decode(bytes(getattr(blob, "value", blob)))
+
+    def put(self, key, results):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            self.get_table().put_item(
+                Item={
+                    KEY_ATTRIBUTE: key,
+                    RESULTS_ATTRIBUTE: encode(results),
+                    TTL_ATTRIBUTE: int(time.time())
+                    + self.settings["ttl_days"] * 86400,
+                }
+            )
+        except (BotoCoreError, ClientError) as e:
+            raise RetrievalCacheError(f"Cannot write {key}: {e}") from e
+
+
+class RetrievalCache:
+    def __init__(self, settings, shared=None):
+        self.local = LocalTier(settings["local_size"])
+        self.shared = shared
+
+    def get(self, key):
+        """(results, tier) on a hit, (None, None) on a miss."""
+        results = self.local.get(key)
+        if results is not None:
+            return results, LOCAL
+        if self.shared is None:
+            return None, None
+        results = self.shared.get(key)
+        if results is None:
+            return None, None
+        self.local.put(key, results)
+        return results, SHARED
+
+    def put(self, key, results):
+        self.local.put(key, results)
+        if self.shared is not None:
+            self.shared.put(key, results)
+
+
+def create_cache(settings, get_table=None):
+    backend = settings["backend"]
+    if backend == "dynamodb":
+        return RetrievalCache(settings, DynamoDBTier(settings, get_table))
+    if backend == "memory":
+        return RetrievalCache(settings)
+    raise ValueError(f"Unknown retrieval cache backend {backend!r}")
@@ -0,0 +1,215 @@
+"""
+Conversation session storage for the orchestrator.
+
+A session holds the Bedrock knowledge base session id and a short history
+of question and answer turns. Items expire ttl_seconds after their last
+write: DynamoDB deletes them through the table's TTL attribute, and every
+backend ignores expired items on read because TTL deletion can lag. The
+history is kept to the last max_turns turns and stored zlib-compressed,
+dropping the oldest turns until it fits in max_history_bytes.
+
+Backends:
+    dynamodb  the conversation table (the deployed default)
+    memory    a dict in the execution environment, for tests and benchmarks
+    file      one JSON file per session, for local runs
+"""
+
+import abc
+import base64
+import json
+import logging
+import os
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Overridden by the SESSION_STORE environment variable
+DEFAULT_SESSION_STORE = {
+    "backend": "dynamodb",
+    # Longer than the Lex idle session TTL, so a live session never expires
+    "ttl_seconds": 900,
+    "max_turns": 6,
+    "max_history_bytes": 4096,
+    # file backend only
+    "path": "/tmp/sessions",
+}
+
+KEY_ATTRIBUTE = "SessionID_Lex"
+KB_SESSION_ATTRIBUTE = "kbsession"
+HISTORY_ATTRIBUTE = "history"
+TTL_ATTRIBUTE = "expires_at"
+
+
+class SessionStoreError(Exception):
+    """A session could not be read or written."""
+
+
+def new_session():
+    return {"kb_session": None, "history": []}
+
+
+def encode_history(history, max_turns, max_bytes):
+    """Compressed bytes of the most recent turns that fit in max_bytes."""
+    turns = history[-max_turns:] if max_turns else []
+    while turns:
+        blob = zlib.compress(
+            json.dumps(turns, separators=(",", ":")).encode("utf-8")
+        )
+        if len(blob) <= max_bytes:
+            return blob
+        turns = turns[1:]
+    return b""
+
+
+def decode_history(blob):
+    if not blob:
+        return []
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class SessionStore(abc.ABC):
+    """Expiry and history encoding shared by the backends."""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def load(self, session_id):
+        item = self.read(session_id)
+        if not item or item.get(TTL_ATTRIBUTE, 0) <= time.time():
+            return new_session()
+        try:
+            history = decode_history(item.get(HISTORY_ATTRIBUTE))
+        except (zlib.error, ValueError) as e:
+            # A damaged history is not worth failing the turn over
+            logger.warning("Discarding unreadable session history: %s", e)
+            history = []
+        return {
+            "kb_session": item.get(KB_SESSION_ATTRIBUTE),
+            "history": history,
+        }
+
+    def save(self, session_id, session):
+        item = {
+            HISTORY_ATTRIBUTE: encode_history(
+                session["history"],
+                self.settings["max_turns"],
+                self.settings["max_history_bytes"],
+            ),
+            TTL_ATTRIBUTE: int(time.time()) + self.settings["ttl_seconds"],
+        }
+        if session["kb_session"]:
+            item[KB_SESSION_ATTRIBUTE] = session["kb_session"]
+        self.write(session_id, item)
+
+    @abc.abstractmethod
+    def read(self, session_id):
+        """The item stored for the session, or None."""
+
+    @abc.abstractmethod
+    def write(self, session_id, item):
+        """Store the item, replacing the session's previous one."""
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.items = {}
+
+    def read(self, session_id):
+        return self.items.get(session_id)
+
+    def write(self, session_id, item):
+        self.items[session_id] = item
+
+
+class FileSessionStore(SessionStore):
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.path = settings["path"]
+
+    def file_name(self, session_id):
+        # Session ids come from callers, so never use them as paths directly
+        encoded = base64.urlsafe_b64encode(session_id.encode("utf-8"))
+        return os.path.join(self.path, encoded.decode("ascii") + ".json")
+
+    def read(self, session_id):
+        try:
+            with open(self.file_name(session_id)) as f:
+                item = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise SessionStoreError(f"Cannot read session: {e}") from e
+        item[HISTORY_ATTRIBUTE] = base64.b64decode(item[HISTORY_ATTRIBUTE])
+        return item
+
+    def write(self, session_id, item):
+        item = {
+            **item,
+            HISTORY_ATTRIBUTE: base64.b64encode(item[HISTORY_ATTRIBUTE]).decode(
+                "ascii"
+            ),
+        }
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.file_name(session_id), "w") as f:
+                json.dump(item, f)
+        except OSError as e:
+            raise SessionStoreError(f"Cannot write session: {e}") from e
+
+
+class DynamoDBSessionStore(SessionStore):
+    """Sessions in the conversation table.
+
+    get_table returns the boto3 Table, so the resource is only created on
+    first use.
+    """
+
+    def __init__(self, settings, get_table):
+        super().__init__(settings)
+        self.get_table = get_table
+
+    def read(self, session_id):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            item = (
+                self.get_table()
+                .get_item(Key={KEY_ATTRIBUTE: session_id})
+                .get("Item")
+            )
+        except (BotoCoreError, ClientError) as e:
+            raise SessionStoreError(f"Cannot read session: {e}") from e
+        if item and HISTORY_ATTRIBUTE in item:
+            # boto3 wraps binary attributes in Binary
+            history = item[HISTORY_ATTRIBUTE]
+            item[HISTORY_ATTRIBUTE] = bytes(getattr(history, "value", history))
+        return item
+
+    def write(self, session_id, item):
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        names = {f"#{name}": name for name in item}
+        values = {f":{name}": value for name, value in item.items()}
+        try:
+            self.get_table().update_item(
+                Key={KEY_ATTRIBUTE: session_id},
+                UpdateExpression="SET "
+                + ", ".join(f"#{name} = :{name}" for name in item),
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+            )
+        except (BotoCoreError, ClientError) as e:
+            raise SessionStoreError(f"Cannot write session: {e}") from e
+
+
+def create_store(settings, get_table=None):
+    backend = settings["backend"]
+    if backend == "dynamodb":
+        return DynamoDBSessionStore(settings, get_table)
+    if backend == "memory":
+        return InMemorySessionStore(settings)
+    if backend == "file":
+        return FileSessionStore(settings)
+    raise ValueError(f"Unknown session store backend {backend!r}")
@@ -0,0 +1,91 @@
+"""
+Small-talk and off-topic detection for FallbackIntent turns.
+
+A multinomial naive Bayes model over character n-grams and words, trained
+offline by src/orchestrator_tools/smalltalk_training.py and shipped as
+smalltalk_model.json. Classifying a turn is a few hundred dictionary
+lookups, so it stays well under a millisecond and needs no network call.
+"""
+
+import json
+import math
+import os
+import re
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "smalltalk_model.json")
+
+# The label for turns that should go to the knowledge base
+QUESTION_LABEL = "question"
+
+# Longer turns are almost always real questions; also bounds the work
+MAX_CHARS = 200
+
+RESPONSES = {
+    "thanks": "You're welcome! Is there anything else I can help you with?",
+    "goodbye": "Thank you for contacting us. Take care!",
+    "offtopic": (
+        "I can help with public health questions, like vaccines, clinics, "
+        "and disease prevention. What would you like to know?"
+    ),
+    "agent": "Let me connect you with an agent.",
+}
+
+# Labels that hand the contact to a person instead of answering
+TRANSFER_LABELS = {"agent"}
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+model = {}
+
+
+def features(text, ngram_range=(3, 5)):
+    """Words plus character n-grams of each padded word."""
+    words = WORD_PATTERN.findall(text.lower()[:MAX_CHARS])
+    feats = [f"w:{word}" for word in words]
+    low, high = ngram_range
+    for word in words:
+        padded = f" {word} "
+        for n in range(low, high + 1):
+            feats.extend(padded[i : i + n] for i in range(len(padded) - n + 1))
+    return feats
+
+
+def load_model(path=MODEL_PATH):
+    if not model:
+        if not os.path.exists(path):
+            return model
+        with open(path) as f:
+            model.update(json.load(f))
+    return model
+
+
+def predict(text, params=None):
+    """Return (label, probability) for text; (None, 0.0) without a model."""
+    params = params or load_model()
+    if not params:
+        return None, 0.0
+    labels = params["labels"]
+    scores = list(params["log_priors"])
+    weights = params["log_likelihoods"]
+    for feat in features(text, tuple(params["ngram_range"])):
+        feature_weights = weights.get(feat)
+        if feature_weights is not None:
+            for i, weight in enumerate(feature_weights):
+                scores[i] += weight
+    best = max(range(len(labels)), key=scores.__getitem__)
+    # Softmax probability of the winning label
+    total = sum(math.exp(score - scores[best]) for score in scores)
+    return labels[best], 1.0 / total
+
+
+def classify(text, params=None):
+    """Label for a turn that should skip the knowledge base, else None."""
+    params = params or load_model()
+    if not params or len(text) > MAX_CHARS:
+        return None
+    if len(WORD_PATTERN.findall(text.lower())) > params["max_words"]:
+        return None
+    label, probability = predict(text, params)
+    if label == QUESTION_LABEL or probability < params["threshold"]:
+        return None
+    return label
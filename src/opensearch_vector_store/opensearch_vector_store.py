@@ -0,0 +1,364 @@
+"""
+OpenSearch Serverless vector store backend.
+
+Creates k-NN indexes with configurable engine, quantization and HNSW
+parameters, bulk loads vectors in parallel batches, and benchmarks queries.
+
+Usage:
+    python opensearch_vector_store.py --config ../../config.yaml create
+    python opensearch_vector_store.py --config ../../config.yaml load \\
+        --snapshot snapshots/2024-06-01
+    python opensearch_vector_store.py --config ../../config.yaml benchmark \\
+        --snapshot snapshots/2024-06-01 --queries 200
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+ENGINES = {"faiss", "lucene"}
+QUANTIZATIONS = {None, "fp16", "byte"}
+
+DEFAULT_INDEX_SETTINGS = {
+    "dimension": 1024,
+    "engine": "faiss",
+    # Titan v2 embeddings are normalized, so inner product ranks like cosine
+    "space_type": "innerproduct",
+    "quantization": None,
+    "m": 16,
+    "ef_construction": 512,
+    "ef_search": 512,
+    "refresh_interval": None,
+    # Honoured by managed OpenSearch domains; serverless collections manage
+    # shards themselves, so leave these unset there
+    "number_of_shards": None,
+    "number_of_replicas": None,
+}
+
+
+def index_settings(overrides=None):
+    settings = dict(DEFAULT_INDEX_SETTINGS)
+    settings.update(
+        {
+            key: value
+            for key, value in (overrides or {}).items()
+            if key in DEFAULT_INDEX_SETTINGS
+        }
+    )
+    if settings["engine"] not in ENGINES:
+        raise ValueError(
+            f"engine must be one of {sorted(ENGINES)}, got {settings['engine']!r}"
+        )
+    if settings["quantization"] not in QUANTIZATIONS:
+        raise ValueError(
+            f"quantization must be fp16, byte or unset, got {settings['quantization']!r}"
+        )
+    if settings["quantization"] == "fp16" and settings["engine"] != "faiss":
+        raise ValueError("fp16 quantization requires the faiss engine")
+    return settings
+
+
+def build_index_body(settings):
+    parameters = {
+        "m": settings["m"],
+        "ef_construction": settings["ef_construction"],
+    }
+    if settings["quantization"] == "fp16":
+        parameters["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+
+    embedding = {
+        "type": "knn_vector",
+        "dimension": settings["dimension"],
+        "method": {
+            "name": "hnsw",
+            "engine": settings["engine"],
+            "space_type": settings["space_type"],
+            "parameters": parameters,
+        },
+    }
+    if settings["quantization"] == "byte":
+        embedding["data_type"] = "byte"
+
+    index = {"knn": True, "knn.algo_param.ef_search": settings["ef_search"]}
+    for key in ("refresh_interval", "number_of_shards", "number_of_replicas"):
+        if settings[key] is not None:
+            index[key] = settings[key]
+
+    return {
+        "settings": {"index": index},
+        "mappings": {
+            "properties": {
+                "chunk_id": {"type": "keyword"},
+                "passage": {
+                    "type": "text",
+                    "fields": {"keyword": {"type": "keyword"}},
+                },
+                "embedding": embedding,
+                "source_url": {
+                    "type": "text",
+                    "fields": {"keyword": {"type": "keyword"}},
+                },
+            }
+        },
+    }
+
+
+def get_client(endpoint, region, service="aoss"):
+    import boto3
+    from opensearchpy import AWSV4SignerAuth, OpenSearch, RequestsHttpConnection
+
+    credentials = boto3.Session().get_credentials()
+    return OpenSearch(
+        hosts=[{"host": endpoint, "port": 443}],
+        http_auth=AWSV4SignerAuth(credentials, region, service),
+        use_ssl=True,
+        verify_certs=True,
+        timeout=300,
+        http_compress=True,
+        connection_class=RequestsHttpConnection,
+        pool_maxsize=32,
+    )
+
+
+def create_index(client, index, settings):
+    """Create the index if it does not exist. Returns True when created."""
+    if client.indices.exists(index=index):
+        logger.info(f"Index {index} already exists")
+        return False
+    client.indices.create(index=index, body=build_index_body(settings))
+    logger.info(f"Index {index} created")
+    return True
+
+
+def quantize_to_bytes(vector, scale):
+    """Scale a float vector into the signed byte range byte indexes require."""
+    return [max(-128, min(127, round(value * scale))) for value in vector]
+
+
+def _bulk_body(index, documents):
+    body = []
+    for document in documents:
+        body.append({"index": {"_index": index}})
+        body.append(document)
+    return body
+
+
+def _send_batch(client, index, documents):
+    response = client.bulk(body=_bulk_body(index, documents))
+    failed = 0
+    if response.get("errors"):
+        for item in response["items"]:
+            result = next(iter(item.values()))
+            if result.get("error"):
+                failed += 1
+                logger.warning(f"Bulk item failed: {result['error']}")
+    return len(documents) - failed, failed
+
+
+def bulk_load(client, index, documents, batch_size=500, workers=4):
+    """Index documents in parallel batches.
+
+    documents is any iterable, consumed lazily; at most two batches per
+    worker are held in memory at a time.
+    """
+    started = time.monotonic()
+    indexed = failed = 0
+    in_flight = set()
+
+    def collect(done):
+        nonlocal indexed, failed
+        for future in done:
+            ok, bad = future.result()
+            indexed += ok
+            failed += bad
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) < batch_size:
+                continue
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(_send_batch, client, index, batch))
+            batch = []
+        if batch:
+            in_flight.add(executor.submit(_send_batch, client, index, batch))
+        collect(wait(in_flight).done)
+
+    seconds = time.monotonic() - started
+    return {
+        "indexed": indexed,
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "docs_per_second": round(indexed / seconds, 1) if seconds else None,
+    }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[
+        min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)
+    ]
+
+
+def benchmark_queries(client, index, query_vectors, k=10, workers=4):
+    """Run one k-NN query per vector and report latency percentiles and QPS."""
+
+    def run(vector):
+        body = {
+            "size": k,
+            "_source": ["chunk_id"],
+            "query": {"knn": {"embedding": {"vector": vector, "k": k}}},
+        }
+        query_started = time.monotonic()
+        client.search(index=index, body=body)
+        return (time.monotonic() - query_started) * 1000
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(run, query_vectors))
+    seconds = time.monotonic() - started
+
+    if not latencies:
+        return {"queries": 0}
+    return {
+        "queries": len(latencies),
+        "k": k,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "qps": round(len(latencies) / seconds, 1),
+    }
+
+
+def iter_snapshot_documents(snapshot_path, quantization=None, batch_rows=5000):
+    """Yield index documents from a vector_store_export snapshot directory."""
+    import numpy as np
+    import pyarrow.parquet as pq
+
+    embeddings = np.load(
+        os.path.join(snapshot_path, "embeddings.npy"), mmap_mode="r"
+    )
+    scale = None
+    if quantization == "byte":
+        scale = 127 / max(float(np.abs(embeddings).max()), 1e-12)
+
+    rows = pq.ParquetFile(os.path.join(snapshot_path, "rows.parquet"))
+    for batch in rows.iter_batches(
+        batch_size=batch_rows, columns=["row", "id", "chunks", "metadata"]
+    ):
+        for row, chunk_id, chunks, metadata in zip(
+            *(column.to_pylist() for column in batch.columns)
+        ):
+            vector = embeddings[row].tolist()
+            if scale is not None:
+                vector = quantize_to_bytes(vector, scale)
+            source_url = None
+            if metadata:
+                source_url = json.loads(metadata).get(
+                    "x-amz-bedrock-kb-source-uri"
+                )
+            yield {
+                "chunk_id": chunk_id,
+                "passage": chunks,
+                "embedding": vector,
+                "source_url": source_url,
+            }
+
+
+def sample_query_vectors(snapshot_path, count, quantization=None, seed=0):
+    import numpy as np
+
+    embeddings = np.load(
+        os.path.join(snapshot_path, "embeddings.npy"), mmap_mode="r"
+    )
+    rows = np.random.default_rng(seed).choice(
+        len(embeddings), size=min(count, len(embeddings)), replace=False
+    )
+    vectors = [embeddings[row].tolist() for row in sorted(rows)]
+    if quantization == "byte":
+        scale = 127 / max(float(np.abs(embeddings).max()), 1e-12)
+        vectors = [quantize_to_bytes(vector, scale) for vector in vectors]
+    return vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenSearch vector backend")
+    parser.add_argument(
+        "--config", help="config.yaml with an opensearch section"
+    )
+    parser.add_argument(
+        "--endpoint", help="Collection endpoint, without https://"
+    )
+    parser.add_argument("--region")
+    parser.add_argument("--index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("create", help="Create the index if it is missing")
+
+    load_parser = subparsers.add_parser("load", help="Bulk load a snapshot")
+    load_parser.add_argument("--snapshot", required=True)
+    load_parser.add_argument("--batch-size", type=int, default=500)
+    load_parser.add_argument("--workers", type=int, default=4)
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="Query with vectors sampled from a snapshot"
+    )
+    benchmark_parser.add_argument("--snapshot", required=True)
+    benchmark_parser.add_argument("--queries", type=int, default=100)
+    benchmark_parser.add_argument("-k", type=int, default=10)
+    benchmark_parser.add_argument("--workers", type=int, default=4)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    config = {}
+    if args.config:
+        import yaml
+
+        with open(args.config) as f:
+            config = yaml.safe_load(f)
+    opensearch_config = config.get("opensearch", {})
+    endpoint = args.endpoint or opensearch_config.get("endpoint")
+    region = args.region or config.get("region")
+    index = args.index or opensearch_config.get("index", "rag-kb")
+    settings = index_settings(opensearch_config)
+
+    client = get_client(endpoint, region)
+
+    if args.command == "create":
+        create_index(client, index, settings)
+        return
+    if args.command == "load":
+        create_index(client, index, settings)
+        result = bulk_load(
+            client,
+            index,
+            iter_snapshot_documents(args.snapshot, settings["quantization"]),
+            batch_size=args.batch_size,
+            workers=args.workers,
+        )
+    else:
+        result = benchmark_queries(
+            client,
+            index,
+            sample_query_vectors(
+                args.snapshot, args.queries, settings["quantization"]
+            ),
+            k=args.k,
+            workers=args.workers,
+        )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
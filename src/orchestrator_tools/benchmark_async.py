@@ -0,0 +1,245 @@
+"""
+FallbackIntent latency of the sync and asyncio orchestrator handlers.
+
+Runs both handlers in this process against stub clients that sleep for
+fixed service latencies, so the comparison shows only what overlapping
+the I/O saves, without network noise. Three variants are measured:
+
+    sync            lambda_orchestrator.lambda_handler
+    async-threaded  async_orchestrator.lambda_handler over boto3-style
+                    clients, each call run in a worker thread (the default
+                    deployment)
+    async-native    async_orchestrator.lambda_handler over clients with
+                    native async methods, as aioboto3 would provide
+
+Each variant runs with context compression off (RetrieveAndGenerate) and
+on (Retrieve + Converse). Conversations have several turns with a pause
+between them, as a caller would. Session writes are awaited unless
+ASYNC_ORCHESTRATOR='{"defer_session_writes": true}' is set in the shell,
+in which case they finish while the caller thinks.
+
+Usage:
+    python benchmark_async.py
+    python benchmark_async.py --sessions 50 --turns 4 --session-read-ms 15 \\
+        --retrieve-ms 250 --generate-ms 1200
+
+Needs no AWS access.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ORCHESTRATOR_DIR = os.path.join(TOOLS_DIR, os.pardir, "lambda_orchestrator")
+sys.path.insert(0, os.path.abspath(ORCHESTRATOR_DIR))
+
+os.environ.setdefault("KBID", "benchmark-kb")
+os.environ.setdefault("MODEL_ARN", "benchmark-model")
+os.environ.setdefault("DDB_Name", "benchmark-table")
+
+import async_orchestrator  # noqa: E402
+import lambda_orchestrator  # noqa: E402
+
+QUESTIONS = [
+    "Do I need an appointment for a flu shot",
+    "Which clinics give the shot on weekends",
+    "Does insurance cover it for children",
+    "What should I bring to the appointment",
+]
+
+PASSAGE = (
+    "Flu shots are available at every clinic without an appointment. "
+    "Weekend hours are posted on the clinic page."
+)
+
+
+class Latencies:
+    def __init__(self, args):
+        self.session_read = args.session_read_ms / 1000
+        self.session_write = args.session_write_ms / 1000
+        self.retrieve = args.retrieve_ms / 1000
+        self.generate = args.generate_ms / 1000
+
+
+def retrieval_results(kwargs):
+    return {
+        "retrievalResults": [
+            {
+                "content": {"text": PASSAGE},
+                "location": {"s3Location": {"uri": "s3://docs/flu.pdf"}},
+                "score": 0.7,
+            }
+        ]
+    }
+
+
+def generated_answer():
+    return {
+        "output": {"message": {"content": [{"text": "No appointment."}]}},
+        "usage": {"inputTokens": 60},
+    }
+
+
+class StubTable:
+    """Conversation table that sleeps like DynamoDB."""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.items = {}
+
+    def get_item(self, Key):
+        time.sleep(self.latencies.session_read)
+        item = self.items.get(Key["SessionID_Lex"])
+        return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, **kwargs):
+        time.sleep(self.latencies.session_write)
+        item = self.items.setdefault(Key["SessionID_Lex"], {})
+        for name, value in kwargs["ExpressionAttributeValues"].items():
+            item[name[1:]] = value
+
+
+class StubBedrock:
+    """Blocking Bedrock clients, as boto3 provides."""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    def retrieve(self, **kwargs):
+        time.sleep(self.latencies.retrieve)
+        return retrieval_results(kwargs)
+
+    def retrieve_and_generate(self, **kwargs):
+        time.sleep(self.latencies.retrieve + self.latencies.generate)
+        return {
+            "sessionId": kwargs.get("sessionId") or "kb-session",
+            "output": {"text": "No appointment."},
+        }
+
+    def converse(self, **kwargs):
+        time.sleep(self.latencies.generate)
+        return generated_answer()
+
+
+class AsyncStubBedrock:
+    """Bedrock clients with native async methods."""
+
+    def __init__(self, latencies):
+        self.latencies = latencies
+
+    async def retrieve(self, **kwargs):
+        await asyncio.sleep(self.latencies.retrieve)
+        return retrieval_results(kwargs)
+
+    async def retrieve_and_generate(self, **kwargs):
+        await asyncio.sleep(self.latencies.retrieve + self.latencies.generate)
+        return {
+            "sessionId": kwargs.get("sessionId") or "kb-session",
+            "output": {"text": "No appointment."},
+        }
+
+    async def converse(self, **kwargs):
+        await asyncio.sleep(self.latencies.generate)
+        return generated_answer()
+
+
+def question_event(session_id, text):
+    return {
+        "sessionId": session_id,
+        "inputMode": "Text",
+        "inputTranscript": text,
+        "sessionState": {
+            "sessionAttributes": {},
+            "intent": {"name": "FallbackIntent", "state": "InProgress"},
+        },
+        "transcriptions": [{"transcription": text}],
+    }
+
+
+def install_clients(variant, latencies):
+    blocking = StubBedrock(latencies)
+    lambda_orchestrator.clients.clear()
+    lambda_orchestrator.clients.update(
+        {
+            "bedrock-agent-runtime": blocking,
+            "bedrock-runtime": blocking,
+            "conversation_table": StubTable(latencies),
+        }
+    )
+    lambda_orchestrator.session_stores.clear()
+    async_orchestrator.async_clients.clear()
+    if variant == "async-native":
+        native = AsyncStubBedrock(latencies)
+        async_orchestrator.async_clients.update(
+            {"bedrock-agent-runtime": native, "bedrock-runtime": native}
+        )
+    if variant == "sync":
+        return lambda_orchestrator.lambda_handler
+    return async_orchestrator.lambda_handler
+
+
+def run_variant(variant, compression, latencies, args):
+    lambda_orchestrator.CONTEXT_COMPRESSION["enabled"] = compression
+    handler = install_clients(variant, latencies)
+    samples = []
+    for session in range(args.sessions):
+        session_id = f"benchmark-{variant}-{compression}-{session}"
+        for turn in range(args.turns):
+            event = question_event(session_id, QUESTIONS[turn % len(QUESTIONS)])
+            started = time.perf_counter()
+            # Metrics go to stdout as EMF lines; keep them out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                handler(event, None)
+            samples.append((time.perf_counter() - started) * 1000)
+            time.sleep(args.think_seconds)
+    # Finish the last deferred session write
+    async_orchestrator.get_event_loop().run_until_complete(
+        async_orchestrator.drain()
+    )
+    return samples
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[max(int(len(samples) * fraction) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare sync and asyncio orchestrator handler latency"
+    )
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--think-seconds", type=float, default=0.05)
+    parser.add_argument("--session-read-ms", type=float, default=10)
+    parser.add_argument("--session-write-ms", type=float, default=15)
+    parser.add_argument("--retrieve-ms", type=float, default=200)
+    parser.add_argument("--generate-ms", type=float, default=800)
+    args = parser.parse_args()
+    latencies = Latencies(args)
+
+    print(
+        f"{args.sessions} sessions x {args.turns} turns; stub latency ms: "
+        f"session read {args.session_read_ms:g}, write "
+        f"{args.session_write_ms:g}, retrieve {args.retrieve_ms:g}, "
+        f"generate {args.generate_ms:g}"
+    )
+    print(f"{'variant':<16} {'compression':<12} {'p50 ms':>8} {'p99 ms':>8}")
+    for compression in (False, True):
+        for variant in ("sync", "async-threaded", "async-native"):
+            samples = run_variant(variant, compression, latencies, args)
+            print(
+                f"{variant:<16} {'on' if compression else 'off':<12} "
+                f"{statistics.median(samples):8.0f} "
+                f"{percentile(samples, 0.99):8.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
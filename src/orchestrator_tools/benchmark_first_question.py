@@ -0,0 +1,196 @@
+"""
+First-question latency with and without the greeting prefetch.
+
+Each run starts a fresh interpreter, the same as a new execution
+environment, sends the greeting, waits while the greeting would play, and
+then asks the first question. Runs alternate between prefetch on and off
+and the report compares the median and p90 latency of both invocations.
+
+Usage:
+    python benchmark_first_question.py --question "When is the flu clinic open"
+    python benchmark_first_question.py --runs 20 --think-seconds 3 \\
+        --question "Do I need an appointment for a flu shot"
+    python benchmark_first_question.py --stub --retrieve-ms 250 \\
+        --question "Do I need an appointment for a flu shot"
+
+Needs AWS credentials and the orchestrator's environment variables
+(KBID, MODEL_ARN, DDB_Name, and optionally PREFETCH,
+CONTEXT_COMPRESSION, ...) set in the shell. Both modes use the PREFETCH
+settings from the shell apart from "enabled". Without opening_questions
+the question itself is prefetched, which measures the best case.
+
+With --stub, Bedrock and the conversation table are the fixed-latency
+stubs of benchmark_async.py instead, and no AWS access is needed. Context
+compression is on unless CONTEXT_COMPRESSION says otherwise, since only
+the Retrieve path reuses prefetched results. The stubs exist before the
+greeting, so client creation is not part of what the prefetch saves here.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmark_init import GREETING_EVENT, ORCHESTRATOR_DIR
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in the child interpreter; stdout carries the timings back as JSON
+CHILD_SCRIPT = """
+import json, sys, time
+import lambda_orchestrator
+greeting, question = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+stub = json.loads(sys.argv[4])
+if stub:
+    import types
+    from benchmark_async import StubBedrock, StubTable
+    latencies = types.SimpleNamespace(**stub)
+    bedrock = StubBedrock(latencies)
+    lambda_orchestrator.clients.update({
+        "bedrock-agent-runtime": bedrock,
+        "bedrock-runtime": bedrock,
+        "conversation_table": StubTable(latencies),
+    })
+started = time.perf_counter()
+lambda_orchestrator.lambda_handler(greeting, None)
+greeted = time.perf_counter()
+time.sleep(float(sys.argv[3]))
+asked = time.perf_counter()
+lambda_orchestrator.lambda_handler(question, None)
+answered = time.perf_counter()
+print(json.dumps({"greeting_ms": (greeted - started) * 1000,
+                  "question_ms": (answered - asked) * 1000}))
+"""
+
+
+def question_event(session_id, text):
+    return {
+        "sessionId": session_id,
+        "inputMode": "Text",
+        "inputTranscript": text,
+        "sessionState": {
+            "sessionAttributes": {},
+            "intent": {"name": "FallbackIntent", "state": "InProgress"},
+        },
+        "transcriptions": [{"transcription": text}],
+    }
+
+
+def stub_environment(env):
+    env.setdefault("KBID", "benchmark-kb")
+    env.setdefault("MODEL_ARN", "benchmark-model")
+    env.setdefault("DDB_Name", "benchmark-table")
+    env.setdefault("CONTEXT_COMPRESSION", json.dumps({"enabled": True}))
+    env["PYTHONPATH"] += os.pathsep + TOOLS_DIR
+
+
+def run_once(python, enabled, question, think_seconds, run, stub=None):
+    settings = json.loads(os.environ.get("PREFETCH", "{}"))
+    settings["enabled"] = enabled
+    settings.setdefault("opening_questions", [question])
+    env = dict(os.environ, PREFETCH=json.dumps(settings))
+    env["PYTHONPATH"] = os.path.abspath(ORCHESTRATOR_DIR)
+    if stub:
+        stub_environment(env)
+    session_id = f"benchmark-{run}-{'prefetch' if enabled else 'cold'}"
+    result = subprocess.run(
+        [
+            python,
+            "-c",
+            CHILD_SCRIPT,
+            json.dumps({**GREETING_EVENT, "sessionId": session_id}),
+            json.dumps(question_event(session_id, question)),
+            str(think_seconds),
+            json.dumps(stub),
+        ],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Orchestrator run failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.9) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare first-question latency with greeting prefetch"
+    )
+    parser.add_argument("--question", required=True)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--think-seconds",
+        type=float,
+        default=2.0,
+        help="pause between greeting and question",
+    )
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument(
+        "--stub",
+        action="store_true",
+        help="use fixed-latency stub clients instead of AWS",
+    )
+    parser.add_argument("--session-read-ms", type=float, default=10)
+    parser.add_argument("--session-write-ms", type=float, default=15)
+    parser.add_argument("--retrieve-ms", type=float, default=200)
+    parser.add_argument("--generate-ms", type=float, default=800)
+    args = parser.parse_args()
+    stub = None
+    if args.stub:
+        stub = {
+            "session_read": args.session_read_ms / 1000,
+            "session_write": args.session_write_ms / 1000,
+            "retrieve": args.retrieve_ms / 1000,
+            "generate": args.generate_ms / 1000,
+        }
+
+    results = {True: [], False: []}
+    for run in range(args.runs):
+        for enabled in (False, True):
+            results[enabled].append(
+                run_once(
+                    args.python,
+                    enabled,
+                    args.question,
+                    args.think_seconds,
+                    run,
+                    stub,
+                )
+            )
+
+    print(f"runs per mode: {args.runs}, think time {args.think_seconds} s")
+    if stub:
+        print(
+            f"stub latency ms: session read {args.session_read_ms:g}, write "
+            f"{args.session_write_ms:g}, retrieve {args.retrieve_ms:g}, "
+            f"generate {args.generate_ms:g}"
+        )
+    print(
+        f"{'prefetch':<9} {'greeting p50/p90 ms':>20} {'question p50/p90 ms':>20}"
+    )
+    for enabled, label in ((False, "off"), (True, "on")):
+        greeting = summarize([r["greeting_ms"] for r in results[enabled]])
+        question = summarize([r["question_ms"] for r in results[enabled]])
+        print(
+            f"{label:<9} {greeting[0]:10.0f}/{greeting[1]:<9.0f} "
+            f"{question[0]:10.0f}/{question[1]:<9.0f}"
+        )
+    added = [
+        on["greeting_ms"] - off["greeting_ms"]
+        for on, off in zip(results[True], results[False])
+    ]
+    print(
+        f"greeting latency added by prefetch p50/p90 ms: "
+        f"{summarize(added)[0]:.0f}/{summarize(added)[1]:.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Cold start benchmark for the orchestrator Lambda.
+
+Each run starts a fresh interpreter with -X importtime, imports
+lambda_orchestrator, and invokes lambda_handler once, the same work an
+execution environment does for the first caller. Reports the median init
+(module import) and first-invoke durations across runs, and the modules
+that cost the most import time.
+
+Usage:
+    python benchmark_init.py
+    python benchmark_init.py --runs 20 --top 15 --python python3.12
+    python benchmark_init.py --event lex_event.json
+
+The default event is a greeting, which needs no AWS access. Events that
+reach Bedrock or DynamoDB need credentials and the orchestrator's
+environment variables (KBID, MODEL_ARN, DDB_Name) set in the shell.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ORCHESTRATOR_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "lambda_orchestrator"
+)
+
+GREETING_EVENT = {
+    "sessionId": "benchmark-session",
+    "inputTranscript": "hello",
+    "sessionState": {
+        "sessionAttributes": {},
+        "intent": {"name": "greeting_intent", "state": "InProgress"},
+    },
+    "transcriptions": [{"transcription": "hello"}],
+}
+
+# Runs in the child interpreter; stdout carries the timings back as JSON
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import lambda_orchestrator
+imported = time.perf_counter()
+lambda_orchestrator.lambda_handler(json.loads(sys.argv[1]), None)
+invoked = time.perf_counter()
+print(json.dumps({"init_ms": (imported - started) * 1000,
+                  "invoke_ms": (invoked - imported) * 1000}))
+"""
+
+
+def parse_importtime(stderr):
+    """Map module name to (self_us, cumulative_us) from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_once(python, event):
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env.setdefault("KBID", "benchmark")
+    env.setdefault("MODEL_ARN", "benchmark")
+    env.setdefault("DDB_Name", "benchmark")
+    env["PYTHONPATH"] = os.path.abspath(ORCHESTRATOR_DIR)
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", CHILD_SCRIPT, json.dumps(event)],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Orchestrator run failed:\n{result.stderr}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["modules"] = parse_importtime(result.stderr)
+    return timings
+
+
+def summarize(runs, top):
+    module_names = set().union(*(run["modules"] for run in runs))
+    modules = []
+    for name in module_names:
+        samples = [
+            run["modules"][name] for run in runs if name in run["modules"]
+        ]
+        modules.append(
+            {
+                "module": name,
+                "self_ms": statistics.median(s[0] for s in samples) / 1000,
+                "cumulative_ms": statistics.median(s[1] for s in samples)
+                / 1000,
+            }
+        )
+    modules.sort(key=lambda m: m["self_ms"], reverse=True)
+    return {
+        "runs": len(runs),
+        "init_ms": statistics.median(run["init_ms"] for run in runs),
+        "invoke_ms": statistics.median(run["invoke_ms"] for run in runs),
+        "modules_imported": len(module_names),
+        "top_modules": modules[:top],
+    }
+
+
+def print_report(summary):
+    print(f"runs:              {summary['runs']}")
+    print(f"init (import):     {summary['init_ms']:8.1f} ms (median)")
+    print(f"first invoke:      {summary['invoke_ms']:8.1f} ms (median)")
+    print(f"modules imported:  {summary['modules_imported']}")
+    print()
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for module in summary["top_modules"]:
+        print(
+            f"{module['self_ms']:9.2f} {module['cumulative_ms']:9.2f}  "
+            f"{module['module']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure orchestrator init time in fresh interpreters"
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--python", default=sys.executable, help="interpreter to benchmark"
+    )
+    parser.add_argument("--event", help="Lex event JSON file to invoke with")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args()
+
+    event = GREETING_EVENT
+    if args.event:
+        with open(args.event) as f:
+            event = json.load(f)
+
+    summary = summarize(
+        [run_once(args.python, event) for _ in range(args.runs)], args.top
+    )
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_report(summary)
+
+
+if __name__ == "__main__":
+    main()
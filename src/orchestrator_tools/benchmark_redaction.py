@@ -0,0 +1,152 @@
+"""
+Per-turn cost of PII redaction in the orchestrator.
+
+Times lambda_orchestrator.redact_event on Lex events built from a mix of
+plain questions and questions carrying phone numbers, dates of birth,
+SSNs and Medicaid ids, plus the log filter on the debug dump of each
+event. Each sample is one turn, so the percentiles are what a turn pays.
+
+Usage:
+    python benchmark_redaction.py
+    python benchmark_redaction.py --turns 50000 --pii-share 0.3 \\
+        --budget-ms 0.5
+
+Exits with status 1 if the p99 of a turn exceeds --budget-ms. Needs no
+AWS access.
+"""
+
+import argparse
+import copy
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ORCHESTRATOR_DIR = os.path.join(TOOLS_DIR, os.pardir, "lambda_orchestrator")
+sys.path.insert(0, os.path.abspath(ORCHESTRATOR_DIR))
+
+os.environ.setdefault("KBID", "benchmark-kb")
+os.environ.setdefault("MODEL_ARN", "benchmark-model")
+
+import lambda_orchestrator  # noqa: E402
+import metrics  # noqa: E402
+import redaction  # noqa: E402
+
+QUESTIONS = [
+    "Do I need an appointment for a flu shot",
+    "Which clinics give the shot on weekends and how late are they open",
+    "Hi, I'm calling to ask whether my daughter can get the flu shot at "
+    "the Main Street clinic this Saturday morning",
+    "Where do I apply for WIC",
+    "Is the COVID booster covered for people over 65",
+]
+
+PII_QUESTIONS = [
+    "My number is 555-201-3344, can someone call me back about WIC",
+    "I was born March 14th, 1985, am I due for a tetanus shot",
+    "My Medicaid ID is AB12345C, does it cover the dentist",
+    "Call me at (555) 201 3344 about my son's records, DOB 04/02/2016",
+    "My social is 123-45-6789 and I need my vaccine record",
+]
+
+
+def event(text):
+    return {
+        "sessionId": "benchmark-session",
+        "inputMode": "Text",
+        "inputTranscript": text,
+        "transcriptions": [{"transcription": text}],
+        "sessionState": {
+            "sessionAttributes": {"customer_address": "+15552013344"},
+            "intent": {"name": "FallbackIntent"},
+        },
+    }
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[max(int(len(samples) * fraction) - 1, 0)]
+
+
+def time_turns(events, redact, log_filter):
+    """Microseconds per turn: redact the event, then filter its log line."""
+    samples = []
+    for lex_event in events:
+        started = time.perf_counter_ns()
+        redact(lex_event)
+        record = logging.LogRecord(
+            "benchmark",
+            logging.DEBUG,
+            __file__,
+            0,
+            "Lex event info = %s",
+            (json.dumps(lex_event),),
+            None,
+        )
+        log_filter.filter(record)
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure PII redaction cost per orchestrator turn"
+    )
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--pii-share", type=float, default=0.2)
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [
+        rng.choice(
+            PII_QUESTIONS if rng.random() < args.pii_share else QUESTIONS
+        )
+        for _ in range(args.turns)
+    ]
+    events = [event(text) for text in texts]
+    log_filter = redaction.RedactingFilter(lambda_orchestrator.redactor)
+    # RedactedEntities records would swamp the report
+    metrics.emit = lambda *args, **kwargs: None
+
+    started = time.perf_counter_ns()
+    redaction.Redactor(lambda_orchestrator.REDACTION)
+    compile_us = (time.perf_counter_ns() - started) / 1000
+    samples = time_turns(
+        copy.deepcopy(events), lambda_orchestrator.redact_event, log_filter
+    )
+    # json.dumps and the log record alone, without the redactor
+    baseline = time_turns(
+        copy.deepcopy(events), lambda lex_event: None, logging.Filter()
+    )
+
+    print(
+        f"{args.turns} turns, {args.pii_share:.0%} with PII; entities "
+        f"{', '.join(lambda_orchestrator.REDACTION['entities'])}"
+    )
+    print(f"pattern compile (once per environment): {compile_us:.0f} us")
+    print(f"{'':<22} {'mean us':>8} {'p50 us':>8} {'p99 us':>8}")
+    for name, values in (
+        ("turn with redaction", samples),
+        ("without", baseline),
+    ):
+        print(
+            f"{name:<22} {statistics.fmean(values):8.1f} "
+            f"{percentile(values, 0.5):8.1f} {percentile(values, 0.99):8.1f}"
+        )
+    added = [with_ - without for with_, without in zip(samples, baseline)]
+    p99_ms = percentile(added, 0.99) / 1000
+    print(
+        f"added by redaction: p99 {p99_ms:.3f} ms (budget {args.budget_ms} ms)"
+    )
+    if p99_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Readers for Lex V2 conversation logs.
+
+Accepts any mix of:
+    - JSON lines, one conversation log record per line (S3 text logs)
+    - CloudWatch Logs exports, either JSON lines or the output of
+      `aws logs filter-log-events`, where each record is wrapped in an
+      event whose "message" holds the record as a JSON string
+and yields one turn per caller utterance.
+"""
+
+import glob
+import json
+import re
+
+
+def iter_records(path):
+    with open(path) as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("{") and '"events"' in stripped[:200]:
+        # aws logs filter-log-events output
+        for event in json.loads(text)["events"]:
+            yield json.loads(event["message"])
+        return
+    if stripped.startswith("["):
+        yield from json.loads(text)
+        return
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if isinstance(record.get("message"), str):
+            record = json.loads(record["message"])
+        yield record
+
+
+def to_turn(record):
+    session_state = record.get("sessionState") or {}
+    intent = session_state.get("intent") or {}
+    request_attributes = record.get("requestAttributes") or {}
+    return {
+        "session_id": record.get("sessionId"),
+        "request_id": record.get("requestId"),
+        "timestamp": record.get("timestamp"),
+        "transcript": (record.get("inputTranscript") or "").strip(),
+        "intent": intent.get("name"),
+        "missed": bool(record.get("missedUtterance", False)),
+        "input_mode": record.get("inputMode"),
+        "session_attributes": session_state.get("sessionAttributes") or {},
+        "request_attributes": request_attributes,
+    }
+
+
+def load_turns(patterns):
+    """Turns with a non-empty transcript from every file matching patterns."""
+    paths = sorted({path for p in patterns for path in glob.glob(p)})
+    if not paths:
+        raise FileNotFoundError(f"No conversation logs match {patterns}")
+    for path in paths:
+        for record in iter_records(path):
+            turn = to_turn(record)
+            if turn["transcript"]:
+                yield turn
+
+
+# Words that carry no meaning for grouping questions together
+STOPWORDS = frozenset("""
+    a an and are as at be can could do does for from get have how i if in
+    is it me my of on or please should so tell that the there this to was
+    we what when where which who why will with would you your um uh like
+    just know need want hi hello hey ok okay
+    """.split())
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def content_words(text):
+    words = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        word = word.strip("'")
+        if not word or word in STOPWORDS:
+            continue
+        # Crude plural folding, enough to group "shots" with "shot"
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
@@ -0,0 +1,254 @@
+"""
+FAQ intents generated from conversation logs.
+
+Frequent questions get their own Lex intent with a curated answer, which
+the orchestrator serves from an in-process table without calling Bedrock.
+
+Usage:
+    # Add the most frequent question clusters to the curated answers file
+    python generate_faq_intents.py mine --logs 'logs/*.jsonl' --top 25
+
+    # Regenerate the Lex intents and the orchestrator answer table
+    python generate_faq_intents.py build
+
+    # Both in one step
+    python generate_faq_intents.py refresh --logs 'logs/*.jsonl'
+
+Mining only proposes intents. An entry is built once someone fills in its
+answer in the curated file (faq_curated_answers.yaml by default, see
+faq_curated_answers.example.yaml). Entries keep their name and answer
+across later mining runs, and new utterances from the logs are added to
+them. Redeploy the stack after build to update the bot locale.
+"""
+
+import argparse
+import collections
+import json
+import os
+import re
+
+import yaml
+
+from conversation_logs import content_words, load_turns
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(TOOLS_DIR, os.pardir, os.pardir))
+
+DEFAULT_CURATED_PATH = os.path.join(TOOLS_DIR, "faq_curated_answers.yaml")
+DEFAULT_INTENTS_PATH = os.path.join(REPO_DIR, "cdk", "faq_intents.json")
+DEFAULT_ANSWERS_PATH = os.path.join(
+    REPO_DIR, "src", "lambda_orchestrator", "faq_answers.json"
+)
+
+# Only questions that went to the knowledge base are FAQ candidates
+SOURCE_INTENTS = {"FallbackIntent"}
+
+# Two questions belong together when their content words overlap this much
+SIMILARITY_THRESHOLD = 0.6
+MAX_UTTERANCES = 20
+MIN_CLUSTER_SIZE = 3
+
+# Lex sample utterances allow letters, digits, spaces and a few marks
+UTTERANCE_DISALLOWED = re.compile(r"[^A-Za-z0-9 '\-.,]")
+# Utterances already claimed by hand-written intents
+RESERVED_UTTERANCES = {"hi", "hello"}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def clean_utterance(text):
+    text = UTTERANCE_DISALLOWED.sub(" ", text)
+    return " ".join(text.split()).rstrip(".,").lower()
+
+
+def cluster_questions(questions, threshold=SIMILARITY_THRESHOLD):
+    """Group questions whose content words overlap, most frequent first.
+
+    Each cluster is keyed by its most frequent question; a question joins
+    the first cluster whose key it matches by Jaccard similarity.
+    """
+    counts = collections.Counter(
+        clean_utterance(q) for q in questions if clean_utterance(q)
+    )
+    clusters = []
+    for utterance, count in counts.most_common():
+        words = frozenset(content_words(utterance))
+        if not words:
+            continue
+        for cluster in clusters:
+            if jaccard(words, cluster["words"]) >= threshold:
+                cluster["utterances"][utterance] = count
+                cluster["occurrences"] += count
+                break
+        else:
+            clusters.append(
+                {
+                    "words": words,
+                    "utterances": {utterance: count},
+                    "occurrences": count,
+                }
+            )
+    clusters.sort(key=lambda c: c["occurrences"], reverse=True)
+    return clusters
+
+
+def intent_name(utterance, taken):
+    words = [w for w in content_words(utterance) if w.isalnum()][:4]
+    base = "Faq" + "".join(w.capitalize() for w in words)
+    name, n = base, 2
+    while name in taken:
+        name, n = f"{base}{n}", n + 1
+    return name[:100]
+
+
+def merge_clusters(entries, clusters, top, min_size=MIN_CLUSTER_SIZE):
+    """Fold mined clusters into the curated entries, adding new ones."""
+    taken = {entry["intent"] for entry in entries}
+    added = 0
+    for cluster in clusters:
+        if cluster["occurrences"] < min_size:
+            break
+        utterances = sorted(
+            cluster["utterances"], key=cluster["utterances"].get, reverse=True
+        )
+        match = next(
+            (
+                entry
+                for entry in entries
+                if any(
+                    jaccard(
+                        cluster["words"], frozenset(content_words(utterance))
+                    )
+                    >= SIMILARITY_THRESHOLD
+                    for utterance in entry["utterances"]
+                )
+            ),
+            None,
+        )
+        if match is not None:
+            for utterance in utterances:
+                if (
+                    utterance not in match["utterances"]
+                    and len(match["utterances"]) < MAX_UTTERANCES
+                ):
+                    match["utterances"].append(utterance)
+            match["occurrences"] = cluster["occurrences"]
+        elif added < top:
+            name = intent_name(utterances[0], taken)
+            taken.add(name)
+            entries.append(
+                {
+                    "intent": name,
+                    "answer": "",
+                    "occurrences": cluster["occurrences"],
+                    "utterances": utterances[:MAX_UTTERANCES],
+                }
+            )
+            added += 1
+    return added
+
+
+def build_outputs(entries):
+    """Lex intent definitions and the answer table for answered entries."""
+    intents, answers = [], {}
+    seen_utterances = set(RESERVED_UTTERANCES)
+    for entry in entries:
+        answer = (entry.get("answer") or "").strip()
+        if not answer:
+            continue
+        utterances = []
+        for utterance in entry["utterances"]:
+            utterance = clean_utterance(utterance)
+            # Lex rejects a locale where two intents share an utterance
+            if utterance and utterance not in seen_utterances:
+                seen_utterances.add(utterance)
+                utterances.append(utterance)
+        if not utterances:
+            continue
+        intents.append(
+            {
+                "Name": entry["intent"],
+                "Description": f"FAQ: {utterances[0]}"[:200],
+                "SampleUtterances": [{"Utterance": u} for u in utterances],
+                "FulfillmentCodeHook": {"Enabled": True},
+            }
+        )
+        answers[entry["intent"]] = answer
+    return intents, answers
+
+
+def load_curated(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return (yaml.safe_load(f) or {}).get("faqs") or []
+
+
+def save_curated(path, entries):
+    with open(path, "w") as f:
+        yaml.safe_dump(
+            {"faqs": entries}, f, sort_keys=False, allow_unicode=True, width=80
+        )
+
+
+def write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def mine(args):
+    questions = [
+        turn["transcript"]
+        for turn in load_turns(args.logs)
+        if turn["intent"] in SOURCE_INTENTS
+    ]
+    entries = load_curated(args.curated)
+    added = merge_clusters(
+        entries, cluster_questions(questions), args.top, args.min_size
+    )
+    save_curated(args.curated, entries)
+    unanswered = sum(1 for entry in entries if not entry.get("answer"))
+    print(
+        f"{len(questions)} questions, {added} new FAQ candidates, "
+        f"{unanswered} awaiting an answer in {args.curated}"
+    )
+
+
+def build(args):
+    intents, answers = build_outputs(load_curated(args.curated))
+    write_json(args.intents, intents)
+    write_json(args.answers, answers)
+    print(f"Wrote {len(intents)} intents to {args.intents}")
+    print(f"Wrote {len(answers)} answers to {args.answers}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Lex FAQ intents")
+    parser.add_argument("--curated", default=DEFAULT_CURATED_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ("mine", "refresh"):
+        sub = subparsers.add_parser(command)
+        sub.add_argument(
+            "--logs", nargs="+", required=True, help="conversation log files"
+        )
+        sub.add_argument("--top", type=int, default=25)
+        sub.add_argument("--min-size", type=int, default=MIN_CLUSTER_SIZE)
+    for command in ("build", "refresh"):
+        sub = subparsers.choices.get(command) or subparsers.add_parser(command)
+        sub.add_argument("--intents", default=DEFAULT_INTENTS_PATH)
+        sub.add_argument("--answers", default=DEFAULT_ANSWERS_PATH)
+    args = parser.parse_args()
+
+    if args.command in ("mine", "refresh"):
+        mine(args)
+    if args.command in ("build", "refresh"):
+        build(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,620 @@
+"""
+Replay logged FallbackIntent questions against the knowledge base.
+
+Capturing calls Retrieve once per logged question and saves the results,
+so the reports below run offline, repeatably, and without Bedrock cost.
+
+Usage:
+    # Retrieve for every FallbackIntent turn in the logs (needs AWS access)
+    python replay.py capture --logs 'logs/*.jsonl' --kb-id KBID \\
+        --output replay.jsonl --number-of-results 10
+
+    # Context tokens saved by compression, and what it costs in latency
+    python replay.py compression replay.jsonl
+    python replay.py compression replay.jsonl --token-budget 600 800 1200
+
+    # Also generate with full and compressed context and compare the
+    # model's own input token counts and latency (needs AWS access)
+    python replay.py compression replay.jsonl --generate \\
+        --model-arn arn:aws:bedrock:us-east-1::foundation-model/...
+
+    # Adaptive retrieval settings against fixed ones: Retrieve latency and
+    # recall of the expected sources, plus generated answer latency and
+    # overlap with reference answers with --generate (needs AWS access)
+    python replay.py retrieval --questions labeled.jsonl --kb-id KBID
+    python replay.py retrieval --logs 'logs/*.jsonl' --kb-id KBID \
+        --settings adaptive.json --generate --model-arn ...
+
+    # The most common first questions of a session, for
+    # prefetch.opening_questions
+    python replay.py openings --logs 'logs/*.jsonl' --top 5
+
+    # Cache and precomputed answer hit rates with and without transcript
+    # normalization (normalizer.py), and the most common rewrites
+    python replay.py normalization --logs 'logs/*.jsonl'
+    python replay.py normalization --logs 'logs/*.jsonl' \
+        --settings normalization.json --top-questions 500
+
+Each captured line holds the question, its channel, the Retrieve results
+and the Retrieve latency. Labeled questions are JSON lines of
+{"query": ..., "relevant": [...], "answer": ...}, where relevant lists
+substrings of the source URIs (or passages) that answer the question,
+and channel and answer are optional.
+"""
+
+import argparse
+import collections
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ORCHESTRATOR_DIR = os.path.join(TOOLS_DIR, os.pardir, "lambda_orchestrator")
+sys.path.insert(0, os.path.abspath(ORCHESTRATOR_DIR))
+
+import adaptive_retrieval  # noqa: E402
+import channels  # noqa: E402
+import context_compression  # noqa: E402
+import normalizer  # noqa: E402
+import prefetch  # noqa: E402
+import redaction  # noqa: E402
+import smalltalk  # noqa: E402
+from conversation_logs import load_turns  # noqa: E402
+
+
+def turn_channel(turn):
+    """Channel of a logged turn, detected as the orchestrator would."""
+    return channels.detect_channel(
+        {
+            "inputMode": turn["input_mode"],
+            "sessionState": {"sessionAttributes": turn["session_attributes"]},
+            "requestAttributes": turn["request_attributes"],
+        }
+    )
+
+
+def load_replay(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(samples, share):
+    samples = sorted(samples)
+    return samples[max(0, int(len(samples) * share) - 1)]
+
+
+def capture(args):
+    import boto3
+
+    client = boto3.client("bedrock-agent-runtime")
+    turns = [
+        t for t in load_turns(args.logs) if t["intent"] == "FallbackIntent"
+    ]
+    if args.limit:
+        turns = turns[: args.limit]
+    with open(args.output, "w") as f:
+        for turn in turns:
+            started = time.perf_counter()
+            response = client.retrieve(
+                knowledgeBaseId=args.kb_id,
+                retrievalQuery={"text": turn["transcript"]},
+                retrievalConfiguration={
+                    "vectorSearchConfiguration": {
+                        "numberOfResults": args.number_of_results
+                    }
+                },
+            )
+            record = {
+                "query": turn["transcript"],
+                "channel": turn_channel(turn),
+                "retrieve_ms": (time.perf_counter() - started) * 1000,
+                "retrievalResults": response["retrievalResults"],
+            }
+            f.write(json.dumps(record) + "\n")
+    print(f"Captured {len(turns)} turns to {args.output}")
+
+
+def compression_stats(records, settings):
+    stats = []
+    for record in records:
+        _, result = context_compression.compress(
+            record["retrievalResults"], settings
+        )
+        stats.append(result)
+    input_tokens = sum(s["input_tokens"] for s in stats)
+    output_tokens = sum(s["output_tokens"] for s in stats)
+    latencies = [s["compression_ms"] for s in stats]
+    return {
+        "turns": len(stats),
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "savings": 1 - output_tokens / input_tokens if input_tokens else 0.0,
+        "passages_in": statistics.mean(s["passages_in"] for s in stats),
+        "passages_out": statistics.mean(s["passages_out"] for s in stats),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def generate(client, model_arn, record, passages):
+    profile = channels.CHANNEL_PROFILES[record["channel"]]
+    prompt = channels.PROMPT_TEMPLATE.format(style=profile["style"]).replace(
+        "$search_results$", context_compression.format_context(passages)
+    )
+    started = time.perf_counter()
+    response = client.converse(
+        modelId=model_arn,
+        system=[{"text": prompt}],
+        messages=[{"role": "user", "content": [{"text": record["query"]}]}],
+        inferenceConfig={"maxTokens": profile["max_tokens"]},
+    )
+    return {
+        "input_tokens": response["usage"]["inputTokens"],
+        "latency_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+def generation_stats(records, settings, model_arn):
+    """Generate each turn with full and with compressed context."""
+    import boto3
+
+    client = boto3.client("bedrock-runtime")
+    full, compressed = [], []
+    for record in records:
+        passages = context_compression.to_passages(record["retrievalResults"])
+        full.append(generate(client, model_arn, record, passages))
+        passages, _ = context_compression.compress(
+            record["retrievalResults"], settings
+        )
+        compressed.append(generate(client, model_arn, record, passages))
+    return {
+        name: {
+            "input_tokens": sum(r["input_tokens"] for r in results),
+            "p50_ms": statistics.median(r["latency_ms"] for r in results),
+            "p99_ms": percentile([r["latency_ms"] for r in results], 0.99),
+        }
+        for name, results in (("full", full), ("compressed", compressed))
+    }
+
+
+def compression(args):
+    records = load_replay(args.replay)
+    settings = dict(context_compression.DEFAULT_COMPRESSION)
+    if args.settings:
+        with open(args.settings) as f:
+            settings.update(json.load(f))
+    retrieve = [r["retrieve_ms"] for r in records if "retrieve_ms" in r]
+    if retrieve:
+        print(
+            f"Retrieve latency: p50 {statistics.median(retrieve):.0f} ms, "
+            f"p99 {percentile(retrieve, 0.99):.0f} ms"
+        )
+    print(
+        f"{'budget':>7} {'turns':>6} {'tokens in':>10} {'tokens out':>11} "
+        f"{'saved':>6} {'passages':>9} {'p50 ms':>7} {'p99 ms':>7}"
+    )
+    for budget in args.token_budget or [settings["token_budget"]]:
+        result = compression_stats(
+            records, {**settings, "token_budget": budget}
+        )
+        print(
+            f"{budget:7d} {result['turns']:6d} {result['input_tokens']:10d} "
+            f"{result['output_tokens']:11d} {result['savings']:6.1%} "
+            f"{result['passages_in']:4.1f}>{result['passages_out']:<4.1f} "
+            f"{result['p50_ms']:7.2f} {result['p99_ms']:7.2f}"
+        )
+
+    if args.generate:
+        budget = (args.token_budget or [settings["token_budget"]])[-1]
+        results = generation_stats(
+            records, {**settings, "token_budget": budget}, args.model_arn
+        )
+        print(f"Generation with token budget {budget}:")
+        for name, result in results.items():
+            print(
+                f"  {name:<10} model input tokens {result['input_tokens']:8d}  "
+                f"p50 {result['p50_ms']:6.0f} ms  p99 {result['p99_ms']:6.0f} ms"
+            )
+
+
+def load_questions(args):
+    if args.questions:
+        return load_replay(args.questions)
+    return [
+        {"query": t["transcript"], "channel": turn_channel(t)}
+        for t in load_turns(args.logs)
+        if t["intent"] == "FallbackIntent"
+    ]
+
+
+def fixed(client, kb_id, query, profile, settings):
+    return {"numberOfResults": profile["number_of_results"]}
+
+
+def fixed_hybrid(client, kb_id, query, profile, settings):
+    return adaptive_retrieval.vector_search_configuration(
+        profile["number_of_results"], adaptive_retrieval.HYBRID
+    )
+
+
+def adaptive(client, kb_id, query, profile, settings):
+    """The orchestrator's per-query choice, probe included."""
+    number, search_type = adaptive_retrieval.query_settings(
+        query, profile, settings
+    )
+    if settings["probe_results"]:
+        probe = client.retrieve(
+            knowledgeBaseId=kb_id,
+            retrievalQuery={"text": query},
+            retrievalConfiguration={
+                "vectorSearchConfiguration": (
+                    adaptive_retrieval.vector_search_configuration(
+                        settings["probe_results"], search_type
+                    )
+                )
+            },
+        )["retrievalResults"]
+        number, search_type = adaptive_retrieval.probe_settings(
+            [result["score"] for result in probe],
+            number,
+            search_type,
+            settings,
+        )
+    return adaptive_retrieval.vector_search_configuration(number, search_type)
+
+
+STRATEGIES = {
+    "fixed": fixed,
+    "fixed-hybrid": fixed_hybrid,
+    "adaptive": adaptive,
+}
+
+
+def relevant_rank(results, relevant):
+    """1-based rank of the first relevant result, or None."""
+    needles = [r.lower() for r in relevant]
+    for rank, result in enumerate(results, 1):
+        uri = ((result.get("location") or {}).get("s3Location") or {}).get(
+            "uri", ""
+        )
+        haystack = f"{uri} {result['content']['text']}".lower()
+        if any(needle in haystack for needle in needles):
+            return rank
+    return None
+
+
+def token_f1(answer, reference):
+    answer_words = re.findall(r"\w+", answer.lower())
+    reference_words = re.findall(r"\w+", reference.lower())
+    common = sum(
+        (
+            collections.Counter(answer_words)
+            & collections.Counter(reference_words)
+        ).values()
+    )
+    if not common:
+        return 0.0
+    precision = common / len(answer_words)
+    recall = common / len(reference_words)
+    return 2 * precision * recall / (precision + recall)
+
+
+def evaluate_strategy(agent_runtime, args, questions, strategy, settings):
+    rows = []
+    for question in questions:
+        profile = channels.CHANNEL_PROFILES[question.get("channel", "chat")]
+        started = time.perf_counter()
+        vector_search = strategy(
+            agent_runtime, args.kb_id, question["query"], profile, settings
+        )
+        results = agent_runtime.retrieve(
+            knowledgeBaseId=args.kb_id,
+            retrievalQuery={"text": question["query"]},
+            retrievalConfiguration={"vectorSearchConfiguration": vector_search},
+        )["retrievalResults"]
+        row = {
+            "results": vector_search["numberOfResults"],
+            "hybrid": vector_search.get("overrideSearchType")
+            == adaptive_retrieval.HYBRID,
+            "retrieve_ms": (time.perf_counter() - started) * 1000,
+        }
+        if question.get("relevant"):
+            row["rank"] = relevant_rank(results, question["relevant"])
+        if args.generate:
+            started = time.perf_counter()
+            response = agent_runtime.retrieve_and_generate(
+                input={"text": question["query"]},
+                retrieveAndGenerateConfiguration={
+                    "type": "KNOWLEDGE_BASE",
+                    "knowledgeBaseConfiguration": {
+                        "knowledgeBaseId": args.kb_id,
+                        "modelArn": args.model_arn,
+                        **channels.generation_configuration(
+                            profile, vector_search
+                        ),
+                    },
+                },
+            )
+            row["generate_ms"] = (time.perf_counter() - started) * 1000
+            if question.get("answer"):
+                row["answer_f1"] = token_f1(
+                    response["output"]["text"], question["answer"]
+                )
+        rows.append(row)
+    return rows
+
+
+def summarize_retrieval(rows):
+    labeled = [row for row in rows if "rank" in row]
+    latencies = [row["retrieve_ms"] for row in rows]
+    summary = {
+        "questions": len(rows),
+        "mean_results": statistics.mean(row["results"] for row in rows),
+        "hybrid_share": sum(row["hybrid"] for row in rows) / len(rows),
+        "retrieve_p50_ms": statistics.median(latencies),
+        "retrieve_p99_ms": percentile(latencies, 0.99),
+        "recall": None,
+        "mrr": None,
+    }
+    if labeled:
+        summary["recall"] = sum(
+            row["rank"] is not None for row in labeled
+        ) / len(labeled)
+        summary["mrr"] = statistics.mean(
+            1 / row["rank"] if row["rank"] else 0.0 for row in labeled
+        )
+    generated = [row["generate_ms"] for row in rows if "generate_ms" in row]
+    if generated:
+        summary["generate_p50_ms"] = statistics.median(generated)
+        summary["generate_p99_ms"] = percentile(generated, 0.99)
+    scored = [row["answer_f1"] for row in rows if "answer_f1" in row]
+    if scored:
+        summary["answer_f1"] = statistics.mean(scored)
+    return summary
+
+
+def retrieval(args):
+    import boto3
+
+    questions = load_questions(args)
+    settings = dict(adaptive_retrieval.DEFAULT_ADAPTIVE_RETRIEVAL)
+    if args.settings:
+        with open(args.settings) as f:
+            settings.update(json.load(f))
+    agent_runtime = boto3.client("bedrock-agent-runtime")
+    print(
+        f"{'strategy':<13} {'k':>5} {'hybrid':>7} {'p50 ms':>7} "
+        f"{'p99 ms':>7} {'recall':>7} {'MRR':>6}"
+    )
+    for name in args.strategies:
+        summary = summarize_retrieval(
+            evaluate_strategy(
+                agent_runtime, args, questions, STRATEGIES[name], settings
+            )
+        )
+        quality = "      -      -"
+        if summary["recall"] is not None:
+            quality = f"{summary['recall']:7.1%} {summary['mrr']:6.3f}"
+        line = (
+            f"{name:<13} {summary['mean_results']:5.1f} "
+            f"{summary['hybrid_share']:7.0%} {summary['retrieve_p50_ms']:7.0f} "
+            f"{summary['retrieve_p99_ms']:7.0f} {quality}"
+        )
+        if "generate_p50_ms" in summary:
+            line += (
+                f"  generate p50 {summary['generate_p50_ms']:.0f} ms, "
+                f"p99 {summary['generate_p99_ms']:.0f} ms"
+            )
+        if "answer_f1" in summary:
+            line += f", answer F1 {summary['answer_f1']:.3f}"
+        print(line)
+
+
+def opening_questions(turns):
+    """Counter of each session's first FallbackIntent question, normalized,
+    with the most common wording of each."""
+    first = {}
+    for turn in sorted(turns, key=lambda t: t["timestamp"] or ""):
+        if turn["intent"] == "FallbackIntent":
+            first.setdefault(turn["session_id"], turn["transcript"])
+    counts = collections.Counter()
+    wordings = collections.defaultdict(collections.Counter)
+    for transcript in first.values():
+        key = prefetch.normalize(transcript)
+        counts[key] += 1
+        wordings[key][transcript] += 1
+    return counts, {
+        key: wording.most_common(1)[0][0] for key, wording in wordings.items()
+    }
+
+
+def openings(args):
+    counts, wordings = opening_questions(list(load_turns(args.logs)))
+    sessions = sum(counts.values())
+    print(f"Sessions with a question: {sessions}")
+    top = counts.most_common(args.top)
+    for key, count in top:
+        print(f"  {count:5d} ({count / sessions:.1%})  {wordings[key]}")
+    print("\nprefetch:\n  opening_questions:")
+    for key, _ in top:
+        print(f"    - {json.dumps(wordings[key])}")
+
+
+def replayed_keys(turns, rewrite):
+    """(channel, cache key) of each FallbackIntent question in time order,
+    with the transcript rewritten as the orchestrator would before its
+    lookups. Small talk never reaches the caches."""
+    keys = []
+    for turn in sorted(turns, key=lambda t: t["timestamp"] or ""):
+        if turn["intent"] != "FallbackIntent":
+            continue
+        channel = turn_channel(turn)
+        text = rewrite(turn["transcript"], channel)
+        if smalltalk.classify(text):
+            continue
+        keys.append((channel, prefetch.normalize(text)))
+    return keys
+
+
+def hit_rates(keys, top_questions, min_count):
+    """Share of questions the retrieval cache has already seen (the shared
+    tier keeps every key of a knowledge base version) and share with a
+    precomputed answer, the top questions being those of the same logs."""
+    counts = collections.Counter(keys)
+    precomputed = {
+        key
+        for key, count in counts.most_common(top_questions)
+        if count >= min_count
+    }
+    seen = set()
+    cached = 0
+    for key in keys:
+        cached += key in seen
+        seen.add(key)
+    return {
+        "questions": len(keys),
+        "distinct": len(counts),
+        "cache_hits": cached / len(keys) if keys else 0.0,
+        "precomputed": (
+            sum(key in precomputed for key in keys) / len(keys) if keys else 0.0
+        ),
+    }
+
+
+def normalization_report(turns, settings, top_questions, min_count):
+    """Hit rates per channel without and with normalization, and how often
+    each rewrite happened."""
+    redactor = redaction.Redactor(redaction.DEFAULT_REDACTION)
+    rewriter = normalizer.Normalizer(settings)
+
+    def raw(text, channel):
+        return redactor.redact(text)
+
+    def normalized(text, channel):
+        if settings["enabled"] and channel in settings["channels"]:
+            text = rewriter.normalize(text)
+        return redactor.redact(text)
+
+    rewrites = collections.Counter()
+    for turn in turns:
+        if turn["intent"] == "FallbackIntent":
+            channel = turn_channel(turn)
+            before = raw(turn["transcript"], channel)
+            after = normalized(turn["transcript"], channel)
+            if after != before:
+                rewrites[(before, after)] += 1
+    raw_keys = replayed_keys(turns, raw)
+    normalized_keys = replayed_keys(turns, normalized)
+    rows = {}
+    for channel in [None] + sorted({c for c, _ in raw_keys}):
+        rows[channel or "all"] = [
+            hit_rates(
+                [key for c, key in keys if channel in (None, c)],
+                top_questions,
+                min_count,
+            )
+            for keys in (raw_keys, normalized_keys)
+        ]
+    return rows, rewrites
+
+
+def normalization(args):
+    settings = dict(normalizer.DEFAULT_NORMALIZATION)
+    if args.settings:
+        with open(args.settings) as f:
+            settings.update(json.load(f))
+    rows, rewrites = normalization_report(
+        list(load_turns(args.logs)),
+        settings,
+        args.top_questions,
+        args.min_count,
+    )
+    print(
+        f"{'channel':<8} {'questions':>9} {'distinct':>15} "
+        f"{'cache hits':>15} {'precomputed':>15}"
+    )
+    for channel, (before, after) in rows.items():
+        print(
+            f"{channel:<8} {before['questions']:9d} "
+            f"{before['distinct']:7d}>{after['distinct']:<7d} "
+            f"{before['cache_hits']:7.1%}>{after['cache_hits']:<7.1%} "
+            f"{before['precomputed']:7.1%}>{after['precomputed']:<7.1%}"
+        )
+    print(f"\nMost common rewrites ({sum(rewrites.values())} transcripts):")
+    for (before, after), count in rewrites.most_common(args.examples):
+        print(f"  {count:5d}  {before!r} -> {after!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged questions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    capture_parser = subparsers.add_parser("capture")
+    capture_parser.add_argument("--logs", nargs="+", required=True)
+    capture_parser.add_argument("--kb-id", required=True)
+    capture_parser.add_argument("--output", default="replay.jsonl")
+    capture_parser.add_argument("--number-of-results", type=int, default=10)
+    capture_parser.add_argument("--limit", type=int)
+
+    compression_parser = subparsers.add_parser("compression")
+    compression_parser.add_argument("replay", help="captured JSON lines")
+    compression_parser.add_argument("--token-budget", type=int, nargs="+")
+    compression_parser.add_argument(
+        "--settings", help="JSON file of context_compression overrides"
+    )
+    compression_parser.add_argument("--generate", action="store_true")
+    compression_parser.add_argument("--model-arn")
+
+    retrieval_parser = subparsers.add_parser("retrieval")
+    source = retrieval_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--questions", help="labeled JSON lines")
+    source.add_argument("--logs", nargs="+", help="conversation logs")
+    retrieval_parser.add_argument("--kb-id", required=True)
+    retrieval_parser.add_argument(
+        "--settings", help="JSON file of adaptive_retrieval overrides"
+    )
+    retrieval_parser.add_argument(
+        "--strategies",
+        nargs="+",
+        choices=sorted(STRATEGIES),
+        default=list(STRATEGIES),
+    )
+    retrieval_parser.add_argument("--generate", action="store_true")
+    retrieval_parser.add_argument("--model-arn")
+
+    openings_parser = subparsers.add_parser("openings")
+    openings_parser.add_argument("--logs", nargs="+", required=True)
+    openings_parser.add_argument("--top", type=int, default=5)
+
+    normalization_parser = subparsers.add_parser("normalization")
+    normalization_parser.add_argument("--logs", nargs="+", required=True)
+    normalization_parser.add_argument(
+        "--settings", help="JSON file of normalizer overrides"
+    )
+    normalization_parser.add_argument("--top-questions", type=int, default=500)
+    normalization_parser.add_argument("--min-count", type=int, default=3)
+    normalization_parser.add_argument("--examples", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "capture":
+        capture(args)
+        return
+    if args.command == "openings":
+        openings(args)
+        return
+    if args.command == "normalization":
+        normalization(args)
+        return
+    if args.generate and not args.model_arn:
+        parser.error("--generate needs --model-arn")
+    if args.command == "compression":
+        compression(args)
+    else:
+        retrieval(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Train and evaluate the orchestrator's small-talk classifier.
+
+Usage:
+    # Fit on the seed set and write src/lambda_orchestrator/smalltalk_model.json
+    python smalltalk_training.py train
+
+    # Cross-validated precision/recall, plus latency, on the seed set
+    python smalltalk_training.py evaluate
+    python smalltalk_training.py evaluate --test labeled.jsonl
+    python smalltalk_training.py evaluate --thresholds 0.8 0.9 0.95
+
+    # What share of real FallbackIntent turns would be short-circuited
+    python smalltalk_training.py evaluate --logs 'logs/*.jsonl'
+
+Training data is JSON lines of {"text": ..., "label": ...}, where label is
+"question" for anything the knowledge base should answer, or one of the
+small-talk labels in smalltalk.RESPONSES. The number to watch is
+"questions suppressed": real questions that would get a canned reply.
+"""
+
+import argparse
+import collections
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ORCHESTRATOR_DIR = os.path.join(TOOLS_DIR, os.pardir, "lambda_orchestrator")
+sys.path.insert(0, os.path.abspath(ORCHESTRATOR_DIR))
+
+import smalltalk  # noqa: E402
+from conversation_logs import load_turns  # noqa: E402
+
+DEFAULT_SEED_PATH = os.path.join(TOOLS_DIR, "smalltalk_seed.jsonl")
+
+DEFAULT_TRAINING = {
+    "ngram_range": [3, 5],
+    # Additive smoothing for the per-label feature distributions
+    "alpha": 0.5,
+    # Keep only the most label-discriminative features in the artifact
+    "max_features": 4000,
+    # Minimum winning probability before a turn skips the knowledge base
+    "threshold": 0.9,
+    # Turns longer than this always go to the knowledge base
+    "max_words": 12,
+}
+
+
+def load_examples(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def train(examples, settings=None):
+    settings = {**DEFAULT_TRAINING, **(settings or {})}
+    ngram_range = tuple(settings["ngram_range"])
+    labels = sorted({example["label"] for example in examples})
+    label_index = {label: i for i, label in enumerate(labels)}
+
+    counts = collections.defaultdict(lambda: [0] * len(labels))
+    totals = [0] * len(labels)
+    documents = collections.Counter()
+    for example in examples:
+        i = label_index[example["label"]]
+        documents[i] += 1
+        for feat in smalltalk.features(example["text"], ngram_range):
+            counts[feat][i] += 1
+            totals[i] += 1
+
+    alpha = settings["alpha"]
+    vocabulary_size = len(counts)
+    log_likelihoods = {
+        feat: [
+            math.log((c + alpha) / (totals[i] + alpha * vocabulary_size))
+            for i, c in enumerate(label_counts)
+        ]
+        for feat, label_counts in counts.items()
+    }
+
+    # Features whose likelihood barely differs across labels only add noise
+    def spread(weights):
+        return max(weights) - min(weights)
+
+    kept = sorted(
+        log_likelihoods, key=lambda f: spread(log_likelihoods[f]), reverse=True
+    )[: settings["max_features"]]
+
+    return {
+        "version": 1,
+        "labels": labels,
+        "ngram_range": list(ngram_range),
+        "threshold": settings["threshold"],
+        "max_words": settings["max_words"],
+        "log_priors": [
+            round(math.log(documents[i] / len(examples)), 3)
+            for i in range(len(labels))
+        ],
+        "log_likelihoods": {
+            feat: [round(w, 3) for w in log_likelihoods[feat]]
+            for feat in sorted(kept)
+        },
+    }
+
+
+def decide(params, text):
+    return smalltalk.classify(text, params) or smalltalk.QUESTION_LABEL
+
+
+def score(pairs):
+    """Per-label precision and recall from (expected, predicted) pairs."""
+    labels = sorted({label for pair in pairs for label in pair})
+    report = {}
+    for label in labels:
+        tp = sum(1 for e, p in pairs if e == label and p == label)
+        predicted = sum(1 for _, p in pairs if p == label)
+        actual = sum(1 for e, _ in pairs if e == label)
+        report[label] = {
+            "precision": tp / predicted if predicted else 0.0,
+            "recall": tp / actual if actual else 0.0,
+            "support": actual,
+        }
+    questions = [p for e, p in pairs if e == smalltalk.QUESTION_LABEL]
+    suppressed = [p for p in questions if p != smalltalk.QUESTION_LABEL]
+    return {
+        "labels": report,
+        "questions": len(questions),
+        "questions_suppressed": len(suppressed),
+        "suppression_rate": (
+            len(suppressed) / len(questions) if questions else 0.0
+        ),
+    }
+
+
+def cross_validate(examples, folds, threshold, seed=7):
+    shuffled = list(examples)
+    random.Random(seed).shuffle(shuffled)
+    pairs = []
+    for fold in range(folds):
+        test = shuffled[fold::folds]
+        training = [e for i, e in enumerate(shuffled) if i % folds != fold]
+        params = train(training, {"threshold": threshold})
+        pairs.extend((e["label"], decide(params, e["text"])) for e in test)
+    return pairs
+
+
+def latency(params, texts, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        for text in texts:
+            started = time.perf_counter()
+            smalltalk.classify(text, params)
+            samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "p50_us": statistics.median(samples),
+        "p99_us": samples[int(len(samples) * 0.99) - 1],
+        "max_us": samples[-1],
+    }
+
+
+def print_scores(title, scores):
+    print(title)
+    for label, values in scores["labels"].items():
+        print(
+            f"  {label:<10} precision {values['precision']:.3f}  "
+            f"recall {values['recall']:.3f}  support {values['support']}"
+        )
+    print(
+        f"  questions suppressed: {scores['questions_suppressed']} of "
+        f"{scores['questions']} ({scores['suppression_rate']:.1%})"
+    )
+
+
+def evaluate(args):
+    examples = load_examples(args.seed)
+    thresholds = args.thresholds or [DEFAULT_TRAINING["threshold"]]
+    for threshold in thresholds:
+        print_scores(
+            f"{args.folds}-fold cross-validation, threshold {threshold}",
+            score(cross_validate(examples, args.folds, threshold)),
+        )
+
+    params = train(examples, {"threshold": thresholds[-1]})
+    if args.test:
+        test = load_examples(args.test)
+        print_scores(
+            f"Held-out set {args.test}",
+            score([(e["label"], decide(params, e["text"])) for e in test]),
+        )
+
+    timing = latency(params, [e["text"] for e in examples])
+    print(
+        f"Latency per turn: p50 {timing['p50_us']:.0f} us, "
+        f"p99 {timing['p99_us']:.0f} us, max {timing['max_us']:.0f} us"
+    )
+
+    if args.logs:
+        turns = [
+            t["transcript"]
+            for t in load_turns(args.logs)
+            if t["intent"] == "FallbackIntent"
+        ]
+        routed = collections.Counter()
+        samples = collections.defaultdict(list)
+        for text in turns:
+            label = smalltalk.classify(text, params)
+            if label:
+                routed[label] += 1
+                samples[label].append(text)
+        print(f"FallbackIntent turns in logs: {len(turns)}")
+        for label, count in routed.most_common():
+            print(f"  {label:<10} {count} ({count / len(turns):.1%})")
+            for text in samples[label][: args.show]:
+                print(f"      {text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Small-talk classifier")
+    parser.add_argument("--seed", default=DEFAULT_SEED_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train")
+    train_parser.add_argument("--output", default=smalltalk.MODEL_PATH)
+    train_parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_TRAINING["threshold"]
+    )
+
+    evaluate_parser = subparsers.add_parser("evaluate")
+    evaluate_parser.add_argument("--folds", type=int, default=5)
+    evaluate_parser.add_argument("--thresholds", type=float, nargs="+")
+    evaluate_parser.add_argument("--test", help="labeled JSON lines")
+    evaluate_parser.add_argument("--logs", nargs="+", help="conversation logs")
+    evaluate_parser.add_argument(
+        "--show", type=int, default=5, help="sample turns per label"
+    )
+    args = parser.parse_args()
+
+    if args.command == "train":
+        params = train(load_examples(args.seed), {"threshold": args.threshold})
+        with open(args.output, "w") as f:
+            json.dump(params, f, separators=(",", ":"))
+        print(
+            f"Wrote {len(params['log_likelihoods'])} features for "
+            f"{', '.join(params['labels'])} to {args.output} "
+            f"({os.path.getsize(args.output) // 1024} KiB)"
+        )
+    else:
+        evaluate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Export the Bedrock vector table to local files for offline analysis, and
+load those snapshots back for brute-force and ANN experiments.
+
+A snapshot directory contains:
+    embeddings.npy  float32 (rows, dimension), written through a memory map
+    rows.parquet    row, id, chunks, metadata, custom_metadata
+    manifest.json   row count, dimension and source of the snapshot
+
+Usage:
+    python vector_store_export.py export --out snapshots/2024-06-01 \\
+        --host <reader endpoint> --database ragdb --secret-arn <arn>
+    python vector_store_export.py search --snapshot snapshots/2024-06-01 \\
+        --query-row 42 -k 5
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pg8000
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pg8000.native import identifier
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_NAME = "bedrock_integration"
+TABLE_NAME = "bedrock_kb"
+
+EMBEDDINGS_FILE = "embeddings.npy"
+ROWS_FILE = "rows.parquet"
+MANIFEST_FILE = "manifest.json"
+
+ROWS_SCHEMA = pa.schema(
+    [
+        ("row", pa.int64()),
+        ("id", pa.string()),
+        ("chunks", pa.string()),
+        ("metadata", pa.string()),
+        ("custom_metadata", pa.string()),
+    ]
+)
+
+
+def get_secret(secret_arn):
+    import boto3
+
+    response = boto3.client("secretsmanager").get_secret_value(
+        SecretId=secret_arn
+    )
+    return json.loads(response["SecretString"])
+
+
+def export_snapshot(
+    conn,
+    out_dir,
+    schema=SCHEMA_NAME,
+    table=TABLE_NAME,
+    batch_size=5000,
+):
+    """Stream the vector table into a snapshot directory.
+
+    Rows are read through a server-side cursor inside a single read-only
+    REPEATABLE READ transaction, so memory stays bounded by batch_size and
+    the row count taken up front matches the rows streamed afterwards.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    source = f"{identifier(schema)}.{identifier(table)}"
+    started = time.monotonic()
+
+    cur = conn.cursor()
+    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+    try:
+        cur.execute(
+            f"SELECT count(*), max(vector_dims(embedding)) FROM {source};"
+        )
+        count, dimension = cur.fetchone()
+        dimension = dimension or 0
+        logger.info(f"Exporting {count} rows of dimension {dimension}")
+
+        embeddings = np.lib.format.open_memmap(
+            os.path.join(out_dir, EMBEDDINGS_FILE),
+            mode="w+",
+            dtype=np.float32,
+            shape=(count, dimension),
+        )
+        writer = pq.ParquetWriter(
+            os.path.join(out_dir, ROWS_FILE), ROWS_SCHEMA, compression="zstd"
+        )
+
+        cur.execute(f"""
+            DECLARE snapshot_cursor NO SCROLL CURSOR FOR
+            SELECT id::text, embedding::real[], chunks,
+                   metadata::text, custom_metadata::text
+            FROM {source};""")
+
+        row = 0
+        while row < count:
+            cur.execute(
+                f"FETCH FORWARD {int(batch_size)} FROM snapshot_cursor;"
+            )
+            batch = cur.fetchall()
+            if not batch:
+                break
+            ids, vectors, chunks, metadata, custom_metadata = zip(*batch)
+            end = row + len(batch)
+            embeddings[row:end] = np.asarray(
+                [vector or [0.0] * dimension for vector in vectors],
+                dtype=np.float32,
+            )
+            writer.write_table(
+                pa.table(
+                    {
+                        "row": pa.array(range(row, end), pa.int64()),
+                        "id": ids,
+                        "chunks": chunks,
+                        "metadata": metadata,
+                        "custom_metadata": custom_metadata,
+                    },
+                    schema=ROWS_SCHEMA,
+                )
+            )
+            row = end
+            logger.info(f"Exported {row}/{count} rows")
+
+        cur.execute("CLOSE snapshot_cursor;")
+        writer.close()
+        embeddings.flush()
+        del embeddings
+    finally:
+        conn.rollback()
+
+    manifest = {
+        "rows": row,
+        "dimension": dimension,
+        "source": f"{schema}.{table}",
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class VectorSnapshot:
+    """Read-only view of an exported snapshot.
+
+    embeddings is a memory-mapped array, so slicing it or handing it to
+    NumPy, FAISS or hnswlib reads pages on demand instead of loading the
+    whole matrix up front.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.embeddings = np.load(
+            os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r"
+        )
+        self._norms = None
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    def rows(self, columns=None):
+        """Return the text/metadata table, memory-mapped from Parquet."""
+        return pq.read_table(
+            os.path.join(self.path, ROWS_FILE),
+            columns=columns,
+            memory_map=True,
+        )
+
+    def norms(self, block_rows=65536):
+        if self._norms is None:
+            norms = np.empty(len(self), dtype=np.float32)
+            for start in range(0, len(self), block_rows):
+                block = self.embeddings[start : start + block_rows]
+                norms[start : start + len(block)] = np.linalg.norm(
+                    block, axis=1
+                )
+            norms[norms == 0] = 1.0
+            self._norms = norms
+        return self._norms
+
+    def search(self, queries, k=10, block_rows=65536):
+        """Exact cosine top-k, scanning the memory map block by block.
+
+        Accepts one query vector or a (queries, dimension) matrix and returns
+        (scores, rows) arrays of shape (queries, k), best match first; k is
+        capped at the snapshot's row count, so an empty snapshot returns
+        empty arrays. A zero query vector scores 0 against every row.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        query_norms[query_norms == 0] = 1.0
+        queries = queries / query_norms
+        k = min(k, len(self))
+        if k <= 0:
+            return (
+                np.empty((len(queries), 0), dtype=np.float32),
+                np.empty((len(queries), 0), dtype=np.int64),
+            )
+        norms = self.norms(block_rows)
+
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), k), dtype=np.int64)
+        for start in range(0, len(self), block_rows):
+            block = self.embeddings[start : start + block_rows]
+            scores = queries @ block.T / norms[start : start + len(block)]
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate(
+                [
+                    best_rows,
+                    np.broadcast_to(
+                        np.arange(start, start + len(block)),
+                        (len(queries), len(block)),
+                    ),
+                ],
+                axis=1,
+            )
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_rows = np.take_along_axis(rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return (
+            np.take_along_axis(best_scores, order, axis=1),
+            np.take_along_axis(best_rows, order, axis=1),
+        )
+
+
+def load_snapshot(path):
+    return VectorSnapshot(path)
+
+
+def connect(args):
+    if args.secret_arn:
+        secret = get_secret(args.secret_arn)
+        user, password = secret["username"], secret["password"]
+    else:
+        user, password = args.user, args.password
+    return pg8000.connect(
+        host=args.host,
+        port=args.port,
+        database=args.database,
+        user=user,
+        password=password,
+        ssl_context=True if args.ssl else None,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export a snapshot")
+    export_parser.add_argument("--out", required=True)
+    # Point this at the reader endpoint so exports never load the writer
+    export_parser.add_argument(
+        "--host", default=os.environ.get("DB_READER_HOST", "localhost")
+    )
+    export_parser.add_argument("--port", type=int, default=5432)
+    export_parser.add_argument(
+        "--database", default=os.environ.get("DB_NAME", "ragdb")
+    )
+    export_parser.add_argument("--secret-arn")
+    export_parser.add_argument("--user", default="postgres")
+    export_parser.add_argument("--password")
+    export_parser.add_argument("--ssl", action="store_true")
+    export_parser.add_argument("--schema", default=SCHEMA_NAME)
+    export_parser.add_argument("--table", default=TABLE_NAME)
+    export_parser.add_argument("--batch-size", type=int, default=5000)
+
+    search_parser = subparsers.add_parser(
+        "search", help="Brute-force search a snapshot with one of its rows"
+    )
+    search_parser.add_argument("--snapshot", required=True)
+    search_parser.add_argument("--query-row", type=int, default=0)
+    search_parser.add_argument("-k", type=int, default=5)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "export":
+        conn = connect(args)
+        try:
+            manifest = export_snapshot(
+                conn,
+                args.out,
+                schema=args.schema,
+                table=args.table,
+                batch_size=args.batch_size,
+            )
+        finally:
+            conn.close()
+        print(json.dumps(manifest, indent=2))
+    else:
+        snapshot = load_snapshot(args.snapshot)
+        started = time.monotonic()
+        scores, rows = snapshot.search(
+            snapshot.embeddings[args.query_row], k=args.k
+        )
+        elapsed_ms = (time.monotonic() - started) * 1000
+        chunks = snapshot.rows(columns=["chunks"]).column("chunks")
+        for score, row in zip(scores[0], rows[0]):
+            print(f"{score:.4f}  row {row}: {str(chunks[int(row)])[:80]!r}")
+        print(f"Searched {len(snapshot)} vectors in {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import json
+import logging
+import os
+import re
+import time
+
+import boto3
+import pg8000
+from botocore.exceptions import ClientError
+from pg8000.native import identifier
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SCHEMA_NAME = "bedrock_integration"
+TABLE_NAME = "bedrock_kb"
+STATE_TABLE_NAME = "vector_store_maintenance_state"
+METRIC_NAMESPACE = "RagChatbot/VectorStore"
+
+# Defaults used when the THRESHOLDS environment variable omits a value
+DEFAULT_THRESHOLDS = {
+    # VACUUM (ANALYZE) when dead tuples exceed this share of the table
+    "dead_tuple_ratio": 0.1,
+    "min_dead_tuples": 1000,
+    # ANALYZE when rows modified since the last analyze exceed this share
+    "analyze_ratio": 0.1,
+    # REINDEX CONCURRENTLY when an index has grown this much per live row
+    # compared to its size right after the last rebuild
+    "index_bloat_ratio": 0.3,
+    "min_index_bytes": 10 * 1024 * 1024,
+}
+
+# Invalid indexes an interrupted REINDEX CONCURRENTLY leaves behind: the
+# transient copy (_ccnew) or the original it could not drop (_ccold). The
+# table keeps its valid index either way, so they are safe to drop.
+INTERRUPTED_REINDEX = re.compile(r"_cc(new|old)\d*$")
+
+
+def get_secret(secret_name):
+    client = boto3.client("secretsmanager")
+    try:
+        response = client.get_secret_value(SecretId=secret_name)
+        return json.loads(response["SecretString"])
+    except ClientError as e:
+        logger.error(f"Error retrieving secret: {e}")
+        raise e
+
+
+def load_thresholds():
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    thresholds.update(json.loads(os.environ.get("THRESHOLDS", "{}")))
+    return thresholds
+
+
+def load_tables():
+    """Vector tables to maintain: every knowledge base's, from TABLES."""
+    return json.loads(os.environ.get("TABLES", json.dumps([TABLE_NAME])))
+
+
+def qualified_name(schema, name):
+    return f"{identifier(schema)}.{identifier(name)}"
+
+
+def publish_metrics(cloudwatch, metrics, dimensions):
+    """Send (name, value, unit) tuples to CloudWatch under the given dimensions."""
+    metric_data = [
+        {
+            "MetricName": name,
+            "Value": float(value),
+            "Unit": unit,
+            "Dimensions": [
+                {"Name": key, "Value": val} for key, val in dimensions.items()
+            ],
+        }
+        for name, value, unit in metrics
+    ]
+    # PutMetricData accepts at most 1000 datums per call
+    for start in range(0, len(metric_data), 1000):
+        cloudwatch.put_metric_data(
+            Namespace=METRIC_NAMESPACE,
+            MetricData=metric_data[start : start + 1000],
+        )
+
+
+def ensure_state_table(cur, schema):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {qualified_name(schema, STATE_TABLE_NAME)} (
+            index_name text PRIMARY KEY,
+            bytes_per_tuple double precision NOT NULL,
+            recorded_at timestamptz NOT NULL DEFAULT now()
+        );""")
+
+
+def load_baselines(cur, schema):
+    cur.execute(
+        f"SELECT index_name, bytes_per_tuple FROM {qualified_name(schema, STATE_TABLE_NAME)}"
+    )
+    return {name: bytes_per_tuple for name, bytes_per_tuple in cur.fetchall()}
+
+
+def save_baseline(cur, schema, index_name, bytes_per_tuple):
+    cur.execute(
+        f"""
+        INSERT INTO {qualified_name(schema, STATE_TABLE_NAME)} (index_name, bytes_per_tuple)
+        VALUES (%s, %s)
+        ON CONFLICT (index_name)
+        DO UPDATE SET bytes_per_tuple = EXCLUDED.bytes_per_tuple, recorded_at = now();""",
+        (index_name, bytes_per_tuple),
+    )
+
+
+def measure_table(cur, schema, table):
+    cur.execute(
+        """
+        SELECT n_live_tup, n_dead_tup, n_mod_since_analyze,
+               pg_table_size(relid), pg_indexes_size(relid)
+        FROM pg_stat_user_tables
+        WHERE schemaname = %s AND relname = %s;""",
+        (schema, table),
+    )
+    row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"Table {schema}.{table} does not exist")
+    live, dead, modified, table_bytes, index_bytes = row
+    return {
+        "live_tuples": live,
+        "dead_tuples": dead,
+        "modified_since_analyze": modified,
+        "table_bytes": table_bytes,
+        "index_bytes": index_bytes,
+        "dead_tuple_ratio": dead / (live + dead) if live + dead else 0.0,
+    }
+
+
+def measure_indexes(cur, schema, table):
+    cur.execute(
+        """
+        SELECT s.indexrelname, am.amname, pg_relation_size(s.indexrelid),
+               s.idx_scan, i.indisvalid
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        JOIN pg_class c ON c.oid = s.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE s.schemaname = %s AND s.relname = %s
+        ORDER BY s.indexrelname;""",
+        (schema, table),
+    )
+    return [
+        {
+            "name": name,
+            "access_method": access_method,
+            "size_bytes": size_bytes,
+            "scans": scans,
+            "valid": valid,
+        }
+        for name, access_method, size_bytes, scans, valid in cur.fetchall()
+    ]
+
+
+def index_bloat_ratio(size_bytes, live_tuples, baseline_bytes_per_tuple):
+    """Share of the index that is growth beyond its post-rebuild size per live row.
+
+    HNSW and GIN indexes have no pgstattuple-style bloat estimate, so the size
+    per live row right after the last rebuild serves as the reference.
+    """
+    if not live_tuples or not baseline_bytes_per_tuple:
+        return 0.0
+    current_bytes_per_tuple = size_bytes / live_tuples
+    return max(0.0, 1 - baseline_bytes_per_tuple / current_bytes_per_tuple)
+
+
+def run_maintenance(
+    conn,
+    cloudwatch,
+    thresholds,
+    schema=SCHEMA_NAME,
+    table=TABLE_NAME,
+    dry_run=False,
+):
+    """Measure bloat on the vector table and run the maintenance it calls for.
+
+    The connection must be in autocommit mode because VACUUM and
+    REINDEX CONCURRENTLY cannot run inside a transaction block.
+    """
+    table_name = qualified_name(schema, table)
+    table_dimensions = {"Table": f"{schema}.{table}"}
+    actions = []
+
+    with conn.cursor() as cur:
+        ensure_state_table(cur, schema)
+        baselines = load_baselines(cur, schema)
+
+        stats = measure_table(cur, schema, table)
+        indexes = measure_indexes(cur, schema, table)
+        logger.info(f"Table stats for {schema}.{table}: {stats}")
+
+        publish_metrics(
+            cloudwatch,
+            [
+                ("LiveTuples", stats["live_tuples"], "Count"),
+                ("DeadTuples", stats["dead_tuples"], "Count"),
+                ("DeadTupleRatio", stats["dead_tuple_ratio"], "None"),
+                ("TableSize", stats["table_bytes"], "Bytes"),
+                ("IndexSize", stats["index_bytes"], "Bytes"),
+            ],
+            table_dimensions,
+        )
+
+        for index in indexes:
+            baseline = baselines.get(index["name"])
+            if baseline is None and stats["live_tuples"] and index["valid"]:
+                # First sighting of this index: its current shape is the reference
+                baseline = index["size_bytes"] / stats["live_tuples"]
+                if not dry_run:
+                    save_baseline(cur, schema, index["name"], baseline)
+            index["bloat_ratio"] = index_bloat_ratio(
+                index["size_bytes"], stats["live_tuples"], baseline
+            )
+            publish_metrics(
+                cloudwatch,
+                [
+                    ("IndexSize", index["size_bytes"], "Bytes"),
+                    ("IndexBloatRatio", index["bloat_ratio"], "None"),
+                    ("IndexValid", 1 if index["valid"] else 0, "Count"),
+                ],
+                {**table_dimensions, "Index": index["name"]},
+            )
+
+        vacuum_needed = (
+            stats["dead_tuples"] >= thresholds["min_dead_tuples"]
+            and stats["dead_tuple_ratio"] >= thresholds["dead_tuple_ratio"]
+        )
+        analyze_needed = stats["modified_since_analyze"] >= thresholds[
+            "analyze_ratio"
+        ] * max(stats["live_tuples"], 1)
+
+        if vacuum_needed:
+            actions.append(("Vacuum", f"VACUUM (ANALYZE) {table_name};"))
+        elif analyze_needed:
+            actions.append(("Analyze", f"ANALYZE {table_name};"))
+
+        reindexed = []
+        for index in indexes:
+            if not index["valid"]:
+                if INTERRUPTED_REINDEX.search(index["name"]):
+                    actions.append(
+                        (
+                            "DropInvalidIndex",
+                            f"DROP INDEX CONCURRENTLY IF EXISTS {qualified_name(schema, index['name'])};",
+                        )
+                    )
+                else:
+                    # Not ours to clean up, e.g. a failed CREATE INDEX
+                    # CONCURRENTLY; needs a human
+                    logger.warning(f"Skipping invalid index {index['name']}")
+                continue
+            if (
+                index["size_bytes"] >= thresholds["min_index_bytes"]
+                and index["bloat_ratio"] >= thresholds["index_bloat_ratio"]
+            ):
+                actions.append(
+                    (
+                        "Reindex",
+                        f"REINDEX INDEX CONCURRENTLY {qualified_name(schema, index['name'])};",
+                    )
+                )
+                reindexed.append(index["name"])
+
+        results = []
+        for action, statement in actions:
+            logger.info(f"{'Would run' if dry_run else 'Running'}: {statement}")
+            if dry_run:
+                results.append({"action": action, "statement": statement})
+                continue
+            started = time.monotonic()
+            cur.execute(statement)
+            duration = time.monotonic() - started
+            results.append(
+                {"action": action, "statement": statement, "seconds": duration}
+            )
+            publish_metrics(
+                cloudwatch,
+                [(f"{action}Duration", duration, "Seconds")],
+                table_dimensions,
+            )
+
+        if reindexed and not dry_run:
+            # Rebuilt indexes become the new reference for bloat
+            stats = measure_table(cur, schema, table)
+            for index in measure_indexes(cur, schema, table):
+                if index["name"] in reindexed and stats["live_tuples"]:
+                    save_baseline(
+                        cur,
+                        schema,
+                        index["name"],
+                        index["size_bytes"] / stats["live_tuples"],
+                    )
+
+    return {
+        "table": stats,
+        "indexes": indexes,
+        "actions": results,
+        "dry_run": dry_run,
+    }
+
+
+def handler(event, context):
+    logger.info(f"Received event: {json.dumps(event)}")
+
+    secret = get_secret(os.environ["DB_SECRET_ARN"])
+    conn = pg8000.connect(
+        host=os.environ["DB_HOST"],
+        port=5432,
+        database=os.environ["DB_NAME"],
+        user=secret["username"],
+        password=secret["password"],
+    )
+    conn.autocommit = True
+
+    cloudwatch = boto3.client("cloudwatch")
+    thresholds = load_thresholds()
+    try:
+        result = {
+            table: run_maintenance(
+                conn,
+                cloudwatch,
+                thresholds,
+                table=table,
+                dry_run=bool(event.get("dry_run", False)),
+            )
+            for table in load_tables()
+        }
+    finally:
+        conn.close()
+
+    logger.info(f"Maintenance completed: {json.dumps(result, default=str)}")
+    return result
@@ -6,6 +6,7 @@ import boto3
 import cfnresponse
 import pg8000
 from botocore.exceptions import ClientError
+from pg8000.native import identifier
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -21,6 +22,36 @@ def get_secret(secret_name):
         raise e
 
 
+def get_tables(event):
+    # One vector table per knowledge base slot, e.g. bedrock_kb and bedrock_kb_green
+    return event["ResourceProperties"].get(
+        "Tables", [{"Name": "bedrock_kb", "Dimension": 1024}]
+    )
+
+
+def create_vector_table(cur, table_name, dimension):
+    table = f"bedrock_integration.{identifier(table_name)}"
+
+    logger.info(f"Creating table {table}")
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        id uuid PRIMARY KEY,
+        embedding vector({int(dimension)}),
+        chunks text,
+        metadata json,
+        custom_metadata jsonb
+    );""")
+
+    logger.info(f"Creating indexes on {table}")
+    cur.execute(
+        f"""CREATE INDEX IF NOT EXISTS {identifier(table_name + "_embedding_idx")} ON {table} USING hnsw (embedding vector_cosine_ops);"""
+    )
+
+    cur.execute(
+        f"""CREATE INDEX IF NOT EXISTS {identifier(table_name + "_to_tsvector_idx")} ON {table} USING gin (to_tsvector('simple', chunks));"""
+    )
+
+
 def handler(event, context):
     try:
         logger.info(f"Received event: {json.dumps(event)}")
@@ -55,33 +86,24 @@ def handler(event, context):
                 cur.execute("CREATE SCHEMA IF NOT EXISTS bedrock_integration;")
 
                 logger.info("Creating bedrock user role")
-                cur.execute(
-                    "CREATE ROLE bedrock_user WITH PASSWORD 'password' LOGIN;"
-                )
+                cur.execute("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (
+                        SELECT FROM pg_roles WHERE rolname = 'bedrock_user'
+                    ) THEN
+                        CREATE ROLE bedrock_user WITH PASSWORD 'password' LOGIN;
+                    END IF;
+                END
+                $$;""")
 
                 logger.info("Granting permissions")
                 cur.execute(
                     "GRANT ALL ON SCHEMA bedrock_integration to bedrock_user;"
                 )
 
-                logger.info("Creating table")
-                cur.execute("""
-                CREATE TABLE IF NOT EXISTS bedrock_integration.bedrock_kb (
-                    id uuid PRIMARY KEY,
-                    embedding vector(1024),
-                    chunks text,
-                    metadata json,
-                    custom_metadata jsonb
-                );""")
-
-                logger.info("Creating indexes")
-                cur.execute(
-                    """CREATE INDEX ON bedrock_integration.bedrock_kb USING hnsw (embedding vector_cosine_ops);"""
-                )
-
-                cur.execute(
-                    """CREATE INDEX ON bedrock_integration.bedrock_kb USING gin (to_tsvector('simple', chunks));"""
-                )
+                for table in get_tables(event):
+                    create_vector_table(cur, table["Name"], table["Dimension"])
 
             conn.close()
             logger.info("Database setup completed successfully")
@@ -0,0 +1,75 @@
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "src")
+)
+
+# Each Lambda is packaged from its own directory under src/, so make the
+# handler modules importable the same way the Lambda runtime sees them.
+for name in sorted(os.listdir(SRC_DIR)):
+    path = os.path.join(SRC_DIR, name)
+    if os.path.isdir(path) and path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def make_event():
+    """Builds the Lex event of a turn."""
+
+    def build(
+        text,
+        intent="FallbackIntent",
+        session_id="session-1",
+        session_attributes=None,
+    ):
+        return {
+            "sessionId": session_id,
+            "inputMode": "Text",
+            "transcriptions": [{"transcription": text}],
+            "sessionState": {
+                "sessionAttributes": dict(session_attributes or {}),
+                "intent": {"name": intent},
+            },
+        }
+
+    return build
+
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    """lambda_orchestrator with in-memory sessions and the environment it
+    reads on every turn."""
+    import lambda_orchestrator
+
+    monkeypatch.setitem(lambda_orchestrator.SESSION_STORE, "backend", "memory")
+    monkeypatch.setattr(lambda_orchestrator, "session_stores", {})
+    monkeypatch.setenv("KBID", "kb-1")
+    monkeypatch.setenv("MODEL_ARN", "model")
+    return lambda_orchestrator
+
+
+class VersionParameter:
+    """SSM client serving the knowledge base version parameter."""
+
+    def __init__(self, version="v1"):
+        self.version = version
+
+    def get_parameter(self, Name):
+        return {"Parameter": {"Value": self.version}}
+
+
+@pytest.fixture
+def kb_version(monkeypatch):
+    """The knowledge base version parameter, read afresh by the next turn."""
+    import lambda_orchestrator
+
+    parameter = VersionParameter()
+    monkeypatch.setitem(lambda_orchestrator.clients, "ssm", parameter)
+    monkeypatch.setattr(
+        lambda_orchestrator, "kb_version", {"version": None, "expires_at": 0.0}
+    )
+    monkeypatch.setenv("KB_VERSION_PARAMETER", "/stack/knowledge-base/version")
+    return parameter
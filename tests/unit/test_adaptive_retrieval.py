@@ -0,0 +1,158 @@
+import argparse
+
+import pytest
+
+import adaptive_retrieval
+import lambda_orchestrator
+import replay
+
+SETTINGS = dict(adaptive_retrieval.DEFAULT_ADAPTIVE_RETRIEVAL)
+PROFILE = {"number_of_results": 5}
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("MMR vaccine", (5, "HYBRID")),
+        ("Where do I get form DH680 for school", (5, "HYBRID")),
+        ("Is the flu shot safe while pregnant", (5, "SEMANTIC")),
+        (
+            "What vaccines does my daughter need before starting school "
+            "this fall and where can we get them",
+            (8, "SEMANTIC"),
+        ),
+        ("When do clinics open? Do I need an appointment", (8, "SEMANTIC")),
+    ],
+)
+def test_query_settings(query, expected):
+    assert adaptive_retrieval.query_settings(query, PROFILE, SETTINGS) == (
+        expected
+    )
+
+
+def test_query_settings_stay_within_bounds():
+    settings = {**SETTINGS, "max_results": 6}
+    long_query = " ".join(["vaccine"] * 20)
+
+    assert adaptive_retrieval.query_settings(long_query, PROFILE, settings) == (
+        6,
+        "SEMANTIC",
+    )
+    assert adaptive_retrieval.query_settings(
+        "flu", {"number_of_results": 1}, SETTINGS
+    ) == (2, "HYBRID")
+
+
+@pytest.mark.parametrize(
+    "scores, expected",
+    [
+        ([0.9, 0.6, 0.5], (2, "SEMANTIC")),
+        ([0.8, 0.78, 0.76], (5, "SEMANTIC")),
+        ([0.4, 0.3], (10, "HYBRID")),
+        ([], (10, "HYBRID")),
+    ],
+)
+def test_probe_settings(scores, expected):
+    assert (
+        adaptive_retrieval.probe_settings(scores, 5, "SEMANTIC", SETTINGS)
+        == expected
+    )
+
+
+class FakeAgentRuntime:
+    def __init__(self, scores):
+        self.scores = scores
+        self.calls = []
+
+    def retrieve(self, **kwargs):
+        self.calls.append(("retrieve", kwargs))
+        return {
+            "retrievalResults": [
+                {
+                    "content": {"text": f"passage {i}"},
+                    "location": {
+                        "s3Location": {"uri": f"s3://docs/doc{i}.pdf"}
+                    },
+                    "score": score,
+                }
+                for i, score in enumerate(self.scores)
+            ]
+        }
+
+    def retrieve_and_generate(self, **kwargs):
+        self.calls.append(("retrieve_and_generate", kwargs))
+        return {"sessionId": "kb-session", "output": {"text": "Yes."}}
+
+
+class FakeTable:
+    def get_item(self, Key):
+        return {}
+
+    def update_item(self, **kwargs):
+        return {}
+
+
+def test_fallback_probes_then_generates_with_adaptive_settings(monkeypatch):
+    agent_runtime = FakeAgentRuntime([0.9, 0.5, 0.4])
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", agent_runtime
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "conversation_table", FakeTable()
+    )
+    monkeypatch.setitem(lambda_orchestrator.ADAPTIVE_RETRIEVAL, "enabled", True)
+    monkeypatch.setitem(
+        lambda_orchestrator.ADAPTIVE_RETRIEVAL, "probe_results", 3
+    )
+    monkeypatch.setenv("KBID", "kb-1")
+    monkeypatch.setenv("MODEL_ARN", "model")
+
+    lambda_orchestrator.lambda_handler(
+        {
+            "sessionId": "session-1",
+            "inputMode": "Text",
+            "transcriptions": [{"transcription": "HPV vaccine age"}],
+            "sessionState": {
+                "sessionAttributes": {},
+                "intent": {"name": "FallbackIntent"},
+            },
+        },
+        None,
+    )
+
+    (_, probe), (_, generate) = agent_runtime.calls
+    assert probe["retrievalConfiguration"]["vectorSearchConfiguration"] == {
+        "numberOfResults": 3,
+        "overrideSearchType": "HYBRID",
+    }
+    config = generate["retrieveAndGenerateConfiguration"][
+        "knowledgeBaseConfiguration"
+    ]
+    assert config["retrievalConfiguration"]["vectorSearchConfiguration"] == {
+        "numberOfResults": 2,
+        "overrideSearchType": "HYBRID",
+    }
+
+
+def test_replay_retrieval_scores_recall_and_rank():
+    args = argparse.Namespace(kb_id="kb-1", generate=False)
+    questions = [
+        {"query": "Is the flu shot safe", "relevant": ["doc1.pdf"]},
+        {"query": "Is the flu shot free", "relevant": ["missing.pdf"]},
+    ]
+
+    rows = replay.evaluate_strategy(
+        FakeAgentRuntime([0.9, 0.8]), args, questions, replay.fixed, SETTINGS
+    )
+    summary = replay.summarize_retrieval(rows)
+
+    assert [row["rank"] for row in rows] == [2, None]
+    assert summary["recall"] == 0.5
+    assert summary["mrr"] == 0.25
+    assert summary["mean_results"] == 5
+    assert summary["hybrid_share"] == 0
+
+
+def test_token_f1():
+    assert replay.token_f1("Flu shots are free", "flu shots are free") == 1.0
+    assert replay.token_f1("No", "Yes") == 0.0
@@ -0,0 +1,209 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import answer_queue
+import answer_worker
+import lambda_orchestrator
+
+
+class FakeSQS:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.bodies = []
+
+    def send_message(self, QueueUrl, MessageBody):
+        if self.fail:
+            raise ClientError(
+                {"Error": {"Code": "AWS.SimpleQueueService.NonExistentQueue"}},
+                "SendMessage",
+            )
+        self.bodies.append(json.loads(MessageBody))
+
+
+class FakeBedrock:
+    def __init__(self, fail_on=()):
+        self.questions = []
+        self.fail_on = fail_on
+
+    def retrieve_and_generate(self, **kwargs):
+        question = kwargs["input"]["text"]
+        self.questions.append(question)
+        if question in self.fail_on:
+            raise RuntimeError("throttled")
+        return {"sessionId": "kb-session", "output": {"text": f"A: {question}"}}
+
+
+@pytest.fixture
+def event(make_event):
+    """A turn from a Connect contact; SMS unless subtype says otherwise."""
+
+    def build(text, session_id="session-1", subtype="connect:SMS"):
+        return make_event(
+            text,
+            session_id=session_id,
+            session_attributes={
+                "channel": "CHAT",
+                "channel_subtype": subtype,
+                "customer_address": "+15555550100",
+            },
+        )
+
+    return build
+
+
+@pytest.fixture
+def queue(orchestrator, monkeypatch):
+    sqs = FakeSQS()
+    monkeypatch.setitem(lambda_orchestrator.clients, "sqs", sqs)
+    monkeypatch.setattr(
+        lambda_orchestrator,
+        "ANSWER_QUEUE",
+        {**answer_queue.DEFAULT_ANSWER_QUEUE, "enabled": True},
+    )
+    monkeypatch.setenv("ANSWER_QUEUE_URL", "https://sqs/answers")
+    return sqs
+
+
+def test_sms_questions_are_queued_and_acknowledged(queue, monkeypatch, event):
+    bedrock = FakeBedrock()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+    )
+
+    sms = lambda_orchestrator.lambda_handler(
+        event("Is the flu shot free"), None
+    )
+    chat = lambda_orchestrator.lambda_handler(
+        event("Where do I park", subtype="connect:Chat"), None
+    )
+
+    assert (
+        sms["messages"][0]["content"]
+        == answer_queue.DEFAULT_ANSWER_QUEUE["acknowledgement"]
+    )
+    assert chat["messages"][0]["content"] == "A: Where do I park"
+    assert bedrock.questions == ["Where do I park"]
+    [body] = queue.bodies
+    assert body["event"]["transcriptions"][0]["transcription"] == (
+        "Is the flu shot free"
+    )
+    assert answer_queue.reply_address(body) == "+15555550100"
+
+
+def test_questions_are_answered_now_when_the_queue_is_unreachable(
+    queue, monkeypatch, event
+):
+    queue.fail = True
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", FakeBedrock()
+    )
+
+    response = lambda_orchestrator.lambda_handler(
+        event("Is the flu shot free"), None
+    )
+
+    assert response["messages"][0]["content"] == "A: Is the flu shot free"
+
+
+def records(*events):
+    return [
+        {
+            "messageId": f"m{n}",
+            "body": answer_queue.encode(
+                answer_queue.message(e, e["sessionState"]["sessionAttributes"])
+            ),
+        }
+        for n, e in enumerate(events)
+    ]
+
+
+def test_worker_answers_sessions_in_order_and_returns_failures(
+    queue, monkeypatch, event
+):
+    bedrock = FakeBedrock(fail_on=("Second from one",))
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+    )
+    delivered = []
+    monkeypatch.setitem(
+        answer_queue.CALLBACKS,
+        "log",
+        lambda answer, body: delivered.append(answer),
+    )
+
+    result = answer_worker.lambda_handler(
+        {
+            "Records": records(
+                event("First from one", "one"),
+                event("First from two", "two"),
+                event("Second from one", "one"),
+                event("Third from one", "one"),
+            )
+        },
+        None,
+    )
+
+    assert result == {
+        "batchItemFailures": [
+            {"itemIdentifier": "m2"},
+            {"itemIdentifier": "m3"},
+        ]
+    }
+    assert sorted(delivered) == ["A: First from one", "A: First from two"]
+    assert "Third from one" not in bedrock.questions
+
+
+def test_worker_warms_up_with_the_shared_rate_limit_table(
+    queue, monkeypatch, event
+):
+    # warm_up is not patched out, so keep the clients it creates
+    monkeypatch.setattr(
+        lambda_orchestrator,
+        "clients",
+        {
+            "sqs": queue,
+            "bedrock-agent-runtime": FakeBedrock(),
+        },
+    )
+    monkeypatch.setitem(lambda_orchestrator.RATE_LIMIT, "enabled", True)
+    monkeypatch.setitem(lambda_orchestrator.RATE_LIMIT, "backend", "dynamodb")
+    # Set on every function by the stack (tests/unit/test_lambda_lex_bot.py)
+    monkeypatch.setenv("RATE_LIMIT_TABLE", "rate-limits")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    delivered = []
+    monkeypatch.setitem(
+        answer_queue.CALLBACKS,
+        "log",
+        lambda answer, body: delivered.append(answer),
+    )
+
+    result = answer_worker.lambda_handler(
+        {"Records": records(event("Is the flu shot free"))}, None
+    )
+
+    assert result == {"batchItemFailures": []}
+    assert delivered == ["A: Is the flu shot free"]
+    assert lambda_orchestrator.clients["rate_limit_table"].name == "rate-limits"
+
+
+def test_undeliverable_answers_are_dropped(queue, monkeypatch, event):
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", FakeBedrock()
+    )
+    unaddressed = event("Is the flu shot free")
+    del unaddressed["sessionState"]["sessionAttributes"]["customer_address"]
+
+    retry = answer_worker.process_session(
+        records(unaddressed), answer_queue.deliver_by_sns
+    )
+
+    assert retry == []
+
+
+def test_callbacks_resolve_by_name():
+    assert answer_queue.get_callback("log") is answer_queue.deliver_to_log
+    assert answer_queue.get_callback("json:dumps") is json.dumps
+    with pytest.raises(ValueError, match="email"):
+        answer_queue.get_callback("email")
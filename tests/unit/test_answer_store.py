@@ -0,0 +1,186 @@
+import json
+import time
+
+import pytest
+
+import answer_precompute
+import answer_store
+import lambda_orchestrator
+
+SETTINGS = {**answer_store.DEFAULT_ANSWER_STORE, "backend": "memory"}
+
+
+def test_top_questions_fold_wordings_and_skip_small_talk():
+    questions = answer_precompute.top_questions(
+        {
+            "Is the flu shot free?": 6,
+            "is the flu shot free": 9,
+            "Where do I park": 4,
+            "thank you": 40,
+            "Do you test well water": 1,
+        },
+        limit=5,
+        min_count=2,
+    )
+
+    assert questions == [("is the flu shot free", 15), ("Where do I park", 4)]
+
+
+def test_answers_are_only_served_for_their_knowledge_base_stamp():
+    store = answer_store.create_store(SETTINGS)
+    store.put_many([("Is the flu shot free?", "chat", "Yes.")], "kb-1:v1")
+
+    assert store.get("is the flu shot free", "chat", "kb-1:v1") == "Yes."
+    assert store.get("is the flu shot free", "voice", "kb-1:v1") is None
+    assert store.get("is the flu shot free", "chat", "kb-1:v2") is None
+    assert store.get("is the flu shot free", "chat", "kb-2:v1") is None
+
+
+class ConversationLogs:
+    def start_query(self, **kwargs):
+        return {"queryId": "q-1"}
+
+    def get_query_results(self, queryId):
+        rows = {"Is the flu shot free": 12, "Where do I park": 5}
+        return {
+            "status": "Complete",
+            "results": [
+                [
+                    {"field": "inputTranscript", "value": transcript},
+                    {"field": "asked", "value": str(count)},
+                ]
+                for transcript, count in rows.items()
+            ],
+        }
+
+
+class FlakyBedrock:
+    """Fails the first retrieval for each question."""
+
+    def __init__(self):
+        self.calls = []
+
+    def retrieve(self, **kwargs):
+        question = kwargs["retrievalQuery"]["text"]
+        self.calls.append(question)
+        if self.calls.count(question) == 1:
+            raise RuntimeError("throttled")
+        return {"retrievalResults": []}
+
+    def converse(self, **kwargs):
+        question = kwargs["messages"][-1]["content"][0]["text"]
+        return {
+            "output": {"message": {"content": [{"text": f"A: {question}"}]}},
+            "usage": {"inputTokens": 10},
+        }
+
+
+@pytest.fixture
+def precomputed(orchestrator, kb_version, monkeypatch):
+    bedrock = FlakyBedrock()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+    )
+    monkeypatch.setitem(lambda_orchestrator.clients, "bedrock-runtime", bedrock)
+    monkeypatch.setitem(lambda_orchestrator.clients, "logs", ConversationLogs())
+    monkeypatch.setitem(
+        lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", True
+    )
+    monkeypatch.setattr(
+        lambda_orchestrator,
+        "ANSWER_STORE",
+        {
+            **SETTINGS,
+            "enabled": True,
+            "channels": ["chat"],
+            "min_count": 1,
+            "retry_base_seconds": 0,
+        },
+    )
+    monkeypatch.setattr(lambda_orchestrator, "answer_stores", {})
+    monkeypatch.setenv("CONVERSATION_LOG_GROUP", "conversations")
+    return bedrock, kb_version
+
+
+def test_precomputed_answers_are_served_until_the_version_changes(
+    precomputed, make_event, capsys
+):
+    bedrock, parameter = precomputed
+
+    result = answer_precompute.lambda_handler({}, None)
+
+    assert result == {"stored": 2, "attempted": 2, "kb_version": "kb-1:v1"}
+    assert len(bedrock.calls) == 4
+
+    response = lambda_orchestrator.lambda_handler(
+        make_event("is the flu shot free?"), None
+    )
+    assert response["messages"][0]["content"] == "A: Is the flu shot free"
+    assert len(bedrock.calls) == 4
+
+    # A new ingestion retires every stored answer
+    parameter.version = "v2"
+    lambda_orchestrator.kb_version["expires_at"] = 0.0
+    lambda_orchestrator.lambda_handler(
+        make_event("Is the flu shot free", session_id="session-2"), None
+    )
+    assert len(bedrock.calls) == 5
+
+    records = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+    assert [r["Source"] for r in records if "AnswerLatency" in r] == [
+        "precomputed",
+        "knowledge_base",
+    ]
+
+
+def test_precomputed_answers_only_open_a_session(precomputed, make_event):
+    bedrock, _ = precomputed
+    answer_precompute.lambda_handler({}, None)
+    calls = len(bedrock.calls)
+
+    lambda_orchestrator.lambda_handler(make_event("Where do I park"), None)
+    # Same wording, but it now follows the conversation so far
+    response = lambda_orchestrator.lambda_handler(
+        make_event("Is the flu shot free"), None
+    )
+
+    assert bedrock.calls[calls:] == ["Is the flu shot free"]
+    assert response["messages"][0]["content"] == "A: Is the flu shot free"
+
+
+def test_stored_answers_need_the_converse_path(
+    precomputed, make_event, monkeypatch
+):
+    bedrock, _ = precomputed
+    answer_precompute.lambda_handler({}, None)
+
+    # retrieve_and_generate keeps follow-up context in the Bedrock session,
+    # which a stored first answer never opened
+    monkeypatch.setitem(
+        lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", False
+    )
+    assert (
+        lambda_orchestrator.precomputed_answer(
+            make_event("Is the flu shot free"),
+            {},
+            "Is the flu shot free",
+            "chat",
+            time.monotonic(),
+        )
+        is None
+    )
+
+
+def test_logged_questions_are_only_redacted_when_redaction_is_on(
+    monkeypatch,
+):
+    monkeypatch.setitem(lambda_orchestrator.REDACTION, "enabled", False)
+    assert lambda_orchestrator.redact_question("call 555-123-4567") == (
+        "call 555-123-4567"
+    )
+    monkeypatch.setitem(lambda_orchestrator.REDACTION, "enabled", True)
+    assert "555-123-4567" not in lambda_orchestrator.redact_question(
+        "call 555-123-4567"
+    )
@@ -0,0 +1,252 @@
+import asyncio
+import threading
+
+import pytest
+
+import async_orchestrator
+import lambda_orchestrator
+
+
+def result(text, score, uri="s3://docs/flu.pdf"):
+    return {
+        "content": {"text": text},
+        "location": {"s3Location": {"uri": uri}},
+        "score": score,
+    }
+
+
+class AsyncAgentRuntime:
+    def __init__(self, retrieve_started=None):
+        self.calls = []
+        self.retrieve_started = retrieve_started
+
+    async def retrieve(self, **kwargs):
+        if self.retrieve_started:
+            self.retrieve_started.set()
+        self.calls.append(kwargs)
+        kb_id = kwargs["knowledgeBaseId"]
+        return {
+            "retrievalResults": [
+                result(
+                    f"Clinics in {kb_id} open at eight.", 0.6, f"s3://{kb_id}"
+                ),
+            ]
+        }
+
+    async def retrieve_and_generate(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"sessionId": "kb-session", "output": {"text": "Yes."}}
+
+
+class AsyncConverse:
+    def __init__(self):
+        self.requests = []
+
+    async def converse(self, **kwargs):
+        self.requests.append(kwargs)
+        return {
+            "output": {"message": {"content": [{"text": "At eight."}]}},
+            "usage": {"inputTokens": 40},
+        }
+
+
+class SyncBedrock:
+    def retrieve_and_generate(self, **kwargs):
+        return {"sessionId": "kb-session", "output": {"text": "Yes."}}
+
+
+class FakeTable:
+    """Conversation table whose reads can wait for another event."""
+
+    def __init__(self, read_waits_for=None):
+        self.items = {}
+        self.read_waits_for = read_waits_for
+        self.read_overlapped = None
+
+    def get_item(self, Key):
+        if self.read_waits_for:
+            self.read_overlapped = self.read_waits_for.wait(timeout=1)
+        item = self.items.get(Key["SessionID_Lex"])
+        return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, **kwargs):
+        item = self.items.setdefault(Key["SessionID_Lex"], {})
+        for name, value in kwargs["ExpressionAttributeValues"].items():
+            item[name[1:]] = value
+
+
+@pytest.fixture
+def environment(monkeypatch):
+    monkeypatch.setattr(lambda_orchestrator, "session_stores", {})
+    monkeypatch.setattr(async_orchestrator, "background", set())
+    monkeypatch.setenv("KBID", "kb-1")
+    monkeypatch.setenv("MODEL_ARN", "model")
+
+
+def test_variants_share_the_handler_interface(
+    environment, monkeypatch, make_event
+):
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", SyncBedrock()
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "conversation_table", FakeTable()
+    )
+
+    sync = lambda_orchestrator.lambda_handler(
+        make_event("Is the flu shot free"), None
+    )
+    threaded = async_orchestrator.lambda_handler(
+        make_event("Is the flu shot free"), None
+    )
+    greeting = async_orchestrator.lambda_handler(
+        make_event("hello", "greeting_intent"), None
+    )
+
+    assert threaded == sync
+    assert greeting["messages"][0]["content"].startswith("Hello!")
+
+
+def test_session_read_overlaps_retrieval(environment, monkeypatch, make_event):
+    retrieve_started = threading.Event()
+    table = FakeTable(read_waits_for=retrieve_started)
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "conversation_table", table
+    )
+    monkeypatch.setitem(
+        async_orchestrator.async_clients,
+        "bedrock-agent-runtime",
+        AsyncAgentRuntime(retrieve_started),
+    )
+    monkeypatch.setitem(
+        async_orchestrator.async_clients, "bedrock-runtime", AsyncConverse()
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", True
+    )
+
+    response = async_orchestrator.lambda_handler(
+        make_event("When does the flu clinic open"), None
+    )
+
+    assert response["messages"][0]["content"] == "At eight."
+    assert table.read_overlapped is True
+
+
+def test_session_write_finishes_before_responding(
+    environment, monkeypatch, make_event
+):
+    table = FakeTable()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "conversation_table", table
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", SyncBedrock()
+    )
+
+    async_orchestrator.lambda_handler(make_event("Is the flu shot free"), None)
+
+    # Another execution environment would read the turn right away
+    assert not async_orchestrator.background
+    assert table.items["session-1"]["kbsession"] == "kb-session"
+
+
+def test_deferred_session_write_is_read_by_the_next_turn(
+    environment, monkeypatch, make_event
+):
+    monkeypatch.setitem(
+        async_orchestrator.ASYNC_ORCHESTRATOR, "defer_session_writes", True
+    )
+    converse = AsyncConverse()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "conversation_table", FakeTable()
+    )
+    monkeypatch.setitem(
+        async_orchestrator.async_clients,
+        "bedrock-agent-runtime",
+        AsyncAgentRuntime(),
+    )
+    monkeypatch.setitem(
+        async_orchestrator.async_clients, "bedrock-runtime", converse
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", True
+    )
+
+    async_orchestrator.lambda_handler(
+        make_event("When does the flu clinic open"), None
+    )
+    async_orchestrator.lambda_handler(make_event("Is it free"), None)
+
+    messages = converse.requests[-1]["messages"]
+    assert [m["content"][0]["text"] for m in messages] == [
+        "When does the flu clinic open",
+        "At eight.",
+        "Is it free",
+    ]
+
+
+def test_retrieve_all_drops_slow_sources(monkeypatch):
+    class SlowSource(AsyncAgentRuntime):
+        async def retrieve(self, **kwargs):
+            if kwargs["knowledgeBaseId"] == "kb-slow":
+                await asyncio.sleep(5)
+            return await super().retrieve(**kwargs)
+
+    monkeypatch.setitem(
+        async_orchestrator.async_clients, "bedrock-agent-runtime", SlowSource()
+    )
+
+    async def retrieve_all():
+        return await async_orchestrator.retrieve_all(
+            "flu clinic hours",
+            {"main": "kb-1", "wic": "kb-2", "slow": "kb-slow"},
+            {"numberOfResults": 3},
+            timeout=0.2,
+        )
+
+    results = async_orchestrator.get_event_loop().run_until_complete(
+        retrieve_all()
+    )
+
+    assert sorted(results) == ["main", "wic"]
+    assert results["wic"][0]["location"]["s3Location"]["uri"] == "s3://kb-2"
+
+
+def test_budget_covers_the_whole_turn(environment, monkeypatch, make_event):
+    class SlowConverse(AsyncConverse):
+        async def converse(self, **kwargs):
+            await asyncio.sleep(0.2)
+            return await super().converse(**kwargs)
+
+    class SlowRetrieve(AsyncAgentRuntime):
+        async def retrieve(self, **kwargs):
+            await asyncio.sleep(0.2)
+            return await super().retrieve(**kwargs)
+
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "conversation_table", FakeTable()
+    )
+    monkeypatch.setitem(
+        async_orchestrator.async_clients,
+        "bedrock-agent-runtime",
+        SlowRetrieve(),
+    )
+    monkeypatch.setitem(
+        async_orchestrator.async_clients, "bedrock-runtime", SlowConverse()
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", True
+    )
+    monkeypatch.setattr(lambda_orchestrator, "GENERATION_BUDGET_SECONDS", 0.3)
+
+    response = async_orchestrator.lambda_handler(
+        make_event("When does the flu clinic open"), None
+    )
+
+    # Each call fits the budget on its own, but not both together
+    assert (
+        response["messages"][0]["content"]
+        == lambda_orchestrator.BUDGET_EXCEEDED_MESSAGE
+    )
+    assert lambda_orchestrator.turn_deadline["at"] is None
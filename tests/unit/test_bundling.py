@@ -0,0 +1,127 @@
+import os
+import time
+
+import pytest
+from aws_cdk import App, Stack
+from aws_cdk import aws_lambda as lambda_
+
+from cdk import bundling
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "src" / "function"
+    write(str(path / "handler.py"), "def handler(event, context):\n    pass\n")
+    return str(path)
+
+
+@pytest.fixture
+def bundler(tmp_path):
+    return bundling.LambdaBundler(
+        Stack(App(), "BundlingTest"),
+        {"cache_dir": str(tmp_path / "cache"), "cache_max_age_days": 1},
+    )
+
+
+def local_bundling(bundler, source):
+    return bundling.CachedLocalBundling(
+        bundler,
+        source,
+        bundling.source_hash(source, "python3.12"),
+        lambda_.Runtime.PYTHON_3_12,
+        lambda_.Architecture.X86_64,
+        target_subdir="",
+        copy_source=True,
+    )
+
+
+def test_source_hash_follows_contents_and_salt(source):
+    before = bundling.source_hash(source, "python3.12")
+    write(os.path.join(source, "__pycache__", "handler.cpython-312.pyc"), "x")
+    write(os.path.join(source, "stale.pyc"), "x")
+    assert bundling.source_hash(source, "python3.12") == before
+    assert bundling.source_hash(source, "python3.9") != before
+
+    write(
+        os.path.join(source, "handler.py"), "def handler(e, c):\n    return 1\n"
+    )
+    assert bundling.source_hash(source, "python3.12") != before
+
+
+def test_second_bundle_is_a_cache_hit(bundler, source, tmp_path):
+    local = local_bundling(bundler, source)
+
+    assert local.try_bundle(str(tmp_path / "out1"))
+    assert bundler.timings[source]["status"] == "local build"
+    assert local.try_bundle(str(tmp_path / "out2"))
+    assert bundler.timings[source]["status"] == "local cache hit"
+    assert os.listdir(tmp_path / "out2") == ["handler.py"]
+    assert os.listdir(bundler.cache_dir) == [local.asset_hash]
+
+
+def test_concurrent_synth_keeps_the_first_cached_bundle(
+    bundler, source, tmp_path, monkeypatch
+):
+    local = local_bundling(bundler, source)
+    cache_path = os.path.join(bundler.cache_dir, local.asset_hash)
+    copytree = bundling.shutil.copytree
+
+    def copy_after_another_synth(src, dst, **kwargs):
+        # The other synth renames its bundle into place while this one builds
+        if dst != cache_path and not os.path.exists(cache_path):
+            os.makedirs(cache_path)
+            write(os.path.join(cache_path, "handler.py"), "# first\n")
+        return copytree(src, dst, **kwargs)
+
+    monkeypatch.setattr(bundling.shutil, "copytree", copy_after_another_synth)
+
+    assert local.try_bundle(str(tmp_path / "out"))
+    with open(tmp_path / "out" / "handler.py") as f:
+        assert f.read() == "# first\n"
+    assert os.listdir(bundler.cache_dir) == [local.asset_hash]
+
+
+def test_no_cache_dir_without_local_cache(tmp_path):
+    bundler = bundling.LambdaBundler(
+        Stack(App(), "BundlingTest"),
+        {"cache_dir": str(tmp_path / "cache"), "local_cache": False},
+    )
+
+    assert bundler.prune() == []
+    assert not os.path.exists(tmp_path / "cache")
+
+
+def test_failed_pip_install_falls_back_to_docker(
+    bundler, source, tmp_path, monkeypatch
+):
+    write(os.path.join(source, "requirements.txt"), "pg8000\n")
+    local = local_bundling(bundler, source)
+    monkeypatch.setattr(local, "_pip_install", lambda target: False)
+
+    assert not local.try_bundle(str(tmp_path / "out"))
+    assert bundler.timings[source]["status"] == "docker fallback"
+    # Neither a cache entry nor the build directory is left behind
+    assert os.listdir(bundler.cache_dir) == []
+
+
+def test_prune_removes_only_stale_unused_bundles(bundler, source):
+    bundler.code(source, lambda_.Runtime.PYTHON_3_12)
+    write(os.path.join(source, "requirements.txt"), "pg8000\n")
+    bundler.code(source, lambda_.Runtime.PYTHON_3_12)
+    [used] = bundler.used_hashes
+    day = 86400
+    for name, age in ((used, 3 * day), ("stale", 3 * day), ("recent", 0)):
+        path = os.path.join(bundler.cache_dir, name)
+        os.makedirs(path)
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+
+    assert bundler.prune() == ["stale"]
+    assert sorted(os.listdir(bundler.cache_dir)) == sorted([used, "recent"])
+    assert "pruned 1 stale bundle(s)" in bundler.report()
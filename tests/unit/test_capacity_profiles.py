@@ -0,0 +1,51 @@
+import pytest
+
+from cdk.capacity_profiles import capacity_report, resolve_capacity_profile
+
+PROFILES = {
+    "dev": {"min_capacity": 0.5, "max_capacity": 1},
+    "prod": {"min_capacity": 2, "max_capacity": 16, "readers": 2},
+}
+
+
+def test_profiles_fall_back_to_the_default():
+    assert resolve_capacity_profile(PROFILES, "prod") == {
+        "min_capacity": 2.0,
+        "max_capacity": 16.0,
+        "readers": 2,
+    }
+    assert resolve_capacity_profile(PROFILES, "staging") == {
+        "min_capacity": 0.5,
+        "max_capacity": 1.0,
+        "readers": 0,
+    }
+    assert resolve_capacity_profile(PROFILES, "dev")["min_capacity"] == 0.5
+
+
+@pytest.mark.parametrize(
+    "profile, message",
+    [
+        ({"min_capacity": 0.3}, "min_capacity must be between"),
+        ({"max_capacity": 300}, "max_capacity must be between"),
+        ({"min_capacity": -1}, "min_capacity must be between"),
+        ({"min_capacity": 4, "max_capacity": 2}, "at least min_capacity"),
+        # No automatic pause on the pinned engine version
+        ({"min_capacity": 0}, "min_capacity must be between"),
+        (
+            {"min_capacity": 0, "max_capacity": 0},
+            "min_capacity must be between",
+        ),
+        ({"readers": -1}, "readers must not be negative"),
+    ],
+)
+def test_invalid_profiles_are_rejected(profile, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_capacity_profile({"prod": profile}, "prod")
+
+
+def test_report_multiplies_instance_bounds_by_instances():
+    lines = capacity_report(PROFILES, "prod").splitlines()
+
+    prod = next(line for line in lines if line.startswith("prod *"))
+    assert prod.split()[-2:] == ["6", "48"]
+    assert any(line.startswith("dev ") for line in lines)
@@ -0,0 +1,240 @@
+import json
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+import channels
+import lambda_orchestrator
+
+
+def lex_event(text, input_mode="Text", session_attributes=None, **extra):
+    return {
+        "sessionId": "session-1",
+        "inputMode": input_mode,
+        "transcriptions": [{"transcription": text}],
+        "sessionState": {
+            "sessionAttributes": dict(session_attributes or {}),
+            "intent": {"name": "FallbackIntent"},
+        },
+        **extra,
+    }
+
+
+@pytest.mark.parametrize(
+    "event, channel",
+    [
+        (lex_event("hi", session_attributes={"channel": "VOICE"}), "voice"),
+        (lex_event("hi", session_attributes={"channel": "CHAT"}), "chat"),
+        (
+            lex_event(
+                "hi",
+                session_attributes={
+                    "channel": "CHAT",
+                    "channel_subtype": "connect:SMS",
+                },
+            ),
+            "sms",
+        ),
+        (lex_event("hi", input_mode="Speech"), "voice"),
+        (
+            lex_event(
+                "hi",
+                requestAttributes={"x-amz-lex:channels:platform": "Twilio"},
+            ),
+            "sms",
+        ),
+        (lex_event("hi"), "chat"),
+    ],
+)
+def test_detect_channel(event, channel):
+    assert channels.detect_channel(event) == channel
+
+
+def test_profiles_merge_environment_overrides(monkeypatch):
+    monkeypatch.setenv(
+        "CHANNEL_PROFILES", json.dumps({"voice": {"max_tokens": 80}})
+    )
+
+    profiles = channels.load_channel_profiles()
+
+    assert profiles["voice"]["max_tokens"] == 80
+    assert profiles["voice"]["number_of_results"] == 3
+    assert profiles["chat"] == channels.DEFAULT_CHANNEL_PROFILES["chat"]
+
+
+def test_fit_answer_trims_at_sentence_boundary():
+    profile = {"max_characters": 40}
+    text = "Flu shots are free. Clinics open at eight every weekday."
+
+    assert channels.fit_answer(text, profile) == "Flu shots are free."
+    assert channels.fit_answer("Short.", profile) == "Short."
+
+
+class RecordingBedrock:
+    def __init__(self):
+        self.calls = []
+
+    def retrieve_and_generate(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"sessionId": "kb-session", "output": {"text": "Yes."}}
+
+
+class FakeTable:
+    def get_item(self, Key):
+        return {}
+
+    def update_item(self, **kwargs):
+        return {}
+
+
+def test_voice_turn_uses_voice_budget_and_emits_metrics(monkeypatch, capsys):
+    bedrock = RecordingBedrock()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "conversation_table", FakeTable()
+    )
+    monkeypatch.setenv("KBID", "kb-1")
+    monkeypatch.setenv("MODEL_ARN", "model")
+
+    response = lambda_orchestrator.lambda_handler(
+        lex_event("Is the measles vaccine safe for babies", "Speech"), None
+    )
+
+    assert response["messages"][0]["content"] == "Yes."
+    config = bedrock.calls[0]["retrieveAndGenerateConfiguration"][
+        "knowledgeBaseConfiguration"
+    ]
+    assert (
+        config["generationConfiguration"]["inferenceConfig"][
+            "textInferenceConfig"
+        ]["maxTokens"]
+        == 150
+    )
+    assert (
+        config["retrievalConfiguration"]["vectorSearchConfiguration"][
+            "numberOfResults"
+        ]
+        == 3
+    )
+    record = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert record["Channel"] == "voice"
+    assert record["Source"] == "knowledge_base"
+    assert record["AnswerCharacters"] == 4
+    assert record["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Channel"]]
+
+
+class SlowBedrock:
+    """Answers retrieve and converse after the given delays."""
+
+    def __init__(self, retrieve_seconds=0.0, converse_seconds=0.0, error=None):
+        self.retrieve_seconds = retrieve_seconds
+        self.converse_seconds = converse_seconds
+        self.error = error
+        self.calls = []
+
+    def retrieve(self, **kwargs):
+        self.calls.append("retrieve")
+        time.sleep(self.retrieve_seconds)
+        if self.error:
+            raise self.error
+        return {"retrievalResults": []}
+
+    def converse(self, **kwargs):
+        self.calls.append("converse")
+        time.sleep(self.converse_seconds)
+        return {
+            "output": {"message": {"content": [{"text": "At eight."}]}},
+            "usage": {"inputTokens": 40},
+        }
+
+
+@pytest.fixture
+def budget_turn(monkeypatch):
+    def turn(bedrock, budget_seconds):
+        monkeypatch.setitem(
+            lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+        )
+        monkeypatch.setitem(
+            lambda_orchestrator.clients, "bedrock-runtime", bedrock
+        )
+        monkeypatch.setattr(
+            lambda_orchestrator, "GENERATION_BUDGET_SECONDS", budget_seconds
+        )
+        monkeypatch.setitem(
+            lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", True
+        )
+        monkeypatch.setitem(
+            lambda_orchestrator.SESSION_STORE, "backend", "memory"
+        )
+        monkeypatch.setattr(lambda_orchestrator, "session_stores", {})
+        monkeypatch.setenv("KBID", "kb-1")
+        monkeypatch.setenv("MODEL_ARN", "model")
+        started = time.monotonic()
+        response = lambda_orchestrator.lambda_handler(
+            lex_event("When does the clinic open"), None
+        )
+        return response["messages"][0]["content"], time.monotonic() - started
+
+    return turn
+
+
+def test_budget_covers_the_whole_turn(budget_turn):
+    # Each call fits the budget on its own, but not both together
+    bedrock = SlowBedrock(retrieve_seconds=0.2, converse_seconds=0.2)
+
+    answer, seconds = budget_turn(bedrock, 0.3)
+
+    assert answer == lambda_orchestrator.BUDGET_EXCEEDED_MESSAGE
+    assert seconds < 0.4
+    assert lambda_orchestrator.turn_deadline["at"] is None
+
+
+def test_no_call_starts_after_the_deadline(budget_turn):
+    bedrock = SlowBedrock(retrieve_seconds=0.3)
+
+    answer, _ = budget_turn(bedrock, 0.2)
+
+    assert answer == lambda_orchestrator.BUDGET_EXCEEDED_MESSAGE
+    time.sleep(0.2)
+    assert bedrock.calls == ["retrieve"]
+
+
+def test_turn_within_budget_is_answered(budget_turn):
+    answer, _ = budget_turn(SlowBedrock(), 5)
+
+    assert answer == "At eight."
+
+
+def test_abandoned_calls_reuse_the_shared_threads(budget_turn):
+    before = set(threading.enumerate())
+
+    for _ in range(3):
+        answer, _ = budget_turn(SlowBedrock(retrieve_seconds=0.2), 0.05)
+        assert answer == lambda_orchestrator.BUDGET_EXCEEDED_MESSAGE
+
+    started = set(threading.enumerate()) - before
+    assert all(thread.name.startswith("bedrock") for thread in started)
+    assert len(started) <= lambda_orchestrator.BEDROCK_THREADS
+
+
+def client_error(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "Retrieve")
+
+
+def test_throttling_is_answered_with_the_budget_message(budget_turn):
+    bedrock = SlowBedrock(error=client_error("ThrottlingException"))
+
+    answer, _ = budget_turn(bedrock, 5)
+
+    assert answer == lambda_orchestrator.BUDGET_EXCEEDED_MESSAGE
+
+
+def test_other_client_errors_still_fail_the_turn(budget_turn):
+    bedrock = SlowBedrock(error=client_error("ValidationException"))
+
+    with pytest.raises(ClientError):
+        budget_turn(bedrock, 5)
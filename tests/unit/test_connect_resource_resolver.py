@@ -0,0 +1,141 @@
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+boto3 = pytest.importorskip("boto3")
+Stubber = pytest.importorskip("botocore.stub").Stubber
+resolver = pytest.importorskip("connect_resource_resolver")
+
+INSTANCE_ID = "11111111-2222-3333-4444-555555555555"
+ARN_PREFIX = f"arn:aws:connect:us-west-2:123456789012:instance/{INSTANCE_ID}"
+
+
+def summary(kind, name, number):
+    resource_id = f"{kind}-{number:04d}"
+    return {
+        "Id": resource_id,
+        "Arn": f"{ARN_PREFIX}/{kind}/{resource_id}",
+        "Name": name,
+    }
+
+
+@pytest.fixture
+def connect_client():
+    client = boto3.client(
+        "connect",
+        region_name="us-west-2",
+        aws_access_key_id="testing",
+        aws_secret_access_key="testing",
+    )
+    with Stubber(client) as stubber:
+        client.stubber = stubber
+        yield client
+        stubber.assert_no_pending_responses()
+
+
+PROPERTIES = {
+    "Queues": {"Basic": {"Name": "BasicQueue", "Types": ["STANDARD"]}},
+    "RoutingProfiles": {"Basic": "Basic Routing Profile"},
+    "SecurityProfiles": {"Agent": "Agent", "Admin": "Admin"},
+}
+
+
+def stub_listings(stubber, security_pages):
+    stubber.add_response(
+        "list_queues",
+        {"QueueSummaryList": [summary("queue", "BasicQueue", 1)]},
+        {
+            "InstanceId": INSTANCE_ID,
+            "QueueTypes": ["STANDARD"],
+            "MaxResults": 1000,
+        },
+    )
+    stubber.add_response(
+        "list_routing_profiles",
+        {
+            "RoutingProfileSummaryList": [
+                summary("routing-profile", "Basic Routing Profile", 1)
+            ]
+        },
+        {"InstanceId": INSTANCE_ID, "MaxResults": 1000},
+    )
+    for number, page in enumerate(security_pages):
+        params = {"InstanceId": INSTANCE_ID, "MaxResults": 1000}
+        if number:
+            params["NextToken"] = f"token-{number}"
+        response = {"SecurityProfileSummaryList": page}
+        if number < len(security_pages) - 1:
+            response["NextToken"] = f"token-{number + 1}"
+        stubber.add_response("list_security_profiles", response, params)
+
+
+def test_resolves_every_name_with_one_listing_per_type(connect_client):
+    stub_listings(
+        connect_client.stubber,
+        [
+            [
+                summary("security-profile", "Agent", 1),
+                summary("security-profile", "Admin", 2),
+            ]
+        ],
+    )
+
+    data = resolver.resolve_resources(connect_client, INSTANCE_ID, PROPERTIES)
+
+    assert data["BasicQueueId"] == "queue-0001"
+    assert data["BasicRoutingProfileArn"].endswith(
+        "routing-profile/routing-profile-0001"
+    )
+    assert data["AgentSecurityProfileId"] == "security-profile-0001"
+    assert data["AdminSecurityProfileId"] == "security-profile-0002"
+
+
+def test_finds_names_beyond_the_first_page(connect_client):
+    filler = [
+        summary("security-profile", f"Custom {n}", n) for n in range(3, 1003)
+    ]
+    stub_listings(
+        connect_client.stubber,
+        [
+            filler[:1000],
+            [
+                summary("security-profile", "Admin", 2),
+                summary("security-profile", "Agent", 1),
+            ],
+        ],
+    )
+
+    data = resolver.resolve_resources(connect_client, INSTANCE_ID, PROPERTIES)
+
+    assert data["AgentSecurityProfileArn"].endswith("security-profile-0001")
+    assert data["AdminSecurityProfileArn"].endswith("security-profile-0002")
+
+
+def test_missing_names_are_reported_together(connect_client):
+    stub_listings(
+        connect_client.stubber, [[summary("security-profile", "Agent", 1)]]
+    )
+
+    with pytest.raises(LookupError, match="SecurityProfile 'Admin'"):
+        resolver.resolve_resources(connect_client, INSTANCE_ID, PROPERTIES)
+
+
+def test_handler_sends_failure_instead_of_looping(connect_client, monkeypatch):
+    stub_listings(connect_client.stubber, [[]])
+    sent = []
+    monkeypatch.setattr(resolver, "client", connect_client)
+    monkeypatch.setattr(resolver, "INSTANCE_ID", INSTANCE_ID)
+    monkeypatch.setattr(
+        resolver.cfnresponse,
+        "send",
+        lambda event, context, status, data: sent.append((status, data)),
+    )
+
+    resolver.lambda_handler(
+        {"RequestType": "Create", "ResourceProperties": PROPERTIES}, None
+    )
+
+    assert sent[0][0] == resolver.cfnresponse.FAILED
+    assert "Agent" in sent[0][1]["message"]
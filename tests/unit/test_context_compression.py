@@ -0,0 +1,176 @@
+import json
+
+import context_compression
+import lambda_orchestrator
+import replay
+
+SETTINGS = dict(context_compression.DEFAULT_COMPRESSION)
+
+PARENT = (
+    "Measles vaccine is given in two doses. The first dose is given at "
+    "twelve to fifteen months of age. The second dose is given at four to "
+    "six years of age. Both doses are free at county clinics."
+)
+
+
+def result(text, score, uri="s3://docs/measles.pdf"):
+    return {
+        "content": {"text": text},
+        "location": {"type": "S3", "s3Location": {"uri": uri}},
+        "score": score,
+    }
+
+
+def test_repeated_and_contained_chunks_are_kept_once():
+    results = [
+        result(PARENT, 0.9),
+        result(PARENT, 0.85),
+        result("The second dose is given at four to six years of age.", 0.8),
+    ]
+
+    passages, stats = context_compression.compress(results, SETTINGS)
+
+    assert [p["text"] for p in passages] == [PARENT]
+    assert stats["passages_in"] == 3
+    assert stats["output_tokens"] < stats["input_tokens"]
+
+
+def test_parent_replaces_contained_child_with_higher_score():
+    child = "The first dose is given at twelve to fifteen months of age."
+    passages, _ = context_compression.compress(
+        [result(child, 0.9), result(PARENT, 0.7)], SETTINGS
+    )
+
+    assert passages == [
+        {"text": PARENT, "source": "s3://docs/measles.pdf", "score": 0.9}
+    ]
+
+
+def test_overlapping_chunks_of_one_document_are_merged():
+    first = (
+        "Clinics open at eight on weekdays. Walk-ins are welcome for flu "
+        "shots, and bring your insurance card if you have one."
+    )
+    second = (
+        "and bring your insurance card if you have one. Children need a "
+        "parent or guardian present."
+    )
+    # Same overlap, but another document
+    other = (
+        "and bring your insurance card if you have one. Parking is free on "
+        "weekends."
+    )
+
+    passages, _ = context_compression.compress(
+        [
+            result(first, 0.8),
+            result(second, 0.7),
+            result(other, 0.7, uri="s3://docs/other.pdf"),
+        ],
+        SETTINGS,
+    )
+
+    texts = [p["text"] for p in passages]
+    assert texts[0] == (
+        "Clinics open at eight on weekdays. Walk-ins are welcome for flu "
+        "shots, and bring your insurance card if you have one. Children "
+        "need a parent or guardian present."
+    )
+    assert texts[1] == other
+
+
+def test_low_scores_are_dropped_and_budget_cuts_at_sentence():
+    results = [
+        result(PARENT, 0.9),
+        result("Unrelated text about parking.", 0.2, uri="s3://docs/p.pdf"),
+    ]
+    budget = context_compression.estimate_tokens(
+        "Measles vaccine is given in two doses."
+    )
+
+    passages, _ = context_compression.compress(
+        results, {**SETTINGS, "token_budget": budget + 2}
+    )
+
+    assert [p["text"] for p in passages] == [
+        "Measles vaccine is given in two doses."
+    ]
+
+
+class FakeRetriever:
+    def retrieve(self, **kwargs):
+        self.request = kwargs
+        return {"retrievalResults": [result(PARENT, 0.9), result(PARENT, 0.8)]}
+
+
+class FakeConverse:
+    def converse(self, **kwargs):
+        self.request = kwargs
+        return {
+            "output": {"message": {"content": [{"text": "Two doses."}]}},
+            "usage": {"inputTokens": 120},
+        }
+
+
+def test_fallback_uses_compressed_context_when_enabled(monkeypatch, capsys):
+    retriever, converse = FakeRetriever(), FakeConverse()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", retriever
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-runtime", converse
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", True
+    )
+    monkeypatch.setitem(lambda_orchestrator.SESSION_STORE, "backend", "memory")
+    monkeypatch.setattr(lambda_orchestrator, "session_stores", {})
+    monkeypatch.setenv("KBID", "kb-1")
+    monkeypatch.setenv("MODEL_ARN", "model")
+
+    event = {
+        "sessionId": "session-1",
+        "inputMode": "Text",
+        "transcriptions": [{"transcription": "When is the measles shot"}],
+        "sessionState": {
+            "sessionAttributes": {},
+            "intent": {"name": "FallbackIntent"},
+        },
+    }
+
+    response = lambda_orchestrator.lambda_handler(event, None)
+
+    assert response["messages"][0]["content"] == "Two doses."
+    assert retriever.request["knowledgeBaseId"] == "kb-1"
+    system_prompt = converse.request["system"][0]["text"]
+    assert system_prompt.count("Measles vaccine is given") == 1
+    assert converse.request["inferenceConfig"] == {"maxTokens": 500}
+    records = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+    assert records[0]["PassagesIn"] == 2
+    assert records[0]["PassagesOut"] == 1
+    assert records[0]["ContextTokensSaved"] > 0
+
+    # The follow-up carries the first turn, since Converse has no session
+    event["transcriptions"] = [{"transcription": "Is it free"}]
+    lambda_orchestrator.lambda_handler(event, None)
+    assert [m["content"][0]["text"] for m in converse.request["messages"]] == [
+        "When is the measles shot",
+        "Two doses.",
+        "Is it free",
+    ]
+
+
+def test_replay_report_sums_savings():
+    records = [
+        {"retrievalResults": [result(PARENT, 0.9), result(PARENT, 0.8)]},
+        {"retrievalResults": [result(PARENT, 0.9)]},
+    ]
+
+    stats = replay.compression_stats(records, SETTINGS)
+
+    tokens = context_compression.estimate_tokens(PARENT)
+    assert stats["input_tokens"] == 3 * tokens
+    assert stats["output_tokens"] == 2 * tokens
+    assert round(stats["savings"], 3) == round(1 / 3, 3)
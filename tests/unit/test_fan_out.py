@@ -0,0 +1,175 @@
+import json
+import time
+
+import pytest
+
+import fan_out
+import lambda_orchestrator
+
+SETTINGS = dict(fan_out.DEFAULT_FAN_OUT)
+
+
+def result(text, score, uri="s3://docs/flu.pdf"):
+    return {
+        "content": {"text": text},
+        "location": {"s3Location": {"uri": uri}},
+        "score": score,
+    }
+
+
+def test_min_max_puts_sources_on_one_scale():
+    merged = fan_out.merge(
+        {
+            "main": [result("Clinic hours", 0.62), result("Parking", 0.52)],
+            "wic": [
+                result("WIC office hours", 0.41),
+                result("WIC eligibility", 0.31),
+                result("WIC forms", 0.36),
+            ],
+        },
+        4,
+        {**SETTINGS, "normalization": "min_max"},
+    )
+
+    assert [
+        (r["content"]["text"], r["score"], r["source"]) for r in merged
+    ] == [
+        ("Clinic hours", 1.0, "main"),
+        ("WIC office hours", 1.0, "wic"),
+        ("WIC forms", pytest.approx(0.5), "wic"),
+        ("Parking", 0.0, "main"),
+    ]
+
+
+def test_raw_scores_rank_unrelated_sources_last_by_default():
+    merged = fan_out.merge(
+        {
+            "main": [result("Clinic hours", 0.7), result("Flu shots", 0.6)],
+            "environmental": [result("Septic permits", 0.2)],
+        },
+        2,
+        SETTINGS,
+    )
+
+    assert [r["content"]["text"] for r in merged] == [
+        "Clinic hours",
+        "Flu shots",
+    ]
+
+
+def test_min_score_keeps_unrelated_sources_out():
+    merged = fan_out.merge(
+        {
+            "main": [result("Clinic hours", 0.7)],
+            "environmental": [result("Septic permits", 0.2)],
+        },
+        5,
+        {**SETTINGS, "min_score": 0.3},
+    )
+
+    assert [r["source"] for r in merged] == ["main"]
+
+
+def test_rrf_ranks_by_position_and_keeps_duplicates_once():
+    merged = fan_out.merge(
+        {
+            "main": [result("Flu shots are free", 0.9), result("Hours", 0.8)],
+            "immunization": [
+                result("Flu  shots are free", 0.5),
+                result("Vaccine records", 0.4),
+            ],
+        },
+        3,
+        {**SETTINGS, "normalization": "rrf"},
+    )
+
+    texts = [r["content"]["text"] for r in merged]
+    assert texts[0].split() == ["Flu", "shots", "are", "free"]
+    assert sorted(texts[1:]) == ["Hours", "Vaccine records"]
+
+
+def test_unknown_sources_and_normalizations_are_rejected():
+    with pytest.raises(ValueError, match="wic"):
+        fan_out.select_sources("kb-1", {}, {**SETTINGS, "sources": ["wic"]})
+    with pytest.raises(ValueError, match="zscore"):
+        fan_out.merge({}, 3, {**SETTINGS, "normalization": "zscore"})
+
+
+class ProgramKnowledgeBases:
+    """Retrieve stub with one slow knowledge base."""
+
+    def retrieve(self, **kwargs):
+        kb_id = kwargs["knowledgeBaseId"]
+        if kb_id == "kb-environmental":
+            time.sleep(1)
+        return {
+            "retrievalResults": [
+                result(f"Answer from {kb_id}.", 0.6, f"s3://{kb_id}/doc.pdf")
+            ]
+        }
+
+
+class FakeConverse:
+    def __init__(self):
+        self.requests = []
+
+    def converse(self, **kwargs):
+        self.requests.append(kwargs)
+        return {
+            "output": {"message": {"content": [{"text": "Merged answer."}]}},
+            "usage": {"inputTokens": 80},
+        }
+
+
+def test_fallback_answers_from_sources_that_respond_in_time(
+    monkeypatch, capsys
+):
+    converse = FakeConverse()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients,
+        "bedrock-agent-runtime",
+        ProgramKnowledgeBases(),
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-runtime", converse
+    )
+    monkeypatch.setitem(lambda_orchestrator.SESSION_STORE, "backend", "memory")
+    monkeypatch.setattr(lambda_orchestrator, "session_stores", {})
+    monkeypatch.setattr(
+        lambda_orchestrator,
+        "FAN_OUT",
+        {**SETTINGS, "enabled": True, "source_timeout_seconds": 0.3},
+    )
+    monkeypatch.setenv("KBID", "kb-main")
+    monkeypatch.setenv("MODEL_ARN", "model")
+    monkeypatch.setenv(
+        "PROGRAM_KNOWLEDGE_BASES",
+        json.dumps({"wic": "kb-wic", "environmental": "kb-environmental"}),
+    )
+
+    started = time.monotonic()
+    response = lambda_orchestrator.lambda_handler(
+        {
+            "sessionId": "session-1",
+            "inputMode": "Text",
+            "transcriptions": [{"transcription": "Where do I apply for WIC"}],
+            "sessionState": {
+                "sessionAttributes": {},
+                "intent": {"name": "FallbackIntent"},
+            },
+        },
+        None,
+    )
+
+    assert time.monotonic() - started < 1
+    assert response["messages"][0]["content"] == "Merged answer."
+    prompt = converse.requests[0]["system"][0]["text"]
+    assert "Answer from kb-main." in prompt
+    assert "Answer from kb-wic." in prompt
+    assert "kb-environmental" not in prompt
+    records = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+    fan_out_record = next(r for r in records if "FanOutSources" in r)
+    assert fan_out_record["FanOutSources"] == 2
+    assert fan_out_record["DroppedSources"] == ["environmental"]
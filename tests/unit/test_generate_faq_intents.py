@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+import generate_faq_intents as faq
+import lambda_orchestrator
+
+QUESTIONS = (
+    ["Where can I get a flu shot?"] * 5
+    + ["where do i get flu shots"] * 3
+    + ["What are the clinic hours?"] * 4
+    + ["when is the clinic open"]
+    + ["is measles contagious"] * 2
+)
+
+
+def write_logs(path, questions, intent="FallbackIntent"):
+    with open(path, "w") as f:
+        for n, question in enumerate(questions):
+            record = {
+                "sessionId": f"session-{n}",
+                "inputTranscript": question,
+                "sessionState": {"intent": {"name": intent}},
+            }
+            # Alternate plain records and CloudWatch-wrapped ones
+            if n % 2:
+                record = {"message": json.dumps(record)}
+            f.write(json.dumps(record) + "\n")
+
+
+def test_clusters_group_rephrasings_by_frequency():
+    clusters = faq.cluster_questions(QUESTIONS)
+
+    assert clusters[0]["occurrences"] == 8
+    assert set(clusters[0]["utterances"]) == {
+        "where can i get a flu shot",
+        "where do i get flu shots",
+    }
+    assert clusters[1]["occurrences"] == 4
+
+
+def test_mine_then_build_serves_answered_entries_only(tmp_path):
+    logs = tmp_path / "logs.jsonl"
+    write_logs(logs, QUESTIONS)
+    write_logs(tmp_path / "greetings.jsonl", ["hello"] * 10, "greeting_intent")
+    curated = tmp_path / "curated.yaml"
+    intents_path = tmp_path / "faq_intents.json"
+    answers_path = tmp_path / "faq_answers.json"
+
+    args = type(
+        "Args",
+        (),
+        {
+            "logs": [str(tmp_path / "*.jsonl")],
+            "curated": str(curated),
+            "top": 10,
+            "min_size": 3,
+            "intents": str(intents_path),
+            "answers": str(answers_path),
+        },
+    )
+    faq.mine(args)
+    entries = faq.load_curated(curated)
+    assert [e["intent"] for e in entries] == ["FaqFluShot", "FaqClinicHour"]
+
+    entries[0]["answer"] = "At any county clinic."
+    faq.save_curated(curated, entries)
+    faq.build(args)
+
+    intents = json.loads(intents_path.read_text())
+    assert [i["Name"] for i in intents] == ["FaqFluShot"]
+    assert {"Utterance": "where do i get flu shots"} in intents[0][
+        "SampleUtterances"
+    ]
+    assert json.loads(answers_path.read_text()) == {
+        "FaqFluShot": "At any county clinic."
+    }
+
+    # A second mining run keeps the curated answer and intent name
+    faq.mine(args)
+    assert faq.load_curated(curated)[0]["answer"] == "At any county clinic."
+
+
+def test_duplicate_utterances_are_dropped_across_intents():
+    intents, _ = faq.build_outputs(
+        [
+            {"intent": "FaqA", "answer": "a", "utterances": ["clinic hours"]},
+            {"intent": "FaqB", "answer": "b", "utterances": ["clinic hours"]},
+            {"intent": "FaqC", "answer": "c", "utterances": ["hello"]},
+        ]
+    )
+
+    assert [i["Name"] for i in intents] == ["FaqA"]
+
+
+@pytest.fixture
+def faq_answers(monkeypatch):
+    answers = {"FaqFluShot": "At any county clinic."}
+    monkeypatch.setattr(lambda_orchestrator, "FAQ_ANSWERS", answers)
+    monkeypatch.setitem(
+        lambda_orchestrator.HANDLERS,
+        "FaqFluShot",
+        {"handler": lambda_orchestrator.faq_intent_handler},
+    )
+    return answers
+
+
+def test_orchestrator_answers_faq_intent_without_clients(faq_answers):
+    event = {
+        "sessionId": "session-1",
+        "sessionState": {"intent": {"name": "FaqFluShot"}},
+    }
+
+    response = lambda_orchestrator.lambda_handler(event, None)
+
+    assert response["messages"][0]["content"] == "At any county clinic."
+    assert response["sessionState"]["intent"]["state"] == "Fulfilled"
+    assert lambda_orchestrator.clients == {}
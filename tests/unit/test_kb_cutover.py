@@ -0,0 +1,161 @@
+import json
+import sys
+
+import pytest
+
+import kb_cutover
+
+PREFIX = "/RagChatbotStack/knowledge-base"
+
+
+class FakeSSM:
+    def __init__(self, **values):
+        self.values = {f"{PREFIX}/{k}": v for k, v in values.items()}
+
+    def get_parameters(self, Names):
+        return {
+            "Parameters": [
+                {"Name": name, "Value": self.values[name]}
+                for name in Names
+                if name in self.values
+            ]
+        }
+
+    def put_parameter(self, Name, Value, Type, Overwrite):
+        self.values[Name] = Value
+
+
+class FakeBedrockAgent:
+    """One data source per knowledge base, with its latest ingestion."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.started = []
+
+    def list_data_sources(self, knowledgeBaseId):
+        return {
+            "dataSourceSummaries": [
+                {"dataSourceId": f"ds-{knowledgeBaseId}", "name": "bucket"}
+            ]
+        }
+
+    def list_ingestion_jobs(self, knowledgeBaseId, **kwargs):
+        status = self.statuses.get(knowledgeBaseId)
+        return {"ingestionJobSummaries": [{"status": status}] if status else []}
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId):
+        self.started.append((knowledgeBaseId, dataSourceId))
+        self.statuses[knowledgeBaseId] = "STARTING"
+        return {"ingestionJob": {"ingestionJobId": "job-1"}}
+
+
+class FakeAgentRuntime:
+    """Retrieves chunks from the source named after the question's first
+    word."""
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, **kwargs):
+        source = retrievalQuery["text"].split()[0].lower()
+        return {
+            "retrievalResults": [
+                {
+                    "content": {"text": f"About {source}"},
+                    "location": {
+                        "s3Location": {"uri": f"s3://bucket/{source}.pdf"}
+                    },
+                }
+            ]
+        }
+
+
+GOLDEN = [
+    {"question": "Vaccines for kindergarten", "expected_sources": ["vaccines"]},
+    {"question": "WIC eligibility", "expected_text": ["about wic"]},
+    {
+        "question": "Parking near the clinic",
+        "expected_sources": ["parking-map"],
+    },
+]
+
+
+def test_read_slots_requires_blue_green_parameters():
+    ssm = FakeSSM(blue="kb-blue", green="kb-green", active="blue")
+    assert kb_cutover.read_slots(ssm, PREFIX) == {
+        "blue": "kb-blue",
+        "green": "kb-green",
+        "active": "blue",
+    }
+
+    with pytest.raises(ValueError, match="is blue_green enabled"):
+        kb_cutover.read_slots(FakeSSM(blue="kb-blue"), PREFIX)
+
+
+def test_recall_matches_sources_or_text():
+    results = FakeAgentRuntime().retrieve("kb", {"text": "WIC hours"})[
+        "retrievalResults"
+    ]
+
+    assert kb_cutover.is_recalled({"expected_sources": ["wic"]}, results)
+    assert kb_cutover.is_recalled({"expected_text": ["ABOUT WIC"]}, results)
+    assert not kb_cutover.is_recalled({"expected_sources": ["snap"]}, results)
+    assert not kb_cutover.is_recalled({}, results)
+
+
+def test_validation_reports_recall_and_threshold_failures():
+    report = kb_cutover.validate_slot(FakeAgentRuntime(), "kb-green", GOLDEN)
+
+    assert report["questions"] == 3
+    assert report["recall"] == pytest.approx(2 / 3)
+    assert report["misses"] == ["Parking near the clinic"]
+    assert kb_cutover.check_thresholds(
+        report, kb_cutover.DEFAULT_THRESHOLDS
+    ) == ["recall 0.67 < 0.8"]
+    assert (
+        kb_cutover.check_thresholds(
+            report, {"min_recall": 0.5, "max_p95_latency_ms": 2000}
+        )
+        == []
+    )
+
+
+@pytest.fixture
+def cutover(monkeypatch, tmp_path):
+    """Runs kb_cutover's command line against fake clients."""
+    ssm = FakeSSM(blue="kb-blue", green="kb-green", active="blue")
+    agent = FakeBedrockAgent({"kb-blue": "COMPLETE"})
+    clients = {
+        "ssm": ssm,
+        "bedrock-agent": agent,
+        "bedrock-agent-runtime": FakeAgentRuntime(),
+    }
+    monkeypatch.setattr(kb_cutover.boto3, "client", clients.__getitem__)
+    golden = tmp_path / "golden.json"
+    golden.write_text(json.dumps(GOLDEN[:2]))
+
+    def run(*args):
+        monkeypatch.setattr(sys, "argv", ["kb_cutover.py", *args])
+        kb_cutover.main()
+
+    run.ssm, run.agent, run.golden = ssm, agent, str(golden)
+    return run
+
+
+def test_promote_needs_a_completed_ingestion(cutover):
+    promote = ("promote", "--slot", "green", "--golden", cutover.golden)
+
+    # Green has never ingested the bucket
+    with pytest.raises(SystemExit, match="latest ingestion not complete"):
+        cutover(*promote)
+
+    cutover("ingest", "--slot", "green")
+    assert cutover.agent.started == [("kb-green", "ds-kb-green")]
+    cutover.agent.statuses["kb-green"] = "COMPLETE"
+    cutover(*promote)
+    assert cutover.ssm.values[f"{PREFIX}/active"] == "green"
+
+
+def test_rollback_switches_to_the_other_slot(cutover):
+    cutover.ssm.values[f"{PREFIX}/active"] = "green"
+
+    cutover("rollback")
+
+    assert cutover.ssm.values[f"{PREFIX}/active"] == "blue"
@@ -0,0 +1,143 @@
+import datetime
+import hashlib
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+boto3 = pytest.importorskip("boto3")
+Stubber = pytest.importorskip("botocore.stub").Stubber
+kb_ingestion_manager = pytest.importorskip("kb_ingestion_manager")
+
+TARGETS = [
+    {"knowledgeBaseId": "KB1", "dataSourceId": "DS1"},
+    {"knowledgeBaseId": "KB2", "dataSourceId": "DS2"},
+]
+PARAMETER = "/stack/knowledge-base/version"
+STARTED = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def client(service_name):
+    return boto3.client(
+        service_name,
+        region_name="us-west-2",
+        aws_access_key_id="testing",
+        aws_secret_access_key="testing",
+    )
+
+
+@pytest.fixture
+def stubs(monkeypatch):
+    bedrock, ssm = client("bedrock-agent"), client("ssm")
+    monkeypatch.setattr(kb_ingestion_manager, "bedrockClient", bedrock)
+    monkeypatch.setattr(kb_ingestion_manager, "ssmClient", ssm)
+    monkeypatch.setenv("KB_VERSION_PARAMETER", PARAMETER)
+    monkeypatch.setenv("INGESTION_TARGETS", json.dumps(TARGETS))
+    with Stubber(bedrock) as bedrock_stub, Stubber(ssm) as ssm_stub:
+        yield bedrock_stub, ssm_stub
+        bedrock_stub.assert_no_pending_responses()
+        ssm_stub.assert_no_pending_responses()
+
+
+def stub_latest_job(stubber, target, job_id, status, filter_status=None):
+    params = {
+        **target,
+        "sortBy": {"attribute": "STARTED_AT", "order": "DESCENDING"},
+        "maxResults": 1,
+    }
+    if filter_status:
+        params["filters"] = [
+            {"attribute": "STATUS", "operator": "EQ", "values": [filter_status]}
+        ]
+    summaries = []
+    if job_id:
+        summaries.append(
+            {
+                **target,
+                "ingestionJobId": job_id,
+                "status": status,
+                "startedAt": STARTED,
+                "updatedAt": STARTED,
+            }
+        )
+    stubber.add_response(
+        "list_ingestion_jobs", {"ingestionJobSummaries": summaries}, params
+    )
+
+
+def stub_settled(stubber, target, latest, latest_status, completed):
+    stub_latest_job(stubber, target, latest, latest_status)
+    stub_latest_job(stubber, target, completed, "COMPLETE", "COMPLETE")
+
+
+def test_no_version_while_a_job_is_in_progress(stubs):
+    bedrock, _ = stubs
+    stub_settled(bedrock, TARGETS[0], "job-1", "COMPLETE", "job-1")
+    stub_latest_job(bedrock, TARGETS[1], "job-3", "IN_PROGRESS")
+
+    assert kb_ingestion_manager.record_version() == (
+        200,
+        "Ingestion in progress.",
+    )
+
+
+def test_failed_latest_job_keeps_the_last_completed_version(stubs):
+    bedrock, _ = stubs
+    stub_settled(bedrock, TARGETS[0], "job-1", "COMPLETE", "job-1")
+    stub_settled(bedrock, TARGETS[1], "job-3", "FAILED", "job-2")
+    stub_settled(bedrock, TARGETS[0], "job-1", "COMPLETE", "job-1")
+    stub_settled(bedrock, TARGETS[1], "job-2", "COMPLETE", "job-2")
+
+    failed = kb_ingestion_manager.knowledge_base_version(TARGETS)
+
+    # The failed job changed no contents, so the version is the same
+    assert failed == kb_ingestion_manager.knowledge_base_version(TARGETS)
+
+
+def test_unchanged_version_is_not_written(stubs):
+    bedrock, ssm = stubs
+    stub_settled(bedrock, TARGETS[0], "job-1", "COMPLETE", "job-1")
+    stub_settled(bedrock, TARGETS[1], "job-2", "COMPLETE", "job-2")
+    stub_settled(bedrock, TARGETS[0], "job-1", "COMPLETE", "job-1")
+    stub_settled(bedrock, TARGETS[1], "job-2", "COMPLETE", "job-2")
+    version = kb_ingestion_manager.knowledge_base_version(TARGETS)
+    ssm.add_response(
+        "get_parameter",
+        {"Parameter": {"Name": PARAMETER, "Value": version}},
+        {"Name": PARAMETER},
+    )
+
+    assert kb_ingestion_manager.record_version() == (
+        200,
+        "Knowledge base version unchanged.",
+    )
+
+
+def test_new_version_is_written(stubs):
+    bedrock, ssm = stubs
+    stub_settled(bedrock, TARGETS[0], "job-1", "COMPLETE", "job-1")
+    # A knowledge base that has never completed an ingestion
+    stub_settled(bedrock, TARGETS[1], None, None, None)
+    version = hashlib.sha256(b"job-1,").hexdigest()[:16]
+    ssm.add_response(
+        "get_parameter",
+        {"Parameter": {"Name": PARAMETER, "Value": "none"}},
+        {"Name": PARAMETER},
+    )
+    ssm.add_response(
+        "put_parameter",
+        {"Version": 2},
+        {
+            "Name": PARAMETER,
+            "Value": version,
+            "Type": "String",
+            "Overwrite": True,
+        },
+    )
+
+    assert kb_ingestion_manager.record_version() == (
+        200,
+        "Knowledge base version " + version,
+    )
@@ -0,0 +1,265 @@
+import aws_cdk as cdk
+import pytest
+from aws_cdk import assertions
+
+from cdk import lambda_lex_bot
+
+
+def template(**configs):
+    """Template of a LambdaAndLexBot synthesized with configs; every
+    config not given is empty."""
+    stack = cdk.Stack(
+        cdk.App(),
+        "LexBotTest",
+        env={"account": "111111111111", "region": "us-west-2"},
+    )
+    names = (
+        "orchestrator_config",
+        "fulfillment_updates_config",
+        "channel_profiles",
+        "context_compression_config",
+        "adaptive_retrieval_config",
+        "session_store_config",
+        "prefetch_config",
+        "fan_out_config",
+        "rate_limit_config",
+        "answer_queue_config",
+        "answer_store_config",
+        "retrieval_cache_config",
+        "redaction_config",
+        "normalization_config",
+    )
+    lambda_lex_bot.LambdaAndLexBot(
+        stack,
+        "LambdaAndLexBot",
+        knowledge_base_id="kb-1",
+        knowledge_base_slot_ids={"blue": "kb-1"},
+        program_knowledge_base_ids={},
+        active_slot_parameter=None,
+        kb_version_parameter=None,
+        bedrock_model_id="model",
+        account_id="111111111111",
+        region="us-west-2",
+        **{name: configs.get(name, {}) for name in names},
+    )
+    return assertions.Template.from_stack(stack)
+
+
+def function_environment(template, handler):
+    [function] = template.find_resources(
+        "AWS::Lambda::Function", {"Properties": {"Handler": handler}}
+    ).values()
+    return function["Properties"]["Environment"]["Variables"]
+
+
+def test_answer_worker_gets_the_rate_limit_table():
+    synthesized = template(
+        rate_limit_config={"enabled": True},
+        answer_queue_config={"enabled": True},
+    )
+
+    worker = function_environment(synthesized, "answer_worker.lambda_handler")
+    orchestrator = function_environment(
+        synthesized, "lambda_orchestrator.lambda_handler"
+    )
+    assert "RATE_LIMIT_TABLE" in worker
+    assert worker["RATE_LIMIT_TABLE"] == orchestrator["RATE_LIMIT_TABLE"]
+
+
+def test_generation_budget_defaults_to_five_seconds_before_the_timeout():
+    updates = lambda_lex_bot.resolve_fulfillment_updates(
+        {"timeout_seconds": 20}
+    )
+
+    assert updates["generation_budget_seconds"] == 15
+    assert updates["start_messages"] == (
+        lambda_lex_bot.DEFAULT_FULFILLMENT_UPDATES["start_messages"]
+    )
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        # The budget must leave time to answer before Lex times out
+        {"timeout_seconds": 20, "generation_budget_seconds": 20},
+        {"start_delay_seconds": 10, "generation_budget_seconds": 8},
+        {"timeout_seconds": 901},
+        {"start_delay_seconds": 0},
+        {"update_frequency_seconds": 0},
+    ],
+)
+def test_invalid_fulfillment_timing_is_rejected(config):
+    with pytest.raises(ValueError):
+        lambda_lex_bot.resolve_fulfillment_updates(config)
+
+
+def test_fulfillment_code_hook_plays_updates_and_the_timeout_message():
+    updates = lambda_lex_bot.resolve_fulfillment_updates(
+        {
+            "update_messages": ["Still looking.", "Almost there."],
+            "timeout_message": "Please ask again.",
+        }
+    )
+
+    hook = lambda_lex_bot.build_fulfillment_code_hook(updates)
+
+    specification = hook["FulfillmentUpdatesSpecification"]
+    assert specification["TimeoutInSeconds"] == 30
+    assert specification["StartResponse"]["DelayInSeconds"] == 2
+    [group] = specification["UpdateResponse"]["MessageGroups"]
+    assert group == {
+        "Message": {"PlainTextMessage": {"Value": "Still looking."}},
+        "Variations": [{"PlainTextMessage": {"Value": "Almost there."}}],
+    }
+    assert hook["PostFulfillmentStatusSpecification"]["TimeoutResponse"][
+        "MessageGroups"
+    ] == [{"Message": {"PlainTextMessage": {"Value": "Please ask again."}}}]
+    assert lambda_lex_bot.build_fulfillment_code_hook(
+        {**updates, "enabled": False}
+    ) == {"Enabled": True}
+
+
+def test_orchestrator_gets_the_generation_budget():
+    synthesized = template(fulfillment_updates_config={"timeout_seconds": 20})
+
+    orchestrator = function_environment(
+        synthesized, "lambda_orchestrator.lambda_handler"
+    )
+    assert orchestrator["GENERATION_BUDGET_SECONDS"] == "15"
+    [bot] = synthesized.find_resources("AWS::Lex::Bot").values()
+    [fallback] = [
+        intent
+        for intent in bot["Properties"]["BotLocales"][0]["Intents"]
+        if intent["Name"] == "FallbackIntent"
+    ]
+    assert (
+        fallback["FulfillmentCodeHook"]["FulfillmentUpdatesSpecification"][
+            "TimeoutInSeconds"
+        ]
+        == 20
+    )
+
+
+def test_answer_store_needs_the_converse_path():
+    with pytest.raises(ValueError, match="context_compression or fan_out"):
+        template(answer_store_config={"enabled": True})
+
+
+def test_lex_invokes_an_alias_with_scheduled_provisioned_concurrency():
+    synthesized = template(
+        orchestrator_config={
+            "concurrency": {
+                "min_capacity": 1,
+                "max_capacity": 4,
+                "time_zone": "America/New_York",
+                "schedules": [
+                    {
+                        "name": "Clinic hours",
+                        "schedule": "cron(0 8 ? * MON-FRI *)",
+                        "min_capacity": 3,
+                        "max_capacity": 10,
+                    }
+                ],
+                "warmup_schedule": "rate(5 minutes)",
+            }
+        }
+    )
+
+    synthesized.has_resource_properties("AWS::Lambda::Alias", {"Name": "live"})
+    synthesized.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalableTarget",
+        {
+            "MinCapacity": 1,
+            "MaxCapacity": 4,
+            "ScalableDimension": "lambda:function:ProvisionedConcurrency",
+            "ScheduledActions": [
+                {
+                    "ScheduledActionName": "Clinic hours",
+                    "Schedule": "cron(0 8 ? * MON-FRI *)",
+                    "Timezone": "America/New_York",
+                    "ScalableTargetAction": {
+                        "MinCapacity": 3,
+                        "MaxCapacity": 10,
+                    },
+                }
+            ],
+        },
+    )
+    synthesized.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalingPolicy",
+        {
+            "PolicyType": "TargetTrackingScaling",
+            "TargetTrackingScalingPolicyConfiguration": assertions.Match.object_like(
+                {"TargetValue": 0.7}
+            ),
+        },
+    )
+    synthesized.has_resource_properties(
+        "AWS::Events::Rule",
+        {
+            "ScheduleExpression": "rate(5 minutes)",
+            "Targets": [
+                assertions.Match.object_like({"Input": '{"warmup":true}'})
+            ],
+        },
+    )
+
+
+def test_no_scaling_without_provisioned_concurrency():
+    synthesized = template()
+
+    synthesized.resource_count_is("AWS::Lambda::Alias", 1)
+    synthesized.resource_count_is(
+        "AWS::ApplicationAutoScaling::ScalableTarget", 0
+    )
+    synthesized.resource_count_is("AWS::Events::Rule", 0)
+
+
+def test_orchestrator_profile_fills_in_the_named_profile():
+    profile = lambda_lex_bot.resolve_orchestrator_profile(
+        {"profile": "startup", "memory_size": 2048, "concurrency": {}}
+    )
+
+    assert profile == {
+        **lambda_lex_bot.ORCHESTRATOR_PROFILES["startup"],
+        "memory_size": 2048,
+    }
+    assert (
+        lambda_lex_bot.resolve_orchestrator_profile({})
+        == lambda_lex_bot.ORCHESTRATOR_PROFILES["default"]
+    )
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"profile": "fastest"},
+        {"runtime": "python2.7"},
+        {"architecture": "arm32"},
+        {"handler": "threaded"},
+    ],
+)
+def test_unknown_orchestrator_settings_are_rejected(config):
+    with pytest.raises(ValueError):
+        lambda_lex_bot.resolve_orchestrator_profile(config)
+
+
+def test_orchestrator_profile_sets_runtime_and_log_level():
+    synthesized = template(
+        orchestrator_config={"profile": "startup", "log_level": "WARNING"}
+    )
+
+    synthesized.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Handler": "lambda_orchestrator.lambda_handler",
+            "Runtime": "python3.12",
+            "Architectures": ["arm64"],
+            "MemorySize": 1769,
+            "Environment": {
+                "Variables": assertions.Match.object_like(
+                    {"LOG_LEVEL": "WARNING"}
+                )
+            },
+        },
+    )
@@ -0,0 +1,62 @@
+import logging
+import os
+import subprocess
+import sys
+
+import boto3
+
+import lambda_orchestrator
+
+
+class RecordingClient:
+    """boto3 client that records every API call made through it."""
+
+    def __init__(self, service_name, calls):
+        self.service_name = service_name
+        self.calls = calls
+
+    def __getattr__(self, name):
+        def call(**kwargs):
+            self.calls.append((self.service_name, name))
+            return {}
+
+        return call
+
+
+def test_warmup_event_creates_clients_without_calling_bedrock(
+    orchestrator, monkeypatch
+):
+    created, calls = [], []
+
+    def client(service_name, config=None):
+        created.append(service_name)
+        return RecordingClient(service_name, calls)
+
+    monkeypatch.setattr(boto3, "client", client)
+    monkeypatch.setattr(orchestrator, "clients", {})
+    monkeypatch.setitem(orchestrator.CONTEXT_COMPRESSION, "enabled", True)
+
+    result = lambda_orchestrator.lambda_handler({"warmup": True}, None)
+
+    assert result["warmed"] is True
+    assert result["knowledge_base_id"] == "kb-1"
+    assert created == ["bedrock-agent-runtime", "bedrock-runtime"]
+    assert calls == []
+
+
+def test_startup_reads_log_level_and_defers_boto3():
+    # A fresh interpreter, so earlier tests' imports do not count
+    script = (
+        "import sys, lambda_orchestrator; "
+        "print(lambda_orchestrator.logger.level, 'boto3' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(lambda_orchestrator.__file__),
+        env={**os.environ, "LOG_LEVEL": "WARNING"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.split() == [str(logging.WARNING), "False"]
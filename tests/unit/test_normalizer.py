@@ -0,0 +1,146 @@
+import json
+
+import pytest
+
+import lambda_orchestrator
+import normalizer
+import replay
+
+
+@pytest.fixture
+def rewriter():
+    return normalizer.Normalizer(normalizer.DEFAULT_NORMALIZATION)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("um where do i apply for why see", "where do i apply for WIC"),
+        (
+            "uh, does medic aid cover the dentist",
+            "does Medicaid cover the dentist",
+        ),
+        (
+            "is it free for people over sixty-five",
+            "is it free for people over 65",
+        ),
+        ("born nineteen eighty five", "born 1985"),
+        ("the two thousand twenty five schedule", "the 2025 schedule"),
+        ("call five five five two zero one", "call 555201"),
+        ("which one is free", "which one is free"),
+        ("the fourth floor", "the fourth floor"),
+        ("wait a second", "wait a second"),
+        ("the twenty first century", "the twenty first century"),
+        ("open at nine thirty", "open at nine thirty"),
+        ("closes at eleven forty five", "closes at eleven forty five"),
+        ("four hundred and fifty dollars", "450 dollars"),
+        ("two thousand and five", "2005"),
+        ("born june third two thousand and five", "born june 3 2005"),
+        ("bread and milk and one hundred eggs", "bread and milk and 100 eggs"),
+        ("I mean it", "I mean it"),
+        ("I have two three year olds", "I have 2 3 year olds"),
+        ("shots for two four month olds", "shots for 2 4 month olds"),
+        ("open twenty four seven", "open 24 7"),
+        ("the twenty twenty five flu shot", "the 2025 flu shot"),
+        ("zip nine eight one zero four", "zip 98104"),
+        ("open on the fourth of july", "open on july 4"),
+        ("born march fourteenth nineteen eighty five", "born march 14 1985"),
+        ("born March 14th, 1985", "born march 14 1985"),
+        ("may I come in on may twenty first", "may I come in on may 21"),
+        ("the mmr shot you know", "the mmr shot"),
+        ("hmm", "hmm"),
+    ],
+)
+def test_transcriptions_are_normalized(rewriter, text, expected):
+    assert rewriter.normalize(text) == expected
+
+
+def test_longest_lexicon_phrase_wins():
+    rewriter = normalizer.Normalizer(
+        {
+            **normalizer.DEFAULT_NORMALIZATION,
+            "lexicon": {"why": "Y", "why see office": "WIC office"},
+        }
+    )
+
+    assert rewriter.normalize("the why see office") == "the WIC office"
+    assert rewriter.normalize("why see") == "WIC"
+    assert rewriter.normalize("whys") == "whys"
+
+
+def test_numbers_and_dates_can_be_turned_off():
+    rewriter = normalizer.Normalizer(
+        {**normalizer.DEFAULT_NORMALIZATION, "numbers": False, "dates": False}
+    )
+
+    assert rewriter.normalize("um july fourth at five") == "july fourth at five"
+
+
+def voice_event(text):
+    return {
+        "sessionId": "session-1",
+        "inputMode": "Speech",
+        "inputTranscript": text,
+        "transcriptions": [{"transcription": text}],
+        "sessionState": {
+            "sessionAttributes": {},
+            "intent": {"name": "FallbackIntent"},
+        },
+    }
+
+
+def test_voice_events_are_normalized_before_redaction(capsys):
+    event = voice_event(
+        "um my number is five five five two zero one three "
+        "three four four, is why see free"
+    )
+
+    lambda_orchestrator.normalize_event(event)
+    lambda_orchestrator.redact_event(event)
+
+    assert event["transcriptions"][0]["transcription"] == (
+        "my number is [PHONE], is WIC free"
+    )
+    assert event["inputTranscript"] == "my number is [PHONE], is WIC free"
+    record = json.loads(capsys.readouterr().out.splitlines()[0])
+    assert record["NormalizedTranscriptions"] == 1
+    assert record["Channel"] == "voice"
+
+
+def test_typed_questions_are_left_alone():
+    event = {**voice_event("um is why see free"), "inputMode": "Text"}
+
+    lambda_orchestrator.normalize_event(event)
+
+    assert event["inputTranscript"] == "um is why see free"
+
+
+def turn(text, input_mode, timestamp):
+    return {
+        "session_id": timestamp,
+        "timestamp": timestamp,
+        "transcript": text,
+        "intent": "FallbackIntent",
+        "input_mode": input_mode,
+        "session_attributes": {},
+        "request_attributes": {},
+    }
+
+
+def test_replay_reports_hit_rates_with_and_without_normalization():
+    turns = [
+        turn("Where do I apply for WIC", "Text", "1"),
+        turn("um where do i apply for why see", "Speech", "2"),
+        turn("where do i apply for w i c", "Speech", "3"),
+        turn("Is the flu shot free", "Text", "4"),
+    ]
+
+    rows, rewrites = replay.normalization_report(
+        turns, normalizer.DEFAULT_NORMALIZATION, 1, 2
+    )
+
+    before, after = rows["all"]
+    assert (before["distinct"], after["distinct"]) == (4, 2)
+    assert (before["cache_hits"], after["cache_hits"]) == (0.0, 0.5)
+    assert (before["precomputed"], after["precomputed"]) == (0.0, 0.75)
+    assert sum(rewrites.values()) == 2
@@ -0,0 +1,153 @@
+import threading
+
+import pytest
+
+import opensearch_vector_store as ovs
+
+
+class FakeIndices:
+    def __init__(self):
+        self.bodies = {}
+
+    def exists(self, index):
+        return index in self.bodies
+
+    def create(self, index, body):
+        self.bodies[index] = body
+
+
+class FakeOpenSearch:
+    """In-memory stand-in for the parts of opensearch-py the backend uses."""
+
+    def __init__(self, reject_every=None):
+        self.indices = FakeIndices()
+        self.documents = []
+        self.bulk_calls = 0
+        self.threads = set()
+        self.reject_every = reject_every
+        self.lock = threading.Lock()
+
+    def bulk(self, body):
+        items = []
+        with self.lock:
+            self.bulk_calls += 1
+            self.threads.add(threading.get_ident())
+            for action, document in zip(body[::2], body[1::2]):
+                assert "index" in action
+                if (
+                    self.reject_every
+                    and len(self.documents) % self.reject_every == 0
+                ):
+                    self.documents.append(None)
+                    items.append(
+                        {"index": {"error": {"type": "mapper_parsing"}}}
+                    )
+                else:
+                    self.documents.append(document)
+                    items.append({"index": {"result": "created"}})
+        return {
+            "errors": any("error" in item["index"] for item in items),
+            "items": items,
+        }
+
+    def search(self, index, body):
+        vector = body["query"]["knn"]["embedding"]["vector"]
+        scored = sorted(
+            (d for d in self.documents if d),
+            key=lambda d: -sum(a * b for a, b in zip(vector, d["embedding"])),
+        )
+        return {
+            "hits": {"hits": [{"_source": d} for d in scored[: body["size"]]]}
+        }
+
+
+def documents(count, dimension=4):
+    for i in range(count):
+        yield {
+            "chunk_id": str(i),
+            "passage": f"passage {i}",
+            "embedding": [float(i % 7)] * dimension,
+            "source_url": f"s3://bucket/doc-{i % 3}.pdf",
+        }
+
+
+def test_index_body_uses_faiss_with_fp16_encoder():
+    settings = ovs.index_settings(
+        {
+            "dimension": 8,
+            "quantization": "fp16",
+            "m": 24,
+            "refresh_interval": "30s",
+        }
+    )
+    body = ovs.build_index_body(settings)
+
+    embedding = body["mappings"]["properties"]["embedding"]
+    assert "passage" in body["mappings"]["properties"]
+    assert embedding["dimension"] == 8
+    assert embedding["method"]["engine"] == "faiss"
+    assert embedding["method"]["parameters"]["m"] == 24
+    assert embedding["method"]["parameters"]["encoder"]["parameters"] == {
+        "type": "fp16"
+    }
+    assert body["settings"]["index"]["refresh_interval"] == "30s"
+    assert "number_of_shards" not in body["settings"]["index"]
+
+
+def test_byte_quantization_sets_data_type():
+    body = ovs.build_index_body(ovs.index_settings({"quantization": "byte"}))
+
+    embedding = body["mappings"]["properties"]["embedding"]
+    assert embedding["data_type"] == "byte"
+    assert "encoder" not in embedding["method"]["parameters"]
+    assert ovs.quantize_to_bytes([1.0, -2.0, 0.25], 127) == [127, -128, 32]
+
+
+def test_rejects_unsupported_engine_and_quantization():
+    with pytest.raises(ValueError):
+        ovs.index_settings({"engine": "nmslib"})
+    with pytest.raises(ValueError):
+        ovs.index_settings({"engine": "lucene", "quantization": "fp16"})
+
+
+def test_create_index_is_idempotent():
+    client = FakeOpenSearch()
+    settings = ovs.index_settings()
+
+    assert ovs.create_index(client, "rag-kb", settings) is True
+    assert ovs.create_index(client, "rag-kb", settings) is False
+
+
+def test_bulk_load_batches_in_parallel():
+    client = FakeOpenSearch()
+
+    result = ovs.bulk_load(
+        client, "rag-kb", documents(1050), batch_size=100, workers=4
+    )
+
+    assert result["indexed"] == 1050
+    assert result["failed"] == 0
+    assert client.bulk_calls == 11
+    assert len(client.documents) == 1050
+
+
+def test_bulk_load_counts_failed_items():
+    client = FakeOpenSearch(reject_every=10)
+
+    result = ovs.bulk_load(client, "rag-kb", documents(100), batch_size=25)
+
+    assert result["failed"] == 10
+    assert result["indexed"] == 90
+
+
+def test_benchmark_reports_latency_percentiles():
+    client = FakeOpenSearch()
+    ovs.bulk_load(client, "rag-kb", documents(50), batch_size=10)
+
+    result = ovs.benchmark_queries(
+        client, "rag-kb", [[1.0] * 4 for _ in range(20)], k=5, workers=2
+    )
+
+    assert result["queries"] == 20
+    assert result["k"] == 5
+    assert 0 <= result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
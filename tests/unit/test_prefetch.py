@@ -0,0 +1,188 @@
+import threading
+import time
+
+import pytest
+
+import lambda_orchestrator
+import prefetch
+import replay
+import retrieval_cache
+
+OPENING = "When is the flu clinic open?"
+
+
+class CountingAgentRuntime:
+    def __init__(self):
+        self.queries = []
+
+    def retrieve(self, **kwargs):
+        self.queries.append(kwargs["retrievalQuery"]["text"])
+        return {
+            "retrievalResults": [
+                {
+                    "content": {"text": "Clinics open at eight on weekdays."},
+                    "location": {"s3Location": {"uri": "s3://docs/flu.pdf"}},
+                    "score": 0.8,
+                }
+            ]
+        }
+
+
+class FakeConverse:
+    def converse(self, **kwargs):
+        return {
+            "output": {"message": {"content": [{"text": "At eight."}]}},
+            "usage": {"inputTokens": 50},
+        }
+
+
+@pytest.fixture
+def prefetching(orchestrator, monkeypatch):
+    agent_runtime = CountingAgentRuntime()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", agent_runtime
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-runtime", FakeConverse()
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", True
+    )
+    monkeypatch.setattr(
+        lambda_orchestrator,
+        "PREFETCH",
+        {
+            **prefetch.DEFAULT_PREFETCH,
+            "enabled": True,
+            "budget_seconds": 5,
+            "opening_questions": [OPENING],
+        },
+    )
+    monkeypatch.setattr(prefetch, "retrievals", {})
+    return agent_runtime
+
+
+def test_greeting_prefetches_the_first_question(prefetching, make_event):
+    greeting = lambda_orchestrator.lambda_handler(
+        make_event("hello", "greeting_intent"), None
+    )
+
+    assert greeting["messages"][0]["content"].startswith("Hello!")
+    assert prefetching.queries == [OPENING]
+    store = lambda_orchestrator.get_session_store()
+    assert "session-1" in store.items
+
+    answer = lambda_orchestrator.lambda_handler(
+        make_event("when is the flu clinic open"), None
+    )
+
+    assert answer["messages"][0]["content"] == "At eight."
+    # Served from the prefetch; nothing else was retrieved
+    assert prefetching.queries == [OPENING]
+
+    lambda_orchestrator.lambda_handler(make_event("Is the flu shot free"), None)
+    assert prefetching.queries == [OPENING, "Is the flu shot free"]
+
+
+def test_greeting_does_not_wait_out_a_slow_prefetch(
+    prefetching, monkeypatch, make_event
+):
+    released = threading.Event()
+    retrieve = prefetching.retrieve
+
+    def slow_retrieve(**kwargs):
+        released.wait(5)
+        return retrieve(**kwargs)
+
+    monkeypatch.setattr(prefetching, "retrieve", slow_retrieve)
+    monkeypatch.setitem(lambda_orchestrator.PREFETCH, "budget_seconds", 0.05)
+    started = time.monotonic()
+    try:
+        lambda_orchestrator.lambda_handler(
+            make_event("hello", "greeting_intent"), None
+        )
+        assert time.monotonic() - started < 1
+        assert prefetching.queries == []
+    finally:
+        released.set()
+
+
+def test_greeting_survives_a_failed_prefetch(
+    prefetching, monkeypatch, make_event
+):
+    monkeypatch.delenv("KBID")
+
+    greeting = lambda_orchestrator.lambda_handler(
+        make_event("hello", "greeting_intent"), None
+    )
+
+    assert greeting["messages"][0]["content"].startswith("Hello!")
+    assert prefetching.queries == []
+
+
+def test_retrieval_cache_is_created_before_prefetch_threads(
+    prefetching, kb_version, make_event, monkeypatch
+):
+    creating_threads = []
+    create_cache = retrieval_cache.create_cache
+
+    def recording_create_cache(*args):
+        creating_threads.append(threading.current_thread())
+        return create_cache(*args)
+
+    monkeypatch.setattr(retrieval_cache, "create_cache", recording_create_cache)
+    monkeypatch.setattr(
+        lambda_orchestrator,
+        "RETRIEVAL_CACHE",
+        {
+            **retrieval_cache.DEFAULT_RETRIEVAL_CACHE,
+            "enabled": True,
+            "backend": "memory",
+        },
+    )
+    monkeypatch.setattr(lambda_orchestrator, "retrieval_caches", {})
+
+    lambda_orchestrator.lambda_handler(
+        make_event("hello", "greeting_intent"), None
+    )
+
+    assert prefetching.queries == [OPENING]
+    assert creating_threads == [threading.main_thread()]
+
+
+def test_prefetched_results_expire(monkeypatch):
+    monkeypatch.setattr(prefetch, "retrievals", {})
+    now = prefetch.time.monotonic()
+    prefetch.store(OPENING, "kb-1", {"numberOfResults": 3}, ["result"], 60)
+
+    assert prefetch.lookup(
+        "when is the FLU clinic open", "kb-1", {"numberOfResults": 3}
+    ) == ["result"]
+    assert prefetch.lookup(OPENING, "kb-2", {"numberOfResults": 3}) is None
+
+    monkeypatch.setattr(prefetch.time, "monotonic", lambda: now + 61)
+    assert prefetch.lookup(OPENING, "kb-1", {"numberOfResults": 3}) is None
+
+
+def test_opening_questions_count_first_question_per_session():
+    turns = [
+        {
+            "session_id": session,
+            "timestamp": timestamp,
+            "intent": intent,
+            "transcript": text,
+        }
+        for session, timestamp, intent, text in [
+            ("a", "1", "greeting_intent", "hi"),
+            ("a", "2", "FallbackIntent", "When is the flu clinic open?"),
+            ("a", "3", "FallbackIntent", "Is it free"),
+            ("b", "1", "FallbackIntent", "when is the flu clinic open"),
+            ("c", "1", "FallbackIntent", "Where do I park"),
+        ]
+    ]
+
+    counts, wordings = replay.opening_questions(turns)
+
+    assert counts.most_common(1) == [("when is the flu clinic open", 2)]
+    assert counts["is it free"] == 0
+    assert wordings["where do i park"] == "Where do I park"
@@ -0,0 +1,234 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import lambda_orchestrator
+import rate_limit
+
+SETTINGS = {
+    **rate_limit.DEFAULT_RATE_LIMIT,
+    "session": {"rate": 0.5, "burst": 2},
+    "global": {"rate": 10, "burst": 10},
+}
+
+
+class BucketTable:
+    """The two conditional updates rate_limit.DynamoDBBuckets sends."""
+
+    def __init__(self):
+        self.items = {}
+        self.updates = 0
+
+    def update_item(
+        self,
+        Key,
+        UpdateExpression,
+        ConditionExpression,
+        ExpressionAttributeNames,
+        ExpressionAttributeValues,
+    ):
+        self.updates += 1
+        values = ExpressionAttributeValues
+        item = self.items.get(Key["bucket"])
+        arrival = item["arrival"] if item else None
+        if ConditionExpression.startswith("attribute_not_exists"):
+            admitted = arrival is None or arrival < values[":now"]
+            new_arrival = values.get(":arrival")
+        else:
+            admitted = arrival is not None and arrival <= values[":latest"]
+            new_arrival = arrival + values[":interval"] if admitted else None
+        if not admitted:
+            raise ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException"}},
+                "UpdateItem",
+            )
+        self.items[Key["bucket"]] = {
+            "arrival": new_arrival,
+            "expires_at": values[":ttl"],
+        }
+
+
+def test_session_bucket_allows_burst_then_refills():
+    limiter = rate_limit.create_limiter({**SETTINGS, "backend": "memory"})
+
+    assert limiter.admit("a", now=100.0) is None
+    assert limiter.admit("a", now=100.1) is None
+    assert limiter.admit("a", now=100.2) == rate_limit.SESSION
+    # Other sessions have their own bucket
+    assert limiter.admit("b", now=100.2) is None
+    # One token back every two seconds
+    assert limiter.admit("a", now=102.1) is None
+    assert limiter.admit("a", now=102.2) == rate_limit.SESSION
+
+
+def test_global_bucket_is_shared_across_environments():
+    table = BucketTable()
+    settings = {
+        **SETTINGS,
+        "session": {"rate": 100, "burst": 100},
+        "global": {"rate": 1, "burst": 4},
+        "lease_size": 2,
+    }
+    first = rate_limit.create_limiter(settings, lambda: table)
+    second = rate_limit.create_limiter(settings, lambda: table)
+
+    admitted = [
+        limiter.admit(f"session-{n}", now=50.0)
+        for n, limiter in enumerate([first, second] * 3)
+    ]
+
+    assert admitted == [None, None, None, None, "global", "global"]
+    # After one second one token is back
+    assert first.admit("session-9", now=51.0) is None
+    assert second.admit("session-9", now=51.0) == rate_limit.GLOBAL
+
+
+def test_local_fast_path_skips_the_table():
+    table = BucketTable()
+    limiter = rate_limit.create_limiter(SETTINGS, lambda: table)
+
+    for _ in range(2):
+        assert limiter.admit("loop", now=10.0) is None
+    updates = table.updates
+
+    assert limiter.admit("loop", now=10.0) == rate_limit.SESSION
+    assert table.updates == updates
+
+
+def test_bucket_settings_merge_with_the_defaults():
+    settings = rate_limit.load_settings(
+        {"enabled": True, "session": {"rate": 1}}
+    )
+
+    assert settings["session"] == {
+        "rate": 1,
+        "burst": rate_limit.DEFAULT_RATE_LIMIT["session"]["burst"],
+    }
+    assert settings["global"] == rate_limit.DEFAULT_RATE_LIMIT["global"]
+    limiter = rate_limit.create_limiter({**settings, "backend": "memory"})
+    assert limiter.admit("a", now=1.0) is None
+
+
+def test_recent_answers_expire_and_are_bounded(monkeypatch):
+    monkeypatch.setattr(rate_limit, "answers", rate_limit.OrderedDict())
+    settings = {**SETTINGS, "answer_cache_size": 2}
+
+    rate_limit.remember("Is the flu shot free?", "chat", "Yes.", settings)
+    rate_limit.remember("Where is the clinic", "chat", "Main St.", settings)
+    rate_limit.remember("When does it open", "chat", "At eight.", settings)
+
+    assert rate_limit.recent_answer("is the flu shot free", "chat") is None
+    assert rate_limit.recent_answer("when does it OPEN", "chat") == "At eight."
+    assert rate_limit.recent_answer("when does it open", "voice") is None
+
+
+class FakeBedrock:
+    def __init__(self):
+        self.calls = 0
+
+    def retrieve_and_generate(self, **kwargs):
+        self.calls += 1
+        return {"sessionId": "kb-session", "output": {"text": "Yes, free."}}
+
+
+@pytest.fixture
+def limited(orchestrator, monkeypatch):
+    bedrock = FakeBedrock()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+    )
+    monkeypatch.setattr(
+        lambda_orchestrator,
+        "RATE_LIMIT",
+        {
+            **SETTINGS,
+            "enabled": True,
+            "backend": "memory",
+            "session": {"rate": 0.01, "burst": 1},
+        },
+    )
+    monkeypatch.setattr(lambda_orchestrator, "rate_limiters", {})
+    monkeypatch.setattr(rate_limit, "answers", rate_limit.OrderedDict())
+    return bedrock
+
+
+def test_over_limit_turns_get_cached_or_canned_answers(
+    limited, make_event, capsys
+):
+    first = lambda_orchestrator.lambda_handler(
+        make_event("Is the flu shot free"), None
+    )
+    repeated = lambda_orchestrator.lambda_handler(
+        make_event("is the flu shot free?"), None
+    )
+    new = lambda_orchestrator.lambda_handler(
+        make_event("Where do I park"), None
+    )
+
+    assert limited.calls == 1
+    assert first["messages"][0]["content"] == "Yes, free."
+    assert repeated["messages"][0]["content"] == "Yes, free."
+    assert (
+        new["messages"][0]["content"]
+        == rate_limit.DEFAULT_RATE_LIMIT["message"]
+    )
+    records = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+    rejected = [r for r in records if "RateLimitedTurns" in r]
+    assert [(r["Scope"], r["Served"]) for r in rejected] == [
+        ("session", "cached"),
+        ("session", "canned"),
+    ]
+
+
+def test_turns_are_admitted_when_the_table_is_unreachable(
+    limited, make_event, monkeypatch
+):
+    class Unreachable:
+        def update_item(self, **kwargs):
+            raise ClientError(
+                {"Error": {"Code": "ProvisionedThroughputExceededException"}},
+                "UpdateItem",
+            )
+
+    monkeypatch.setitem(lambda_orchestrator.RATE_LIMIT, "backend", "dynamodb")
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "rate_limit_table", Unreachable()
+    )
+
+    response = lambda_orchestrator.lambda_handler(
+        make_event("Is the flu shot free"), None
+    )
+
+    assert response["messages"][0]["content"] == "Yes, free."
+
+
+def test_follow_up_answers_are_not_served_to_other_sessions(
+    limited, make_event, monkeypatch
+):
+    monkeypatch.setitem(
+        lambda_orchestrator.RATE_LIMIT, "session", {"rate": 0.01, "burst": 2}
+    )
+    turns = [
+        ("one", "Where is the flu clinic"),
+        # Answered from session one's history
+        ("one", "Is it free"),
+        ("two", "Where do I apply for WIC"),
+        ("two", "Where do I park"),
+        ("two", "Is it free"),
+    ]
+
+    responses = [
+        lambda_orchestrator.lambda_handler(
+            make_event(text, session_id=session_id), None
+        )
+        for session_id, text in turns
+    ]
+
+    assert limited.calls == 4
+    assert (
+        responses[-1]["messages"][0]["content"]
+        == rate_limit.DEFAULT_RATE_LIMIT["message"]
+    )
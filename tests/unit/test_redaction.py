@@ -0,0 +1,148 @@
+import logging
+
+import pytest
+
+import lambda_orchestrator
+import redaction
+
+
+@pytest.fixture
+def redactor():
+    return redaction.Redactor(redaction.DEFAULT_REDACTION)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Write to jane.doe+wic@example.org", "Write to [EMAIL]"),
+        ("Call me at 555-201-3344 please", "Call me at [PHONE] please"),
+        ("my number is (555) 201 3344", "my number is [PHONE]"),
+        ("reach me on +1 555 201 3344", "reach me on [PHONE]"),
+        ("I was born 03/14/1985", "I was born [DATE]"),
+        ("born March 14th, 1985 in Ohio", "born [DATE] in Ohio"),
+        ("DOB 14 of march 1985", "DOB [DATE]"),
+        ("my date of birth is 1985-03-14", "my date of birth is [DATE]"),
+        ("my social is 123-45-6789", "my social is [SSN]"),
+        ("Medicaid ID AB12345C", "Medicaid ID [MEDICAID_ID]"),
+        ("member 123456789012 here", "member [MEDICAID_ID] here"),
+    ],
+)
+def test_entities_are_replaced_by_their_tokens(redactor, text, expected):
+    assert redactor.redact(text) == expected
+    # Redacting twice changes nothing
+    assert redactor.redact(expected) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Do I need an appointment for a flu shot",
+        "Is the COVID booster covered for people over 65",
+        "Open from 9 to 5 on weekdays, room 204",
+        "is the clinic open on 12/24/2025",
+        "Is the birthing center open on December 24th, 2025 or 12/31/25",
+    ],
+)
+def test_questions_without_pii_are_unchanged(redactor, text):
+    assert redactor.scan(text) == (text, [])
+
+
+def test_entities_are_configurable():
+    redactor = redaction.Redactor(
+        {
+            **redaction.DEFAULT_REDACTION,
+            "entities": ["phone"],
+            "patterns": {"member_id": r"\bWIC\d{7}\b"},
+        }
+    )
+
+    assert redactor.scan("WIC1234567, born 03/14/1985, 555-201-3344") == (
+        "[MEMBER_ID], born 03/14/1985, [PHONE]",
+        ["member_id", "phone"],
+    )
+    with pytest.raises(ValueError):
+        redaction.Redactor({"entities": ["passport"], "patterns": {}})
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def test_log_filter_redacts_formatted_records(redactor):
+    root = logging.Logger("root")
+    collect = Collect()
+    root.addHandler(collect)
+    redaction.install_log_filter(redactor, root)
+
+    root.warning(
+        "Lex event info = %s", {"inputTranscript": "call 555-201-3344"}
+    )
+    root.warning("Is the flu shot free")
+
+    assert collect.lines == [
+        "Lex event info = {'inputTranscript': 'call [PHONE]'}",
+        "Is the flu shot free",
+    ]
+
+
+def test_log_filter_redacts_tracebacks(redactor):
+    root = logging.Logger("root")
+    collect = Collect()
+    root.addHandler(collect)
+    redaction.install_log_filter(redactor, root)
+
+    try:
+        raise ValueError("No session for caller 555-201-3344")
+    except ValueError:
+        root.exception("Session lookup failed")
+
+    [line] = collect.lines
+    assert "ValueError: No session for caller [PHONE]" in line
+    assert "555-201-3344" not in line
+
+
+class RecordingBedrock:
+    def __init__(self):
+        self.inputs = []
+
+    def retrieve_and_generate(self, **kwargs):
+        self.inputs.append(kwargs["input"]["text"])
+        return {
+            "output": {"text": "Someone will call you back."},
+            "sessionId": "bedrock-session",
+        }
+
+
+def test_queries_are_redacted_before_they_leave(monkeypatch, capsys):
+    bedrock = RecordingBedrock()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+    )
+    monkeypatch.setitem(lambda_orchestrator.SESSION_STORE, "backend", "memory")
+    monkeypatch.setattr(lambda_orchestrator, "session_stores", {})
+    monkeypatch.setenv("KBID", "kb-1")
+    monkeypatch.setenv("MODEL_ARN", "model")
+    text = "My number is 555-201-3344, is the flu shot free at the clinic"
+    event = {
+        "sessionId": "session-1",
+        "inputMode": "Text",
+        "inputTranscript": text,
+        "transcriptions": [{"transcription": text}],
+        "sessionState": {
+            "sessionAttributes": {},
+            "intent": {"name": "FallbackIntent"},
+        },
+    }
+
+    lambda_orchestrator.lambda_handler(event, None)
+
+    assert bedrock.inputs == [
+        "My number is [PHONE], is the flu shot free at the clinic"
+    ]
+    assert "555-201-3344" not in str(event)
+    assert '"RedactedEntities": 1' in capsys.readouterr().out
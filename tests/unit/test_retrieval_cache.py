@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+import lambda_orchestrator
+import retrieval_cache
+
+SETTINGS = {**retrieval_cache.DEFAULT_RETRIEVAL_CACHE, "local_size": 2}
+
+
+class CacheTable:
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, Key):
+        item = self.items.get(Key["cache_key"])
+        return {"Item": item} if item else {}
+
+    def put_item(self, Item):
+        self.items[Item["cache_key"]] = Item
+
+
+def test_local_tier_is_least_recently_used():
+    cache = retrieval_cache.create_cache({**SETTINGS, "backend": "memory"})
+    cache.put("a", ["A"])
+    cache.put("b", ["B"])
+    cache.get("a")
+    cache.put("c", ["C"])
+
+    assert cache.get("a") == (["A"], retrieval_cache.LOCAL)
+    assert cache.get("b") == (None, None)
+
+
+def test_shared_hits_are_kept_locally():
+    table = CacheTable()
+    writer = retrieval_cache.create_cache(SETTINGS, lambda: table)
+    reader = retrieval_cache.create_cache(SETTINGS, lambda: table)
+    results = [{"content": {"text": "Flu shots are free."}, "score": 0.7}]
+    writer.put("key", results)
+
+    assert reader.get("key") == (results, retrieval_cache.SHARED)
+    assert reader.get("key") == (results, retrieval_cache.LOCAL)
+
+
+def test_keys_change_with_the_version_but_not_the_wording():
+    search = {"numberOfResults": 5}
+    key = retrieval_cache.cache_key("Is the flu shot free?", "kb", search, "v1")
+
+    assert key == retrieval_cache.cache_key(
+        "is the flu shot FREE", "kb", search, "v1"
+    )
+    assert key != retrieval_cache.cache_key(
+        "is the flu shot free", "kb", search, "v2"
+    )
+    assert key != retrieval_cache.cache_key(
+        "is the flu shot free", "kb", {"numberOfResults": 3}, "v1"
+    )
+
+
+class CountingRetrieve:
+    def __init__(self):
+        self.calls = 0
+
+    def retrieve(self, **kwargs):
+        self.calls += 1
+        return {
+            "retrievalResults": [
+                {
+                    "content": {"text": "Flu shots are free at the clinic."},
+                    "location": {"s3Location": {"uri": "s3://docs/flu.pdf"}},
+                    "score": 0.7,
+                }
+            ]
+        }
+
+
+class Converse:
+    def converse(self, **kwargs):
+        return {
+            "output": {"message": {"content": [{"text": "Yes, free."}]}},
+            "usage": {"inputTokens": 40},
+        }
+
+
+@pytest.fixture
+def cached(orchestrator, kb_version, monkeypatch):
+    bedrock = CountingRetrieve()
+    table = CacheTable()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-runtime", Converse()
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "retrieval_cache_table", table
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.CONTEXT_COMPRESSION, "enabled", True
+    )
+    monkeypatch.setattr(
+        lambda_orchestrator, "RETRIEVAL_CACHE", {**SETTINGS, "enabled": True}
+    )
+    monkeypatch.setattr(lambda_orchestrator, "retrieval_caches", {})
+    return bedrock, kb_version
+
+
+@pytest.fixture
+def ask(make_event):
+    def turn(text):
+        return lambda_orchestrator.lambda_handler(make_event(text), None)
+
+    return turn
+
+
+def test_retrievals_are_cached_until_the_version_changes(cached, ask, capsys):
+    bedrock, parameter = cached
+
+    ask("Is the flu shot free")
+    ask("is the flu shot free?")
+    # A new execution environment finds the shared entry
+    lambda_orchestrator.retrieval_caches.clear()
+    ask("Is the flu shot free")
+    assert bedrock.calls == 1
+
+    parameter.version = "v2"
+    lambda_orchestrator.kb_version["expires_at"] = 0.0
+    response = ask("Is the flu shot free")
+    assert bedrock.calls == 2
+    assert response["messages"][0]["content"] == "Yes, free."
+
+    records = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+    lookups = [r for r in records if "RetrievalCacheLookups" in r]
+    assert [
+        (r["RetrievalCacheLocalHits"], r["RetrievalCacheSharedHits"])
+        for r in lookups
+    ] == [(0, 0), (1, 0), (0, 1), (0, 0)]
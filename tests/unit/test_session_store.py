@@ -0,0 +1,147 @@
+import random
+
+import pytest
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+
+import lambda_orchestrator
+import session_store
+
+SETTINGS = {**session_store.DEFAULT_SESSION_STORE, "backend": "memory"}
+
+
+def turns(count, text="How do I book a flu shot"):
+    return [
+        {"q": f"{text} {n}", "a": f"Call the clinic {n}."} for n in range(count)
+    ]
+
+
+@pytest.fixture(params=["memory", "file"])
+def store(request, tmp_path):
+    return session_store.create_store(
+        {**SETTINGS, "backend": request.param, "path": str(tmp_path)}
+    )
+
+
+def test_round_trip(store):
+    store.save("session/1", {"kb_session": "kb-1", "history": turns(2)})
+
+    assert store.load("session/1") == {
+        "kb_session": "kb-1",
+        "history": turns(2),
+    }
+    assert store.load("other") == session_store.new_session()
+
+
+def test_backends_must_read_and_write():
+    with pytest.raises(TypeError):
+        session_store.SessionStore(SETTINGS)
+
+
+def test_expired_sessions_are_new(store, monkeypatch):
+    store.save("session-1", {"kb_session": "kb-1", "history": turns(1)})
+    expired = session_store.time.time() + SETTINGS["ttl_seconds"] + 1
+    monkeypatch.setattr(session_store.time, "time", lambda: expired)
+
+    assert store.load("session-1") == session_store.new_session()
+
+
+def test_history_keeps_recent_turns_within_limits():
+    blob = session_store.encode_history(turns(10), 3, 4096)
+    assert session_store.decode_history(blob) == turns(10)[-3:]
+
+    # Random text barely compresses, so no turn fits in 100 bytes
+    long_turns = [
+        {"q": random.Random(n).randbytes(200).hex(), "a": "y"} for n in range(3)
+    ]
+    blob = session_store.encode_history(long_turns, 6, 100)
+    assert session_store.decode_history(blob) == []
+
+
+class FakeTable:
+    def __init__(self, error=None):
+        self.items = {}
+        self.error = error
+
+    def get_item(self, Key):
+        if self.error:
+            raise self.error
+        item = self.items.get(Key["SessionID_Lex"])
+        return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, **kwargs):
+        if self.error:
+            raise self.error
+        item = self.items.setdefault(Key["SessionID_Lex"], {})
+        for name, value in kwargs["ExpressionAttributeValues"].items():
+            # boto3 returns binary attributes wrapped in Binary
+            item[name[1:]] = (
+                Binary(value) if isinstance(value, bytes) else value
+            )
+
+
+THROTTLED = ClientError(
+    {"Error": {"Code": "ProvisionedThroughputExceededException"}}, "GetItem"
+)
+
+
+def test_dynamodb_backend_sets_ttl_and_unwraps_binary():
+    table = FakeTable()
+    store = session_store.create_store(
+        {**SETTINGS, "backend": "dynamodb"}, lambda: table
+    )
+
+    store.save("session-1", {"kb_session": "kb-1", "history": turns(1)})
+
+    item = table.items["session-1"]
+    assert item["expires_at"] > session_store.time.time()
+    assert store.load("session-1")["history"] == turns(1)
+
+
+def test_dynamodb_errors_are_typed():
+    store = session_store.create_store(
+        {**SETTINGS, "backend": "dynamodb"}, lambda: FakeTable(THROTTLED)
+    )
+
+    with pytest.raises(session_store.SessionStoreError):
+        store.load("session-1")
+    with pytest.raises(session_store.SessionStoreError):
+        store.save("session-1", session_store.new_session())
+
+
+class RecordingBedrock:
+    def __init__(self):
+        self.calls = []
+
+    def retrieve_and_generate(self, **kwargs):
+        self.calls.append(kwargs)
+        return {"sessionId": "kb-session", "output": {"text": "Yes."}}
+
+
+def test_store_failures_never_reach_bedrock(monkeypatch):
+    bedrock = RecordingBedrock()
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "bedrock-agent-runtime", bedrock
+    )
+    monkeypatch.setitem(
+        lambda_orchestrator.clients, "conversation_table", FakeTable(THROTTLED)
+    )
+    monkeypatch.setattr(lambda_orchestrator, "session_stores", {})
+    monkeypatch.setenv("KBID", "kb-1")
+    monkeypatch.setenv("MODEL_ARN", "model")
+
+    response = lambda_orchestrator.lambda_handler(
+        {
+            "sessionId": "session-1",
+            "inputMode": "Text",
+            "transcriptions": [{"transcription": "Is the flu shot free"}],
+            "sessionState": {
+                "sessionAttributes": {},
+                "intent": {"name": "FallbackIntent"},
+            },
+        },
+        None,
+    )
+
+    assert response["messages"][0]["content"] == "Yes."
+    assert "sessionId" not in bedrock.calls[0]
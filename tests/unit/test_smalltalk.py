@@ -0,0 +1,63 @@
+import pytest
+
+import lambda_orchestrator
+import smalltalk
+import smalltalk_training
+
+
+@pytest.mark.parametrize(
+    "text, label",
+    [
+        ("thanks so much", "thanks"),
+        ("ok bye", "goodbye"),
+        ("can I talk to a person", "agent"),
+        ("tell me a joke", "offtopic"),
+        ("what are the symptoms of measles", None),
+        ("where can I get my flu shot, thanks", None),
+        # Greetings and requests for help are not thanks or goodbyes
+        ("help", None),
+        ("I need help", None),
+        ("hello", None),
+        ("good morning", None),
+    ],
+)
+def test_shipped_model_routes_small_talk_only(text, label):
+    assert smalltalk.classify(text) == label
+
+
+def test_long_turns_always_reach_the_knowledge_base():
+    text = "thank you " * 10
+
+    assert smalltalk.predict(text)[0] == "thanks"
+    assert smalltalk.classify(text) is None
+
+
+def test_cross_validation_rarely_suppresses_questions():
+    examples = smalltalk_training.load_examples(
+        smalltalk_training.DEFAULT_SEED_PATH
+    )
+
+    scores = smalltalk_training.score(
+        smalltalk_training.cross_validate(examples, folds=5, threshold=0.9)
+    )
+
+    assert scores["suppression_rate"] < 0.05
+    assert scores["labels"]["thanks"]["recall"] > 0.8
+
+
+def test_agent_request_sets_transfer_attribute_without_bedrock():
+    event = {
+        "sessionId": "session-1",
+        "transcriptions": [{"transcription": "I want to speak to a human"}],
+        "sessionState": {
+            "sessionAttributes": {},
+            "intent": {"name": "FallbackIntent"},
+        },
+    }
+
+    response = lambda_orchestrator.lambda_handler(event, None)
+
+    attributes = response["sessionState"]["sessionAttributes"]
+    assert attributes[lambda_orchestrator.TRANSFER_ATTRIBUTE] == "true"
+    assert response["messages"][0]["content"] == smalltalk.RESPONSES["agent"]
+    assert "bedrock-agent-runtime" not in lambda_orchestrator.clients
@@ -0,0 +1,122 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+vector_store_export = pytest.importorskip("vector_store_export")
+
+
+class FakeCursor:
+    """Serves the count query and FETCH FORWARD batches of rows."""
+
+    def __init__(self, rows, dimension):
+        self.rows = rows
+        self.dimension = dimension
+        self.position = 0
+        self.result = []
+
+    def execute(self, statement):
+        if statement.startswith("SELECT count(*)"):
+            dimension = self.dimension if self.rows else None
+            self.result = [(len(self.rows), dimension)]
+        elif statement.startswith("FETCH FORWARD"):
+            size = int(statement.split()[2])
+            self.result = self.rows[self.position : self.position + size]
+            self.position += len(self.result)
+        else:
+            self.result = []
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, rows, dimension):
+        self._cursor = FakeCursor(rows, dimension)
+        self.rolled_back = False
+
+    def cursor(self):
+        return self._cursor
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def table_rows(count, dimension, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        (
+            f"id-{n}",
+            rng.standard_normal(dimension).astype(np.float32).tolist(),
+            f"chunk {n}",
+            json.dumps({"source": f"doc-{n % 3}.pdf"}),
+            None,
+        )
+        for n in range(count)
+    ]
+
+
+def export(tmp_path, rows, dimension, batch_size=4):
+    conn = FakeConnection(rows, dimension)
+    manifest = vector_store_export.export_snapshot(
+        conn, str(tmp_path), batch_size=batch_size
+    )
+    assert conn.rolled_back
+    return manifest, vector_store_export.load_snapshot(str(tmp_path))
+
+
+def test_export_round_trip(tmp_path):
+    rows = table_rows(10, 6)
+
+    manifest, snapshot = export(tmp_path, rows, 6)
+
+    assert manifest["rows"] == 10 and manifest["dimension"] == 6
+    assert snapshot.manifest["source"] == "bedrock_integration.bedrock_kb"
+    np.testing.assert_allclose(
+        snapshot.embeddings, np.array([row[1] for row in rows], np.float32)
+    )
+    table = snapshot.rows().to_pydict()
+    assert table["row"] == list(range(10))
+    assert table["id"] == [row[0] for row in rows]
+    assert table["chunks"][7] == "chunk 7"
+    assert json.loads(table["metadata"][4]) == {"source": "doc-1.pdf"}
+
+
+def test_search_matches_exact_top_k(tmp_path):
+    _, snapshot = export(tmp_path, table_rows(50, 8), 8)
+    queries = np.random.default_rng(1).standard_normal((3, 8))
+
+    # Small blocks exercise the merge across blocks
+    scores, rows = snapshot.search(queries, k=5, block_rows=7)
+
+    matrix = np.asarray(snapshot.embeddings, dtype=np.float64)
+    cosine = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ (
+        matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    ).T
+    expected = np.argsort(-cosine, axis=1)[:, :5]
+    np.testing.assert_array_equal(rows, expected)
+    np.testing.assert_allclose(
+        scores, np.take_along_axis(cosine, expected, axis=1), rtol=1e-5
+    )
+
+
+def test_search_caps_k_and_handles_empty_snapshots(tmp_path):
+    _, snapshot = export(tmp_path / "small", table_rows(3, 4), 4)
+    scores, rows = snapshot.search(np.ones(4), k=10)
+    assert rows.shape == (1, 3)
+
+    _, empty = export(tmp_path / "empty", [], 4)
+    scores, rows = empty.search(np.ones(4), k=5)
+    assert scores.shape == rows.shape == (1, 0)
+
+
+def test_zero_query_scores_zero(tmp_path):
+    _, snapshot = export(tmp_path, table_rows(5, 4), 4)
+
+    scores, _ = snapshot.search(np.zeros(4), k=2)
+
+    assert np.all(np.isfinite(scores)) and np.all(scores == 0)
@@ -0,0 +1,402 @@
+"""Tests for the vector store maintenance Lambda.
+
+The decision tests run against a fake cursor. The rest run against a local
+Postgres with pgvector, configured through the standard PGHOST / PGPORT /
+PGUSER / PGPASSWORD / PGDATABASE variables.
+"""
+
+import os
+import time
+import uuid
+
+import pytest
+
+pg8000 = pytest.importorskip("pg8000")
+vector_store_maintenance = pytest.importorskip("vector_store_maintenance")
+
+requires_postgres = pytest.mark.skipif(
+    "PGHOST" not in os.environ, reason="PGHOST not set, no local Postgres"
+)
+
+
+class RecordingCloudWatch:
+    def __init__(self):
+        self.metrics = []
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.metrics.extend(MetricData)
+
+    def names(self):
+        return [datum["MetricName"] for datum in self.metrics]
+
+
+MB = 1024 * 1024
+
+
+class FakeCursor:
+    """Answers the maintenance queries from canned statistics and records
+    every other statement."""
+
+    def __init__(self, table, indexes, baselines=None):
+        self.table = table
+        self.indexes = indexes
+        self.baselines = dict(baselines or {})
+        self.statements = []
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        if "FROM pg_stat_user_tables" in statement:
+            self.rows = [self.table]
+        elif "FROM pg_stat_user_indexes" in statement:
+            self.rows = self.indexes
+        elif "SELECT index_name, bytes_per_tuple" in statement:
+            self.rows = list(self.baselines.items())
+        else:
+            if statement.lstrip().startswith("INSERT"):
+                self.baselines[params[0]] = params[1]
+            self.statements.append(" ".join(statement.split()))
+            self.rows = []
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def run(self, dry_run=False, **overrides):
+        return vector_store_maintenance.run_maintenance(
+            FakeConnection(self),
+            RecordingCloudWatch(),
+            thresholds(**overrides),
+            dry_run=dry_run,
+        )
+
+    def maintenance(self):
+        """Statements other than the state table's own bookkeeping."""
+        return [
+            s
+            for s in self.statements
+            if vector_store_maintenance.STATE_TABLE_NAME not in s
+        ]
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def table_row(live=10000, dead=0, modified=0):
+    return (live, dead, modified, 100 * MB, 60 * MB)
+
+
+def index_row(name, size_bytes=50 * MB, valid=True):
+    return (name, "hnsw", size_bytes, 12, valid)
+
+
+def test_index_bloat_ratio_compares_size_per_live_row():
+    ratio = vector_store_maintenance.index_bloat_ratio
+    assert ratio(2000, 10, 100) == pytest.approx(0.5)
+    # Shrunk below the reference, or nothing to compare against
+    assert ratio(500, 10, 100) == 0.0
+    assert ratio(2000, 0, 100) == 0.0
+    assert ratio(2000, 10, None) == 0.0
+
+
+@pytest.mark.parametrize(
+    "dead, modified, expected",
+    [
+        # 20% dead and over min_dead_tuples
+        (2500, 0, ["Vacuum"]),
+        # 20% dead but under min_dead_tuples: only the analyze is due
+        (500, 2500, ["Analyze"]),
+        # Few dead rows, few changes since the last analyze
+        (50, 100, []),
+    ],
+)
+def test_table_actions_follow_thresholds(dead, modified, expected):
+    live = dead * 4 if dead >= 500 else 10000
+    cur = FakeCursor(
+        table_row(live=live, dead=dead, modified=modified),
+        [index_row("bedrock_kb_embedding_idx")],
+    )
+
+    result = cur.run()
+
+    assert [a["action"] for a in result["actions"]] == expected
+    assert len(cur.maintenance()) == len(expected)
+
+
+def test_reindexes_only_large_bloated_indexes():
+    per_row = 50 * MB / 10000
+    cur = FakeCursor(
+        table_row(),
+        [
+            index_row("bloated_idx", 50 * MB),
+            index_row("small_idx", 1 * MB),
+            index_row("steady_idx", 50 * MB),
+        ],
+        # bloated_idx has doubled per row since its rebuild
+        {
+            "bloated_idx": per_row / 2,
+            "small_idx": 1 * MB / 10000 / 2,
+            "steady_idx": per_row,
+        },
+    )
+
+    result = cur.run()
+
+    assert [a["statement"] for a in result["actions"]] == [
+        'REINDEX INDEX CONCURRENTLY "bedrock_integration"."bloated_idx";'
+    ]
+    # The rebuilt index becomes the new reference
+    assert cur.baselines["bloated_idx"] == pytest.approx(per_row)
+
+
+def test_dry_run_reports_actions_without_running_them():
+    cur = FakeCursor(
+        table_row(live=8000, dead=2000),
+        [index_row("new_idx"), index_row("bedrock_kb_ccnew", valid=False)],
+    )
+
+    result = cur.run(dry_run=True)
+
+    assert [a["action"] for a in result["actions"]] == [
+        "Vacuum",
+        "DropInvalidIndex",
+    ]
+    assert all("seconds" not in a for a in result["actions"])
+    assert cur.maintenance() == []
+    # No baseline is recorded for the new index either
+    assert cur.baselines == {}
+
+
+def test_drops_indexes_left_by_interrupted_reindex():
+    cur = FakeCursor(
+        table_row(),
+        [
+            index_row("embedding_idx"),
+            index_row("embedding_idx_ccnew", valid=False),
+            index_row("embedding_idx_ccold1", valid=False),
+            index_row("half_built_idx", valid=False),
+        ],
+    )
+
+    cur.run()
+
+    assert cur.maintenance() == [
+        "DROP INDEX CONCURRENTLY IF EXISTS "
+        '"bedrock_integration"."embedding_idx_ccnew";',
+        "DROP INDEX CONCURRENTLY IF EXISTS "
+        '"bedrock_integration"."embedding_idx_ccold1";',
+    ]
+    # Invalid indexes never become a bloat reference
+    assert set(cur.baselines) == {"embedding_idx"}
+
+
+def test_handler_maintains_every_configured_table(monkeypatch):
+    maintained = []
+    monkeypatch.setenv("DB_SECRET_ARN", "secret")
+    monkeypatch.setenv("DB_HOST", "proxy")
+    monkeypatch.setenv("DB_NAME", "postgres")
+    monkeypatch.setenv("TABLES", '["bedrock_kb", "bedrock_kb_green"]')
+    monkeypatch.setattr(
+        vector_store_maintenance,
+        "get_secret",
+        lambda arn: {"username": "postgres", "password": "secret"},
+    )
+
+    class Connection:
+        def close(self):
+            pass
+
+    monkeypatch.setattr(
+        vector_store_maintenance.pg8000, "connect", lambda **kw: Connection()
+    )
+    monkeypatch.setattr(
+        vector_store_maintenance.boto3, "client", lambda name: None
+    )
+
+    def run_maintenance(conn, cloudwatch, thresholds, table, dry_run):
+        maintained.append((table, dry_run))
+        return {"actions": []}
+
+    monkeypatch.setattr(
+        vector_store_maintenance, "run_maintenance", run_maintenance
+    )
+
+    result = vector_store_maintenance.handler({"dry_run": True}, None)
+
+    assert maintained == [("bedrock_kb", True), ("bedrock_kb_green", True)]
+    assert set(result) == {"bedrock_kb", "bedrock_kb_green"}
+
+
+@pytest.fixture
+def conn():
+    conn = pg8000.connect(
+        host=os.environ["PGHOST"],
+        port=int(os.environ.get("PGPORT", 5432)),
+        user=os.environ.get("PGUSER", "postgres"),
+        password=os.environ.get("PGPASSWORD"),
+        database=os.environ.get("PGDATABASE", "postgres"),
+    )
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+    except pg8000.DatabaseError:
+        conn.close()
+        pytest.skip("pgvector extension is not available")
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def schema(conn):
+    schema = f"maintenance_test_{uuid.uuid4().hex[:8]}"
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema};")
+    cur.execute(f"""
+        CREATE TABLE {schema}.bedrock_kb (
+            id uuid PRIMARY KEY,
+            embedding vector(3),
+            chunks text
+        );""")
+    cur.execute(
+        f"CREATE INDEX ON {schema}.bedrock_kb USING hnsw (embedding vector_cosine_ops);"
+    )
+    cur.execute(f"""
+        INSERT INTO {schema}.bedrock_kb
+        SELECT gen_random_uuid(),
+               ARRAY[random(), random(), random()]::vector,
+               'chunk ' || n
+        FROM generate_series(1, 2000) AS n;""")
+    yield schema
+    cur.execute(f"DROP SCHEMA {schema} CASCADE;")
+
+
+def wait_for_stats(conn, schema, predicate):
+    # Table statistics are flushed asynchronously by the backend
+    cur = conn.cursor()
+    deadline = time.monotonic() + 10
+    while True:
+        cur.execute("SELECT pg_stat_clear_snapshot();")
+        stats = vector_store_maintenance.measure_table(
+            cur, schema, "bedrock_kb"
+        )
+        if predicate(stats) or time.monotonic() > deadline:
+            return stats
+        time.sleep(0.2)
+
+
+def thresholds(**overrides):
+    values = dict(vector_store_maintenance.DEFAULT_THRESHOLDS)
+    values.update(overrides)
+    return values
+
+
+@requires_postgres
+def test_vacuums_when_dead_tuples_cross_threshold(conn, schema):
+    conn.cursor().execute(
+        f"DELETE FROM {schema}.bedrock_kb WHERE chunks LIKE 'chunk 1%';"
+    )
+    wait_for_stats(conn, schema, lambda stats: stats["dead_tuples"] > 0)
+    cloudwatch = RecordingCloudWatch()
+
+    result = vector_store_maintenance.run_maintenance(
+        conn,
+        cloudwatch,
+        thresholds(min_dead_tuples=100),
+        schema=schema,
+        table="bedrock_kb",
+    )
+
+    assert result["table"]["dead_tuples"] > 100
+    assert [action["action"] for action in result["actions"]] == ["Vacuum"]
+    assert "DeadTuples" in cloudwatch.names()
+    assert "VacuumDuration" in cloudwatch.names()
+    stats = wait_for_stats(
+        conn, schema, lambda stats: stats["dead_tuples"] == 0
+    )
+    assert stats["dead_tuples"] == 0
+
+
+@requires_postgres
+def test_leaves_clean_table_alone(conn, schema):
+    conn.cursor().execute(f"ANALYZE {schema}.bedrock_kb;")
+    wait_for_stats(
+        conn, schema, lambda stats: stats["modified_since_analyze"] == 0
+    )
+
+    result = vector_store_maintenance.run_maintenance(
+        conn,
+        RecordingCloudWatch(),
+        thresholds(),
+        schema=schema,
+        table="bedrock_kb",
+    )
+
+    assert result["actions"] == []
+    # First run records the post-build size of each index as its baseline
+    baselines = vector_store_maintenance.load_baselines(conn.cursor(), schema)
+    assert set(baselines) == {index["name"] for index in result["indexes"]}
+
+
+@requires_postgres
+def test_reindexes_bloated_index_concurrently(conn, schema):
+    wait_for_stats(conn, schema, lambda stats: stats["live_tuples"] > 0)
+    cur = conn.cursor()
+    vector_store_maintenance.ensure_state_table(cur, schema)
+    indexes = vector_store_maintenance.measure_indexes(
+        cur, schema, "bedrock_kb"
+    )
+    hnsw_index = next(i for i in indexes if i["access_method"] == "hnsw")
+    vector_store_maintenance.save_baseline(cur, schema, hnsw_index["name"], 1.0)
+    cloudwatch = RecordingCloudWatch()
+
+    result = vector_store_maintenance.run_maintenance(
+        conn,
+        cloudwatch,
+        thresholds(min_index_bytes=0, analyze_ratio=10),
+        schema=schema,
+        table="bedrock_kb",
+    )
+
+    statements = [action["statement"] for action in result["actions"]]
+    assert any(
+        "REINDEX INDEX CONCURRENTLY" in s and hnsw_index["name"] in s
+        for s in statements
+    )
+    assert "ReindexDuration" in cloudwatch.names()
+    baselines = vector_store_maintenance.load_baselines(cur, schema)
+    assert baselines[hnsw_index["name"]] > 1.0
+
+
+@requires_postgres
+def test_dry_run_reports_without_executing(conn, schema):
+    conn.cursor().execute(f"DELETE FROM {schema}.bedrock_kb;")
+    wait_for_stats(conn, schema, lambda stats: stats["dead_tuples"] > 0)
+
+    result = vector_store_maintenance.run_maintenance(
+        conn,
+        RecordingCloudWatch(),
+        thresholds(min_dead_tuples=1),
+        schema=schema,
+        table="bedrock_kb",
+        dry_run=True,
+    )
+
+    assert result["actions"][0]["action"] == "Vacuum"
+    assert "seconds" not in result["actions"][0]
+    stats = vector_store_maintenance.measure_table(
+        conn.cursor(), schema, "bedrock_kb"
+    )
+    assert stats["dead_tuples"] > 0
@@ -0,0 +1,101 @@
+import pytest
+
+vector_store_setup = pytest.importorskip("vector_store_setup")
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        self.statements.append(" ".join(statement.split()))
+
+
+class FakeConnection:
+    def __init__(self):
+        self._cursor = RecordingCursor()
+        self.autocommit = False
+
+    def cursor(self):
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+def event(tables=None, request_type="Create"):
+    properties = {"Timestamp": "1"}
+    if tables is not None:
+        properties["Tables"] = tables
+    return {"RequestType": request_type, "ResourceProperties": properties}
+
+
+def test_tables_default_to_the_main_table():
+    assert vector_store_setup.get_tables(event()) == [
+        {"Name": "bedrock_kb", "Dimension": 1024}
+    ]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    conn = FakeConnection()
+    responses = []
+    monkeypatch.setenv("DB_SECRET_ARN", "secret")
+    monkeypatch.setenv("DB_HOST", "proxy")
+    monkeypatch.setenv("DB_NAME", "postgres")
+    monkeypatch.setattr(
+        vector_store_setup,
+        "get_secret",
+        lambda arn: {"username": "postgres", "password": "secret"},
+    )
+    monkeypatch.setattr(
+        vector_store_setup.pg8000, "connect", lambda **kwargs: conn
+    )
+    monkeypatch.setattr(
+        vector_store_setup.cfnresponse,
+        "send",
+        lambda event, context, status, data: responses.append(status),
+    )
+    conn.responses = responses
+    return conn
+
+
+def test_every_slot_and_program_table_is_created(database):
+    vector_store_setup.handler(
+        event(
+            [
+                {"Name": "bedrock_kb", "Dimension": 1024},
+                {"Name": "bedrock_kb_green", "Dimension": 512},
+                {"Name": "bedrock_kb_wic", "Dimension": 1024},
+            ]
+        ),
+        None,
+    )
+
+    assert database.responses == [vector_store_setup.cfnresponse.SUCCESS]
+    created = [
+        s for s in database._cursor.statements if s.startswith("CREATE TABLE")
+    ]
+    assert [s.split()[5] for s in created] == [
+        'bedrock_integration."bedrock_kb"',
+        'bedrock_integration."bedrock_kb_green"',
+        'bedrock_integration."bedrock_kb_wic"',
+    ]
+    assert "embedding vector(512)" in created[1]
+    assert any(
+        "bedrock_kb_green_embedding_idx" in s
+        for s in database._cursor.statements
+    )
+
+
+def test_delete_leaves_the_tables(database):
+    vector_store_setup.handler(event(request_type="Delete"), None)
+
+    assert database._cursor.statements == []
+    assert database.responses == [vector_store_setup.cfnresponse.SUCCESS]